@@ -8,36 +8,43 @@ import matplotlib.pyplot as plt
 from datetime import datetime, date
 from typing import Tuple, Dict, List, Optional
 import os
+from pathlib import Path
+
+from archivo_eventos import bloques_en_rango, extremos_fechas, leer_eventos_texto, ruta_indice
+from exportar_columnar import a_temporal, borrar_temporales, exportar_eventos, exportar_metricas
+from memo_metricas import MemoLRU, normalizar_filtros, version_archivo
+from metricas_parqueos import preparar_eventos, mascara_filtros, calcular_metricas, ocupacion_rango
+from reporte_diario import html_bytes, reporte_rango
+from sketch_cuantiles import CuantilesDiarios
+from sketch_hll import UnicosDiarios
+from sketch_topk import TopKDiario
+from tabla_paginada import tabla_paginada
+
+ADMIN_CODE = "UVG-2025"   # el mismo de app_streamlit.py: habilita la vista Admin
 
 # ------------------------- CARGA Y PREPARACIÓN -------------------------
 
-@st.cache_data
-def cargar_datos(ruta_eventos: str, ruta_parqueos: str) -> Tuple[pd.DataFrame, pd.DataFrame, str]:
-    """Lee CSVs y retorna df_eventos, df_parqueos y un mensaje de estado."""
+@st.cache_resource(max_entries=2)
+def cargar_datos(ruta_eventos: str, ruta_parqueos: str, version: tuple,
+                 desde_carga: Optional[date] = None) -> Tuple[pd.DataFrame, pd.DataFrame, str]:
+    """
+    Lee CSVs y retorna df_eventos, df_parqueos y un mensaje de estado.
+    `version` (mtime, tamaño de ambos archivos y del índice del archivo frío)
+    invalida la caché cuando el log crece o se archiva; los DataFrames se
+    comparten entre sesiones (solo lectura). Del archivo frío y de Eventos.csv
+    solo se leen los bloques y horas desde `desde_carga` (None: todo el historial).
+    """
     estado = "OK"
     if not os.path.exists(ruta_eventos) or not os.path.exists(ruta_parqueos):
         estado = "No se encontraron uno o más archivos CSV requeridos."
         return pd.DataFrame(), pd.DataFrame(), estado
 
-    df_eventos = pd.read_csv(ruta_eventos, dtype=str)
+    df_eventos = leer_eventos_texto(ruta_eventos, desde_carga)
     df_parqueos = pd.read_csv(ruta_parqueos, header=None, names=["lot_id", "capacity", "occupied"], dtype=str)
 
-    # Tipos y columnas derivadas
-    if "timestamp" in df_eventos.columns:
-        df_eventos["timestamp"] = pd.to_datetime(df_eventos["timestamp"], errors="coerce", utc=True)
-        df_eventos["fecha"] = df_eventos["timestamp"].dt.date
-        df_eventos["hora"] = df_eventos["timestamp"].dt.hour
-    else:
-        df_eventos["fecha"] = pd.NaT
-        df_eventos["hora"] = pd.NA
-
-    for col in ["success", "free_spots_after", "capacity"]:
-        if col in df_eventos.columns:
-            df_eventos[col] = pd.to_numeric(df_eventos[col], errors="coerce")
-
-    for col in ["accion", "motivo", "lot_id"]:
-        if col in df_eventos.columns:
-            df_eventos[col] = df_eventos[col].fillna("").str.strip()
+    df_eventos = preparar_eventos(df_eventos)
+    if desde_carga is not None and not df_eventos.empty:
+        df_eventos = df_eventos[df_eventos["fecha"] >= desde_carga].reset_index(drop=True)
 
     df_parqueos["capacity"] = pd.to_numeric(df_parqueos["capacity"], errors="coerce")
     df_parqueos["occupied"] = pd.to_numeric(df_parqueos["occupied"], errors="coerce")
@@ -45,65 +52,61 @@ def cargar_datos(ruta_eventos: str, ruta_parqueos: str) -> Tuple[pd.DataFrame, p
     return df_eventos, df_parqueos, estado
 
 
-def aplicar_filtros(df: pd.DataFrame,
-                    f_ini: Optional[date],
-                    f_fin: Optional[date],
-                    motivos: List[str],
-                    lotes: List[str]) -> pd.DataFrame:
-    """Filtra por rango de fechas, motivos y lotes."""
-    dff = df.copy()
-    if f_ini:
-        dff = dff[dff["fecha"] >= f_ini]
-    if f_fin:
-        dff = dff[dff["fecha"] <= f_fin]
-    if motivos:
-        dff = dff[dff["motivo"].str.lower().isin([m.lower() for m in motivos])]
-    if lotes:
-        dff = dff[dff["lot_id"].isin(lotes)]
-    return dff
+@st.cache_resource
+def memo_metricas() -> MemoLRU:
+    """Filtros, métricas y datos de gráficos por (versión del log, filtros normalizados)."""
+    return MemoLRU()
 
 
-# ------------------------- ANÁLISIS (10) -------------------------
+# `origen` = (ruta absoluta, versión del índice del archivo frío, desde_carga):
+# los sketches se sincronizan por posición de fila, y archivar o cambiar el
+# rango cargado cambia las filas del DataFrame.
+@st.cache_resource(max_entries=2)
+def topk_diario(origen: tuple) -> TopKDiario:
+    """Sketches diarios de usuarios y lotes; `sincronizar` solo procesa las filas nuevas."""
+    return TopKDiario()
 
-def calcular_metricas(df: pd.DataFrame) -> Dict[str, object]:
-    """Devuelve 10 indicadores/series para usar en tarjetas y gráficos."""
-    resultados: Dict[str, object] = {}
 
-    acciones = df["accion"].value_counts(dropna=False) if "accion" in df.columns else pd.Series(dtype=int)
-    reservas = df[df["accion"] == "reserva"] if "accion" in df.columns else pd.DataFrame()
+@st.cache_resource(max_entries=2)
+def unicos_diarios(origen: tuple) -> UnicosDiarios:
+    """HyperLogLog por (fecha, lote, motivo) para usuarios únicos con cualquier filtro."""
+    return UnicosDiarios()
 
-    total_reservas = int(len(reservas))
-    tasa_exito = float(round(reservas["success"].mean() * 100, 2)) if "success" in reservas.columns and len(reservas) else 0.0
 
-    motivos = reservas["motivo"].value_counts() if "motivo" in reservas.columns else pd.Series(dtype=int)
-    horas = df["hora"].value_counts().sort_index() if "hora" in df.columns else pd.Series(dtype=int)
-    reservas_por_dia = reservas.groupby("fecha").size() if "fecha" in reservas.columns and len(reservas) else pd.Series(dtype=int)
-    reservas_por_lote = reservas["lot_id"].value_counts() if "lot_id" in reservas.columns else pd.Series(dtype=int)
+@st.cache_resource(max_entries=2)
+def cuantiles_diarios(origen: tuple) -> CuantilesDiarios:
+    """t-digest por (fecha, lote, motivo) de anticipación, duración y retraso de check-in."""
+    return CuantilesDiarios()
 
-    if {"free_spots_after", "capacity"}.issubset(df.columns):
-        occ = (1 - (df["free_spots_after"] / df["capacity"])).dropna()
-        ocupacion_prom = float(round(occ.mean() * 100, 2)) if len(occ) else 0.0
-        df_occ = df.dropna(subset=["lot_id", "free_spots_after", "capacity"]).copy()
-        df_occ["occ"] = 1 - (df_occ["free_spots_after"] / df_occ["capacity"])
-        ocupacion_por_lote = df_occ.groupby("lot_id")["occ"].mean().sort_values(ascending=False) * 100 if len(df_occ) else pd.Series(dtype=float)
-    else:
-        ocupacion_prom = 0.0
-        ocupacion_por_lote = pd.Series(dtype=float)
 
-    top_usuarios = reservas["user_id"].value_counts().head(10) if "user_id" in reservas.columns else pd.Series(dtype=int)
+def _filas_filtradas(df: pd.DataFrame, filtros: tuple):
+    """Posiciones de las filas que pasan los filtros (None = todas)."""
+    f_ini, f_fin, motivos, lotes = filtros
+    mask = mascara_filtros(df, date.fromisoformat(f_ini) if f_ini else None,
+                           date.fromisoformat(f_fin) if f_fin else None, list(motivos), list(lotes))
+    return None if mask.all() else mask.to_numpy().nonzero()[0]
 
-    resultados["acciones"] = acciones
-    resultados["total_reservas"] = total_reservas
-    resultados["tasa_exito"] = tasa_exito
-    resultados["motivos"] = motivos
-    resultados["horas"] = horas
-    resultados["reservas_por_dia"] = reservas_por_dia
-    resultados["reservas_por_lote"] = reservas_por_lote
-    resultados["ocupacion_prom"] = ocupacion_prom
-    resultados["ocupacion_por_lote"] = ocupacion_por_lote
-    resultados["top_usuarios"] = top_usuarios
 
-    return resultados
+def _metricas(df_eventos: pd.DataFrame, df_parqueos: pd.DataFrame, dff: pd.DataFrame,
+              filtros: tuple, tiempos: pd.DataFrame, usuarios: pd.Series) -> Dict[str, object]:
+    # Ocupación de los días del rango con las reservas que los solapan, la capacidad
+    # de los lotes elegidos en Parqueos.csv y las cancelaciones del log completo
+    f_ini, f_fin, motivos, lotes = filtros
+    capacidades = df_parqueos.dropna(subset=["capacity"]).set_index("lot_id")["capacity"].astype(int).to_dict()
+    occ = ocupacion_rango(df_eventos, date.fromisoformat(f_ini) if f_ini else None,
+                          date.fromisoformat(f_fin) if f_fin else None, list(motivos), list(lotes), capacidades)
+    return calcular_metricas(dff, tiempos=tiempos, ocupacion=occ, usuarios=usuarios)
+
+
+def _datos_graficos(dff: pd.DataFrame) -> Dict[str, object]:
+    """Lo que necesitan los gráficos que no está en `calcular_metricas` (éxito/fallo, histograma por hora)."""
+    con_reserva = {"accion", "success"}.issubset(dff.columns)
+    es_reserva = dff["accion"] == "reserva" if con_reserva else None
+    return {
+        "exito": int((es_reserva & (dff["success"] == 1)).sum()) if con_reserva else 0,
+        "fallo": int((es_reserva & (dff["success"] == 0)).sum()) if con_reserva else 0,
+        "horas": dff["hora"].dropna().value_counts().sort_index() if "hora" in dff.columns else pd.Series(dtype=int),
+    }
 
 
 # ------------------------- GRÁFICOS (5) -------------------------
@@ -142,12 +145,17 @@ def plot_pie(valores: List[float], labels: List[str], titulo: str):
     fig.tight_layout()
     return fig
 
-def plot_hist(valores: pd.Series, titulo: str, xlabel: str, bins: int = 24, rango: tuple = (0, 24)):
+def plot_hist(valores: pd.Series, titulo: str, xlabel: str, bins: int = 24, rango: tuple = (0, 24),
+              conteos: bool = False):
+    # conteos=True: `valores` ya viene agregado (índice = valor, dato = frecuencia)
     fig, ax = plt.subplots()
     if valores is None or len(valores.dropna()) == 0:
         ax.set_title(f"{titulo} (sin datos para los filtros)")
         return fig
-    ax.hist(valores.dropna(), bins=bins, range=rango)
+    if conteos:
+        ax.hist(valores.index, bins=bins, range=rango, weights=valores.to_numpy())
+    else:
+        ax.hist(valores.dropna(), bins=bins, range=rango)
     ax.set_title(titulo)
     ax.set_xlabel(xlabel)
     ax.set_ylabel("Frecuencia")
@@ -158,6 +166,9 @@ def plot_hist(valores: pd.Series, titulo: str, xlabel: str, bins: int = 24, rang
 # ------------------------- UI STREAMLIT -------------------------
 
 def main():
+    # Copy-on-write: filtros y selecciones son vistas hasta que se modifican (siempre activo desde pandas 3)
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
     st.set_page_config(page_title="Parqueos UVG – Análisis", layout="wide")
     st.title("📊 Sistema de Parqueos UVG — Análisis (Pandas + Matplotlib)")
 
@@ -167,7 +178,24 @@ def main():
     with col_paths[1]:
         ruta_parqueos = st.text_input("Ruta de **Parqueos.csv**", value="Parqueos.csv")
 
-    df_eventos, df_parqueos, estado = cargar_datos(ruta_eventos, ruta_parqueos)
+    # Rango cargado: por defecto el historial completo; acotarlo es opcional. Los
+    # índices del archivo frío y de Eventos.csv dicen qué bloques y bytes leer,
+    # así que con un rango el costo depende de él y no del largo del historial.
+    desde_carga = None
+    extremos = extremos_fechas(ruta_eventos)
+    if extremos:
+        primero, ultimo = extremos
+        bloques = bloques_en_rango(ruta_eventos)
+        desde_carga = st.sidebar.date_input(
+            "Cargar historial desde", value=primero,
+            min_value=primero, max_value=ultimo,
+            help=f"Historial {primero} → {ultimo} ({len(bloques)} bloques archivados); "
+                 "solo se leen los días desde esta fecha.")
+    version_log = (os.path.abspath(ruta_eventos), version_archivo(ruta_eventos),
+                   os.path.abspath(ruta_parqueos), version_archivo(ruta_parqueos),
+                   version_archivo(ruta_indice(ruta_eventos)), desde_carga)
+    df_eventos, df_parqueos, estado = cargar_datos(ruta_eventos, ruta_parqueos, version_log, desde_carga)
+    origen = (os.path.abspath(ruta_eventos), version_archivo(ruta_indice(ruta_eventos)), desde_carga)
     if estado != "OK":
         st.error(estado)
         st.stop()
@@ -187,13 +215,30 @@ def main():
     lotes_unicos = sorted(df_eventos["lot_id"].dropna().unique()) if "lot_id" in df_eventos.columns else []
     lotes_sel = st.sidebar.multiselect("Lotes", options=lotes_unicos, default=[])
 
-    dff = aplicar_filtros(df_eventos, f_ini if isinstance(f_ini, date) else None,
-                          f_fin if isinstance(f_fin, date) else None, motivos_sel, lotes_sel)
+    admin_try = st.sidebar.text_input("Admin Code (opcional)", type="password")
+    es_admin = bool(admin_try) and admin_try == ADMIN_CODE
+
+    # Cada resultado se calcula una vez por (versión del log, filtros) y se comparte entre sesiones
+    memo = memo_metricas()
+    clave = (version_log, normalizar_filtros(f_ini, f_fin, motivos_sel, lotes_sel))
+    filas = memo.obtener(("filtro",) + clave, lambda: _filas_filtradas(df_eventos, clave[1]))
+    dff = df_eventos if filas is None else df_eventos.iloc[filas]
 
     st.caption(f"Filas después de filtros: **{len(dff)}**")
 
     # ---- Métricas clave
-    resultados = calcular_metricas(dff)
+    # Percentiles de tiempos y top de usuarios desde los sketches diarios (no se recorre el historial)
+    cuantiles = cuantiles_diarios(origen)
+    cuantiles.sincronizar(df_eventos)
+    topk = topk_diario(origen)
+    topk.sincronizar(df_eventos)
+    f_i, f_f, mot, lot = clave[1]
+    filtro_sketch = dict(desde=date.fromisoformat(f_i) if f_i else None, hasta=date.fromisoformat(f_f) if f_f else None,
+                         lotes=lot, motivos=mot, sin_mayusculas=True)
+    resultados = memo.obtener(("metricas",) + clave, lambda: _metricas(
+        df_eventos, df_parqueos, dff, clave[1], cuantiles.resumen(**filtro_sketch),
+        topk.combinado("usuarios", **filtro_sketch).serie(10, "user_email")))
+    graficos = memo.obtener(("graficos",) + clave, lambda: _datos_graficos(dff))
     m1, m2, m3, m4 = st.columns(4)
     m1.metric("Reservas (total)", resultados["total_reservas"])
     m2.metric("Tasa de éxito (%)", resultados["tasa_exito"])
@@ -205,25 +250,103 @@ def main():
     with g1:
         st.pyplot(plot_barras(resultados["acciones"], "Frecuencia de acciones", "Acción", "Cantidad"))
     with g2:
-        exito = int((dff[(dff["accion"] == "reserva") & (dff["success"] == 1)]).shape[0]) if {"accion","success"}.issubset(dff.columns) else 0
-        fallo = int((dff[(dff["accion"] == "reserva") & (dff["success"] == 0)]).shape[0]) if {"accion","success"}.issubset(dff.columns) else 0
-        st.pyplot(plot_pie([exito, fallo], ["Éxito", "Fallo"], "Éxito vs. fallo en reservas"))
+        st.pyplot(plot_pie([graficos["exito"], graficos["fallo"]], ["Éxito", "Fallo"], "Éxito vs. fallo en reservas"))
 
     g3, g4 = st.columns(2)
     with g3:
         st.pyplot(plot_linea(resultados["reservas_por_dia"], "Reservas por día", "Fecha", "Nº reservas"))
     with g4:
-        st.pyplot(plot_hist(dff["hora"] if "hora" in dff.columns else pd.Series(dtype=int), "Distribución por hora", "Hora del día"))
+        st.pyplot(plot_hist(graficos["horas"], "Distribución por hora", "Hora del día", conteos=True))
 
     st.pyplot(plot_barras(resultados["reservas_por_lote"], "Reservas por lote", "Lote", "Nº reservas"))
 
+    with st.expander("Percentiles de tiempos (minutos, aproximados)"):
+        st.caption("Anticipación = inicio − momento de reservar · duración reservada · "
+                   "retraso de check-in = check-in − inicio (negativo: llegó antes).")
+        st.dataframe(resultados["percentiles_tiempos"], use_container_width=True)
+
+    # ---- Usuarios únicos (HyperLogLog): se combinan registros, no se recorren correos
+    unicos = unicos_diarios(origen)
+    unicos.sincronizar(df_eventos)
+    filtro_hll = dict(desde=f_ini if isinstance(f_ini, date) else None, hasta=f_fin if isinstance(f_fin, date) else None,
+                      lotes=lotes_sel, motivos=motivos_sel, sin_mayusculas=True)
+    u1, u2 = st.columns([1, 3])
+    u1.metric("Usuarios únicos (aprox.)", unicos.unicos(**filtro_hll), help="HyperLogLog, error típico ≈3 %.")
+    with u2:
+        st.pyplot(plot_linea(unicos.serie("fecha", **filtro_hll), "Usuarios únicos por día (aprox.)", "Fecha", "Nº usuarios"))
+
+    # ---- Top 10 por rango de fechas desde los sketches diarios (no recorre el log)
+    with st.expander("Top 10 usuarios y lotes (aproximado, con los filtros)"):
+        st.caption("Conteo real entre **minimo** y **conteo**; *garantizado* = seguro entre los 10 primeros. "
+                   "Aplica los filtros de fechas, motivos y lotes.")
+        t1, t2 = st.columns(2)
+        for col, tipo, titulo in [(t1, "usuarios", "Usuarios"), (t2, "lotes", "Lotes")]:
+            sk = topk.combinado(tipo, **filtro_sketch)
+            with col:
+                st.markdown(f"**{titulo}** · error máximo ±{sk.cota_error()} de {sk.total} reservas")
+                st.dataframe(sk.top(10), use_container_width=True, hide_index=True)
+
     # ---- Tabla y descarga de reporte
+    version = clave
     with st.expander("Ver tabla filtrada"):
-        st.dataframe(dff.sort_values("timestamp") if "timestamp" in dff.columns else dff)
+        tabla_paginada(dff, "cf3_tabla", version,
+                       columnas_orden=["timestamp", "accion", "lot_id", "motivo", "user_email", "slot_start"],
+                       columnas_filtro=["accion", "lot_id"])
 
-    reporte = _reporte_texto(resultados, f_ini, f_fin, motivos_sel, lotes_sel)
-    st.download_button("⬇️ Descargar reporte (TXT)", data=reporte.encode("utf-8"),
+    # Los reportes se arman al hacer clic, no en cada rerun
+    st.download_button("⬇️ Descargar reporte (TXT)",
+                       data=lambda: _reporte_texto(resultados, f_ini, f_fin, motivos_sel, lotes_sel).encode("utf-8"),
                        file_name="reporte_analisis.txt", mime="text/plain")
+    if isinstance(f_ini, date) and isinstance(f_fin, date):
+        st.download_button("⬇️ Descargar reporte (HTML con gráficos)",
+                           data=lambda: _reporte_html(ruta_eventos, df_eventos, df_parqueos, f_ini, f_fin,
+                                                      motivos_sel, lotes_sel),
+                           file_name="reporte_parqueos.html", mime="text/html")
+
+    # ---- Exportación columnar (se genera solo al pedirla)
+    with st.expander("Exportar datos (Parquet / Arrow)"):
+        formato = st.radio("Formato", ["parquet", "arrow"], horizontal=True, key="cf3_formato")
+        if st.button("Preparar exportación"):
+            # Archivos temporales escritos por bloques; la sesión guarda solo las rutas
+            previa = st.session_state.pop("cf3_export", None)
+            if previa:
+                borrar_temporales(*previa[2:])
+            st.session_state["cf3_export"] = (version, formato,
+                                              a_temporal(exportar_eventos, dff, formato=formato, sufijo=f".{formato}"),
+                                              a_temporal(exportar_metricas, resultados, formato=formato,
+                                                         sufijo=f".{formato}"))
+        exp = st.session_state.get("cf3_export")
+        if exp and exp[0] == version:
+            _, fmt, ruta_ev, ruta_met = exp
+            st.download_button(f"⬇️ Eventos filtrados (.{fmt})", data=Path(ruta_ev).read_bytes,
+                               file_name=f"eventos_filtrados.{fmt}", mime="application/octet-stream")
+            st.download_button(f"⬇️ Métricas (.{fmt})", data=Path(ruta_met).read_bytes,
+                               file_name=f"metricas.{fmt}", mime="application/octet-stream")
+
+    # ---- Admin (solo con el código de administración, como en app_streamlit)
+    if es_admin:
+        st.subheader("Panel de Administración")
+        with st.expander("Caché de métricas (compartida entre sesiones)"):
+            st.caption(f"Ocupación: **{memo.resumen()}** · se desaloja el resultado usado hace más tiempo.")
+            st.dataframe(memo.estadisticas(), use_container_width=True, hide_index=True)
+            if st.button("Vaciar caché de métricas", key="cf3_memo_limpiar"):
+                memo.limpiar()
+                st.success("Caché vaciada.")
+
+def _reporte_html(ruta_eventos: str, df_eventos: pd.DataFrame, df_parqueos: pd.DataFrame,
+                  f_ini: date, f_fin: date, motivos, lotes) -> bytes:
+    """Sin filtros de motivo/lote combina los paquetes diarios cerrados (reporte_diario.py)."""
+    capacidades = df_parqueos.dropna(subset=["capacity"]).set_index("lot_id")["capacity"].astype(int).to_dict()
+    canceladas = df_eventos.loc[(df_eventos["accion"] == "cancelacion") & (df_eventos["success"] == 1), "booking_id"]
+    df = df_eventos
+    if motivos:
+        df = df[df["motivo"].isin(motivos)]
+    if lotes:
+        df = df[df["lot_id"].isin(lotes)]
+    res, n_paq, n_calc = reporte_rango(ruta_eventos, f_ini, f_fin, df, capacidades, canceladas,
+                                       usar_paquetes=not motivos and not lotes)
+    return html_bytes(res, f_ini, f_fin, dias_paquete=n_paq, dias_calculados=n_calc)
+
 
 def _reporte_texto(res: Dict[str, object], f_ini, f_fin, motivos, lotes) -> str:
     """Genera texto con las 10 justificaciones para adjuntar en el informe."""
@@ -249,12 +372,16 @@ def _reporte_texto(res: Dict[str, object], f_ini, f_fin, motivos, lotes) -> str:
         f"{s(res.get('reservas_por_dia'))}\n\n",
         "7) Lotes más utilizados — Detección de zonas de mayor presión.\n",
         f"{s(res.get('reservas_por_lote'))}\n\n",
-        "8) Ocupación promedio observada (%) — Qué tan lleno opera el sistema.\n",
+        "8) Ocupación promedio ponderada por tiempo (%) — Qué tan lleno opera el sistema.\n",
         f"{res.get('ocupacion_prom', 0.0)}\n\n",
-        "9) Ocupación promedio por lote (%) — Comparativa entre zonas.\n",
-        f"{s(res.get('ocupacion_por_lote'))}\n\n",
+        "9) Ocupación promedio por lote (%) — Comparativa entre zonas (media, pico y p90 en el tiempo).\n",
+        f"{s(res.get('ocupacion_por_lote'))}\n",
+        f"Pico:\n{s(res.get('ocupacion_pico_por_lote'))}\n",
+        f"p90:\n{s(res.get('ocupacion_p90_por_lote'))}\n\n",
         "10) Usuarios con más reservas — Segmentación de uso recurrente.\n",
         f"{s(res.get('top_usuarios'))}\n\n",
+        "11) Percentiles de tiempos (min) — Anticipación, duración y retraso de check-in (p50/p90/p99).\n",
+        f"{s(res.get('percentiles_tiempos'))}\n\n",
     ]
     return "".join(lineas)
 
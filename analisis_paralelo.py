@@ -0,0 +1,286 @@
+# analisis_paralelo.py — analisis_basicos sobre el historial completo, en varios procesos.
+# El log se parte en segmentos (cada bloque del archivo frío con eventos o slots
+# en el rango y tramos de BYTES_POR_SEGMENTO de Eventos.csv, cortados en fin de
+# línea). Cada proceso lee
+# su segmento, aplica los mismos filtros y devuelve agregados parciales: conteos
+# (Series chicas), un t-digest por medida y, en memoria compartida, las reservas
+# vivas en forma compacta (lote, booking, inicio, fin, capacidad) más los
+# booking_id cancelados. El proceso principal suma los conteos, une los digests
+# y calcula la ocupación sobre las reservas juntas: el resultado tiene las mismas
+# claves que analisis_basicos. Los percentiles son aproximados (t-digest), igual
+# que en la versión secuencial.
+#
+# Los procesos se crean con fork: con spawn cada hijo volvería a ejecutar el
+# script que lo importó (analisis_parqueos.py pide los filtros al cargarse).
+# Donde fork no existe, o con un solo proceso o segmento, se corre en secuencia.
+
+import io
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
+from functools import partial
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from archivo_eventos import bloques_en_rango, leer_bloque
+from metricas_parqueos import mascara_filtros, preparar_eventos, reservas_en_rango
+from ocupacion_ponderada import ocupacion_ponderada, reservas_vivas
+from sketch_cuantiles import DELTA, MEDIDAS, TDigest, medidas_de_eventos, tabla_cuantiles
+from sketch_topk import SpaceSaving, TopKDiario
+
+BYTES_POR_SEGMENTO = 16 * 1024 * 1024
+_COLA_BYTES = 65536
+
+
+# ---------------------- SEGMENTOS ----------------------
+
+def segmentos(ruta_eventos: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+              bytes_por_segmento: int = BYTES_POR_SEGMENTO) -> List[Tuple]:
+    """
+    ("bloque", entrada_del_indice) por cada bloque archivado que toca el rango y
+    ("csv", byte_ini, byte_fin) por tramo de Eventos.csv; los tramos empiezan y
+    terminan en fin de línea y dejan fuera una última línea incompleta. Como la
+    ocupación cuenta las reservas hechas antes de `desde` con slots en el rango,
+    se incluyen sus bloques y el CSV se lee entero (como leer_eventos_texto con por_slot).
+    """
+    out: List[Tuple] = [("bloque", b) for b in bloques_en_rango(ruta_eventos, desde, hasta, por_slot=True)]
+    if not os.path.exists(ruta_eventos):
+        return out
+    with open(ruta_eventos, "rb") as f:
+        f.readline()
+        inicio = f.tell()
+        f.seek(max(inicio, os.path.getsize(ruta_eventos) - _COLA_BYTES))
+        pos = f.tell()
+        fin = pos + f.read().rfind(b"\n") + 1
+        cortes = [inicio]
+        for objetivo in range(inicio + bytes_por_segmento, fin, bytes_por_segmento):
+            if objetivo <= cortes[-1]:
+                continue
+            f.seek(objetivo - 1)
+            f.readline()
+            if f.tell() < fin:
+                cortes.append(f.tell())
+        cortes.append(fin)
+        out.extend(("csv", x, y) for x, y in zip(cortes[:-1], cortes[1:]) if y > x)
+    return out
+
+
+def _leer_segmento(ruta_eventos: str, segmento: Tuple) -> pd.DataFrame:
+    if segmento[0] == "bloque":
+        return leer_bloque(ruta_eventos, segmento[1])
+    _, a, b = segmento
+    with open(ruta_eventos, "rb") as f:
+        cabecera = f.readline()
+        f.seek(a)
+        datos = f.read(b - a)
+    return pd.read_csv(io.BytesIO(cabecera + datos), dtype=str)
+
+
+# ---------------------- PARCIALES (en cada proceso) ----------------------
+
+def _hash_ids(ids: pd.Series) -> np.ndarray:
+    return pd.util.hash_array(ids.fillna("").astype(str).to_numpy(dtype=object)).view(np.int64)
+
+
+def _a_memoria(vivas: pd.DataFrame, canceladas: pd.Series) -> Tuple[str, int, int, List[str]]:
+    """
+    Copia las reservas vivas y las cancelaciones a un bloque de memoria compartida:
+    int64 [n×4] (lote, booking, ini, fin), float64 [n] capacidad, int64 [m] cancelados.
+    """
+    codigos, lotes = pd.factorize(vivas["lot_id"])
+    n, m = len(vivas), len(canceladas)
+    shm = SharedMemory(create=True, size=max(8, 8 * (5 * n + m)))
+    try:
+        enteros = np.ndarray((n, 4), dtype=np.int64, buffer=shm.buf)
+        enteros[:, 0] = codigos
+        enteros[:, 1] = _hash_ids(vivas["booking_id"])
+        enteros[:, 2] = vivas["ini"].to_numpy(dtype=np.int64)
+        enteros[:, 3] = vivas["fin"].to_numpy(dtype=np.int64)
+        np.ndarray(n, dtype=np.float64, buffer=shm.buf, offset=32 * n)[:] = vivas["capacity"].to_numpy(dtype=float)
+        np.ndarray(m, dtype=np.int64, buffer=shm.buf, offset=40 * n)[:] = _hash_ids(canceladas)
+        del enteros
+        return shm.name, n, m, [str(x) for x in lotes]
+    finally:
+        shm.close()
+
+
+def _sketches_usuarios(df: pd.DataFrame) -> List[SpaceSaving]:
+    """Space-Saving por (fecha, lote, motivo) del segmento, como los de la app."""
+    sk = TopKDiario()
+    sk.agregar_df(df)
+    return sk.resumenes("usuarios")
+
+
+def _parcial(segmento: Tuple, ruta_eventos: str, desde: Optional[date], hasta: Optional[date],
+             motivos: List[str]) -> Dict[str, object]:
+    """Agregados de un segmento, ya filtrado como lo filtra analisis_parqueos."""
+    segmento_df = preparar_eventos(_leer_segmento(ruta_eventos, segmento))
+    df = segmento_df[mascara_filtros(segmento_df, desde, hasta, motivos, [])]
+    reservas = df[df["accion"] == "reserva"]
+    # Ocupación: reservas que solapan el rango y cancelaciones de todo el segmento
+    solapan = reservas_en_rango(segmento_df, desde, hasta, motivos, [])
+
+    digests = {m: TDigest(DELTA) for m in MEDIDAS}
+    largo = medidas_de_eventos(df)
+    if motivos:
+        # El check-in toma el motivo de su reserva, que puede estar en otro segmento: se cruza en combinar
+        largo = largo[largo["medida"] != "retraso_checkin"]
+    for medida, grupo in largo.groupby("medida", sort=False):
+        digests[medida].agregar(grupo["minutos"].to_numpy())
+
+    ok = segmento_df["success"] == 1
+    canceladas = segmento_df.loc[ok & (segmento_df["accion"] == "cancelacion"), "booking_id"]
+    checkins = None
+    if motivos:
+        chk = segmento_df[mascara_filtros(segmento_df, desde, hasta, [], []) & ok & (segmento_df["accion"] == "checkin")]
+        minutos = ((chk["timestamp"] - chk["slot_start"]).dt.total_seconds() / 60.0).to_numpy(dtype=float)
+        finitos = np.isfinite(minutos)
+        del_motivo = mascara_filtros(segmento_df, None, None, motivos, []) & ok & (segmento_df["accion"] == "reserva")
+        checkins = (_hash_ids(chk["booking_id"])[finitos], minutos[finitos],
+                    _hash_ids(segmento_df.loc[del_motivo, "booking_id"]))
+    return {
+        "acciones": df["accion"].value_counts(dropna=False),
+        "reservas": len(reservas),
+        "exitos": float(reservas["success"].sum()),
+        "con_resultado": int(reservas["success"].count()),
+        "motivos": reservas["motivo"].value_counts(),
+        "horas": df["hora"].value_counts(),
+        "por_dia": reservas.groupby("fecha").size(),
+        "por_lote": reservas["lot_id"].value_counts(),
+        "usuarios": _sketches_usuarios(df),
+        "digests": digests,
+        "checkins": checkins,      # (booking, minutos, reservas del motivo) con filtro de motivo
+        "memoria": _a_memoria(reservas_vivas(solapan, canceladas=()), canceladas),
+    }
+
+
+# ---------------------- COMBINACIÓN (proceso principal) ----------------------
+
+def _leer_memoria(nombre: str, n: int, m: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    shm = SharedMemory(name=nombre)
+    try:
+        enteros = np.ndarray((n, 4), dtype=np.int64, buffer=shm.buf).copy()
+        capacidad = np.ndarray(n, dtype=np.float64, buffer=shm.buf, offset=32 * n).copy()
+        canceladas = np.ndarray(m, dtype=np.int64, buffer=shm.buf, offset=40 * n).copy()
+        return enteros, capacidad, canceladas
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _sumar(series: List[pd.Series], ordenar_indice: bool = False) -> pd.Series:
+    series = [s for s in series if len(s)]
+    if not series:
+        return pd.Series(dtype="int64")
+    total = pd.concat(series).groupby(level=0, dropna=False).sum().astype("int64")
+    return total.sort_index() if ordenar_indice else total.sort_values(ascending=False, kind="stable")
+
+
+def _reservas_juntas(memorias: List[Tuple]) -> pd.DataFrame:
+    """Reservas vivas de todos los segmentos, sin las canceladas en cualquiera de ellos."""
+    lotes, enteros, capacidad, canceladas = [], [], [], []
+    for (e, c, k), (_, _, _, nombres) in memorias:
+        lotes.append(np.asarray(nombres, dtype=object)[e[:, 0]] if len(e) else np.empty(0, dtype=object))
+        enteros.append(e)
+        capacidad.append(c)
+        canceladas.append(k)
+    e = np.concatenate(enteros) if enteros else np.empty((0, 4), dtype=np.int64)
+    vivas = ~np.isin(e[:, 1], np.concatenate(canceladas)) if canceladas else np.ones(0, dtype=bool)
+    return pd.DataFrame({
+        "accion": "reserva",
+        "success": 1,
+        "lot_id": (np.concatenate(lotes) if lotes else np.empty(0, dtype=object))[vivas],
+        "booking_id": e[vivas, 1],
+        "slot_start": pd.to_datetime(e[vivas, 2], utc=True),
+        "slot_end": pd.to_datetime(e[vivas, 3], utc=True),
+        "capacity": (np.concatenate(capacidad) if capacidad else np.empty(0))[vivas],
+    })
+
+
+def _tabla_percentiles(digests: Dict[str, List[TDigest]]) -> pd.DataFrame:
+    """Mismo formato que CuantilesDiarios.resumen."""
+    return tabla_cuantiles({m: TDigest.unir(digests[m], DELTA) for m in MEDIDAS})
+
+
+def combinar(parciales: List[Dict[str, object]], memorias: List[Tuple],
+             capacidades: Optional[Dict[str, int]] = None,
+             desde: Optional[date] = None, hasta: Optional[date] = None) -> Dict[str, object]:
+    """Une los parciales en el diccionario de analisis_basicos (ocupación de los días [desde, hasta])."""
+    total_reservas = sum(p["reservas"] for p in parciales)
+    con_resultado = sum(p["con_resultado"] for p in parciales)
+    exitos = sum(p["exitos"] for p in parciales)
+    if total_reservas == 0:
+        tasa_exito = 0.0
+    else:
+        tasa_exito = exitos / con_resultado * 100 if con_resultado else float("nan")
+
+    occ = ocupacion_ponderada(_reservas_juntas(memorias), capacidades=capacidades, canceladas=(),
+                              desde=datetime.combine(desde, time(0), tzinfo=timezone.utc) if desde else None,
+                              hasta=datetime.combine(hasta + timedelta(days=1), time(0), tzinfo=timezone.utc) if hasta else None)
+    digests = {m: [p["digests"][m] for p in parciales] for m in MEDIDAS}
+    con_motivo = [p["checkins"] for p in parciales if p.get("checkins") is not None]
+    if con_motivo:
+        del_motivo = np.concatenate([c[2] for c in con_motivo])
+        retraso = TDigest(DELTA)
+        for booking, minutos, _ in con_motivo:
+            retraso.agregar(minutos[np.isin(booking, del_motivo)])
+        digests["retraso_checkin"].append(retraso)
+
+    resultados: Dict[str, object] = {}
+    resultados["acciones"] = _sumar([p["acciones"] for p in parciales])
+    resultados["total_reservas"] = int(total_reservas)
+    resultados["tasa_exito"] = float(round(tasa_exito, 2))
+    resultados["motivos_reserva"] = _sumar([p["motivos"] for p in parciales])
+    resultados["horas_actividad"] = _sumar([p["horas"] for p in parciales], ordenar_indice=True)
+    resultados["reservas_por_dia"] = _sumar([p["por_dia"] for p in parciales], ordenar_indice=True)
+    resultados["reservas_por_lote"] = _sumar([p["por_lote"] for p in parciales])
+    resultados["ocupacion_promedio"] = float(round(occ["global"], 2))
+    resultados["ocupacion_por_lote"] = occ["por_lote"]["media"]
+    resultados["ocupacion_detalle_lote"] = occ["por_lote"]
+    resultados["ocupacion_por_hora"] = occ["serie_hora"]
+    usuarios = SpaceSaving.unir(s for p in parciales for s in p["usuarios"])
+    resultados["top_usuarios_reservas"] = usuarios.serie(10, "user_email")
+    resultados["percentiles_tiempos"] = _tabla_percentiles(digests)
+    return resultados
+
+
+def analisis_paralelo(ruta_eventos: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+                      motivos: Iterable[str] = (), procesos: Optional[int] = None,
+                      bytes_por_segmento: int = BYTES_POR_SEGMENTO,
+                      capacidades: Optional[Dict[str, int]] = None) -> Dict[str, object]:
+    """
+    Mismo resultado que analisis_basicos(aplicar_filtros(cargar_datos(...)), ocupacion_rango(...))
+    sin cargar el historial en un solo DataFrame. `procesos` por defecto es el número
+    de núcleos; los filtros de motivo no distinguen mayúsculas.
+    """
+    motivos = [m.strip() for m in motivos if m.strip()]
+    partes = segmentos(ruta_eventos, desde, hasta, bytes_por_segmento)
+    if not partes:
+        partes = [("csv", 0, 0)]
+    procesos = min(procesos or os.cpu_count() or 1, len(partes))
+    tarea = partial(_parcial, ruta_eventos=ruta_eventos, desde=desde, hasta=hasta, motivos=motivos)
+
+    parciales: List[Dict[str, object]] = []
+    memorias: List[Tuple] = []
+
+    def recibir(parcial: Dict[str, object]) -> None:
+        # El bloque de memoria compartida se copia y se libera apenas llega su parcial
+        info = parcial.pop("memoria")
+        memorias.append((_leer_memoria(*info[:3]), info))
+        parciales.append(parcial)
+
+    if procesos <= 1 or "fork" not in mp.get_all_start_methods():
+        for parte in partes:
+            recibir(tarea(parte))
+    else:
+        # Los hijos registran sus bloques en el mismo rastreador que luego ve el unlink del padre
+        resource_tracker.ensure_running()
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=mp.get_context("fork")) as pool:
+            for parcial in pool.map(tarea, partes):
+                recibir(parcial)
+    return combinar(parciales, memorias, capacidades, desde, hasta)
@@ -5,14 +5,30 @@
 from typing import Tuple, List, Dict, Optional
 import pandas as pd
 import matplotlib.pyplot as plt
-from datetime import datetime
+from datetime import datetime, date
 import os
 
+from analisis_paralelo import analisis_paralelo
+from archivo_eventos import leer_eventos_texto
+
+from metricas_parqueos import ocupacion_rango
+from ocupacion_ponderada import ocupacion_ponderada
+from sketch_cuantiles import percentiles_tiempos
+from sketch_topk import usuarios_con_mas_reservas
+
+# Procesos para el análisis (vacío o 1 = secuencial; 0 = todos los núcleos)
+ENV_PROCESOS = "PARQUEOS_PROCESOS"
+
 # ---------------------- CARGA Y PREPARACIÓN ----------------------
 
-def cargar_datos(ruta_eventos: str, ruta_parqueos: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """Lee CSVs y retorna df_eventos y df_parqueos con tipos preparados."""
-    df_eventos = pd.read_csv(ruta_eventos, dtype=str)
+def cargar_datos(ruta_eventos: str, ruta_parqueos: str,
+                 desde: Optional[date] = None, hasta: Optional[date] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Lee CSVs y retorna df_eventos y df_parqueos con tipos preparados.
+    Del archivo frío solo se descomprimen los bloques que tocan [desde, hasta];
+    se incluyen las reservas hechas antes con slots en el rango (ocupación).
+    """
+    df_eventos = leer_eventos_texto(ruta_eventos, desde, hasta, por_slot=True)
     df_parqueos = pd.read_csv(
         ruta_parqueos, header=None, names=["lot_id", "capacity", "occupied"], dtype=str
     )
@@ -26,6 +42,10 @@ def cargar_datos(ruta_eventos: str, ruta_parqueos: str) -> Tuple[pd.DataFrame, p
         df_eventos["fecha"] = pd.NaT
         df_eventos["hora"] = pd.NA
 
+    for col in ["slot_start", "slot_end"]:
+        if col in df_eventos.columns:
+            df_eventos[col] = pd.to_datetime(df_eventos[col], errors="coerce", utc=True)
+
     for col in ["success", "free_spots_after", "capacity"]:
         if col in df_eventos.columns:
             df_eventos[col] = pd.to_numeric(df_eventos[col], errors="coerce")
@@ -42,42 +62,58 @@ def cargar_datos(ruta_eventos: str, ruta_parqueos: str) -> Tuple[pd.DataFrame, p
     return df_eventos, df_parqueos
 
 
+def capacidades_lotes(df_parqueos: pd.DataFrame) -> Dict[str, int]:
+    """lot_id → capacidad de Parqueos.csv (los lotes sin capacidad válida se omiten)."""
+    capacidad = pd.to_numeric(df_parqueos["capacity"], errors="coerce")
+    return dict(zip(df_parqueos["lot_id"][capacidad.notna()], capacidad.dropna().astype(int)))
+
+
+def leer_fecha(texto: Optional[str]) -> Optional[date]:
+    """Fecha ISO de un filtro; None si viene vacía o no se puede interpretar (se ignora el filtro)."""
+    if not texto:
+        return None
+    try:
+        return datetime.fromisoformat(texto).date()
+    except Exception:
+        return None
+
+
 def aplicar_filtros(df: pd.DataFrame,
                     fecha_ini: Optional[str],
                     fecha_fin: Optional[str],
                     motivos: List[str]) -> pd.DataFrame:
     """Aplica filtros por fecha (inclusive) y lista de motivos; retorna DataFrame filtrado."""
-    df_filtrado = df.copy()
+    # Se acumula una sola máscara y se selecciona una vez (sin copias intermedias)
+    mask = pd.Series(True, index=df.index)
 
     # Filtro de fechas si se proporcionan
-    if fecha_ini:
-        try:
-            f_ini = datetime.fromisoformat(fecha_ini).date()
-            df_filtrado = df_filtrado[df_filtrado["fecha"] >= f_ini]
-        except Exception:
-            pass
-
-    if fecha_fin:
-        try:
-            f_fin = datetime.fromisoformat(fecha_fin).date()
-            df_filtrado = df_filtrado[df_filtrado["fecha"] <= f_fin]
-        except Exception:
-            pass
+    f_ini = leer_fecha(fecha_ini)
+    if f_ini:
+        mask &= df["fecha"] >= f_ini
+
+    f_fin = leer_fecha(fecha_fin)
+    if f_fin:
+        mask &= df["fecha"] <= f_fin
 
     # Filtro de motivos (si se dan)
     motivos_norm = [m.strip().lower() for m in motivos if m.strip()]
-    if len(motivos_norm) > 0 and "motivo" in df_filtrado.columns:
-        df_filtrado = df_filtrado[df_filtrado["motivo"].str.lower().isin(motivos_norm)]
+    if len(motivos_norm) > 0 and "motivo" in df.columns:
+        mask &= df["motivo"].str.lower().isin(motivos_norm)
 
-    return df_filtrado
+    return df[mask]
 
 
 # ---------------------- ANÁLISIS (10) ----------------------
 
-def analisis_basicos(df: pd.DataFrame) -> Dict[str, object]:
+def analisis_basicos(df: pd.DataFrame, ocupacion: Optional[Dict[str, object]] = None,
+                     tiempos: Optional[pd.DataFrame] = None) -> Dict[str, object]:
     """
     Devuelve un diccionario con resultados clave.
     Cada análisis está justificado en el reporte que se escribe a disco.
+    `ocupacion` es la del rango (ocupacion_rango: reservas que lo solapan,
+    capacidades de Parqueos.csv y cancelaciones de todo el log); sin ella se
+    calcula solo con `df`. `tiempos` son los percentiles del log con los mismos
+    filtros (percentiles_tiempos): con filtro de motivo, `df` ya no trae los check-ins.
     """
     resultados: Dict[str, object] = {}
 
@@ -103,24 +139,16 @@ def analisis_basicos(df: pd.DataFrame) -> Dict[str, object]:
     # 7) Lotes más utilizados (reservas por lot_id)
     reservas_por_lote = reservas["lot_id"].value_counts()
 
-    # 8) Promedio de ocupación observado (1 - libres/capacidad)
-    #    Nota: usamos columnas al momento del evento (free_spots_after/capacity)
-    if "free_spots_after" in df.columns and "capacity" in df.columns:
-        ocupacion = (1 - (df["free_spots_after"] / df["capacity"])).dropna()
-        ocupacion_prom = ocupacion.mean() * 100 if len(ocupacion) > 0 else 0.0
-    else:
-        ocupacion_prom = 0.0
+    # 8) Ocupación promedio ponderada por tiempo (reservas vivas entre slot_start y slot_end)
+    #    Nota: promediar 1 - libres/capacidad por evento sobrepesa los momentos con más actividad
+    occ = ocupacion_ponderada(df) if ocupacion is None else ocupacion
+    ocupacion_prom = occ["global"]
 
-    # 9) Ocupación promedio por lote (promedio de ocupación observado por lot_id)
-    if "lot_id" in df.columns and "free_spots_after" in df.columns and "capacity" in df.columns:
-        df_occ = df.dropna(subset=["lot_id", "free_spots_after", "capacity"]).copy()
-        df_occ["occ"] = 1 - (df_occ["free_spots_after"] / df_occ["capacity"])
-        ocupacion_por_lote = df_occ.groupby("lot_id")["occ"].mean().sort_values(ascending=False) * 100
-    else:
-        ocupacion_por_lote = pd.Series(dtype=float)
+    # 9) Ocupación por lote: media, pico y percentiles ponderados por tiempo
+    ocupacion_por_lote = occ["por_lote"]["media"]
 
-    # 10) Usuarios más activos (número de reservas por user_id)
-    top_usuarios = reservas["user_id"].value_counts().head(10)
+    # 10) Usuarios más activos (reservas por user_email; sketch Space-Saving combinable, como la app)
+    top_usuarios = usuarios_con_mas_reservas(df)
 
     resultados["acciones"] = acciones
     resultados["total_reservas"] = int(total_reservas)
@@ -131,8 +159,13 @@ def analisis_basicos(df: pd.DataFrame) -> Dict[str, object]:
     resultados["reservas_por_lote"] = reservas_por_lote
     resultados["ocupacion_promedio"] = float(round(ocupacion_prom, 2))
     resultados["ocupacion_por_lote"] = ocupacion_por_lote
+    resultados["ocupacion_detalle_lote"] = occ["por_lote"]
+    resultados["ocupacion_por_hora"] = occ["serie_hora"]
     resultados["top_usuarios_reservas"] = top_usuarios
 
+    # 11) Percentiles de tiempos (t-digest): anticipación, duración y retraso de check-in
+    resultados["percentiles_tiempos"] = percentiles_tiempos(df) if tiempos is None else tiempos
+
     return resultados
 
 
@@ -211,6 +244,43 @@ def grafico_barras_reservas_por_lote(df: pd.DataFrame, ruta_salida: str) -> None
     plt.savefig(ruta_salida)
     plt.close()
 
+def graficos_desde_resultados(resultados: Dict[str, object], carpeta: str) -> None:
+    """Los mismos 5 gráficos a partir de los conteos (modo paralelo: no hay DataFrame de eventos)."""
+    asegurar_directorio(carpeta)
+    barras = [("acciones.png", resultados["acciones"], "Frecuencia de acciones", "Acción", "Cantidad", "bar"),
+              ("reservas_diarias.png", resultados["reservas_por_dia"], "Reservas por día", "Fecha", "Nº reservas", "line"),
+              ("reservas_por_lote.png", resultados["reservas_por_lote"], "Reservas por lote", "Lote", "Nº reservas", "bar")]
+    for archivo, serie, titulo, eje_x, eje_y, tipo in barras:
+        plt.figure()
+        serie.plot(kind=tipo)
+        plt.title(titulo)
+        plt.xlabel(eje_x)
+        plt.ylabel(eje_y)
+        plt.tight_layout()
+        plt.savefig(os.path.join(carpeta, archivo))
+        plt.close()
+
+    plt.figure()
+    if resultados["total_reservas"] == 0:
+        plt.title("Éxito de reservas (sin datos)")
+    else:
+        tasa = resultados["tasa_exito"]
+        plt.pie([tasa, 100 - tasa], labels=["Éxito", "Fallo"], autopct="%1.1f%%")
+        plt.title("Éxito vs. fallo en reservas")
+        plt.tight_layout()
+    plt.savefig(os.path.join(carpeta, "exito_reservas.png"))
+    plt.close()
+
+    horas = resultados["horas_actividad"]
+    plt.figure()
+    plt.hist(horas.index.to_numpy(dtype=float), bins=24, range=(0, 24), weights=horas.to_numpy(dtype=float))
+    plt.title("Distribución por hora")
+    plt.xlabel("Hora del día")
+    plt.ylabel("Frecuencia")
+    plt.tight_layout()
+    plt.savefig(os.path.join(carpeta, "horas.png"))
+    plt.close()
+
 
 # ---------------------- REPORTE TEXTO ----------------------
 
@@ -264,26 +334,38 @@ def escribir_reporte(resultados: Dict[str, object], ruta_reporte: str,
     lineas.append(f"{resultados['reservas_por_lote']}\n\n")
 
     # 8 Ocupación promedio global
-    lineas.append("8) Ocupación promedio observada (%)\n")
-    lineas.append("   Justificación: mide cuán lleno opera el sistema en promedio.\n")
+    lineas.append("8) Ocupación promedio ponderada por tiempo (%)\n")
+    lineas.append("   Justificación: mide cuán lleno opera el sistema en promedio, según la duración real de las reservas.\n")
     lineas.append(f"   ocupacion_promedio = {resultados['ocupacion_promedio']}%\n\n")
 
     # 9 Ocupación por lote
-    lineas.append("9) Ocupación promedio por lote (%)\n")
+    lineas.append("9) Ocupación por lote (%): media, pico y percentiles en el tiempo\n")
     lineas.append("   Justificación: comparación entre zonas para reasignar cupos y priorizar mejoras.\n")
-    lineas.append(f"{resultados['ocupacion_por_lote']}\n\n")
+    lineas.append(f"{resultados['ocupacion_detalle_lote'].round(2)}\n\n")
+    lineas.append("   Ocupación media por hora del día (UTC):\n")
+    lineas.append(f"{resultados['ocupacion_por_hora'].round(2)}\n\n")
 
     # 10 Usuarios más activos
     lineas.append("10) Usuarios con más reservas\n")
     lineas.append("   Justificación: segmenta el uso por usuarios para estudiar reglas (ej. 1 reserva activa).\n")
     lineas.append(f"{resultados['top_usuarios_reservas']}\n\n")
 
+    # 11 Tiempos
+    lineas.append("11) Percentiles de tiempos en minutos (p50 / p90 / p99)\n")
+    lineas.append("   Justificación: anticipación con que se reserva, duración pedida y retraso del check-in\n")
+    lineas.append("   respecto al inicio; los promedios esconden las colas que afectan la operación.\n")
+    lineas.append(f"{resultados['percentiles_tiempos']}\n\n")
+
     with open(ruta_reporte, "w", encoding="utf-8") as f:
         f.writelines(lineas)
 
 
 # ---------------------- FLUJO SUPERIOR (AQUÍ SÍ HAY input/print) ----------------------
 
+# Copy-on-write: las selecciones son vistas hasta que se modifican (siempre activo desde pandas 3)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
 # 1) Lectura de filtros “interactivos” (por consola; no dentro de funciones)
 print("\n=== FILTROS (ENTER para omitir) ===")
 f_ini = input("Fecha inicial (YYYY-MM-DD) : ").strip()
@@ -295,21 +377,35 @@ motivos_list = [m.strip() for m in motivos_raw.split(",")] if motivos_raw else [
 # 2) Carga y preparación
 RUTA_EVENTOS = "Eventos.csv"
 RUTA_PARQUEOS = "Parqueos.csv"
-
-df_eventos, df_parqueos = cargar_datos(RUTA_EVENTOS, RUTA_PARQUEOS)
-
-# 3) Aplicar filtros
-df_filtrado = aplicar_filtros(df_eventos, f_ini if f_ini else None, f_fin if f_fin else None, motivos_list)
-
-# 4) Análisis (10)
-resultados = analisis_basicos(df_filtrado)
-
-# 5) Gráficos (5) → carpeta /graficos
-grafico_barras_acciones(df_filtrado, "graficos/acciones.png")
-grafico_linea_reservas_diarias(df_filtrado, "graficos/reservas_diarias.png")
-grafico_pie_exito_reservas(df_filtrado, "graficos/exito_reservas.png")
-grafico_histograma_horas(df_filtrado, "graficos/horas.png")
-grafico_barras_reservas_por_lote(df_filtrado, "graficos/reservas_por_lote.png")
+PROCESOS = int(os.environ.get(ENV_PROCESOS) or 1)
+
+if PROCESOS != 1:
+    # 2-5) Historial por segmentos en varios procesos; los gráficos salen de los conteos
+    print(f"Análisis en paralelo ({PROCESOS or os.cpu_count()} procesos)...")
+    capacidades = capacidades_lotes(pd.read_csv(RUTA_PARQUEOS, header=None, names=["lot_id", "capacity", "occupied"]))
+    resultados = analisis_paralelo(RUTA_EVENTOS, leer_fecha(f_ini), leer_fecha(f_fin),
+                                   motivos_list, procesos=PROCESOS or None, capacidades=capacidades)
+    graficos_desde_resultados(resultados, "graficos")
+else:
+    df_eventos, df_parqueos = cargar_datos(RUTA_EVENTOS, RUTA_PARQUEOS, leer_fecha(f_ini), leer_fecha(f_fin))
+
+    # 3) Aplicar filtros
+    df_filtrado = aplicar_filtros(df_eventos, f_ini if f_ini else None, f_fin if f_fin else None, motivos_list)
+
+    # 4) Análisis (10); la ocupación cuenta los días del rango con las reservas que los solapan
+    occ = ocupacion_rango(df_eventos, leer_fecha(f_ini), leer_fecha(f_fin), motivos_list, [],
+                          capacidades_lotes(df_parqueos))
+    # Los check-ins no traen motivo: los percentiles se sacan del log completo con los mismos filtros
+    tiempos = percentiles_tiempos(df_eventos, desde=leer_fecha(f_ini), hasta=leer_fecha(f_fin),
+                                  motivos=[m for m in motivos_list if m], sin_mayusculas=True)
+    resultados = analisis_basicos(df_filtrado, ocupacion=occ, tiempos=tiempos)
+
+    # 5) Gráficos (5) → carpeta /graficos
+    grafico_barras_acciones(df_filtrado, "graficos/acciones.png")
+    grafico_linea_reservas_diarias(df_filtrado, "graficos/reservas_diarias.png")
+    grafico_pie_exito_reservas(df_filtrado, "graficos/exito_reservas.png")
+    grafico_histograma_horas(df_filtrado, "graficos/horas.png")
+    grafico_barras_reservas_por_lote(df_filtrado, "graficos/reservas_por_lote.png")
 
 # 6) Reporte con justificación de cada análisis
 filtros_info = {
@@ -1,19 +1,45 @@
-import os, csv, uuid, time
+import os, sys, csv, time, uuid, tracemalloc
+from collections import deque
+from pathlib import Path
 from datetime import datetime, date, time as dtime, timedelta, timezone
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 import pandas as pd
-import matplotlib.pyplot as plt
 import streamlit as st
 
+from archivo_eventos import bloques_en_rango, extremos_fechas, leer_archivados, leer_eventos_texto, ruta_indice
+from consola_sql import ConsultaCancelada, LIMITE_FILAS, TIMEOUT_S, columnas_fuente, ejecutar_consulta, fuentes_sql, motor_disponible
+from disponibilidad_slots import OcupacionSlots, CRITERIO_PRIMERO, CRITERIO_MENOS_OCUPADO, ZONA_SERVIDOR, ocupacion_dia
+from importar_reservas import leer_solicitudes, validar_solicitudes, filas_evento, ACEPTADA
+from indice_usuarios import IndiceUsuarios
+from lista_espera import ListaEspera
+from memo_metricas import MemoLRU, normalizar_filtros
+from sketch_cuantiles import CuantilesDiarios
+from sketch_hll import UnicosDiarios
+from sketch_topk import TopKDiario
+from exportar_columnar import a_temporal, borrar_temporales, exportar_eventos, exportar_metricas
+from metricas_parqueos import calcular_metricas, ocupacion_rango, preparar_eventos
+from metricas_operacion import (EVENTOS_FALLIDOS, EVENTOS_REGISTRADOS, EXPIRACION_PENDIENTES, EXPIRADAS,
+                                EXPIRAR_SEGUNDOS, PROMOCIONES_PENDIENTES, PROMOCIONES_POSPUESTAS,
+                                REGISTRAR_SEGUNDOS, REGISTRO, RESERVA_SEGUNDOS, RESERVAS,
+                                cronometro, exportador_desde_entorno)
+from reporte_diario import cerrar_dias, html_bytes, reporte_rango
+from reglas_reserva import (ProyeccionEventos, fila_evento, hay_traslape,
+                            mascara_reservas_vivas, reservas_activas, recalcular_ocupacion_desde_eventos,
+                            tiene_checkin, tipar_eventos, verificar_reserva)
+from servicio_eventos import EVENT_HEADERS, ErrorEscritura, acquire_lock, obtener_escritor, release_lock
+from tabla_paginada import tabla_paginada
+
 MODO_DEMO = False
 
 # ---------- Parámetros ----------
 PARQUEOS_CSV = "Parqueos.csv"
 EVENTOS_CSV  = "Eventos.csv"
 USUARIOS_CSV = "Usuarios.csv"
-LOCK_FILE    = ".parqueos.lock"
 ADMIN_CODE   = "UVG-2025"
+PRESUPUESTO_MEMORIA_SESION_MB = 64  # pico por rerun que se marca como excedido en Admin
+DIAS_REPORTE_CIERRE = 7             # paquetes diarios pendientes que genera cada cierre de jornada
+LISTA_ESPERA_LOCK = ".lista_espera.lock"  # serializa las promociones entre réplicas
 
 # ---------------------------------------------------------------------
 # Helper de zona horaria: convierte fecha+hora (local) a datetime en UTC
@@ -34,6 +60,13 @@ def to_utc(fecha: date, hora: dtime) -> datetime:
         return naive.replace(tzinfo=timezone.utc)
 
 # ---------- Config UI ----------
+# Copy-on-write: filtros y selecciones devuelven vistas hasta que alguien escribe,
+# así ninguna interacción copia el DataFrame completo de eventos. Se activa aquí,
+# en el script de la app, y no al importar los módulos compartidos. Desde pandas 3
+# siempre está activo y la opción solo emite una advertencia en cada rerun.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
 st.set_page_config(page_title="Parqueos UVG — App", layout="wide")
 THEME_CSS = """
 <style>
@@ -63,36 +96,13 @@ div[data-baseweb="select"]>div, .stTextInput input, .stDateInput input, .stTimeI
 """
 st.markdown(THEME_CSS, unsafe_allow_html=True)
 
-# ---------- Lockfile  ----------
-def acquire_lock(path: str, timeout_sec: int = 4) -> bool:
-    inicio = time.time()
-    while time.time() - inicio <= timeout_sec:
-        try:
-            with open(path, "x"):
-                return True
-        except FileExistsError:
-            time.sleep(0.08)
-    return False
-
-def release_lock(path: str) -> None:
-    try:
-        os.remove(path)
-    except FileNotFoundError:
-        pass
-
-# ---------- Cabeceras de eventos ----------
-EVENT_HEADERS = [
-    "event_id","timestamp","user_email","accion","motivo","lot_id","spot_id",
-    "booking_id","success","free_spots_after","capacity","source","app_version",
-    "error_code","slot_start","slot_end"
-]
-
 def asegurar_csv_eventos(ruta: str) -> None:
     if os.path.exists(ruta):
         try:
-            df = pd.read_csv(ruta, dtype=str)
-            falt = [h for h in EVENT_HEADERS if h not in df.columns]
+            cols = pd.read_csv(ruta, dtype=str, nrows=0).columns
+            falt = [h for h in EVENT_HEADERS if h not in cols]
             if falt:
+                df = pd.read_csv(ruta, dtype=str)
                 for h in falt:
                     df[h] = ""
                 df.to_csv(ruta, index=False)
@@ -130,98 +140,44 @@ def guardar_parqueos(ruta: str, lotes_estado) -> None:
     if MODO_DEMO:
         return
 
-    fieldnames = [
-        "lot_id",
-        "nombre",
-        "capacidad",
-        "ocupados",
-        "libres",
-        "activo",
-        "apertura",
-        "cierre",
-        "permite_espera",
-    ]
+    # Mismo formato que lee cargar_parqueos (y CF3 / analisis_parqueos):
+    # nombre,capacidad,ocupados sin cabecera.
+    def as_int(x, default=0):
+        try:
+            return int(x) if x not in (None, "") else default
+        except Exception:
+            return default
 
     with open(ruta, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-
+        writer = csv.writer(f, lineterminator="\n")
         for lot in lotes_estado:
             if isinstance(lot, dict):
-                lot_id         = str(lot.get("lot_id", ""))
-                nombre         = lot.get("nombre", "")
-                capacidad      = lot.get("capacidad", 0)
-                ocupados       = lot.get("ocupados", 0)
-                libres         = lot.get("libres", 0)
-                activo         = lot.get("activo", True)
-                apertura       = lot.get("apertura", "")
-                cierre         = lot.get("cierre", "")
-                permite_espera = lot.get("permite_espera", True)
+                nombre    = lot.get("lot_id") or lot.get("nombre", "")
+                capacidad = lot.get("capacidad", 0)
+                ocupados  = lot.get("ocupados", 0)
             elif isinstance(lot, (list, tuple)):
-                values = list(lot) + [None] * 9
-                lot_id, nombre, capacidad, ocupados, libres, activo, apertura, cierre, permite_espera = values[:9]
+                nombre, capacidad, ocupados = (list(lot) + [None] * 3)[:3]
             else:
                 continue
+            writer.writerow([str(nombre), as_int(capacidad), as_int(ocupados)])
 
-            # Normalizar tipos
-            def as_int(x, default=0):
-                try:
-                    return int(x) if x not in (None, "") else default
-                except Exception:
-                    return default
-
-            capacidad = as_int(capacidad)
-            ocupados  = as_int(ocupados)
-            libres    = as_int(libres)
-
-            def _to_bool(x, default=True):
-                if isinstance(x, bool):
-                    return x
-                s = str(x).strip().lower()
-                if s in ("1", "true", "sí", "si"):
-                    return True
-                if s in ("0", "false", "no"):
-                    return False
-                return default
-
-            activo         = _to_bool(activo, True)
-            permite_espera = _to_bool(permite_espera, True)
-
-            writer.writerow({
-                "lot_id": str(lot_id),
-                "nombre": nombre or "",
-                "capacidad": capacidad,
-                "ocupados": ocupados,
-                "libres": libres,
-                "activo": int(activo),
-                "apertura": apertura or "",
-                "cierre": cierre or "",
-                "permite_espera": int(permite_espera),
-            })
-
-def leer_eventos(ruta: str) -> pd.DataFrame:
-    if not os.path.exists(ruta):
-        return pd.DataFrame(columns=EVENT_HEADERS)
-
-    df = pd.read_csv(ruta, dtype=str)
-
-    for c in ["success", "free_spots_after", "capacity"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    for c in ["timestamp", "slot_start", "slot_end"]:
-        if c in df.columns:
-            df[c] = pd.to_datetime(df[c], errors="coerce", utc=True)
-
-    if "timestamp" in df.columns:
-        df["fecha"] = df["timestamp"].dt.date
-        df["hora"] = df["timestamp"].dt.hour
+def version_archivo(ruta: str) -> tuple:
+    # (mtime, tamaño): cambia con cada append al CSV
+    try:
+        s = os.stat(ruta)
+        return (s.st_mtime_ns, s.st_size)
+    except FileNotFoundError:
+        return (0, 0)
 
-    for c in ["accion", "motivo", "lot_id", "user_email", "booking_id", "error_code"]:
-        if c in df.columns:
-            df[c] = df[c].fillna("").str.strip()
+@st.cache_resource
+def escritor_eventos(ruta: str):
+    # Uno por proceso: cliente del servicio de eventos o escritor en proceso.
+    return obtener_escritor(ruta)
 
-    return df
+@st.cache_resource
+def exportador_metricas():
+    # Uno por proceso; archivo .prom y/o endpoint local según PARQUEOS_METRICAS_*
+    return exportador_desde_entorno()
 
 def registrar_evento(
     ruta_eventos: str,
@@ -233,111 +189,51 @@ def registrar_evento(
     origen: str = "ui",
     version: str = "v2",
     codigo_error: str = ""
-) -> None:
+) -> Optional[Dict]:
+    # Retorna la fila escrita para quien la quiera reflejar en memoria; None en modo demo
+    # o si no se pudo escribir (el llamador no debe confirmar nada al usuario)
     if MODO_DEMO:
-        return
+        return None
 
-    asegurar_csv_eventos(ruta_eventos)
-    fila = {
-        "event_id": str(uuid.uuid4()),
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "user_email": user_email,
-        "accion": accion,
-        "motivo": motivo,
-        "lot_id": lot_id,
-        "spot_id": "",
-        "booking_id": booking_id,
-        "success": "1" if exito else "0",
-        "free_spots_after": str(libres_despues),
-        "capacity": str(capacidad),
-        "source": origen,
-        "app_version": version,
-        "error_code": codigo_error,
-        "slot_start": slot_start.isoformat() if slot_start else "",
-        "slot_end":   slot_end.isoformat()   if slot_end   else ""
-    }
+    fila = fila_evento(user_email, accion, motivo, lot_id, booking_id, exito, libres_despues, capacidad,
+                       slot_start, slot_end, origen=origen, version=version, codigo_error=codigo_error)
+    try:
+        with cronometro(REGISTRAR_SEGUNDOS, accion=accion):
+            offset = escritor_eventos(ruta_eventos).agregar(fila)
+    except ErrorEscritura as e:
+        EVENTOS_FALLIDOS.inc(accion=accion, error=type(e.__cause__ or e).__name__)
+        return None
+    if offset is None:
+        EVENTOS_FALLIDOS.inc(accion=accion, error="sin_confirmar")
+        return None
+    EVENTOS_REGISTRADOS.inc(accion=accion, origen=origen)
+    return fila
 
-    if acquire_lock(LOCK_FILE):
-        try:
-            write_header = (
-                not os.path.exists(ruta_eventos)
-                or os.stat(ruta_eventos).st_size == 0
-            )
-            with open(ruta_eventos, "a", newline="", encoding="utf-8") as f:
-                w = csv.DictWriter(f, fieldnames=EVENT_HEADERS)
-                if write_header:
-                    w.writeheader()
-                w.writerow(fila)
-        finally:
-            release_lock(LOCK_FILE)
+def no_registrado(fila: Optional[Dict]) -> bool:
+    return fila is None and not MODO_DEMO
 
 # ---------- Reglas de negocio con horarios ----------
-def overlap(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datetime) -> bool:
-    return (a_start < b_end) and (b_start < a_end)
-
-def reservas_activas(df: pd.DataFrame, ahora_utc: datetime) -> pd.DataFrame:
-    if df.empty:
-        return df
-    ok_res = (df["accion"] == "reserva") & (df["success"] == 1)
-    ok_can = (df["accion"] == "cancelacion") & (df["success"] == 1)
-    vivos = df[ok_res & (~df["booking_id"].isin(df[ok_can]["booking_id"]))].copy()
-    if "slot_end" in vivos.columns:
-        vivos = vivos[vivos["slot_end"] >= ahora_utc]
-    return vivos
-
-def hay_traslape(df: pd.DataFrame, lot_id: str, start: datetime, end: datetime) -> bool:
-    if df.empty:
-        return False
-    df_lote = df[(df["lot_id"] == lot_id) & (df["accion"] == "reserva") & (df["success"] == 1)].copy()
-    cancel_ok = df[(df["accion"] == "cancelacion") & (df["success"] == 1)][["booking_id"]]
-    df_lote = df_lote[~df_lote["booking_id"].isin(cancel_ok["booking_id"])]
-    if df_lote.empty:
-        return False
-    df_lote = df_lote.dropna(subset=["slot_start", "slot_end"])
-    for _, r in df_lote.iterrows():
-        if overlap(start, end, r["slot_start"], r["slot_end"]):
-            return True
-    return False
-
-def recalcular_ocupacion_desde_eventos(lotes: List[List], df: pd.DataFrame, instante: datetime) -> List[List]:
-    activos = reservas_activas(df, instante)
-    mapa = {}
-    for _, r in activos.iterrows():
-        lid = str(r["lot_id"])
-        mapa[lid] = mapa.get(lid, 0) + 1
-    actualizados: List[List] = []
-    for nombre, cap, _ in lotes:
-        ocup = mapa.get(nombre, 0)
-        actualizados.append([nombre, cap, min(ocup, cap)])
-    return actualizados
-
-def tiene_checkin(df: pd.DataFrame, booking_id: str) -> bool:
-    if df.empty or not booking_id:
-        return False
-    sel = (df["accion"] == "checkin") & (df["success"] == 1) & (df["booking_id"] == booking_id)
-    return bool(sel.any())
-
 def expirar_vencidas(df: pd.DataFrame, ahora: datetime, ruta_eventos: str) -> None:
     if df.empty:
         return
+    with cronometro(EXPIRAR_SEGUNDOS):
+        _expirar_vencidas(df, ahora, ruta_eventos)
 
-    ok_res = (df["accion"] == "reserva") & (df["success"] == 1)
-    ok_can = (df["accion"] == "cancelacion") & (df["success"] == 1)
+def _expirar_vencidas(df: pd.DataFrame, ahora: datetime, ruta_eventos: str) -> None:
 
     # 👉 aquí va el cambio importante
-    activos = df[ok_res & (~df["booking_id"].isin(df[ok_can]["booking_id"]))].copy()
-
-    vencidas = activos.dropna(subset=["slot_end"])
-    vencidas = vencidas[vencidas["slot_end"] < ahora]
-
-    ya_fin = set(df[df["accion"].isin(["expiracion", "cierrejornada", "no_show"])]["booking_id"])
-
-    for _, r in vencidas.iterrows():
+    ya_fin = df.loc[df["accion"].isin(["expiracion", "cierrejornada", "no_show"]), "booking_id"]
+    con_checkin = set(df.loc[(df["accion"] == "checkin") & (df["success"] == 1), "booking_id"])
+    abiertas = mascara_reservas_vivas(df) & (df["booking_id"] != "") & ~df["booking_id"].isin(ya_fin)
+    vencidas = abiertas & (df["slot_end"] < ahora)
+    # Backlog: vencidas que aún no tienen cierre al empezar la pasada
+    EXPIRACION_PENDIENTES.fijar(int(vencidas.sum()))
+
+    for _, r in df[vencidas].iterrows():
         bid = r["booking_id"]
-        if not bid or bid in ya_fin:
-            continue
-        accion = "expiracion" if tiene_checkin(df, bid) else "no_show"
-        registrar_evento(
+        accion = "expiracion" if bid in con_checkin else "no_show"
+        EXPIRADAS.inc(accion=accion)
+        fila = registrar_evento(
             ruta_eventos,
             r["user_email"],
             accion,
@@ -352,6 +248,10 @@ def expirar_vencidas(df: pd.DataFrame, ahora: datetime, ruta_eventos: str) -> No
             origen="system",
             version="v2"
         )
+        if no_registrado(fila):
+            continue    # sigue abierta: la próxima pasada lo vuelve a intentar
+        # Expiración y no-show también consultan la lista de espera (y depuran solicitudes vencidas)
+        promover_lista_espera(r["lot_id"], r["slot_start"], r["slot_end"])
 
 
 def cerrar_jornada(df: pd.DataFrame, ahora: datetime, ruta_eventos: str) -> int:
@@ -365,7 +265,7 @@ def cerrar_jornada(df: pd.DataFrame, ahora: datetime, ruta_eventos: str) -> int:
         if not bid or bid in ya:
             continue
         accion = "expiracion" if tiene_checkin(df, bid) else "no_show"
-        registrar_evento(
+        fila = registrar_evento(
             ruta_eventos,
             r["user_email"],
             accion,
@@ -380,9 +280,398 @@ def cerrar_jornada(df: pd.DataFrame, ahora: datetime, ruta_eventos: str) -> int:
             origen="admin",
             version="v2"
         )
+        if no_registrado(fila):
+            continue
         n += 1
     return n
 
+def procesar_reserva(df: pd.DataFrame, lotes: List[List], email: str, lote_sel: str,
+                     start_dt: datetime, end_dt: datetime, motivo: str,
+                     origen: str = "ui") -> Dict:
+    """
+    Aplica las reglas de reserva (traslape y cupo) y registra el evento.
+    Retorna {"resultado": "reserva" | "TRASLAPE" | "SIN_CUPO" | "ERROR_ESCRITURA", "booking": ..., "fila": fila escrita}.
+    """
+    t = time.perf_counter()
+    res = _procesar_reserva(df, lotes, email, lote_sel, start_dt, end_dt, motivo, origen)
+    RESERVA_SEGUNDOS.observar(time.perf_counter() - t, origen=origen)
+    RESERVAS.inc(resultado=res["resultado"], origen=origen)
+    return res
+
+def _procesar_reserva(df: pd.DataFrame, lotes: List[List], email: str, lote_sel: str,
+                      start_dt: datetime, end_dt: datetime, motivo: str, origen: str) -> Dict:
+    resultado, libres, capacidad_lote = verificar_reserva(df, lotes, lote_sel, start_dt, end_dt)
+    if resultado != "reserva":
+        fila = registrar_evento(
+            EVENTOS_CSV,
+            email,
+            "lista_espera",
+            motivo,
+            lote_sel,
+            "",
+            True,
+            0,
+            capacidad_lote,
+            start_dt,
+            end_dt,
+            origen=origen,
+            codigo_error=resultado
+        )
+        if no_registrado(fila):
+            return {"resultado": "ERROR_ESCRITURA", "booking": "", "fila": None}
+        return {"resultado": resultado, "booking": "", "fila": None}
+
+    booking = str(uuid.uuid4())
+    fila = registrar_evento(
+        EVENTOS_CSV,
+        email,
+        "reserva",
+        motivo,
+        lote_sel,
+        booking,
+        True,
+        libres - 1,
+        capacidad_lote,
+        start_dt,
+        end_dt,
+        origen=origen
+    )
+    if no_registrado(fila):
+        return {"resultado": "ERROR_ESCRITURA", "booking": "", "fila": None}
+    return {"resultado": "reserva", "booking": booking, "fila": fila}
+
+@st.cache_resource
+def lista_espera(ruta_eventos: str) -> ListaEspera:
+    # Compartida entre sesiones; se pone al día con las filas nuevas del log
+    return ListaEspera()
+
+@st.cache_resource
+def promociones_pendientes() -> deque:
+    # (lot_id, inicio, fin) liberados que no consiguieron LISTA_ESPERA_LOCK; los reintenta
+    # la próxima pasada de expirar_si_corresponde
+    return deque()
+
+def promover_lista_espera(lot_id: str, inicio: datetime, fin: datetime) -> Optional[List[Dict]]:
+    """
+    Llamar después de registrar lo que libera [inicio, fin) en `lot_id`.
+    Promueve a las solicitudes compatibles en orden de llegada y retorna las promovidas.
+    Cada réplica tiene su propia ListaEspera: la promoción corre bajo LISTA_ESPERA_LOCK
+    y con el log recién cargado, así ninguna promueve a quien otra ya atendió.
+    Si el lock no se consigue, la liberación queda en promociones_pendientes y retorna None.
+    """
+    if MODO_DEMO or pd.isna(inicio) or pd.isna(fin):
+        return []
+    if not acquire_lock(LISTA_ESPERA_LOCK, timeout_sec=10):
+        pendientes = promociones_pendientes()
+        pendientes.append((lot_id, inicio, fin))
+        PROMOCIONES_POSPUESTAS.inc()
+        PROMOCIONES_PENDIENTES.fijar(len(pendientes))
+        return None
+    try:
+        return _promover_lista_espera(lot_id, inicio, fin)
+    finally:
+        release_lock(LISTA_ESPERA_LOCK)
+
+def reintentar_promociones() -> None:
+    # Espera corta: si el lock sigue tomado, la cola queda para la siguiente pasada
+    pendientes = promociones_pendientes()
+    if MODO_DEMO or not pendientes or not acquire_lock(LISTA_ESPERA_LOCK, timeout_sec=1):
+        return
+    try:
+        while pendientes:
+            _promover_lista_espera(*pendientes.popleft())
+    finally:
+        release_lock(LISTA_ESPERA_LOCK)
+        PROMOCIONES_PENDIENTES.fijar(len(pendientes))
+
+def _promover_lista_espera(lot_id: str, inicio: datetime, fin: datetime) -> List[Dict]:
+    cola = lista_espera(EVENTOS_CSV)
+    df = cargar_eventos(EVENTOS_CSV)
+    cola.sincronizar(df)
+    lotes_actuales = _parqueos_en_version(PARQUEOS_CSV, version_archivo(PARQUEOS_CSV))
+    ahora = pd.Timestamp(datetime.now(timezone.utc))
+    escritas: List[Dict] = []   # reservas de esta llamada, que `df` aún no trae
+
+    def tramo(e: Dict) -> Tuple[datetime, datetime]:
+        # De una ventana ya empezada solo se asigna lo que queda
+        return max(e["slot_start"], ahora).to_pydatetime(), e["slot_end"].to_pydatetime()
+
+    def compatible(e: Dict) -> bool:
+        ini, fin_e = tramo(e)
+        if escritas and hay_traslape(tipar_eventos(pd.DataFrame(escritas, columns=EVENT_HEADERS)),
+                                     e["lot_id"], ini, fin_e):
+            return False
+        return verificar_reserva(df, lotes_actuales, e["lot_id"], ini, fin_e)[0] == "reserva"
+
+    def asignar(e: Dict) -> bool:
+        ini, fin_e = tramo(e)
+        res = procesar_reserva(df, lotes_actuales, e["user_email"], e["lot_id"], ini, fin_e,
+                               e["motivo"], origen="waitlist")
+        if res["resultado"] != "reserva":
+            return False
+        escritas.append(res["fila"])
+        return True
+
+    return cola.promover(lot_id, inicio, fin, ahora.to_pydatetime(), compatible, asignar)
+
+def mostrar_resultado_reserva(res: Dict, lote_sel: str, start_dt: datetime, end_dt: datetime) -> None:
+    if res["resultado"] == "ERROR_ESCRITURA":
+        st.error("No se pudo registrar la solicitud (servicio de eventos no disponible). Intenta de nuevo.")
+    elif res["resultado"] == "TRASLAPE":
+        st.error("Ese horario ya está ocupado en ese lote. Se registró tu solicitud en la lista de espera.")
+    elif res["resultado"] == "SIN_CUPO":
+        st.error("No hay cupo en ese horario. Se registró tu solicitud en la lista de espera.")
+    else:
+        st.success(
+            f"Reserva confirmada en **{lote_sel}** — "
+            f"{start_dt.astimezone().strftime('%d/%m %H:%M')}–"
+            f"{end_dt.astimezone().strftime('%H:%M')}.\n"
+            f"Booking: `{res['booking']}`"
+        )
+
+# ---------- Rerun rápido: cachés por versión de archivo ----------
+# Un rerun sin cambios solo hace os.stat de los CSV: cargas, expiración,
+# ocupación y escritura de Parqueos.csv se saltan si su versión no cambió.
+# Los DataFrames cacheados se comparten entre sesiones: son de solo lectura.
+@st.cache_resource(max_entries=4)
+def _csv_eventos_asegurado(ruta: str, version: tuple) -> bool:
+    asegurar_csv_eventos(ruta)
+    return True
+
+@st.cache_resource(max_entries=4)
+def _parqueos_en_version(ruta: str, version: tuple) -> List[List]:
+    return cargar_parqueos(ruta)
+
+@st.cache_resource(max_entries=2)
+def proyeccion_eventos(ruta: str) -> ProyeccionEventos:
+    # Una por proceso: se pone al día con los avisos de commit del escritor
+    # (en proceso o del servicio) en lugar de releer Eventos.csv en cada cambio.
+    proyeccion = ProyeccionEventos(ruta)
+    try:
+        escritor_eventos(ruta).suscribir(proyeccion.recibir)
+    except OSError:
+        pass    # servicio caído: la proyección lee la cola del archivo
+    return proyeccion
+
+def cargar_eventos(ruta: str) -> pd.DataFrame:
+    return proyeccion_eventos(ruta).obtener()
+
+@st.cache_resource(max_entries=2)
+def _historial_en_version(ruta: str, version: tuple, version_indice: tuple, desde: date, hasta: date) -> pd.DataFrame:
+    return tipar_eventos(leer_eventos_texto(ruta, desde, hasta, por_slot=True))
+
+def eventos_analisis(ruta: str, df_log: pd.DataFrame, desde: date, hasta: date) -> pd.DataFrame:
+    # Análisis de un rango con días archivados: bloques del rango (y los de reservas
+    # hechas antes con slots en él) + el CSV. Sin bloques que lo toquen basta el log en memoria.
+    if not bloques_en_rango(ruta, desde, hasta, por_slot=True):
+        return df_log
+    return _historial_en_version(ruta, version_archivo(ruta), version_archivo(ruta_indice(ruta)), desde, hasta)
+
+@st.cache_resource
+def _ultimo_estado() -> Dict[tuple, tuple]:
+    # (tarea, ruta) -> (versión del archivo tras la tarea, dato asociado)
+    return {}
+
+def proxima_expiracion(df: pd.DataFrame, ahora: datetime) -> datetime:
+    activos = reservas_activas(df, ahora)
+    if activos.empty or activos["slot_end"].isna().all():
+        return datetime.max.replace(tzinfo=timezone.utc)
+    return activos["slot_end"].min().to_pydatetime()
+
+def expirar_si_corresponde(ruta: str, ahora: datetime) -> pd.DataFrame:
+    # Solo recorre el log si cambió o si ya pasó el slot_end más próximo.
+    reintentar_promociones()
+    estado = _ultimo_estado()
+    previo = estado.get(("expiracion", ruta))
+    if previo and previo[0] == version_archivo(ruta) and ahora <= previo[1]:
+        return cargar_eventos(ruta)
+    expirar_vencidas(cargar_eventos(ruta), ahora, ruta)
+    df = cargar_eventos(ruta)
+    estado[("expiracion", ruta)] = (version_archivo(ruta), proxima_expiracion(df, ahora))
+    return df
+
+@st.cache_data(max_entries=64)
+def ocupacion_en(version_eventos: tuple, version_parqueos: tuple, instante: datetime,
+                 _lotes: List[List], _df: pd.DataFrame) -> List[List]:
+    return recalcular_ocupacion_desde_eventos(_lotes, _df, instante)
+
+@st.cache_resource(max_entries=2)
+def ocupacion_slots(ruta_eventos: str, capacidades: tuple) -> OcupacionSlots:
+    # Compartido entre sesiones; `sincronizar` solo procesa las filas nuevas del log.
+    # Se reconstruye solo si cambian los lotes o su capacidad (no con cada "ocupados").
+    # max_simultaneas=1: hay_traslape rechaza cualquier reserva traslapada en un mismo lote.
+    # cupo_vigentes: verificar_reserva cuenta las vivas con slot_end ≥ inicio contra la capacidad.
+    return OcupacionSlots(list(capacidades), max_simultaneas=1, cupo_vigentes=True)
+
+@st.cache_data(max_entries=16)
+def linea_de_tiempo(version_eventos: tuple, capacidades: tuple, desde: datetime, hasta: datetime,
+                    _df: pd.DataFrame) -> pd.DataFrame:
+    # Un barrido por día y versión del log: cambiar la hora de referencia no recalcula nada
+    if _df.empty:
+        return ocupacion_dia(_df, list(capacidades), desde, hasta)
+    vivas = _df[mascara_reservas_vivas(_df) & (_df["slot_start"] < hasta) & (_df["slot_end"] > desde)]
+    return ocupacion_dia(vivas, list(capacidades), desde, hasta)
+
+@st.cache_resource
+def indice_usuarios(ruta_eventos: str) -> IndiceUsuarios:
+    # Compartido entre sesiones; cada tab por usuario lo pone al día con las filas nuevas
+    return IndiceUsuarios()
+
+def reservas_de(ruta_eventos: str, df: pd.DataFrame) -> IndiceUsuarios:
+    idx = indice_usuarios(ruta_eventos)
+    idx.sincronizar(df)
+    return idx
+
+@st.cache_resource
+def memo_metricas() -> MemoLRU:
+    # Resultados de Análisis por (versión del log, lotes, filtros), compartidos entre sesiones
+    return MemoLRU()
+
+def _sembrar_archivo(sketch, ruta_eventos: str):
+    # Los días del archivo frío ya no están en el CSV: se agregan una vez al crear el sketch
+    historial = leer_archivados(ruta_eventos)
+    if not historial.empty:
+        sketch.agregar_df(preparar_eventos(historial))
+    return sketch
+
+@st.cache_resource
+def topk_diario(ruta_eventos: str) -> TopKDiario:
+    # Sketches diarios de usuarios y lotes con más reservas; se ponen al día con las filas nuevas
+    return _sembrar_archivo(TopKDiario(), ruta_eventos)
+
+@st.cache_resource
+def unicos_diarios(ruta_eventos: str) -> UnicosDiarios:
+    # HyperLogLog por (fecha, lote, motivo): usuarios únicos de cualquier filtro combinando registros
+    return _sembrar_archivo(UnicosDiarios(), ruta_eventos)
+
+@st.cache_resource
+def cuantiles_diarios(ruta_eventos: str) -> CuantilesDiarios:
+    # t-digest por (fecha, lote, motivo): percentiles de anticipación, duración y retraso de check-in
+    return _sembrar_archivo(CuantilesDiarios(), ruta_eventos)
+
+def reiniciar_si_archivado(ruta: str) -> None:
+    # Archivar saca filas del inicio del log: los motores que avanzan por posición
+    # de fila (filas_vistas) se rehacen desde cero cuando cambia el índice del archivo.
+    estado = _ultimo_estado()
+    version = version_archivo(ruta_indice(ruta))
+    previo = estado.get(("archivo", ruta))
+    if previo is not None and previo[0] != version:
+        for motor in (lista_espera, ocupacion_slots, indice_usuarios, topk_diario, unicos_diarios, cuantiles_diarios):
+            motor.clear()
+    estado[("archivo", ruta)] = (version, None)
+
+def datos_analisis(df: pd.DataFrame, df_log: pd.DataFrame, filtros: tuple, capacidades: Dict[str, int]) -> Dict[str, object]:
+    # `df`: eventos del rango (con el archivo frío); `df_log`: Eventos.csv, con el que avanzan los sketches
+    f_ini, f_fin, motivos, _ = filtros
+    mask = (df["fecha"] >= date.fromisoformat(f_ini)) & (df["fecha"] <= date.fromisoformat(f_fin))
+    if motivos:
+        mask &= df["motivo"].isin(motivos)
+    dff = df[mask]
+    reservas = dff[dff["accion"] == "reserva"]
+    canceladas = df.loc[(df["accion"] == "cancelacion") & (df["success"] == 1), "booking_id"]
+    total_res = int(len(reservas))
+    exito = float(round((reservas["success"] == 1).mean() * 100, 2)) if len(reservas) else 0.0
+    # Ocupación ponderada por tiempo durante los días del rango (no promedio sobre eventos):
+    # cuenta también las reservas hechas antes que caen en él, como los paquetes diarios
+    occ = ocupacion_rango(df, date.fromisoformat(f_ini), date.fromisoformat(f_fin), list(motivos), [],
+                          capacidades, canceladas)
+    cuantiles = cuantiles_diarios(EVENTOS_CSV)
+    cuantiles.sincronizar(df_log)
+    tiempos = cuantiles.resumen(date.fromisoformat(f_ini), date.fromisoformat(f_fin), motivos=motivos)
+    topk = topk_diario(EVENTOS_CSV)
+    topk.sincronizar(df_log)
+    usuarios = topk.combinado("usuarios", date.fromisoformat(f_ini), date.fromisoformat(f_fin),
+                              motivos=motivos).serie(10, "user_email")
+    return {
+        "filas": mask.to_numpy().nonzero()[0],
+        "total_res": total_res,
+        "exito": exito,
+        "occ": occ,
+        "acciones": dff["accion"].value_counts(),
+        "r_ok": int((reservas["success"] == 1).sum()),
+        "r_bad": int((reservas["success"] == 0).sum()),
+        "por_dia": reservas.groupby("fecha").size() if len(reservas) else pd.Series(dtype=int),
+        "por_hora": dff["hora"].dropna().value_counts().sort_index(),
+        "por_lote": reservas["lot_id"].value_counts(),
+        "tiempos": tiempos,
+        "usuarios": usuarios,
+    }
+
+def guardar_parqueos_si_cambia(ruta: str, lotes_estado: List[List]) -> None:
+    estado = _ultimo_estado()
+    previo = estado.get(("parqueos", ruta))
+    if previo and previo[0] == version_archivo(ruta) and previo[1] == lotes_estado:
+        return
+    guardar_parqueos(ruta, lotes_estado)
+    estado[("parqueos", ruta)] = (version_archivo(ruta), [list(l) for l in lotes_estado])
+
+# ---------- Memoria por sesión (tracemalloc) ----------
+# La medición es opcional (se activa desde Admin) porque tracemalloc
+# encarece cada asignación. El pico es del proceso: con reruns concurrentes
+# de otras sesiones es una cota superior de lo que usó esta sesión.
+@st.cache_resource
+def _memoria_sesiones() -> Dict[str, Dict]:
+    return {}
+
+def id_sesion() -> str:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else "local"
+    except Exception:
+        return "local"
+
+def _bytes_aprox(obj, _prof: int = 0) -> int:
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if _prof < 3 and isinstance(obj, (list, tuple)):
+        return sum(_bytes_aprox(v, _prof + 1) for v in obj)
+    if _prof < 3 and isinstance(obj, dict):
+        return sum(_bytes_aprox(v, _prof + 1) for v in obj.values())
+    if _prof < 3 and hasattr(obj, "__dict__"):
+        # p. ej. IndiceTabla: sus arreglos de orden/filtros (el DataFrame es compartido)
+        return sum(_bytes_aprox(v, _prof + 1) for k, v in vars(obj).items() if k != "df")
+    return sys.getsizeof(obj)
+
+def iniciar_medicion_memoria() -> Optional[int]:
+    if not tracemalloc.is_tracing():
+        return None
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+def registrar_memoria_sesion(usuario: Dict, base: Optional[int]) -> None:
+    if base is None or not tracemalloc.is_tracing():
+        return
+    actual, pico = tracemalloc.get_traced_memory()
+    sesiones = _memoria_sesiones()
+    sesiones[id_sesion()] = {
+        "usuario": usuario["email"],
+        "ultimo_rerun": datetime.now(timezone.utc),
+        "pico_mb": (pico - base) / 2**20,
+        "retenido_mb": (actual - base) / 2**20,
+        "session_state_mb": sum(_bytes_aprox(v) for v in st.session_state.to_dict().values()) / 2**20,
+    }
+    # Sesiones sin reruns en la última hora se descartan
+    limite = datetime.now(timezone.utc) - timedelta(hours=1)
+    for sid in [k for k, v in sesiones.items() if v["ultimo_rerun"] < limite]:
+        sesiones.pop(sid, None)
+
+def reporte_memoria() -> pd.DataFrame:
+    filas = [{
+        "Sesión": sid[:8],
+        "Usuario": v["usuario"],
+        "Último rerun": v["ultimo_rerun"].astimezone().strftime("%H:%M:%S"),
+        "Pico rerun (MB)": round(v["pico_mb"], 2),
+        "Retenido (MB)": round(v["retenido_mb"], 2),
+        "session_state (MB)": round(v["session_state_mb"], 2),
+        "Excede presupuesto": v["pico_mb"] + v["session_state_mb"] > PRESUPUESTO_MEMORIA_SESION_MB,
+    } for sid, v in list(_memoria_sesiones().items())]
+    return pd.DataFrame(filas)
+
 # ---------- Auth ----------
 def registrar_usuario(email: str, name: str, role: str) -> None:
     asegurar_csv_usuarios(USUARIOS_CSV)
@@ -423,52 +712,23 @@ def auth_ui() -> Optional[Dict]:
         ses["user"] = None
     return ses.get("user")
 
-# ---------- Generador de reporte HTML ----------
-def generar_reporte_html(
-    dff: pd.DataFrame,
-    reservas: pd.DataFrame,
-    total_res: int,
-    exito: float,
-    ocup: float,
-    f_ini: date,
-    f_fin: date
-) -> str:
-    motivo_top = ""
-    if "motivo" in reservas.columns and not reservas.empty:
-        serie_mot = reservas["motivo"].value_counts()
-        if len(serie_mot) > 0:
-            motivo_top = str(serie_mot.index[0])
-    lote_top = ""
-    if "lot_id" in reservas.columns and not reservas.empty:
-        serie_lote = reservas["lot_id"].value_counts()
-        if len(serie_lote) > 0:
-            lote_top = str(serie_lote.index[0])
-    acciones = dff["accion"].value_counts() if "accion" in dff.columns else pd.Series(dtype=int)
-    html = "<html><head><meta charset='utf-8'><title>Reporte Parqueos</title></head><body>"
-    html += "<h1>Reporte de uso de parqueos</h1>"
-    html += f"<p>Rango de fechas analizado: <b>{f_ini}</b> a <b>{f_fin}</b>.</p>"
-    html += "<h2>Resumen general</h2>"
-    html += "<ul>"
-    html += f"<li>Total de reservas: <b>{total_res}</b></li>"
-    html += f"<li>Tasa de éxito: <b>{exito:.2f}%</b></li>"
-    html += f"<li>Ocupación promedio (estimada): <b>{ocup:.2f}%</b></li>"
-    if motivo_top:
-        html += f"<li>Motivo más frecuente: <b>{motivo_top}</b></li>"
-    if lote_top:
-        html += f"<li>Lote más utilizado: <b>{lote_top}</b></li>"
-    html += "</ul>"
-    html += "<h2>Acciones registradas</h2><ul>"
-    for acc, cnt in acciones.items():
-        html += f"<li>{acc}: {cnt}</li>"
-    html += "</ul>"
-    html += "<p>Este reporte fue generado automáticamente por el prototipo de gestión de parqueos UVG.</p>"
-    html += "</body></html>"
-    return html
+# ---------- Reporte HTML (paquetes diarios) ----------
+def reporte_html_rango(df: pd.DataFrame, f_ini: date, f_fin: date, motivos: List[str],
+                       capacidades: Dict[str, int]) -> bytes:
+    # Sin filtro de motivos se combinan los paquetes de los días cerrados; solo
+    # los días sin paquete (p. ej. hoy) se calculan desde los eventos.
+    canceladas = df.loc[(df["accion"] == "cancelacion") & (df["success"] == 1), "booking_id"]
+    if motivos:
+        res, n_paq, n_calc = reporte_rango(EVENTOS_CSV, f_ini, f_fin, df[df["motivo"].isin(motivos)],
+                                           capacidades, canceladas, usar_paquetes=False)
+    else:
+        res, n_paq, n_calc = reporte_rango(EVENTOS_CSV, f_ini, f_fin, df, capacidades, canceladas)
+    return html_bytes(res, f_ini, f_fin, dias_paquete=n_paq, dias_calculados=n_calc)
 
 # ---------- App ----------
-asegurar_csv_eventos(EVENTOS_CSV)
+_csv_eventos_asegurado(EVENTOS_CSV, version_archivo(EVENTOS_CSV))
 asegurar_csv_usuarios(USUARIOS_CSV)
-lotes = cargar_parqueos(PARQUEOS_CSV)
+lotes = _parqueos_en_version(PARQUEOS_CSV, version_archivo(PARQUEOS_CSV))
 
 usuario = auth_ui()
 st.title("🚗 Parqueos UVG — Horarios y Reservas")
@@ -482,21 +742,32 @@ if not usuario:
 
 st.caption(f"Sesión: **{usuario['email']}** — Rol: **{usuario['role']}**")
 
-df_all = leer_eventos(EVENTOS_CSV)
 ahora = datetime.now(timezone.utc)
+mem_base = iniciar_medicion_memoria()
+
+exportador_metricas()
+reiniciar_si_archivado(EVENTOS_CSV)
 
 # 1) Expirar vencidas por slot_end < ahora
-expirar_vencidas(df_all, ahora, EVENTOS_CSV)
-df_all = leer_eventos(EVENTOS_CSV)
+df_all = expirar_si_corresponde(EVENTOS_CSV, ahora)
 
 # ---------- Tabs ----------
 tabs = ["Estado", "Reservar", "Check-in", "Cancelar", "Análisis"]
 if usuario["role"] == "admin":
     tabs.append("Admin")
 
-estado_tab, reservar_tab, checkin_tab, cancelar_tab, analisis_tab, *rest = st.tabs(tabs)
+try:
+    # Pestañas perezosas: solo corre el cuerpo de la pestaña abierta
+    pestanas = st.tabs(tabs, key="tabs_app", on_change="rerun")
+except TypeError:
+    pestanas = st.tabs(tabs)
+estado_tab, reservar_tab, checkin_tab, cancelar_tab, analisis_tab, *rest = pestanas
 admin_tab = rest[0] if rest else None
 
+def pestana_abierta(tab) -> bool:
+    # Sin seguimiento de estado (Streamlit antiguo) `open` no existe: se asume abierta
+    return getattr(tab, "open", None) is not False
+
 # ----- Estado -----
 with estado_tab:
     st.subheader("Disponibilidad por horario")
@@ -507,12 +778,31 @@ with estado_tab:
         hora_ref = st.time_input("Hora de referencia", value=dtime(hour=ahora.hour, minute=0))
     ref_dt = to_utc(fecha_ref, hora_ref)
 
-    lotes_estado = recalcular_ocupacion_desde_eventos(lotes, df_all, ref_dt)
+    lotes_estado = ocupacion_en(version_archivo(EVENTOS_CSV), version_archivo(PARQUEOS_CSV), ref_dt, lotes, df_all)
     df_estado = pd.DataFrame(
         [{"Parqueo": l[0], "Capacidad": l[1], "Ocupados": l[2], "Libres": max(l[1] - l[2], 0)} for l in lotes_estado]
     )
     st.dataframe(df_estado, use_container_width=True)
-    guardar_parqueos(PARQUEOS_CSV, lotes_estado)
+    guardar_parqueos_si_cambia(PARQUEOS_CSV, lotes_estado)
+
+    st.markdown("**Disponibilidad del día** (lugares libres por franja de 15 min, reservas en curso)")
+    inicio_dia = to_utc(fecha_ref, dtime(0, 0))
+    df_linea = linea_de_tiempo(
+        version_archivo(EVENTOS_CSV), tuple((l[0], int(l[1])) for l in lotes),
+        inicio_dia, inicio_dia + timedelta(days=1), df_all
+    )
+    df_linea = df_linea.assign(hora=df_linea["inicio"].dt.tz_convert(inicio_dia.astimezone().tzinfo).dt.strftime("%H:%M"))
+    st.vega_lite_chart(df_linea, {
+        "mark": "rect",
+        "encoding": {
+            "x": {"field": "hora", "type": "ordinal", "title": "Hora"},
+            "y": {"field": "lot_id", "type": "nominal", "title": "Parqueo"},
+            "color": {"field": "libres", "type": "quantitative", "title": "Libres",
+                      "scale": {"scheme": "redyellowgreen"}},
+            "tooltip": [{"field": "lot_id", "title": "Parqueo"}, {"field": "hora"},
+                        {"field": "ocupados"}, {"field": "libres"}],
+        },
+    }, use_container_width=True)
 
 # ----- Reservar -----
 with reservar_tab:
@@ -534,86 +824,68 @@ with reservar_tab:
     if st.button("Reservar"):
         start_dt = to_utc(fecha, hora)
         end_dt   = start_dt + timedelta(minutes=int(dur_min))
-
-        if hay_traslape(df_all, lote_sel, start_dt, end_dt):
-            capacidad_lote = 0
-            for l in lotes:
-                if l[0] == lote_sel:
-                    capacidad_lote = int(l[1])
-                    break
-            registrar_evento(
-                EVENTOS_CSV,
-                usuario["email"],
-                "lista_espera",
-                motivo,
-                lote_sel,
-                "",
-                True,
-                0,
-                capacidad_lote,
-                start_dt,
-                end_dt,
-                codigo_error="TRASLAPE"
+        resultado = procesar_reserva(df_all, lotes, usuario["email"], lote_sel, start_dt, end_dt, motivo)
+        mostrar_resultado_reserva(resultado, lote_sel, start_dt, end_dt)
+        df_all = cargar_eventos(EVENTOS_CSV)
+
+    st.divider()
+    with st.expander("🔎 Buscar horario libre en todos los parqueos"):
+        b1, b2, b3 = st.columns(3)
+        with b1:
+            bus_dur = st.selectbox("Duración (min)", [30, 60, 90], index=1, key="bus_dur")
+            bus_desde = st.date_input("Desde", value=date.today(), key="bus_desde")
+        with b2:
+            bus_dias = st.number_input("Días a revisar", min_value=1, max_value=14, value=7, key="bus_dias")
+            bus_criterio = st.radio("Preferir", ["Más temprano", "Lote menos ocupado"], key="bus_criterio")
+        with b3:
+            bus_h0 = st.time_input("Hora mínima", value=dtime(hour=7), key="bus_h0")
+            bus_h1 = st.time_input("Hora máxima", value=dtime(hour=19), key="bus_h1")
+        bus_lotes = st.multiselect("Parqueos", [l[0] for l in lotes], default=[l[0] for l in lotes], key="bus_lotes")
+
+        if st.button("Buscar horarios"):
+            slots = ocupacion_slots(EVENTOS_CSV, tuple((l[0], int(l[1])) for l in lotes))
+            slots.sincronizar(df_all)
+            desde_dt = max(to_utc(bus_desde, dtime(0, 0)), datetime.now(timezone.utc))
+            hasta_dt = to_utc(bus_desde + timedelta(days=int(bus_dias)), dtime(0, 0))
+            st.session_state["bus_resultados"] = slots.buscar(
+                int(bus_dur), desde_dt, hasta_dt, lotes=bus_lotes,
+                horas=(bus_h0, bus_h1), tz=ZONA_SERVIDOR,
+                criterio=CRITERIO_MENOS_OCUPADO if bus_criterio == "Lote menos ocupado" else CRITERIO_PRIMERO,
             )
-            st.error("Ese horario ya está ocupado en ese lote. Se registró tu solicitud en la lista de espera.")
-        else:
-            lotes_slot = recalcular_ocupacion_desde_eventos(lotes, df_all, start_dt)
-            lotemap = {l[0]: l for l in lotes_slot}
-            lote = lotemap.get(lote_sel)
-            libres = max(int(lote[1]) - int(lote[2]), 0) if lote else 0
-            if libres <= 0:
-                capacidad_lote = int(lote[1]) if lote else 0
-                registrar_evento(
-                    EVENTOS_CSV,
-                    usuario["email"],
-                    "lista_espera",
-                    motivo,
-                    lote_sel,
-                    "",
-                    True,
-                    0,
-                    capacidad_lote,
-                    start_dt,
-                    end_dt,
-                    codigo_error="SIN_CUPO"
-                )
-                st.error("No hay cupo en ese horario. Se registró tu solicitud en la lista de espera.")
-            else:
-                booking = str(uuid.uuid4())
-                registrar_evento(
-                    EVENTOS_CSV,
-                    usuario["email"],
-                    "reserva",
-                    motivo,
-                    lote_sel,
-                    booking,
-                    True,
-                    libres - 1,
-                    int(lote[1]),
-                    start_dt,
-                    end_dt
-                )
-                st.success(
-                    f"Reserva confirmada en **{lote_sel}** — "
-                    f"{start_dt.astimezone().strftime('%d/%m %H:%M')}–"
-                    f"{end_dt.astimezone().strftime('%H:%M')}.\n"
-                    f"Booking: `{booking}`"
-                )
-                df_all = leer_eventos(EVENTOS_CSV)
+
+        encontrados = st.session_state.get("bus_resultados")
+        if encontrados is not None and encontrados.empty:
+            st.info("No hay horarios libres con esos criterios.")
+        elif encontrados is not None:
+            etiquetas_bus = [
+                f"{r.lot_id} — {r.slot_start.to_pydatetime().astimezone().strftime('%d/%m %H:%M')}–"
+                f"{r.slot_end.to_pydatetime().astimezone().strftime('%H:%M')} ({r.libres} libres)"
+                for r in encontrados.itertuples()
+            ]
+            elegido_bus = st.radio("Horarios disponibles", range(len(etiquetas_bus)),
+                                   format_func=lambda i: etiquetas_bus[i], key="bus_elegido")
+            if st.button("Reservar horario seleccionado"):
+                r = encontrados.iloc[int(elegido_bus)]
+                start_dt, end_dt = r["slot_start"].to_pydatetime(), r["slot_end"].to_pydatetime()
+                resultado = procesar_reserva(df_all, lotes, usuario["email"], r["lot_id"], start_dt, end_dt, motivo)
+                mostrar_resultado_reserva(resultado, r["lot_id"], start_dt, end_dt)
+                st.session_state.pop("bus_resultados", None)
+                df_all = cargar_eventos(EVENTOS_CSV)
 
 # ----- Check-in -----
 with checkin_tab:
     st.subheader("Check-in de reservas activas")
-    activos_usuario = reservas_activas(df_all, datetime.now(timezone.utc))
-    activos_usuario = activos_usuario[activos_usuario["user_email"] == usuario["email"]].copy()
+    idx_usuario = reservas_de(EVENTOS_CSV, df_all)
+    activos_usuario = idx_usuario.activas(usuario["email"], datetime.now(timezone.utc))
     if activos_usuario.empty:
         st.info("No tienes reservas activas para hacer check-in.")
     else:
         activos_usuario = activos_usuario.sort_values("slot_start")
         opciones = []
         for _, r in activos_usuario.iterrows():
-            inicio_local = r["slot_start"].astimezone()
-            fin_local    = r["slot_end"].astimezone()
+            # Timestamp.astimezone() sin argumentos falla en pandas: se pasa a datetime
+            inicio_local = r["slot_start"].to_pydatetime().astimezone()
+            fin_local    = r["slot_end"].to_pydatetime().astimezone()
             etiqueta = f"{r['lot_id']} — {inicio_local.strftime('%d/%m %H:%M')}–{fin_local.strftime('%H:%M')}"
             opciones.append((etiqueta, r["booking_id"]))
         etiquetas = [e[0] for e in opciones]
@@ -621,13 +893,13 @@ with checkin_tab:
         elegido = st.selectbox("Selecciona tu reserva", etiquetas)
         if st.button("Hacer check-in"):
             booking_sel = mapa_labels.get(elegido, "")
-            if booking_sel and tiene_checkin(df_all, booking_sel):
+            if booking_sel and idx_usuario.tiene_checkin(booking_sel):
                 st.warning("Esta reserva ya tiene check-in registrado.")
             else:
                 fila_sel = activos_usuario[activos_usuario["booking_id"] == booking_sel].iloc[0]
                 cap = int(fila_sel.get("capacity") or 0)
                 libres_reg = int(fila_sel.get("free_spots_after") or 0)
-                registrar_evento(
+                fila = registrar_evento(
                     EVENTOS_CSV,
                     usuario["email"],
                     "checkin",
@@ -642,34 +914,19 @@ with checkin_tab:
                     origen="ui",
                     version="v2"
                 )
-                st.success("Check-in registrado correctamente.")
-                df_all = leer_eventos(EVENTOS_CSV)
+                if no_registrado(fila):
+                    st.error("No se pudo registrar el check-in. Intenta de nuevo.")
+                else:
+                    st.success("Check-in registrado correctamente.")
+                    df_all = cargar_eventos(EVENTOS_CSV)
 
 # ----- Cancelar -----
-def ultima_reserva_activa(df: pd.DataFrame, email: str, lot_id: str) -> Optional[str]:
-    if df.empty:
-        return None
-    ok_res = (
-        (df["accion"] == "reserva") &
-        (df["success"] == 1) &
-        (df["user_email"] == email) &
-        (df["lot_id"] == lot_id)
-    )
-    res = df[ok_res].copy()
-    if res.empty:
-        return None
-    canc = df[(df["accion"] == "cancelacion") & (df["success"] == 1)][["booking_id"]]
-    res = res[~res["booking_id"].isin(canc["booking_id"])]
-    if res.empty:
-        return None
-    res = res.sort_values("slot_start")
-    return str(res.iloc[-1]["booking_id"])
-
 with cancelar_tab:
     st.subheader("Cancelar mi reserva")
     lote_cancel = st.selectbox("Parqueo", [l[0] for l in lotes], key="cancel_lote")
     if st.button("Cancelar"):
-        b = ultima_reserva_activa(df_all, usuario["email"], lote_cancel)
+        idx_usuario = reservas_de(EVENTOS_CSV, df_all)
+        b = idx_usuario.ultima_activa(usuario["email"], lote_cancel)
         lotes_now = recalcular_ocupacion_desde_eventos(lotes, df_all, ahora)
         lotemap = {l[0]: l for l in lotes_now}
         lote = lotemap.get(lote_cancel)
@@ -690,8 +947,7 @@ with cancelar_tab:
                 codigo_error="SIN_RESERVA_ACTIVA"
             )
             st.warning("No se encontró una reserva activa tuya en ese parqueo.")
-        else:
-            registrar_evento(
+        elif no_registrado(registrar_evento(
                 EVENTOS_CSV,
                 usuario["email"],
                 "cancelacion",
@@ -701,23 +957,39 @@ with cancelar_tab:
                 True,
                 libres_actuales + 1,
                 capacidad
-            )
+            )):
+            st.error("No se pudo registrar la cancelación. Intenta de nuevo.")
+        else:
             st.success("Reserva cancelada.")
-            df_all = leer_eventos(EVENTOS_CSV)
+            mias = idx_usuario.reservas(usuario["email"])
+            fila_b = mias[mias["booking_id"] == b].iloc[0]
+            promovidas = promover_lista_espera(lote_cancel, fila_b["slot_start"], fila_b["slot_end"])
+            if promovidas is None:
+                st.warning("La lista de espera está ocupada: el espacio liberado se le asignará en la próxima actualización.")
+            elif promovidas:
+                st.info(f"El espacio liberado se asignó a {len(promovidas)} solicitud(es) de la lista de espera.")
+            df_all = cargar_eventos(EVENTOS_CSV)
 
 # ----- Análisis -----
 with analisis_tab:
     st.subheader("Análisis (filtros + 5 gráficos)")
-    df_eventos = leer_eventos(EVENTOS_CSV)
-    if df_eventos.empty:
+    abierta = pestana_abierta(analisis_tab)
+    # Extremos entre el archivo frío y el CSV, sin leer eventos
+    extremos = extremos_fechas(EVENTOS_CSV) if abierta else None
+    if abierta and extremos is None and not df_all.empty:
+        fechas = df_all["fecha"].dropna()
+        extremos = (fechas.min(), fechas.max()) if len(fechas) else None
+    if abierta and extremos is None:
         st.info("Aún no hay eventos.")
-    else:
+    elif abierta:
+        import matplotlib.pyplot as plt  # solo se carga si se abre Análisis
+
         colf1, colf2, colf3 = st.columns(3)
-        fechas = sorted([d for d in df_eventos["fecha"].dropna().unique()])
         with colf1:
-            f_ini = st.date_input("Fecha inicial", value=min(fechas) if fechas else date.today())
+            f_ini = st.date_input("Fecha inicial", value=extremos[0])
         with colf2:
-            f_fin = st.date_input("Fecha final", value=max(fechas) if fechas else date.today())
+            f_fin = st.date_input("Fecha final", value=extremos[1])
+        df_eventos = eventos_analisis(EVENTOS_CSV, df_all, f_ini, f_fin)
         with colf3:
             motivos = st.multiselect(
                 "Motivos",
@@ -725,29 +997,53 @@ with analisis_tab:
                 default=[]
             )
 
-        dff = df_eventos.copy()
-        dff = dff[(dff["fecha"] >= f_ini) & (dff["fecha"] <= f_fin)]
-        if motivos:
-            dff = dff[dff["motivo"].isin(motivos)]
-
-        reservas = dff[dff["accion"] == "reserva"]
+        # Mismo log y mismos filtros → mismo resultado, calculado una vez para todas las sesiones
+        capacidades = {l[0]: int(l[1]) for l in lotes}
+        filtros = normalizar_filtros(f_ini, f_fin, motivos)
+        clave = ("analisis", version_archivo(EVENTOS_CSV), version_archivo(ruta_indice(EVENTOS_CSV)),
+                 tuple(sorted(capacidades.items())), filtros)
+        datos = memo_metricas().obtener(clave, lambda: datos_analisis(df_eventos, df_all, filtros, capacidades))
+        dff = df_eventos.iloc[datos["filas"]]
+        total_res, exito, occ = datos["total_res"], datos["exito"], datos["occ"]
+        ocup = float(round(occ["global"], 2))
 
         m1, m2, m3 = st.columns(3)
-        total_res = int(len(reservas))
-        exito = float(round((reservas["success"] == 1).mean() * 100, 2)) if len(reservas) else 0.0
-        ocup = 0.0
-        if {"free_spots_after", "capacity"}.issubset(dff.columns) and len(
-            dff.dropna(subset=["free_spots_after", "capacity"])
-        ) > 0:
-            occ = 1 - (dff["free_spots_after"] / dff["capacity"])
-            ocup = float(round(occ.mean() * 100, 2))
         m1.metric("Reservas (total)", total_res)
         m2.metric("Tasa de éxito (%)", exito)
-        m3.metric("Ocupación promedio (%)", ocup)
+        m3.metric("Ocupación promedio (%)", ocup, help="Ponderada por el tiempo que duran las reservas (UTC, días completos).")
+
+        with st.expander("Ocupación por lote y por hora (ponderada por tiempo)"):
+            if occ["por_lote"].empty:
+                st.caption("No hay reservas con horario en el rango seleccionado.")
+            else:
+                st.dataframe(occ["por_lote"].round(2), use_container_width=True)
+                st.bar_chart(occ["serie_hora"].rename("Ocupación media (%)"))
+
+        unicos = unicos_diarios(EVENTOS_CSV)
+        unicos.sincronizar(df_all)
+        st.markdown(f"**Usuarios únicos con reservas (aprox.):** {unicos.unicos(f_ini, f_fin, motivos=motivos)}")
+        st.line_chart(unicos.serie("fecha", f_ini, f_fin, motivos=motivos).rename("Usuarios únicos por día"))
+
+        with st.expander("Percentiles de tiempos (minutos, aproximados)"):
+            st.caption("Anticipación = inicio − momento de reservar · duración reservada · "
+                       "retraso de check-in = check-in − inicio (negativo: llegó antes).")
+            st.dataframe(datos["tiempos"], use_container_width=True)
+
+        with st.expander("Usuarios y lotes con más reservas (aproximado)"):
+            topk = topk_diario(EVENTOS_CSV)
+            topk.sincronizar(df_all)
+            st.caption("Top 10 de las fechas y motivos elegidos combinando sketches por día, lote y motivo. "
+                       "El conteo real está entre *minimo* y *conteo*.")
+            t1, t2 = st.columns(2)
+            for col, tipo, titulo in [(t1, "usuarios", "Usuarios"), (t2, "lotes", "Lotes")]:
+                sk = topk.combinado(tipo, f_ini, f_fin, motivos=motivos)
+                with col:
+                    st.markdown(f"**{titulo}** · error máximo ±{sk.cota_error()}")
+                    st.dataframe(sk.top(10), use_container_width=True, hide_index=True)
 
         c1, c2 = st.columns(2)
         with c1:
-            serie = dff["accion"].value_counts()
+            serie = datos["acciones"]
             fig, ax = plt.subplots()
             if len(serie) == 0:
                 ax.set_title("Frecuencia de acciones (sin datos)")
@@ -760,8 +1056,7 @@ with analisis_tab:
 
         with c2:
             fig, ax = plt.subplots()
-            r_ok = int((reservas["success"] == 1).sum())
-            r_bad = int((reservas["success"] == 0).sum())
+            r_ok, r_bad = datos["r_ok"], datos["r_bad"]
             if r_ok + r_bad == 0:
                 ax.set_title("Éxito vs. fallo (sin datos)")
             else:
@@ -771,7 +1066,7 @@ with analisis_tab:
 
         c3, c4 = st.columns(2)
         with c3:
-            serie = reservas.groupby("fecha").size() if len(reservas) else pd.Series(dtype=int)
+            serie = datos["por_dia"]
             fig, ax = plt.subplots()
             if len(serie) == 0:
                 ax.set_title("Reservas por día (sin datos)")
@@ -783,18 +1078,18 @@ with analisis_tab:
             st.pyplot(fig)
 
         with c4:
-            vals = dff["hora"].dropna()
+            por_hora = datos["por_hora"]
             fig, ax = plt.subplots()
-            if len(vals) == 0:
+            if len(por_hora) == 0:
                 ax.set_title("Distribución por hora (sin datos)")
             else:
-                ax.hist(vals, bins=24, range=(0, 24))
+                ax.hist(por_hora.index, bins=24, range=(0, 24), weights=por_hora.to_numpy())
                 ax.set_title("Distribución por hora")
                 ax.set_xlabel("Hora")
                 ax.set_ylabel("Frecuencia")
             st.pyplot(fig)
 
-        serie_lotes = reservas["lot_id"].value_counts()
+        serie_lotes = datos["por_lote"]
         fig, ax = plt.subplots()
         if len(serie_lotes) == 0:
             ax.set_title("Reservas por lote (sin datos)")
@@ -806,31 +1101,57 @@ with analisis_tab:
         st.pyplot(fig)
 
         st.subheader("Solicitudes en lista de espera")
-        df_wait = dff[dff["accion"] == "lista_espera"].copy()
+        df_wait = dff[dff["accion"] == "lista_espera"]
         if df_wait.empty:
             st.caption("No hay registros en lista de espera en el rango seleccionado.")
         else:
             cols = ["user_email", "lot_id", "motivo", "slot_start", "slot_end", "error_code"]
-            for c in cols:
-                if c not in df_wait.columns:
-                    df_wait[c] = ""
-            df_wait = df_wait[cols].copy()
-            if "slot_start" in df_wait.columns:
-                df_wait["slot_start"] = df_wait["slot_start"].dt.tz_convert(None)
-            if "slot_end" in df_wait.columns:
-                df_wait["slot_end"] = df_wait["slot_end"].dt.tz_convert(None)
-            st.dataframe(df_wait, use_container_width=True)
-
-        reporte_html = generar_reporte_html(dff, reservas, total_res, exito, ocup, f_ini, f_fin)
+            tabla_paginada(
+                df_wait,
+                "tp_espera",
+                version_archivo(EVENTOS_CSV) + (f_ini, f_fin, tuple(motivos)),
+                columnas=cols,
+                columnas_orden=["slot_start", "lot_id", "user_email"],
+                columnas_filtro=["lot_id", "error_code"]
+            )
+
         st.download_button(
             "Descargar reporte (HTML)",
-            data=reporte_html.encode("utf-8"),
+            # Se arma solo al hacer clic, desde los paquetes diarios
+            data=lambda: reporte_html_rango(df_eventos, f_ini, f_fin, motivos, capacidades),
             file_name="reporte_parqueos.html",
             mime="text/html"
         )
 
+        with st.expander("Exportar datos (Parquet / Arrow)"):
+            version_exp = version_archivo(EVENTOS_CSV) + (f_ini, f_fin, tuple(motivos))
+            formato = st.radio("Formato", ["parquet", "arrow"], horizontal=True, key="exp_formato")
+            if st.button("Preparar exportación"):
+                # Se escribe por bloques a archivos temporales; la sesión guarda solo las rutas
+                previa = st.session_state.pop("exp_columnar", None)
+                if previa:
+                    borrar_temporales(*previa[2:])
+                st.session_state["exp_columnar"] = (
+                    version_exp,
+                    formato,
+                    a_temporal(exportar_eventos, dff, formato=formato, sufijo=f".{formato}"),
+                    # Con la misma ocupación del rango que muestran las tarjetas
+                    a_temporal(exportar_metricas, memo_metricas().obtener(
+                        ("metricas",) + clave[1:],
+                        lambda: calcular_metricas(dff, ocupacion=occ, tiempos=datos["tiempos"], usuarios=datos["usuarios"])
+                    ), formato=formato, sufijo=f".{formato}")
+                )
+            exp = st.session_state.get("exp_columnar")
+            if exp and exp[0] == version_exp:
+                _, fmt, ruta_ev, ruta_met = exp
+                # El archivo se lee recién al hacer clic
+                st.download_button(f"Eventos filtrados (.{fmt})", data=Path(ruta_ev).read_bytes,
+                                   file_name=f"eventos_filtrados.{fmt}", mime="application/octet-stream")
+                st.download_button(f"Métricas (.{fmt})", data=Path(ruta_met).read_bytes,
+                                   file_name=f"metricas.{fmt}", mime="application/octet-stream")
+
 # ----- Admin -----
-if admin_tab is not None:
+if admin_tab is not None and pestana_abierta(admin_tab):
     with admin_tab:
         st.subheader("Panel de Administración")
 
@@ -841,29 +1162,38 @@ if admin_tab is not None:
             hora_ref = st.time_input("Hora ref.", value=dtime(hour=ahora.astimezone().hour, minute=0), key="adm_h")
         ref_dt = to_utc(fecha_ref, hora_ref)
 
-        df_now = reservas_activas(df_all, ref_dt).copy()
-        if not df_now.empty:
-            df_now = df_now.sort_values(["lot_id", "slot_start"])[
-                ["user_email", "lot_id", "booking_id", "slot_start", "slot_end", "motivo"]
-            ]
-            df_now["slot_start"] = df_now["slot_start"].dt.tz_convert(None)
-            df_now["slot_end"]   = df_now["slot_end"].dt.tz_convert(None)
-
+        df_now = reservas_activas(df_all, ref_dt)
         st.markdown("**Reservas activas en el instante seleccionado**")
-        st.dataframe(
-            df_now if not df_now.empty else pd.DataFrame(
-                columns=["user_email", "lot_id", "booking_id", "slot_start", "slot_end", "motivo"]
-            ),
-            use_container_width=True
+        tabla_paginada(
+            df_now.sort_values("slot_start") if not df_now.empty else df_now,
+            "tp_admin",
+            version_archivo(EVENTOS_CSV) + (ref_dt,),
+            columnas=["user_email", "lot_id", "booking_id", "slot_start", "slot_end", "motivo"],
+            columnas_orden=["lot_id", "slot_start", "user_email"],
+            columnas_filtro=["lot_id", "motivo"]
         )
 
-        lotes_ref = recalcular_ocupacion_desde_eventos(lotes, df_all, ref_dt)
+        lotes_ref = ocupacion_en(version_archivo(EVENTOS_CSV), version_archivo(PARQUEOS_CSV), ref_dt, lotes, df_all)
         df_occ = pd.DataFrame(
             [{"Lote": l[0], "Capacidad": l[1], "Ocupados": l[2], "Libres": max(l[1] - l[2], 0)} for l in lotes_ref]
         )
         st.markdown("**Ocupación por lote (instante ref.)**")
         st.dataframe(df_occ, use_container_width=True)
 
+        cola = lista_espera(EVENTOS_CSV)
+        cola.sincronizar(df_all)
+        df_cola = cola.pendientes(datetime.now(timezone.utc))
+        st.markdown(f"**Lista de espera pendiente** ({len(df_cola)} solicitudes; se promueven solas al liberarse cupo)")
+        if not df_cola.empty:
+            # Las ventanas ya terminadas salen de la cola sin cambiar el log: el tamaño entra en la versión
+            tabla_paginada(
+                df_cola.sort_values(["slot_start", "lot_id", "posicion"]),
+                "tp_lista_espera",
+                version_archivo(EVENTOS_CSV) + (len(df_cola),),
+                columnas_orden=["slot_start", "lot_id", "posicion", "solicitada", "user_email"],
+                columnas_filtro=["lot_id", "motivo"]
+            )
+
         st.divider()
         st.markdown("⚠️ **Acciones de fin de día**")
         confirmar = st.checkbox("Estoy seguro de que quiero cerrar la jornada", key="chk_cierre")
@@ -873,12 +1203,149 @@ if admin_tab is not None:
             if st.button("Cerrar jornada (expirar activas)"):
                 if confirmar:
                     n = cerrar_jornada(df_all, datetime.now(timezone.utc), EVENTOS_CSV)
-                    df_all = leer_eventos(EVENTOS_CSV)
-                    st.success(f"Se cerró la jornada. Reservas expiradas/no-show marcadas: {n}.")
+                    df_all = cargar_eventos(EVENTOS_CSV)
+                    # Paquetes de reporte de los días (UTC) ya terminados que aún no lo tengan
+                    dias = cerrar_dias(EVENTOS_CSV, df_all, {l[0]: int(l[1]) for l in lotes}, max_dias=DIAS_REPORTE_CIERRE)
+                    st.success(f"Se cerró la jornada. Reservas expiradas/no-show marcadas: {n}."
+                               + (f" Reportes diarios generados: {', '.join(map(str, dias))}." if dias else ""))
                 else:
                     st.warning("Marca la casilla de confirmación antes de cerrar la jornada.")
         with col_btn2:
             if st.button("Refrescar datos"):
-                df_all = leer_eventos(EVENTOS_CSV)
+                df_all = cargar_eventos(EVENTOS_CSV)
                 st.info("Datos recargados.")
 
+        st.divider()
+        with st.expander("Importación masiva de reservas (CSV)"):
+            st.caption("Columnas: user_email, lot_id, slot_start, slot_end, motivo (horas sin zona = hora local). "
+                       "Las filas se asignan en el orden del archivo.")
+            archivo = st.file_uploader("Archivo de solicitudes", type=["csv"], key="bulk_archivo")
+            # Por defecto las reglas del formulario: "Capacidad del lote" acepta reservas traslapadas
+            regla = st.radio("Cupo por franja", ["1 por lote (como el formulario de reserva)", "Capacidad del lote"],
+                             key="bulk_regla")
+            max_sim = 1 if regla.startswith("1") else None
+
+            def validar_importacion():
+                ahora_imp = datetime.now(timezone.utc)
+                archivo.seek(0)
+                sol = leer_solicitudes(archivo, datetime.now().astimezone().tzinfo)
+                df_act = cargar_eventos(EVENTOS_CSV)
+                vivas = df_act[mascara_reservas_vivas(df_act) & (df_act["slot_end"] > ahora_imp)] if not df_act.empty else df_act
+                return validar_solicitudes(sol, vivas, [(l[0], l[1]) for l in lotes], ahora_imp, max_simultaneas=max_sim)
+
+            if archivo is not None and st.button("Validar solicitudes"):
+                st.session_state["bulk_reporte"] = (archivo.file_id, regla, validar_importacion())
+            previo = st.session_state.get("bulk_reporte")
+            if archivo is not None and previo and previo[:2] == (archivo.file_id, regla):
+                reporte = previo[2]
+                n_ok = int((reporte["estado"] == ACEPTADA).sum())
+                st.write(f"**{n_ok}** aceptadas · **{len(reporte) - n_ok}** rechazadas")
+                if len(reporte) > n_ok:
+                    st.dataframe(reporte.loc[reporte["estado"] != ACEPTADA, "error_code"].value_counts())
+                st.download_button("Descargar reporte por fila (CSV)", data=reporte.to_csv(index=False).encode("utf-8"),
+                                   file_name="reporte_importacion.csv", mime="text/csv")
+                if n_ok and st.button(f"Confirmar e importar {n_ok} reservas"):
+                    # Se revalida contra el log actual: pudo cambiar desde la validación
+                    reporte = validar_importacion()
+                    filas = filas_evento(reporte[reporte["estado"] == ACEPTADA])
+                    error_lote = ""
+                    if not MODO_DEMO:
+                        try:
+                            if escritor_eventos(EVENTOS_CSV).agregar_lote(filas) is None:
+                                error_lote = "sin confirmación del escritor"
+                        except ErrorEscritura as e:
+                            error_lote = str(e)
+                    if MODO_DEMO:
+                        st.info(f"Modo demo: {len(filas)} reservas validadas, no se escribió nada.")
+                    elif error_lote:
+                        st.error(f"No se pudo escribir el lote en Eventos.csv ({error_lote}).")
+                    else:
+                        st.success(f"Se importaron {len(filas)} reservas en un solo append.")
+                        st.session_state.pop("bulk_reporte", None)
+                        df_all = cargar_eventos(EVENTOS_CSV)
+
+        with st.expander("Caché de métricas (compartida entre sesiones)"):
+            memo = memo_metricas()
+            st.caption(f"Ocupación: **{memo.resumen()}** · se desaloja el resultado usado hace más tiempo.")
+            st.dataframe(memo.estadisticas(), use_container_width=True, hide_index=True)
+            if st.button("Vaciar caché de métricas", key="adm_memo_limpiar"):
+                memo.limpiar()
+                st.success("Caché vaciada.")
+
+        with st.expander("Consola SQL (solo lectura)"):
+            fuentes = fuentes_sql(EVENTOS_CSV)
+            st.caption(
+                f"Motor: **{motor_disponible()}** · solo SELECT/WITH · tablas: "
+                + ", ".join(f"`{t}`" for t in fuentes)
+                + ". Sin DuckDB se cargan solo las columnas que menciona la consulta."
+            )
+            with st.popover("Columnas por tabla"):
+                for t, ruta in fuentes.items():
+                    st.markdown(f"**{t}**: " + ", ".join(columnas_fuente(ruta)))
+            sql = st.text_area(
+                "Consulta",
+                value="SELECT lot_id, count(*) AS reservas\nFROM eventos\nWHERE accion = 'reserva' AND success = 1\nGROUP BY lot_id\nORDER BY reservas DESC",
+                height=140,
+                key="adm_sql",
+            )
+            c1, c2, c3 = st.columns(3)
+            with c1:
+                rango = st.date_input("Fechas del evento (opcional)", value=(), key="adm_sql_rango")
+            with c2:
+                limite = st.number_input("Límite de filas", min_value=1, max_value=100_000, value=LIMITE_FILAS, key="adm_sql_limite")
+            with c3:
+                timeout = st.number_input("Tiempo máximo (s)", min_value=1.0, max_value=120.0, value=TIMEOUT_S, key="adm_sql_timeout")
+            if st.button("Ejecutar consulta", key="adm_sql_ejecutar"):
+                desde_sql = rango[0] if len(rango) > 0 else None
+                hasta_sql = rango[1] if len(rango) > 1 else desde_sql
+                try:
+                    st.session_state["adm_sql_resultado"] = ejecutar_consulta(
+                        sql, fuentes, int(limite), float(timeout), desde_sql, hasta_sql)
+                except ConsultaCancelada as e:
+                    st.session_state.pop("adm_sql_resultado", None)
+                    st.error(f"{e} Acoten el rango de fechas o la consulta.")
+                except Exception as e:
+                    st.session_state.pop("adm_sql_resultado", None)
+                    st.error(f"Error en la consulta: {e}")
+            res_sql = st.session_state.get("adm_sql_resultado")
+            if res_sql is not None:
+                st.caption(
+                    f"{len(res_sql['df'])} filas en {res_sql['segundos']:.2f} s ({res_sql['motor']})"
+                    + (f" · truncado a {len(res_sql['df'])} filas" if res_sql["truncado"] else "")
+                )
+                st.dataframe(res_sql["df"], use_container_width=True, hide_index=True)
+                st.download_button("Descargar resultado (CSV)", data=res_sql["df"].to_csv(index=False).encode("utf-8"),
+                                   file_name="consulta.csv", mime="text/csv", key="adm_sql_descarga")
+
+        with st.expander("Métricas operativas (Prometheus)"):
+            exp_met = exportador_metricas()
+            destinos = exp_met.destinos()
+            st.caption(
+                ("Exportando a: " + " · ".join(f"`{d}`" for d in destinos)) if destinos else
+                "Sin exportación: definan PARQUEOS_METRICAS_ARCHIVO y/o PARQUEOS_METRICAS_PUERTO "
+                "antes de arrancar la app. Los valores son de este proceso desde que arrancó."
+            )
+            if exp_met.error:
+                st.warning(exp_met.error)
+            st.code(REGISTRO.texto_prometheus(), language="text")
+
+        with st.expander("Memoria por sesión (tracemalloc)"):
+            medir = st.checkbox("Medir memoria por rerun", value=tracemalloc.is_tracing(), key="adm_tracemalloc")
+            if medir and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                st.info("Medición activada: los datos aparecen desde el próximo rerun de cada sesión.")
+            elif not medir and tracemalloc.is_tracing():
+                tracemalloc.stop()
+                _memoria_sesiones().clear()
+            st.caption(
+                f"Presupuesto por sesión: **{PRESUPUESTO_MEMORIA_SESION_MB} MB** (pico del rerun + session_state). "
+                f"Log de eventos compartido en caché: **{_bytes_aprox(df_all) / 2**20:.1f} MB** (una sola copia para todas las sesiones)."
+            )
+            df_mem = reporte_memoria()
+            if df_mem.empty:
+                st.write("Sin mediciones todavía.")
+            else:
+                st.dataframe(df_mem, use_container_width=True)
+
+registrar_memoria_sesion(usuario, mem_base)
+
@@ -0,0 +1,39 @@
+# Mueve los días cerrados de Eventos.csv al archivo frío comprimido (archivo_eventos.py).
+# Uso: python archivar_cli.py [Eventos.csv] [--hasta 2025-11-30] [--compresion zstd|gzip]
+#      [--filas-por-bloque 100000] [--dias-por-bloque 7]
+#   --hasta  último día (UTC) a archivar; por defecto hoy menos DIAS_ABIERTOS
+# Las reservas que siguen vivas (y el resto de su ciclo de vida) se quedan en el CSV.
+# CF3.py y analisis_parqueos.py leen el archivo de forma transparente.
+import argparse, time
+from datetime import date
+
+from archivo_eventos import (COMPRESION, DIAS_POR_BLOQUE, FILAS_POR_BLOQUE, archivar, directorio_archivo,
+                             leer_indice)
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivo frío comprimido de Eventos.csv")
+    parser.add_argument("eventos", nargs="?", default="Eventos.csv")
+    parser.add_argument("--hasta", type=date.fromisoformat)
+    parser.add_argument("--compresion", choices=["zstd", "gzip"], default=COMPRESION)
+    parser.add_argument("--filas-por-bloque", type=int, default=FILAS_POR_BLOQUE)
+    parser.add_argument("--dias-por-bloque", type=int, default=DIAS_POR_BLOQUE)
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    res = archivar(args.eventos, args.hasta, args.compresion, args.filas_por_bloque, args.dias_por_bloque)
+    seg = time.perf_counter() - t
+    if res["filas"] == 0:
+        print(f"Nada que archivar hasta {res['hasta']}.")
+    else:
+        print(f"{res['filas']} eventos hasta {res['hasta']} → {res['bloques']} bloques {args.compresion} "
+              f"({res['bytes_csv'] / 1e6:.1f} MB → {res['bytes_comprimidos'] / 1e6:.1f} MB, "
+              f"{res['bytes_csv'] / max(res['bytes_comprimidos'], 1):.1f}×) en {seg:.1f} s")
+
+    indice = leer_indice(args.eventos)
+    total = sum(b["bytes"] for b in indice["bloques"])
+    print(f"Archivo {directorio_archivo(args.eventos)}: {len(indice['bloques'])} bloques, "
+          f"{indice['filas_archivadas']} eventos, {total / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# archivo_eventos.py — Archivo frío comprimido de los días cerrados de Eventos.csv.
+# `archivar` saca del CSV los eventos de días ya sellados y los guarda en bloques
+# CSV comprimidos (zstd si pyarrow lo trae, si no gzip) de a lo sumo
+# FILAS_POR_BLOQUE filas / DIAS_POR_BLOQUE días, en <Eventos>_archivo/. El índice
+# (indice.json) guarda por bloque el rango de fechas, filas y bytes, así una
+# lectura por rango descomprime solo los bloques que se traslapan con él.
+# Una fila anterior al corte se queda en el CSV si su reserva sigue viva
+# (slot_end ≥ ahora) o si su booking_id tiene otra fila que se queda: el ciclo
+# de vida de cada reserva (reserva, check-in, cancelación) nunca se parte.
+# Cada bloque guarda además el rango de días de los slots de sus filas (una
+# cancelación o check-in cuenta con el slot de su reserva), así la ocupación de
+# un rango encuentra las reservas hechas antes y sus cancelaciones (`por_slot`).
+# La lectura y la compresión se hacen sin el lock del escritor; el lock se toma
+# solo para reescribir el CSV con las filas que llegaron mientras tanto.
+
+import io
+import json
+import os
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cache_columnas import fechas_indexadas, leer_csv_eventos
+from servicio_eventos import LOCK_FILE, acquire_lock, release_lock
+
+FILAS_POR_BLOQUE = 100_000
+DIAS_POR_BLOQUE = 7
+DIAS_ABIERTOS = 8          # días recientes que nunca se archivan por defecto
+COMPRESION = "zstd" if pa.Codec.is_available("zstd") else "gzip"
+_HUELLA_BYTES = 4096
+_EXTENSION = {"zstd": ".csv.zst", "gzip": ".csv.gz"}
+
+
+def directorio_archivo(ruta_eventos: str) -> str:
+    base, _ = os.path.splitext(os.path.abspath(ruta_eventos))
+    return base + "_archivo"
+
+
+def ruta_indice(ruta_eventos: str) -> str:
+    return os.path.join(directorio_archivo(ruta_eventos), "indice.json")
+
+
+def leer_indice(ruta_eventos: str) -> Dict:
+    try:
+        with open(ruta_indice(ruta_eventos), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"bloques": [], "filas_archivadas": 0}
+
+
+def _escribir_atomico(ruta: str, datos: bytes) -> None:
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(datos)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+
+def _comprimir(texto: str, compresion: str) -> bytes:
+    salida = pa.BufferOutputStream()
+    with pa.CompressedOutputStream(salida, compresion) as f:
+        f.write(texto.encode("utf-8"))
+    return salida.getvalue().to_pybytes()
+
+
+def _filas_a_mover(df: pd.DataFrame, ts: pd.Series, corte: pd.Timestamp) -> np.ndarray:
+    slot_end = pd.to_datetime(df["slot_end"], errors="coerce", utc=True, format="ISO8601")
+    retener = (ts >= corte) | ts.isna() | (slot_end >= pd.Timestamp.now(tz="UTC"))
+    ids = df["booking_id"]
+    vivos = set(ids[retener & (ids != "")])
+    retener |= ids.isin(vivos) & (ids != "")
+    return (~retener).to_numpy()
+
+
+def _slots_de_reserva(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    """Slot de cada fila; las que no lo traen (p. ej. cancelaciones) toman el de su reserva."""
+    ini = pd.to_datetime(df["slot_start"], errors="coerce", utc=True, format="ISO8601")
+    fin = pd.to_datetime(df["slot_end"], errors="coerce", utc=True, format="ISO8601")
+    ids = df["booking_id"]
+    es_reserva = (df["accion"] == "reserva") & (ids != "") & ini.notna()
+    ini_id = pd.Series(ini[es_reserva].to_numpy(), index=ids[es_reserva]).groupby(level=0).min()
+    fin_id = pd.Series(fin[es_reserva].to_numpy(), index=ids[es_reserva]).groupby(level=0).max()
+    return {"_slot_ini": ini.fillna(ids.map(ini_id)), "_slot_fin": fin.fillna(ids.map(fin_id))}
+
+
+def _rango_slots(bloque: pd.DataFrame) -> Dict[str, Optional[str]]:
+    """Primer y último día de los slots del bloque (None si no hay)."""
+    ini, fin = bloque["_slot_ini"].min(), bloque["_slot_fin"].max()
+    return {"slots_desde": None if pd.isna(ini) else ini.date().isoformat(),
+            "slots_hasta": None if pd.isna(fin) else fin.date().isoformat()}
+
+
+def _reescribir_csv(ruta_eventos: str, restantes: bytes, leidos: int, huella: bytes, lock_file: str) -> None:
+    """
+    Bajo el lock del escritor: comprueba que los primeros `leidos` bytes siguen
+    siendo los que se archivaron (misma huella final) y reemplaza el CSV por
+    `restantes` más lo que se agregó después de leerlo.
+    """
+    if not acquire_lock(lock_file, timeout_sec=30):
+        raise TimeoutError("No se pudo obtener el lock de Eventos.csv")
+    try:
+        with open(ruta_eventos, "rb") as f:
+            f.seek(max(0, leidos - _HUELLA_BYTES))
+            if f.read(leidos - f.tell()) != huella:
+                raise RuntimeError("Eventos.csv cambió mientras se archivaba; vuelva a intentarlo")
+            nuevas = f.read()
+        _escribir_atomico(ruta_eventos, restantes + nuevas)
+    finally:
+        release_lock(lock_file)
+
+
+def archivar(ruta_eventos: str, hasta: Optional[date] = None, compresion: str = COMPRESION,
+             filas_por_bloque: int = FILAS_POR_BLOQUE, dias_por_bloque: int = DIAS_POR_BLOQUE,
+             lock_file: str = LOCK_FILE) -> Dict[str, object]:
+    """
+    Mueve al archivo los eventos con fecha (UTC) ≤ `hasta` (por defecto, hoy menos
+    DIAS_ABIERTOS) cuyas reservas ya terminaron. Retorna un resumen (filas, bloques, bytes).
+    Se lee y comprime sin bloquear al escritor; su lock solo cubre el reemplazo del
+    CSV (ver _reescribir_csv). Dos archivados a la vez se excluyen con archivar.lock.
+    """
+    hasta = hasta or (datetime.now(timezone.utc).date() - timedelta(days=DIAS_ABIERTOS))
+    corte = pd.Timestamp(datetime.combine(hasta + timedelta(days=1), dtime(0), tzinfo=timezone.utc))
+    directorio = directorio_archivo(ruta_eventos)
+    os.makedirs(directorio, exist_ok=True)
+    lock_archivo = os.path.join(directorio, "archivar.lock")
+    if not acquire_lock(lock_archivo, timeout_sec=30):
+        raise TimeoutError("Ya hay un archivado en curso")
+    escritos: List[str] = []
+    try:
+        # Solo líneas completas: una fila a medio escribir queda para después
+        with open(ruta_eventos, "rb") as f:
+            datos = f.read()
+        leidos = datos.rfind(b"\n") + 1
+        huella = datos[max(0, leidos - _HUELLA_BYTES):leidos]
+        # keep_default_na=False: los vacíos se reescriben tal cual
+        df = pd.read_csv(io.BytesIO(datos[:leidos]), dtype=str, keep_default_na=False)
+        ts = pd.to_datetime(df["timestamp"], errors="coerce", utc=True, format="ISO8601")
+        mover = _filas_a_mover(df, ts, corte)
+        if not mover.any():
+            return {"filas": 0, "bloques": 0, "bytes_csv": 0, "bytes_comprimidos": 0, "hasta": hasta}
+
+        indice = leer_indice(ruta_eventos)
+        archivadas = df[mover].assign(_ts=ts[mover]).sort_values("_ts", kind="stable")
+        archivadas = archivadas.assign(**_slots_de_reserva(archivadas))
+        fechas = archivadas["_ts"].dt.date
+
+        # Bloques de días completos: se cierra uno al pasar de filas_por_bloque o dias_por_bloque
+        bloques: List[pd.DataFrame] = []
+        inicio, filas = 0, 0
+        dias = fechas.to_numpy()
+        cambios = [0] + [i for i in range(1, len(dias)) if dias[i] != dias[i - 1]] + [len(dias)]
+        for a, b in zip(cambios[:-1], cambios[1:]):
+            if filas and (filas + (b - a) > filas_por_bloque or (dias[a] - dias[inicio]).days >= dias_por_bloque):
+                bloques.append(archivadas.iloc[inicio:a])
+                inicio, filas = a, 0
+            filas += b - a
+        bloques.append(archivadas.iloc[inicio:])
+
+        resumen = {"filas": 0, "bloques": 0, "bytes_csv": 0, "bytes_comprimidos": 0, "hasta": hasta}
+        n = len(indice["bloques"])
+        for bloque in bloques:
+            n += 1
+            texto = bloque.drop(columns=["_ts", "_slot_ini", "_slot_fin"]).to_csv(index=False)
+            comprimido = _comprimir(texto, compresion)
+            nombre = f"bloque_{n:06d}{_EXTENSION[compresion]}"
+            _escribir_atomico(os.path.join(directorio, nombre), comprimido)
+            escritos.append(nombre)
+            indice["bloques"].append({
+                "archivo": nombre,
+                "compresion": compresion,
+                "desde": bloque["_ts"].iloc[0].date().isoformat(),
+                "hasta": bloque["_ts"].iloc[-1].date().isoformat(),
+                **_rango_slots(bloque),
+                "filas": len(bloque),
+                "bytes_csv": len(texto.encode("utf-8")),
+                "bytes": len(comprimido),
+            })
+            resumen["filas"] += len(bloque)
+            resumen["bloques"] += 1
+            resumen["bytes_csv"] += indice["bloques"][-1]["bytes_csv"]
+            resumen["bytes_comprimidos"] += len(comprimido)
+        indice["filas_archivadas"] = indice.get("filas_archivadas", 0) + resumen["filas"]
+
+        # Primero el índice, luego el CSV sin las filas archivadas (reemplazo atómico).
+        # Si el CSV no se puede reemplazar se restaura el índice y se borran los bloques.
+        restantes = df[~mover].to_csv(index=False).encode("utf-8")
+        previo = json.dumps(leer_indice(ruta_eventos), indent=1).encode("utf-8")
+        _escribir_atomico(ruta_indice(ruta_eventos), json.dumps(indice, indent=1).encode("utf-8"))
+        try:
+            _reescribir_csv(ruta_eventos, restantes, leidos, huella, lock_file)
+        except Exception:
+            _escribir_atomico(ruta_indice(ruta_eventos), previo)
+            raise
+        escritos = []
+        return resumen
+    finally:
+        for nombre in escritos:
+            os.remove(os.path.join(directorio, nombre))
+        release_lock(lock_archivo)
+
+
+def _traslapa(ini: Optional[str], fin: Optional[str], desde: Optional[date], hasta: Optional[date]) -> bool:
+    if desde is not None and fin is not None and date.fromisoformat(fin) < desde:
+        return False
+    if hasta is not None and ini is not None and date.fromisoformat(ini) > hasta:
+        return False
+    return True
+
+
+def bloques_en_rango(ruta_eventos: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+                     por_slot: bool = False) -> List[Dict]:
+    """
+    Entradas del índice cuyo rango [desde, hasta] de fechas se traslapa con el pedido.
+    Con `por_slot` también las que tienen reservas con slots en el rango (hechas
+    antes de `desde`); un bloque sin ese dato en el índice se incluye si empieza antes de `hasta`.
+    """
+    out = []
+    for b in leer_indice(ruta_eventos)["bloques"]:
+        if _traslapa(b["desde"], b["hasta"], desde, hasta):
+            out.append(b)
+        elif por_slot and "slots_hasta" not in b:
+            if _traslapa(b["desde"], None, desde, hasta):
+                out.append(b)
+        elif por_slot and b["slots_hasta"] is not None and _traslapa(b["slots_desde"], b["slots_hasta"], desde, hasta):
+            out.append(b)
+    return out
+
+
+def ruta_bloque(ruta_eventos: str, bloque: Dict) -> str:
+    return os.path.join(directorio_archivo(ruta_eventos), bloque["archivo"])
+
+
+def leer_bloque(ruta_eventos: str, bloque: Dict) -> pd.DataFrame:
+    with pa.CompressedInputStream(pa.OSFile(ruta_bloque(ruta_eventos, bloque)), bloque["compresion"]) as f:
+        datos = f.read()
+    return pd.read_csv(io.BytesIO(datos), dtype=str)
+
+
+def leer_archivados(ruta_eventos: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+                    por_slot: bool = False) -> pd.DataFrame:
+    """Eventos archivados (texto, como read_csv(dtype=str)) de los bloques que tocan el rango."""
+    partes = [leer_bloque(ruta_eventos, b) for b in bloques_en_rango(ruta_eventos, desde, hasta, por_slot)]
+    if not partes:
+        return pd.DataFrame()
+    return pd.concat(partes, ignore_index=True)
+
+
+def extremos_fechas(ruta_eventos: str) -> Optional[Tuple[date, date]]:
+    """Primera y última fecha entre el archivo frío y Eventos.csv, sin leer eventos."""
+    extremos = [(date.fromisoformat(b["desde"]), date.fromisoformat(b["hasta"])) for b in bloques_en_rango(ruta_eventos)]
+    csv = fechas_indexadas(ruta_eventos)
+    if csv:
+        extremos.append(csv)
+    if not extremos:
+        return None
+    return min(e[0] for e in extremos), max(e[1] for e in extremos)
+
+
+def leer_eventos_texto(ruta_eventos: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+                       por_slot: bool = False) -> pd.DataFrame:
+    """
+    Archivo frío (solo bloques del rango) + Eventos.csv (solo las horas del
+    rango, vía el índice de cache_columnas), como un solo read_csv(dtype=str);
+    las filas del CSV vienen con las fechas ya parseadas. El rango solo poda
+    bloques y horas; el filtrado fino por fecha lo hace cada cargador.
+    Con `por_slot` (ocupación del rango) se agregan las reservas hechas antes
+    de `desde` con slots en el rango, con sus cancelaciones: el CSV se lee entero.
+    """
+    if por_slot:
+        actual = leer_csv_eventos(ruta_eventos)
+    else:
+        actual = leer_csv_eventos(ruta_eventos, desde, hasta)
+    archivados = leer_archivados(ruta_eventos, desde, hasta, por_slot)
+    if archivados.empty:
+        return actual
+    return pd.concat([archivados, actual], ignore_index=True)
@@ -0,0 +1,198 @@
+# Benchmark de punta a punta: reruns completos de app_streamlit.py y CF3.py con el
+# runner headless AppTest de Streamlit, sobre Eventos.csv sintéticos de tamaño creciente.
+# Cada interacción típica (login, cambiar la hora en Estado, reservar, check-in,
+# cambiar un filtro de Análisis, filtros de CF3) se mide en tiempo de pared y en
+# pico de memoria asignada (tracemalloc) durante ese rerun.
+# Uso: python bench_e2e.py [--tamanos 5000,50000,200000] [--reruns 5] [--guardar] [--tolerancia 0.25]
+#   --guardar     escribe los resultados como nueva línea base (--baseline)
+#   sin --guardar compara contra la línea base si existe; sale con código 1 si algo empeoró más que --tolerancia
+#   --sin-memoria mide solo tiempo (tracemalloc encarece cada asignación)
+import argparse, json, os, platform, shutil, statistics, sys, tempfile, time, tracemalloc
+from datetime import date, datetime, time as dtime, timedelta
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from generar_eventos import generar_eventos, leer_lotes
+
+parser = argparse.ArgumentParser(description="Latencia y memoria por interacción de app_streamlit.py y CF3.py")
+parser.add_argument("--tamanos", default="5000,50000,200000", help="eventos por log, separados por coma")
+parser.add_argument("--reruns", type=int, default=5, help="repeticiones del rerun en reposo (se reporta la mediana)")
+parser.add_argument("--apps", default="app,cf3", help="app, cf3 o ambas")
+parser.add_argument("--baseline", default="bench_e2e_baseline.json")
+parser.add_argument("--guardar", action="store_true")
+parser.add_argument("--tolerancia", type=float, default=0.25, help="empeoramiento relativo permitido vs la línea base")
+parser.add_argument("--sin-memoria", action="store_true")
+args = parser.parse_args()
+
+repo = os.path.dirname(os.path.abspath(__file__))
+ruta_baseline = os.path.abspath(args.baseline)
+tamanos = [int(t) for t in args.tamanos.split(",") if t.strip()]
+apps = [a.strip() for a in args.apps.split(",") if a.strip()]
+medir_memoria = not args.sin_memoria
+
+
+def medir(resultados: dict, nombre: str, at: AppTest, accion=None, repeticiones: int = 1) -> None:
+    """Ejecuta `accion` (prepara widgets) y un rerun; guarda ms y pico MB del rerun."""
+    tiempos, picos = [], []
+    for _ in range(repeticiones):
+        if accion is not None:
+            accion(at)
+        if medir_memoria:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        t = time.perf_counter()
+        at.run()
+        tiempos.append((time.perf_counter() - t) * 1000)
+        if medir_memoria:
+            # app_streamlit.py también hace reset_peak al inicio del rerun (memoria por sesión): el pico
+            # queda medido desde ese punto, así que puede quedar por debajo de `base`
+            picos.append(max(tracemalloc.get_traced_memory()[1] - base, 0) / 2**20)
+    errores = [e.message for e in at.exception]
+    resultados[nombre] = {"ms": round(statistics.median(tiempos), 1),
+                          "pico_mb": round(max(picos), 1) if picos else None}
+    if errores:
+        resultados[nombre]["error"] = errores[0][:200]
+    pico = f"{resultados[nombre]['pico_mb']:8.1f} MB" if picos else ""
+    print(f"    {nombre:<22}{resultados[nombre]['ms']:10.1f} ms {pico}" + (f"  ERROR: {errores[0][:80]}" if errores else ""))
+
+
+def boton(etiqueta: str):
+    return lambda at: [b for b in at.button if b.label == etiqueta][0].click()
+
+
+def pestana(nombre: str):
+    def accion(at: AppTest) -> None:
+        at.session_state["tabs_app"] = nombre
+    return accion
+
+
+def preparar_directorio(n: int) -> str:
+    tmp = tempfile.mkdtemp(prefix=f"bench_e2e_{n}_")
+    for nombre in os.listdir(repo):
+        if nombre.endswith(".py") or nombre in ("Parqueos.csv", "Usuarios.csv"):
+            shutil.copy(os.path.join(repo, nombre), tmp)
+    generar_eventos(os.path.join(tmp, "Eventos.csv"), n, leer_lotes(os.path.join(tmp, "Parqueos.csv")))
+    return tmp
+
+
+def bench_app(tmp: str) -> dict:
+    res: dict = {}
+    at = AppTest.from_file(os.path.join(tmp, "app_streamlit.py"), default_timeout=900)
+    medir(res, "carga_inicial", at)
+
+    def login(at: AppTest) -> None:
+        at.sidebar.text_input[0].input("bench@uvg.edu.gt")
+        at.sidebar.button[0].click()
+    medir(res, "login", at, login)
+    medir(res, "rerun_reposo", at, repeticiones=args.reruns)
+
+    def cambiar_hora(at: AppTest) -> None:
+        w = [t for t in at.time_input if t.label == "Hora de referencia"][0]
+        w.set_value(dtime(hour=7) if w.value != dtime(hour=7) else dtime(hour=11))
+    medir(res, "estado_cambiar_hora", at, cambiar_hora)
+
+    medir(res, "abrir_reservar", at, pestana("Reservar"))
+
+    def llenar_reserva(at: AppTest) -> None:
+        [d for d in at.date_input if d.key == "res_fecha"][0].set_value(date.today() + timedelta(days=3))
+        [t for t in at.time_input if t.key == "res_hora"][0].set_value(dtime(hour=20))
+        boton("Reservar")(at)
+    medir(res, "reservar", at, llenar_reserva)
+
+    medir(res, "abrir_checkin", at, pestana("Check-in"))
+    if any(b.label == "Hacer check-in" for b in at.button):
+        medir(res, "checkin", at, boton("Hacer check-in"))
+
+    medir(res, "abrir_analisis", at, pestana("Análisis"))
+
+    def filtro_motivo(at: AppTest) -> None:
+        w = [m for m in at.multiselect if m.label == "Motivos"][0]
+        w.set_value([o for o in w.options if o][:1])
+    medir(res, "analisis_filtro", at, filtro_motivo)
+    medir(res, "analisis_reposo", at, repeticiones=args.reruns)
+    return res
+
+
+def bench_cf3(tmp: str) -> dict:
+    res: dict = {}
+    at = AppTest.from_file(os.path.join(tmp, "CF3.py"), default_timeout=900)
+    medir(res, "carga_inicial", at)
+    medir(res, "rerun_reposo", at, repeticiones=args.reruns)
+
+    def filtro_motivo(at: AppTest) -> None:
+        w = [m for m in at.sidebar.multiselect if m.label == "Motivos"][0]
+        w.set_value([o for o in w.options if o][:1])
+    medir(res, "filtro_motivo", at, filtro_motivo)
+
+    def filtro_fechas(at: AppTest) -> None:
+        w = [d for d in at.sidebar.date_input if d.label == "Fecha inicial"][0]
+        w.set_value(w.value + timedelta(days=7))
+    medir(res, "filtro_fechas", at, filtro_fechas)
+    medir(res, "filtro_reposo", at, repeticiones=args.reruns)
+    return res
+
+
+def comparar(actual: dict, base: dict) -> int:
+    """Imprime la comparación y retorna cuántas mediciones empeoraron más que la tolerancia."""
+    peores = 0
+    print(f"\nComparación contra {ruta_baseline} (tolerancia {args.tolerancia:.0%}):")
+    for app, por_tam in actual.items():
+        for tam, pasos in por_tam.items():
+            previo = base.get("resultados", {}).get(app, {}).get(tam, {})
+            for paso, m in pasos.items():
+                p = previo.get(paso)
+                if not p:
+                    continue
+                for campo in ("ms", "pico_mb"):
+                    if m.get(campo) is None or not p.get(campo):
+                        continue
+                    rel = m[campo] / p[campo] - 1
+                    marca = "  <-- empeoró" if rel > args.tolerancia else ""
+                    peores += bool(marca)
+                    print(f"  {app:<4} {tam:>8} {paso:<22}{campo:<8}{p[campo]:10.1f} -> {m[campo]:10.1f} ({rel:+.0%}){marca}")
+    return peores
+
+
+if medir_memoria:
+    tracemalloc.start()
+resultados: dict = {}
+for n in tamanos:
+    tmp = preparar_directorio(n)
+    cwd = os.getcwd()
+    os.chdir(tmp)      # las apps usan rutas relativas
+    sys.path.insert(0, tmp)
+    try:
+        for app in apps:
+            # Las cachés son del proceso y sus claves usan rutas relativas: se vacían entre logs
+            st.cache_data.clear()
+            st.cache_resource.clear()
+            print(f"{app} · {n} eventos")
+            funcion = bench_app if app == "app" else bench_cf3
+            resultados.setdefault(app, {})[str(n)] = funcion(tmp)
+    finally:
+        sys.path.remove(tmp)
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+regresiones = 0
+if args.guardar:
+    with open(ruta_baseline, "w", encoding="utf-8") as f:
+        json.dump({
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "streamlit": st.__version__,
+            "memoria": medir_memoria,
+            "resultados": resultados,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\nLínea base guardada en {ruta_baseline}")
+elif os.path.exists(ruta_baseline):
+    with open(ruta_baseline, encoding="utf-8") as f:
+        base = json.load(f)
+    if base.get("memoria") != medir_memoria:
+        print("\nAviso: la línea base se midió con otra configuración de memoria; los tiempos no son comparables.")
+    regresiones = comparar(resultados, base)
+    print(f"\n{regresiones} medición(es) empeoraron más de {args.tolerancia:.0%}.")
+else:
+    print(f"\nNo hay línea base en {ruta_baseline}; usen --guardar para crearla.")
+sys.exit(1 if regresiones else 0)
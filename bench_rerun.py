@@ -0,0 +1,62 @@
+# Mide la latencia de un rerun "en reposo" de app_streamlit.py (sin cambiar ningún widget)
+# con el runner headless AppTest de Streamlit, sobre un Eventos.csv sintético.
+# Uso: python bench_rerun.py [--eventos 50000] [--reruns 20] [--app otra_version.py] [--restaurar-parqueos]
+#   --app                 permite comparar contra otra versión del script (p. ej. `git show <rev>:app_streamlit.py`)
+#   --restaurar-parqueos  reescribe Parqueos.csv antes de cada rerun (versiones que lo dejaban ilegible)
+import argparse, atexit, os, shutil, statistics, sys, tempfile, time
+
+from streamlit.testing.v1 import AppTest
+
+from generar_eventos import generar_eventos, leer_lotes
+
+parser = argparse.ArgumentParser(description="Latencia de rerun en reposo de app_streamlit.py")
+parser.add_argument("--eventos", type=int, default=50000)
+parser.add_argument("--reruns", type=int, default=20)
+parser.add_argument("--app", default="app_streamlit.py")
+parser.add_argument("--restaurar-parqueos", action="store_true")
+args = parser.parse_args()
+
+repo = os.path.dirname(os.path.abspath(__file__))
+tmp = tempfile.mkdtemp(prefix="bench_rerun_")
+atexit.register(shutil.rmtree, tmp, True)      # también si el rerun falla: la copia nunca queda en el repo
+for nombre in os.listdir(repo):
+    if nombre.endswith(".py") or nombre == "Parqueos.csv":
+        shutil.copy(os.path.join(repo, nombre), tmp)
+shutil.copy(os.path.abspath(args.app), os.path.join(tmp, "app_bench.py"))
+os.chdir(tmp)
+sys.path.insert(0, tmp)
+with open("Parqueos.csv", encoding="utf-8") as f:
+    parqueos_orig = f.read()
+generar_eventos("Eventos.csv", args.eventos, leer_lotes("Parqueos.csv"))
+
+
+def restaurar() -> None:
+    if args.restaurar_parqueos:
+        with open("Parqueos.csv", "w", encoding="utf-8") as f:
+            f.write(parqueos_orig)
+
+
+at = AppTest.from_file(os.path.join(tmp, "app_bench.py"), default_timeout=600)
+restaurar()
+t0 = time.perf_counter()
+at.run()
+at.sidebar.text_input[0].input("bench@uvg.edu.gt")
+at.sidebar.button[0].click()
+restaurar()
+at.run()
+primera = time.perf_counter() - t0
+if at.exception or at.error:
+    print("La app reportó errores:", [e.value for e in at.error], [e.message for e in at.exception])
+
+tiempos = []
+for _ in range(args.reruns):
+    restaurar()
+    t = time.perf_counter()
+    at.run()
+    tiempos.append(time.perf_counter() - t)
+
+tiempos.sort()
+print(f"app={args.app} eventos={args.eventos} reruns={args.reruns}")
+print(f"  carga inicial + login : {primera * 1000:9.1f} ms")
+print(f"  rerun en reposo p50   : {statistics.median(tiempos) * 1000:9.1f} ms")
+print(f"  rerun en reposo p95   : {tiempos[int(0.95 * (len(tiempos) - 1))] * 1000:9.1f} ms")
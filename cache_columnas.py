@@ -0,0 +1,399 @@
+# cache_columnas.py — Caché binaria por columna de Eventos.csv, mapeada en memoria.
+# El costo de leer el log es sobre todo parsear las fechas ISO-8601: aquí se
+# parsean una sola vez y se guardan en <Eventos>_columnas/ como arreglos crudos:
+#   - timestamp, slot_start, slot_end: int64 (ns UTC; NaT = mínimo int64, igual que pandas)
+#   - success, free_spots_after, capacity: float64
+#   - el resto (texto): códigos int32 + diccionario (.dic, un valor JSON por línea)
+# meta.json guarda filas, bytes del CSV ya procesados y una huella (cabecera +
+# últimos bytes procesados). Al leer: si el CSV creció, solo se parsea la cola y
+# se agrega a los arreglos; si la huella no coincide (archivado, reescritura) se
+# reconstruye. Los arreglos se abren con np.memmap: procesos distintos comparten
+# las mismas páginas y las fechas quedan como vista datetime64 sin copiar.
+# horas.<gen>.npy indexa por hora UTC las filas y bytes del CSV que caen en ella
+# ([hora, fila_ini, fila_fin, byte_ini, byte_fin], fines exclusivos): una lectura
+# por rango de fechas solo toca esas filas de la caché, o esos bytes del CSV.
+
+import hashlib
+import io
+import json
+import os
+from itertools import islice
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from servicio_eventos import acquire_lock, release_lock
+
+COLUMNAS_FECHA = ["timestamp", "slot_start", "slot_end"]
+COLUMNAS_NUMERO = ["success", "free_spots_after", "capacity"]
+_TIPOS = {"fecha": np.int64, "numero": np.float64, "texto": np.int32}
+_HUELLA_BYTES = 4096
+_NS_HORA = 3_600_000_000_000
+_EPOCA = date(1970, 1, 1)
+
+# Diccionarios ya leídos en este proceso: (directorio, columna, generación) ->
+# {"valores": [...], "codigos": {valor: código}, "offset": bytes leídos del .dic}
+_diccionarios: Dict[tuple, Dict] = {}
+
+
+def directorio_cache(ruta_eventos: str) -> str:
+    base, _ = os.path.splitext(os.path.abspath(ruta_eventos))
+    return base + "_columnas"
+
+
+def _tipo(columna: str) -> str:
+    if columna in COLUMNAS_FECHA:
+        return "fecha"
+    if columna in COLUMNAS_NUMERO:
+        return "numero"
+    return "texto"
+
+
+def _leer_meta(directorio: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directorio, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _huella(ruta_eventos: str, hasta_byte: int) -> str:
+    # Cabecera + últimos bytes procesados: detecta reescrituras sin releer el archivo
+    with open(ruta_eventos, "rb") as f:
+        h = hashlib.sha1(f.readline())
+        f.seek(max(0, hasta_byte - _HUELLA_BYTES))
+        h.update(f.read(min(hasta_byte, _HUELLA_BYTES)))
+    return h.hexdigest()
+
+
+def _cola_completa(ruta_eventos: str, desde_byte: int) -> bytes:
+    """Bytes desde `desde_byte` hasta el último salto de línea (una fila a medio escribir se deja)."""
+    with open(ruta_eventos, "rb") as f:
+        f.seek(desde_byte)
+        datos = f.read()
+    fin = datos.rfind(b"\n")
+    return datos[:fin + 1] if fin >= 0 else b""
+
+
+def _a_arreglos(df: pd.DataFrame, diccionarios: Dict[str, Dict[str, int]]) -> Dict[str, np.ndarray]:
+    """Columnas de un bloque leído como texto → arreglos binarios (amplía `diccionarios` en sitio)."""
+    out = {}
+    for col in df.columns:
+        tipo = _tipo(col)
+        if tipo == "fecha":
+            ts = pd.to_datetime(df[col], errors="coerce", utc=True, format="ISO8601")
+            out[col] = ts.dt.as_unit("ns").array.asi8
+        elif tipo == "numero":
+            out[col] = pd.to_numeric(df[col], errors="coerce").to_numpy(np.float64)
+        else:
+            codigos, valores = pd.factorize(df[col])
+            dic = diccionarios.setdefault(col, {})
+            # Códigos del bloque → códigos globales (-1 = vacío)
+            globales = np.array([dic.setdefault(v, len(dic)) for v in valores], dtype=np.int32)
+            out[col] = np.where(codigos < 0, -1, globales[codigos] if len(globales) else -1).astype(np.int32)
+    return out
+
+
+def _enteros(df: pd.DataFrame) -> Dict[str, bool]:
+    # pd.to_numeric da int64 si todo el bloque es entero y sin vacíos; se respeta al leer
+    return {c: pd.api.types.is_integer_dtype(pd.to_numeric(df[c], errors="coerce"))
+            for c in df.columns if _tipo(c) == "numero"}
+
+
+def _limites_de_filas(datos: bytes, base: int, con_cabecera: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Byte de inicio y de fin (exclusivo) de cada línea de `datos`, desplazados a `base`."""
+    fines = np.flatnonzero(np.frombuffer(datos, dtype=np.uint8) == 10) + 1
+    inicios = np.concatenate(([0], fines[:-1]))
+    if con_cabecera:
+        inicios, fines = inicios[1:], fines[1:]
+    return inicios + base, fines + base
+
+
+def _agrupar_horas(entradas: np.ndarray) -> np.ndarray:
+    """Une entradas [hora, fila_ini, fila_fin, byte_ini, byte_fin] de la misma hora (mín. de inicios, máx. de fines)."""
+    if not len(entradas):
+        return np.empty((0, 5), dtype=np.int64)
+    horas, inv = np.unique(entradas[:, 0], return_inverse=True)
+    out = [horas]
+    for j, ufunc, neutro in [(1, np.minimum, np.iinfo(np.int64).max), (2, np.maximum, 0),
+                             (3, np.minimum, np.iinfo(np.int64).max), (4, np.maximum, 0)]:
+        col = np.full(len(horas), neutro, dtype=np.int64)
+        ufunc.at(col, inv, entradas[:, j])
+        out.append(col)
+    return np.column_stack(out)
+
+
+def _indice_horas(ts: np.ndarray, inicios: np.ndarray, fines: np.ndarray, fila0: int) -> np.ndarray:
+    # Las filas sin timestamp no entran: ningún filtro por fecha las conserva
+    validas = ts != np.iinfo(np.int64).min
+    filas = np.flatnonzero(validas) + fila0
+    return _agrupar_horas(np.column_stack([ts[validas] // _NS_HORA, filas, filas + 1,
+                                           inicios[validas], fines[validas]]))
+
+
+def _guardar_indice(directorio: str, generacion: int, indice: np.ndarray) -> None:
+    ruta = os.path.join(directorio, f"horas.{generacion}.npy")
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, indice)
+    os.replace(tmp, ruta)
+
+
+def _leer_indice(directorio: str, meta: Dict) -> Optional[np.ndarray]:
+    if not meta.get("indice_horas"):
+        return None
+    return np.load(os.path.join(directorio, f"horas.{meta['generacion']}.npy"))
+
+
+def _rango(indice: np.ndarray, desde: Optional[date], hasta: Optional[date]) -> Tuple[int, int, int, int]:
+    """(fila_ini, fila_fin, byte_ini, byte_fin) que cubren todas las filas con fecha en [desde, hasta]."""
+    h0 = (desde - _EPOCA).days * 24 if desde else np.iinfo(np.int64).min
+    h1 = (hasta + timedelta(days=1) - _EPOCA).days * 24 if hasta else np.iinfo(np.int64).max
+    sel = indice[(indice[:, 0] >= h0) & (indice[:, 0] < h1)]
+    if not len(sel):
+        return 0, 0, 0, 0
+    return int(sel[:, 1].min()), int(sel[:, 2].max()), int(sel[:, 3].min()), int(sel[:, 4].max())
+
+
+def _escribir_meta(directorio: str, meta: Dict) -> None:
+    ruta = os.path.join(directorio, "meta.json")
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, ruta)
+
+
+def _reconstruir(ruta_eventos: str, directorio: str, generacion: int) -> Dict:
+    with open(ruta_eventos, "rb") as f:
+        datos = f.read()
+    fin = datos.rfind(b"\n") + 1
+    df = pd.read_csv(io.BytesIO(datos[:fin]), dtype=str)
+    diccionarios: Dict[str, Dict[str, int]] = {}
+    arreglos = _a_arreglos(df, diccionarios)
+    # Archivos nuevos por generación: quien tenga mapeada la anterior la sigue leyendo
+    for col, arr in arreglos.items():
+        arr.tofile(os.path.join(directorio, f"{col}.{generacion}.bin"))
+    for col, dic in diccionarios.items():
+        with open(os.path.join(directorio, f"{col}.{generacion}.dic"), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(v) + "\n" for v in dic)
+    inicios, fines = _limites_de_filas(datos[:fin], 0, con_cabecera=True)
+    # Un campo entre comillas con saltos de línea desalinea líneas y filas: sin índice
+    con_indice = "timestamp" in arreglos and len(inicios) == len(df)
+    if con_indice:
+        _guardar_indice(directorio, generacion, _indice_horas(arreglos["timestamp"], inicios, fines, 0))
+    meta = {"generacion": generacion, "columnas": list(df.columns), "filas": len(df), "bytes": fin,
+            "huella": _huella(ruta_eventos, fin), "enteros": _enteros(df),
+            "diccionarios": {c: len(d) for c, d in diccionarios.items()}, "indice_horas": con_indice}
+    _escribir_meta(directorio, meta)
+    for nombre in os.listdir(directorio):
+        partes = nombre.split(".")
+        if len(partes) == 3 and partes[1].isdigit() and int(partes[1]) != generacion:
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except OSError:
+                pass
+    return meta
+
+
+def _diccionario(directorio: str, col: str, generacion: int, n: int) -> Dict:
+    """Primeros `n` valores del .dic; en un proceso de larga vida solo se leen las líneas nuevas."""
+    clave = (directorio, col, generacion)
+    memo = _diccionarios.get(clave)
+    if memo is None or len(memo["valores"]) > n:
+        memo = _diccionarios[clave] = {"valores": [], "codigos": {}, "offset": 0}
+    faltan = n - len(memo["valores"])
+    if faltan > 0:
+        with open(os.path.join(directorio, f"{col}.{generacion}.dic"), "rb") as f:
+            f.seek(memo["offset"])
+            lineas = f.read().split(b"\n", faltan)[:faltan]
+        # Un solo json.loads para todas las líneas nuevas
+        memo["valores"].extend(json.loads(b"[" + b",".join(lineas) + b"]"))
+        memo["offset"] += sum(map(len, lineas)) + faltan
+    return memo
+
+
+def _valores(memo: Dict) -> np.ndarray:
+    # Arreglo de objetos valores + [NaN] (el código -1 cae en el último); se rehace solo si creció
+    arr = memo.get("arreglo")
+    if arr is None or len(arr) != len(memo["valores"]) + 1:
+        arr = np.empty(len(memo["valores"]) + 1, dtype=object)
+        arr[:-1] = memo["valores"]
+        arr[-1] = np.nan
+        memo["arreglo"] = arr
+    return arr
+
+
+def _codigos(memo: Dict) -> Dict[str, int]:
+    # valor → código; solo hace falta al extender, así que se arma a demanda
+    codigos, valores = memo["codigos"], memo["valores"]
+    if len(codigos) < len(valores):
+        codigos.update(zip(valores[len(codigos):], range(len(codigos), len(valores))))
+    return codigos
+
+
+def _extender(ruta_eventos: str, directorio: str, meta: Dict) -> Dict:
+    cola = _cola_completa(ruta_eventos, meta["bytes"])
+    if not cola:
+        return meta
+    with open(ruta_eventos, "rb") as f:
+        cabecera = f.readline()
+    df = pd.read_csv(io.BytesIO(cabecera + cola), dtype=str)
+    if list(df.columns) != meta["columnas"]:
+        return _reconstruir(ruta_eventos, directorio, meta["generacion"] + 1)
+    gen = meta["generacion"]
+    memos = {c: _diccionario(directorio, c, gen, meta["diccionarios"].get(c, 0))
+             for c in df.columns if _tipo(c) == "texto"}
+    diccionarios = {c: _codigos(m) for c, m in memos.items()}
+    previos = {c: len(d) for c, d in diccionarios.items()}
+    arreglos = _a_arreglos(df, diccionarios)
+    for col, arr in arreglos.items():
+        ruta = os.path.join(directorio, f"{col}.{gen}.bin")
+        with open(ruta, "r+b") as f:
+            # Se trunca a lo confirmado en meta por si una extensión anterior quedó a medias
+            f.truncate(meta["filas"] * arr.itemsize)
+            f.seek(0, os.SEEK_END)
+            arr.tofile(f)
+    for col, memo in memos.items():
+        ruta = os.path.join(directorio, f"{col}.{gen}.dic")
+        nuevos = list(islice(memo["codigos"], previos[col], None))
+        datos = "".join(json.dumps(v) + "\n" for v in nuevos).encode("utf-8")
+        with open(ruta, "r+b" if os.path.exists(ruta) else "wb") as f:
+            # Igual que los .bin: se descarta lo que meta.json no llegó a confirmar
+            f.truncate(memo["offset"])
+            f.seek(memo["offset"])
+            f.write(datos)
+        memo["valores"].extend(nuevos)
+        memo["offset"] += len(datos)
+    inicios, fines = _limites_de_filas(cola, meta["bytes"], con_cabecera=False)
+    con_indice = bool(meta.get("indice_horas")) and len(inicios) == len(df)
+    if con_indice:
+        # Se escribe antes que meta.json: un lector con la meta anterior recorta a sus filas
+        nuevas = _indice_horas(arreglos["timestamp"], inicios, fines, meta["filas"])
+        _guardar_indice(directorio, gen, _agrupar_horas(np.concatenate([_leer_indice(directorio, meta), nuevas])))
+    enteros = _enteros(df)
+    fin = meta["bytes"] + len(cola)
+    meta = dict(meta, filas=meta["filas"] + len(df), bytes=fin, huella=_huella(ruta_eventos, fin),
+                enteros={c: meta["enteros"].get(c, True) and enteros.get(c, True) for c in meta["enteros"]},
+                diccionarios={c: len(d) for c, d in diccionarios.items()}, indice_horas=con_indice)
+    _escribir_meta(directorio, meta)
+    return meta
+
+
+def actualizar_cache(ruta_eventos: str) -> Optional[Dict]:
+    """
+    Pone la caché al día con el CSV (extiende o reconstruye) y retorna su meta.
+    None si no hay CSV o no se obtuvo el lock de la caché (el llamador lee el CSV).
+    """
+    if not os.path.exists(ruta_eventos):
+        return None
+    directorio = directorio_cache(ruta_eventos)
+    meta = _leer_meta(directorio)
+    tam = os.path.getsize(ruta_eventos)
+    if (meta is not None and meta["bytes"] == tam
+            and meta["huella"] == _huella(ruta_eventos, meta["bytes"])):
+        return meta
+    os.makedirs(directorio, exist_ok=True)
+    lock = os.path.join(directorio, "cache.lock")
+    if not acquire_lock(lock, timeout_sec=10):
+        return None
+    try:
+        meta = _leer_meta(directorio)     # otro proceso pudo actualizarla mientras se esperaba
+        tam = os.path.getsize(ruta_eventos)
+        if meta is None or tam < meta["bytes"] or meta["huella"] != _huella(ruta_eventos, meta["bytes"]):
+            return _reconstruir(ruta_eventos, directorio, (meta or {}).get("generacion", 0) + 1)
+        if tam > meta["bytes"]:
+            return _extender(ruta_eventos, directorio, meta)
+        return meta
+    finally:
+        release_lock(lock)
+
+
+def leer_cache(ruta_eventos: str, meta: Dict, desde: Optional[date] = None,
+               hasta: Optional[date] = None) -> pd.DataFrame:
+    """
+    DataFrame equivalente a pd.read_csv(ruta, dtype=str) salvo que las fechas ya
+    vienen como datetime64[ns, UTC] y los números como float64/int64. Con
+    desde/hasta solo se toman las filas que el índice por hora ubica en el rango
+    (más alguna vecina fuera de orden; el filtro fino lo hace el llamador).
+    """
+    directorio = directorio_cache(ruta_eventos)
+    gen, n = meta["generacion"], meta["filas"]
+    ini, fin = 0, n
+    indice = _leer_indice(directorio, meta) if (desde or hasta) else None
+    if indice is not None:
+        ini, fin, _, _ = _rango(indice, desde, hasta)
+        ini, fin = min(ini, n), min(fin, n)
+    columnas = {}
+    for col in meta["columnas"]:
+        tipo = _tipo(col)
+        ruta = os.path.join(directorio, f"{col}.{gen}.bin")
+        arr = np.memmap(ruta, dtype=_TIPOS[tipo], mode="r", shape=(n,)) if n else np.empty(0, _TIPOS[tipo])
+        arr = arr[ini:fin]
+        if tipo == "fecha":
+            columnas[col] = pd.Series(pd.DatetimeIndex(arr.view("datetime64[ns]")).tz_localize("UTC"))
+        elif tipo == "numero":
+            columnas[col] = arr.astype(np.int64) if meta["enteros"].get(col) else np.asarray(arr)
+        else:
+            valores = _valores(_diccionario(directorio, col, gen, meta["diccionarios"].get(col, 0)))
+            columnas[col] = valores[arr]       # -1 → último elemento (NaN)
+    return pd.DataFrame(columnas)
+
+
+def tramos_en_rango(ruta_eventos: str, desde: Optional[date] = None,
+                    hasta: Optional[date] = None) -> Optional[List[Tuple[int, int]]]:
+    """
+    Tramos de bytes (inicio, fin) del CSV con las filas de [desde, hasta]: lo que
+    el índice por hora ubica en el rango más la cola aún no indexada (puede
+    terminar en una línea incompleta). None sin rango o sin índice válido.
+    """
+    directorio = directorio_cache(ruta_eventos)
+    meta = _leer_meta(directorio) if (desde or hasta) else None
+    if (meta is not None and meta.get("indice_horas") and os.path.getsize(ruta_eventos) >= meta["bytes"]
+            and meta["huella"] == _huella(ruta_eventos, meta["bytes"])):
+        _, _, b0, b1 = _rango(_leer_indice(directorio, meta), desde, hasta)
+        return [(b0, b1), (meta["bytes"], os.path.getsize(ruta_eventos))]
+    return None
+
+
+def leer_csv_rango(ruta_eventos: str, desde: Optional[date] = None, hasta: Optional[date] = None) -> pd.DataFrame:
+    """
+    Sin caché utilizable: lee del CSV solo los bytes que el índice por hora ubica
+    en [desde, hasta], más la cola aún no indexada. Sin índice válido, el CSV entero.
+    """
+    tramos = tramos_en_rango(ruta_eventos, desde, hasta)
+    if tramos is not None:
+        with open(ruta_eventos, "rb") as f:
+            partes = [f.readline()]
+            for a, b in tramos:
+                f.seek(a)
+                partes.append(f.read(b - a))
+        return pd.read_csv(io.BytesIO(b"".join(partes)), dtype=str)
+    return pd.read_csv(ruta_eventos, dtype=str)
+
+
+def fechas_indexadas(ruta_eventos: str) -> Optional[Tuple[date, date]]:
+    """Primera y última fecha (UTC) del CSV según el índice por hora; None si no hay."""
+    try:
+        meta = actualizar_cache(ruta_eventos)
+        indice = _leer_indice(directorio_cache(ruta_eventos), meta) if meta else None
+    except (OSError, ValueError, KeyError):
+        return None
+    if indice is None or not len(indice):
+        return None
+    return (_EPOCA + timedelta(days=int(indice[0, 0]) // 24), _EPOCA + timedelta(days=int(indice[-1, 0]) // 24))
+
+
+def leer_csv_eventos(ruta_eventos: str, desde: Optional[date] = None, hasta: Optional[date] = None) -> pd.DataFrame:
+    """
+    Eventos.csv desde la caché de columnas; si no se puede usar, desde el CSV.
+    Con desde/hasta se leen solo las horas del rango (ver leer_cache).
+    """
+    try:
+        meta = actualizar_cache(ruta_eventos)
+        if meta is not None:
+            return leer_cache(ruta_eventos, meta, desde, hasta)
+    except (OSError, ValueError, KeyError):
+        _diccionarios.clear()
+    return leer_csv_rango(ruta_eventos, desde, hasta)
@@ -0,0 +1,209 @@
+# Prueba de carga: N sesiones simuladas concurrentes contra las reglas de reserva
+# de la app (reglas_reserva) y el mismo escritor de eventos (group commit), sobre un
+# Eventos.csv sintético en un directorio temporal. Las sesiones leen el log como la
+# app: una ProyeccionEventos al día con los avisos de commit del escritor. Mezcla de operaciones por sesión:
+# reservar (en los picos de 7:00 y 11:00), check-in, cancelar y ver el estado.
+# Reporta throughput, latencias p50/p90/p99 por operación, espera en locks,
+# dobles asignaciones (reservas vivas traslapadas en un lote) y eventos perdidos.
+# Uso: python carga_concurrente.py [--sesiones 50] [--duracion 20] [--eventos 20000]
+#                                  [--pausa-ms 50] [--mezcla reserva=45,estado=35,checkin=10,cancelar=10]
+#                                  [--serializar]
+#   --serializar  verifica y escribe cada reserva dentro de un lock del proceso
+#                 (para comparar dobles asignaciones y contención con y sin él)
+import argparse, atexit, os, random, shutil, sys, tempfile, threading, time, uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from generar_eventos import MOTIVOS, generar_eventos, leer_lotes
+from reglas_reserva import (ProyeccionEventos, fila_evento, leer_eventos, recalcular_ocupacion_desde_eventos,
+                            reservas_traslapadas, verificar_reserva)
+from servicio_eventos import ErrorEscritura, EscritorEventos
+
+parser = argparse.ArgumentParser(description="Carga concurrente sobre las reglas de reserva")
+parser.add_argument("--sesiones", type=int, default=50)
+parser.add_argument("--duracion", type=float, default=20.0, help="segundos de carga")
+parser.add_argument("--eventos", type=int, default=20000, help="tamaño del log inicial")
+parser.add_argument("--pausa-ms", type=float, default=50.0, help="pausa media entre operaciones de una sesión")
+parser.add_argument("--mezcla", default="reserva=45,estado=35,checkin=10,cancelar=10")
+parser.add_argument("--serializar", action="store_true")
+parser.add_argument("--semilla", type=int, default=0)
+args = parser.parse_args()
+
+mezcla = {k: float(v) for k, v in (p.split("=") for p in args.mezcla.split(","))}
+operaciones = list(mezcla)
+pesos = np.array([mezcla[o] for o in operaciones]) / sum(mezcla.values())
+
+repo = os.path.dirname(os.path.abspath(__file__))
+tmp = tempfile.mkdtemp(prefix="carga_")
+atexit.register(shutil.rmtree, tmp, True)      # también si la carga se interrumpe
+shutil.copy(os.path.join(repo, "Parqueos.csv"), tmp)
+os.chdir(tmp)      # el lock del escritor usa una ruta relativa
+lotes = [[n, c, 0] for n, c in leer_lotes("Parqueos.csv")]
+generar_eventos("Eventos.csv", args.eventos, [(l[0], l[1]) for l in lotes], semilla=args.semilla)
+
+
+class LogCompartido:
+    """Como proyeccion_eventos() de la app: una proyección por proceso, suscrita al escritor."""
+
+    def __init__(self, ruta: str, escritor: EscritorEventos):
+        self.proyeccion = ProyeccionEventos(ruta)
+        escritor.suscribir(self.proyeccion.recibir)
+        self.esperas = []       # obtener(): lock de la proyección más los lotes nuevos que incorpora
+
+    def actual(self):
+        t = time.perf_counter()
+        df = self.proyeccion.obtener()
+        self.esperas.append(time.perf_counter() - t)
+        return df
+
+
+escritor = EscritorEventos("Eventos.csv")
+log = LogCompartido("Eventos.csv", escritor)
+lock_reserva = threading.Lock()
+esperas_reserva = []
+latencias = defaultdict(list)        # operación -> [s]
+esperas_escritura = []
+enviados = set()                     # event_id confirmados por el escritor
+fallidos = []                        # agregar() sin offset
+resultados_reserva = defaultdict(int)
+mutex = threading.Lock()
+fin_carga = time.monotonic() + args.duracion
+
+
+def escribir(fila: dict) -> bool:
+    t = time.perf_counter()
+    try:
+        offset = escritor.agregar(fila)
+    except ErrorEscritura:
+        offset = None
+    with mutex:
+        esperas_escritura.append(time.perf_counter() - t)
+        if offset is None:
+            fallidos.append(fila["event_id"])
+        else:
+            enviados.add(fila["event_id"])
+    return offset is not None
+
+
+def horario_pico(rng: random.Random):
+    # Mañana a pasado mañana, bloques que arrancan a las 7:00 o a las 11:00 (UTC)
+    dia = (datetime.now(timezone.utc) + timedelta(days=rng.randint(1, 2))).replace(minute=0, second=0, microsecond=0)
+    inicio = dia.replace(hour=rng.choice([7, 11])) + timedelta(minutes=rng.choice([0, 30]))
+    return inicio, inicio + timedelta(minutes=rng.choice([60, 90]))
+
+
+def reservar(email: str, rng: random.Random, mias: dict) -> None:
+    lote = rng.choice(lotes)[0]
+    inicio, fin = horario_pico(rng)
+    motivo = rng.choice(MOTIVOS)
+
+    def verificar_y_escribir() -> None:
+        resultado, libres, cap = verificar_reserva(log.actual(), lotes, lote, inicio, fin)
+        with mutex:
+            resultados_reserva[resultado] += 1
+        if resultado == "reserva":
+            booking = str(uuid.uuid4())
+            if escribir(fila_evento(email, "reserva", motivo, lote, booking, True, libres - 1, cap,
+                                    inicio, fin, origen="carga")):
+                mias[booking] = {"lot_id": lote, "inicio": inicio, "fin": fin, "cap": cap, "checkin": False}
+        else:
+            escribir(fila_evento(email, "lista_espera", motivo, lote, "", True, 0, cap, inicio, fin,
+                                 origen="carga", codigo_error=resultado))
+
+    if args.serializar:
+        t = time.perf_counter()
+        with lock_reserva:
+            with mutex:
+                esperas_reserva.append(time.perf_counter() - t)
+            verificar_y_escribir()
+    else:
+        verificar_y_escribir()
+
+
+def checkin(email: str, rng: random.Random, mias: dict) -> None:
+    pendientes = [b for b, r in mias.items() if not r["checkin"]]
+    if not pendientes:
+        return
+    b = rng.choice(pendientes)
+    r = mias[b]
+    if escribir(fila_evento(email, "checkin", "", r["lot_id"], b, True, 0, r["cap"], r["inicio"], r["fin"],
+                            origen="carga")):
+        r["checkin"] = True
+
+
+def cancelar(email: str, rng: random.Random, mias: dict) -> None:
+    if not mias:
+        return
+    b = rng.choice(list(mias))
+    r = mias.pop(b)
+    escribir(fila_evento(email, "cancelacion", "", r["lot_id"], b, True, 0, r["cap"], r["inicio"], r["fin"],
+                         origen="carga"))
+
+
+def estado(email: str, rng: random.Random, mias: dict) -> None:
+    recalcular_ocupacion_desde_eventos(lotes, log.actual(), horario_pico(rng)[0])
+
+
+acciones = {"reserva": reservar, "checkin": checkin, "cancelar": cancelar, "estado": estado}
+
+
+def sesion(i: int) -> None:
+    rng = random.Random(args.semilla * 100003 + i)
+    email = f"carga{i:04d}@uvg.edu.gt"
+    mias: dict = {}
+    while time.monotonic() < fin_carga:
+        op = operaciones[int(np.searchsorted(np.cumsum(pesos), rng.random(), side="right"))]
+        t = time.perf_counter()
+        acciones[op](email, rng, mias)
+        dt = time.perf_counter() - t
+        with mutex:
+            latencias[op].append(dt)
+        if args.pausa_ms > 0:
+            time.sleep(rng.expovariate(1000.0 / args.pausa_ms))
+
+
+def ms(valores, q) -> str:
+    return f"{np.percentile(valores, q) * 1000:9.1f}" if valores else "        —"
+
+
+print(f"{args.sesiones} sesiones · {args.duracion:.0f} s · log inicial {args.eventos} eventos · "
+      f"{'con' if args.serializar else 'sin'} lock de reserva · directorio {tmp}")
+hilos = [threading.Thread(target=sesion, args=(i,), daemon=True) for i in range(args.sesiones)]
+t0 = time.perf_counter()
+for h in hilos:
+    h.start()
+for h in hilos:
+    h.join()
+transcurrido = time.perf_counter() - t0
+escritor.cerrar()
+
+total = sum(len(v) for v in latencias.values())
+print(f"\nThroughput: {total / transcurrido:8.1f} operaciones/s ({total} en {transcurrido:.1f} s)")
+print(f"{'operación':<12}{'n':>8}{'ops/s':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+for op in operaciones:
+    v = latencias[op]
+    print(f"{op:<12}{len(v):>8}{len(v) / transcurrido:>9.1f}{ms(v, 50)} {ms(v, 90)} {ms(v, 99)}")
+print(f"Resultados de reserva: {dict(resultados_reserva)}")
+
+print("\nContención:")
+print(f"  lectura del log (proyección)       p50 {ms(log.esperas, 50)} ms   p99 {ms(log.esperas, 99)} ms")
+print(f"  escritura (espera del commit)      p50 {ms(esperas_escritura, 50)} ms   p99 {ms(esperas_escritura, 99)} ms")
+if args.serializar:
+    print(f"  lock de reserva                    p50 {ms(esperas_reserva, 50)} ms   p99 {ms(esperas_reserva, 99)} ms")
+print(f"  commits del escritor: {escritor.commits} para {escritor.filas_escritas} filas "
+      f"({escritor.filas_escritas / max(escritor.commits, 1):.1f} filas por commit)")
+
+final = leer_eventos("Eventos.csv")
+perdidos = enviados - set(final["event_id"])
+propias = set(final.loc[final["source"] == "carga", "booking_id"])
+dobles = reservas_traslapadas(final)
+dobles = dobles[dobles["booking_a"].isin(propias) | dobles["booking_b"].isin(propias)]
+print("\nIntegridad:")
+print(f"  eventos confirmados que no están en el log: {len(perdidos)}")
+print(f"  escrituras fallidas (sin confirmación):     {len(fallidos)}")
+print(f"  dobles asignaciones (traslapes vivos):      {len(dobles)}")
+if len(dobles):
+    print(dobles.head(10).to_string(index=False))
+sys.exit(1 if perdidos or len(dobles) else 0)
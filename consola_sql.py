@@ -0,0 +1,300 @@
+# consola_sql.py — Consola SQL de solo lectura (Admin) sobre el log y las exportaciones.
+# Tablas: `eventos` (Eventos.csv más los bloques del archivo frío que tocan el
+# rango de fechas) y cada .parquet / .arrow del directorio del log (p. ej. las
+# de exportar_cli.py), con el nombre del archivo.
+# Motor: DuckDB si está instalado (opcional): consulta los archivos en su lugar,
+# en paralelo, con proyección y filtros empujados al escaneo (en Parquet descarta
+# row groups por estadísticas). Sin DuckDB se usa pyarrow + sqlite3: se escanean
+# solo las columnas que menciona la consulta y las filas del rango de fechas
+# pedido, por lotes, hacia una base SQLite en memoria.
+# En ambos casos: solo SELECT/WITH, límite de filas y tiempo máximo por consulta;
+# con DuckDB además solo se pueden abrir los archivos de las fuentes.
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+try:
+    import duckdb
+except ImportError:          # dependencia opcional
+    duckdb = None
+
+from archivo_eventos import bloques_en_rango, ruta_bloque
+from servicio_eventos import EVENT_HEADERS
+
+MOTOR_DUCKDB = "duckdb"
+MOTOR_SQLITE = "sqlite"
+
+LIMITE_FILAS = 1000
+TIMEOUT_S = 10.0
+FILAS_POR_LOTE = 65536
+
+# Todas las columnas tipadas: inferir el texto del primer bloque falla cuando una
+# columna viene vacía al principio (p. ej. error_code) y tiene valores más adelante
+TIPOS_CSV = {
+    **{c: pa.string() for c in EVENT_HEADERS},
+    "timestamp": pa.timestamp("us", tz="UTC"),
+    "slot_start": pa.timestamp("us", tz="UTC"),
+    "slot_end": pa.timestamp("us", tz="UTC"),
+    "success": pa.int8(),
+    "free_spots_after": pa.int32(),
+    "capacity": pa.int32(),
+}
+# Columnas derivadas de `timestamp`, como en leer_eventos / exportar_columnar
+DERIVADAS = ("fecha", "hora")
+
+_INICIO_VALIDO = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_COMENTARIOS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_IDENT = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class ConsultaCancelada(TimeoutError):
+    """La consulta superó el tiempo máximo."""
+
+
+def motor_disponible() -> str:
+    return MOTOR_DUCKDB if duckdb is not None else MOTOR_SQLITE
+
+
+def fuentes_sql(ruta_eventos: str, directorio: Optional[str] = None) -> Dict[str, str]:
+    """Nombre de tabla → archivo: `eventos` y los .parquet / .arrow del directorio del log."""
+    directorio = directorio or os.path.dirname(os.path.abspath(ruta_eventos))
+    fuentes = {"eventos": ruta_eventos}
+    for nombre in sorted(os.listdir(directorio)):
+        base, ext = os.path.splitext(nombre)
+        if ext.lower() in (".parquet", ".arrow"):
+            tabla = re.sub(r"\W", "_", base).lower()
+            if tabla and tabla not in fuentes and not tabla[0].isdigit():
+                fuentes[tabla] = os.path.join(directorio, nombre)
+    return fuentes
+
+
+def _dataset(ruta: str) -> ds.Dataset:
+    ext = os.path.splitext(ruta)[1].lower()
+    if ext == ".parquet":
+        return ds.dataset(ruta, format="parquet")
+    if ext == ".arrow":
+        return ds.dataset(ruta, format="ipc")
+    convertir = pacsv.ConvertOptions(column_types=TIPOS_CSV, strings_can_be_null=False)
+    return ds.dataset(ruta, format=ds.CsvFileFormat(convert_options=convertir))
+
+
+def _datasets(ruta: str, desde: Optional[date], hasta: Optional[date]) -> Iterator[ds.Dataset]:
+    """El archivo de la tabla; para un log CSV, antes sus bloques archivados del rango (uno a la vez)."""
+    if os.path.splitext(ruta)[1].lower() == ".csv":
+        convertir = pacsv.ConvertOptions(column_types=TIPOS_CSV, strings_can_be_null=False)
+        for bloque in bloques_en_rango(ruta, desde, hasta):
+            with pa.CompressedInputStream(pa.OSFile(ruta_bloque(ruta, bloque)), bloque["compresion"]) as f:
+                yield ds.dataset(pacsv.read_csv(f, convert_options=convertir))
+    yield _dataset(ruta)
+
+
+def columnas_fuente(ruta: str) -> List[str]:
+    nombres = list(_dataset(ruta).schema.names)
+    if "timestamp" in nombres:
+        nombres += [c for c in DERIVADAS if c not in nombres]
+    return nombres
+
+
+def validar_consulta(sql: str) -> str:
+    """Una sola sentencia SELECT/WITH, sin el ';' final. ValueError si no cumple."""
+    limpia = _COMENTARIOS.sub(" ", sql).strip().rstrip(";").strip()
+    if not limpia:
+        raise ValueError("La consulta está vacía.")
+    if ";" in limpia:
+        raise ValueError("Solo se permite una sentencia por consulta.")
+    if not _INICIO_VALIDO.match(limpia):
+        raise ValueError("Solo se permiten consultas de lectura (SELECT o WITH).")
+    return limpia
+
+
+def _rango_utc(desde: Optional[date], hasta: Optional[date]):
+    ini = datetime.combine(desde, dtime(0), tzinfo=timezone.utc) if desde else None
+    fin = datetime.combine(hasta + timedelta(days=1), dtime(0), tzinfo=timezone.utc) if hasta else None
+    return ini, fin
+
+
+# ---------- DuckDB ----------
+def _consulta_duckdb(sql: str, fuentes: Dict[str, str], limite: int, timeout_s: float,
+                     desde: Optional[date], hasta: Optional[date]) -> pd.DataFrame:
+    con = duckdb.connect(":memory:")
+    ini, fin = _rango_utc(desde, hasta)
+    permitidos = []
+    try:
+        con.execute("SET TimeZone = 'UTC'")
+        for tabla, ruta in fuentes.items():
+            ext = os.path.splitext(ruta)[1].lower()
+            ruta_sql = ruta.replace("'", "''")
+            if ext == ".arrow":
+                con.register(f"_{tabla}_ds", _dataset(ruta))
+                origen = f"_{tabla}_ds"
+            elif ext == ".parquet":
+                origen = f"read_parquet('{ruta_sql}')"
+                permitidos.append(ruta)
+            else:
+                # Fechas ISO con zona: el autodetector de read_csv las tipa como TIMESTAMPTZ;
+                # el texto se declara VARCHAR para no depender de la muestra que infiere tipos.
+                # Los bloques del archivo frío (.csv.zst / .csv.gz) se descomprimen al leerlos.
+                # strict_mode = false: el log mezcla filas LF (generar_eventos) y CRLF (módulo csv).
+                texto = ", ".join(f"'{c}': 'VARCHAR'" for c, t in TIPOS_CSV.items() if t == pa.string())
+                archivos = [ruta_bloque(ruta, b) for b in bloques_en_rango(ruta, desde, hasta)] + [ruta]
+                permitidos += archivos
+                lista = ", ".join("'" + a.replace("'", "''") + "'" for a in archivos)
+                origen = (f'(SELECT *, CAST("timestamp" AS DATE) AS fecha, hour("timestamp") AS hora '
+                          f"FROM read_csv([{lista}], header = true, strict_mode = false, types = {{{texto}}}))")
+            condiciones = []
+            if "timestamp" in columnas_fuente(ruta):
+                if ini is not None:
+                    condiciones.append(f"\"timestamp\" >= TIMESTAMPTZ '{ini.isoformat()}'")
+                if fin is not None:
+                    condiciones.append(f"\"timestamp\" < TIMESTAMPTZ '{fin.isoformat()}'")
+            where = f" WHERE {' AND '.join(condiciones)}" if condiciones else ""
+            con.execute(f'CREATE VIEW "{tabla}" AS SELECT * FROM {origen}{where}')
+        # Solo lectura también para el sistema de archivos: la consulta no puede abrir
+        # nada fuera de las fuentes (read_text, read_csv, COPY...) ni deshacer el ajuste
+        lista = ", ".join("'" + os.path.abspath(a).replace("'", "''") + "'" for a in permitidos)
+        con.execute(f"SET allowed_paths = [{lista}]")
+        con.execute("SET enable_external_access = false")
+        con.execute("SET lock_configuration = true")
+        # interrupt() cancela la consulta en curso desde otro hilo
+        reloj = threading.Timer(timeout_s, con.interrupt)
+        reloj.start()
+        try:
+            return con.execute(f"SELECT * FROM ({sql}) AS q LIMIT {int(limite) + 1}").fetchdf()
+        except duckdb.InterruptException as e:
+            raise ConsultaCancelada(f"La consulta superó {timeout_s:g} s.") from e
+        finally:
+            reloj.cancel()
+    finally:
+        con.close()
+
+
+# ---------- Respaldo: pyarrow + sqlite3 ----------
+def _columnas_usadas(sql: str, disponibles: List[str]) -> List[str]:
+    """Proyección: las columnas cuyo nombre aparece en la consulta (todas si hay `*`, no `count(*)`)."""
+    sin_texto = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    if re.search(r"(^|[\s,.])\*", sin_texto):
+        return list(disponibles)
+    tokens = {t.lower() for t in _IDENT.findall(sin_texto)}
+    return [c for c in disponibles if c.lower() in tokens]
+
+
+def _iso(serie: pd.Series, unidad: str, sufijo: str = "") -> pd.Series:
+    # Como generar_eventos._iso: datetime_as_string es mucho más rápido que strftime
+    nulos = serie.isna().to_numpy()
+    texto = np.char.add(np.datetime_as_string(serie.dt.tz_convert(None).to_numpy("datetime64[ns]"), unit=unidad), sufijo)
+    return pd.Series(texto, index=serie.index, dtype=object).where(~nulos, None)
+
+
+def _a_sqlite(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    columnas = {}
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.DatetimeTZDtype):
+            # Texto ISO en UTC, como en Eventos.csv: se compara bien contra '2025-11-01' o '2025-11-01T07:00'
+            columnas[c] = _iso(df[c], "s", "+00:00")
+        elif isinstance(df[c].dtype, pd.CategoricalDtype):
+            columnas[c] = df[c].astype(object)
+        elif pd.api.types.infer_dtype(df[c], skipna=True) == "date":
+            columnas[c] = df[c].map(lambda d: d.isoformat() if d is not None and not pd.isna(d) else None)
+        else:
+            columnas[c] = df[c]
+    return columnas
+
+
+def _cargar_tabla(con: sqlite3.Connection, tabla: str, ruta: str, sql: str, desde: Optional[date],
+                  hasta: Optional[date], limite_tiempo: float) -> int:
+    ini, fin = _rango_utc(desde, hasta)
+    dataset = _dataset(ruta)
+    disponibles = columnas_fuente(ruta)
+    usadas = _columnas_usadas(sql, disponibles)
+    if not usadas:
+        usadas = disponibles[:1]
+    derivadas = [c for c in DERIVADAS if c in usadas and c not in dataset.schema.names]
+    leer = [c for c in usadas if c in dataset.schema.names]
+    if derivadas and "timestamp" not in leer:
+        leer.append("timestamp")
+    filtro = None
+    if "timestamp" in dataset.schema.names:
+        if ini is not None:
+            filtro = pc.field("timestamp") >= pa.scalar(ini, type=dataset.schema.field("timestamp").type)
+        if fin is not None:
+            f = pc.field("timestamp") < pa.scalar(fin, type=dataset.schema.field("timestamp").type)
+            filtro = f if filtro is None else filtro & f
+    nombres = ", ".join(f'"{c}"' for c in usadas)
+    con.execute(f'CREATE TABLE "{tabla}" ({nombres})')
+    insertar = f'INSERT INTO "{tabla}" VALUES ({", ".join("?" * len(usadas))})'
+    filas = 0
+    for fuente in _datasets(ruta, desde, hasta):
+        for lote in fuente.to_batches(columns=leer, filter=filtro, batch_size=FILAS_POR_LOTE):
+            if time.monotonic() > limite_tiempo:
+                raise ConsultaCancelada("La carga de datos superó el tiempo máximo.")
+            df = lote.to_pandas()
+            columnas = _a_sqlite(df[[c for c in usadas if c in df.columns]])
+            if "fecha" in derivadas:
+                columnas["fecha"] = _iso(df["timestamp"], "D")
+            if "hora" in derivadas:
+                columnas["hora"] = df["timestamp"].dt.hour
+            valores = [columnas[c].astype(object).where(columnas[c].notna(), None).tolist() for c in usadas]
+            con.executemany(insertar, zip(*valores))
+            filas += len(df)
+    return filas
+
+
+def _consulta_sqlite(sql: str, fuentes: Dict[str, str], limite: int, timeout_s: float,
+                     desde: Optional[date], hasta: Optional[date]) -> pd.DataFrame:
+    limite_tiempo = time.monotonic() + timeout_s
+    tokens = {t.lower() for t in _IDENT.findall(sql)}
+    con = sqlite3.connect(":memory:")
+    try:
+        for tabla, ruta in fuentes.items():
+            if tabla in tokens:       # solo se cargan las tablas que la consulta nombra
+                _cargar_tabla(con, tabla, ruta, sql, desde, hasta, limite_tiempo)
+        con.execute("PRAGMA query_only = ON")
+        # Se revisa el reloj cada ~10k instrucciones de la VM de SQLite
+        con.set_progress_handler(lambda: int(time.monotonic() > limite_tiempo), 10_000)
+        try:
+            cur = con.execute(f"SELECT * FROM ({sql}) AS q LIMIT {int(limite) + 1}")
+            filas = cur.fetchall()
+        except sqlite3.OperationalError as e:
+            if time.monotonic() > limite_tiempo:
+                raise ConsultaCancelada(f"La consulta superó {timeout_s:g} s.") from e
+            raise
+        return pd.DataFrame(filas, columns=[d[0] for d in cur.description])
+    finally:
+        con.close()
+
+
+def ejecutar_consulta(sql: str, fuentes: Dict[str, str], limite: int = LIMITE_FILAS,
+                      timeout_s: float = TIMEOUT_S, desde: Optional[date] = None,
+                      hasta: Optional[date] = None, motor: Optional[str] = None) -> Dict[str, object]:
+    """
+    Ejecuta una consulta de solo lectura. `desde`/`hasta` (fecha UTC del evento,
+    inclusive) se aplican en el escaneo de toda tabla con `timestamp`.
+    Retorna {"df", "truncado", "segundos", "motor"}; ValueError si la consulta no
+    es válida y ConsultaCancelada si supera `timeout_s`.
+    """
+    sql = validar_consulta(sql)
+    motor = motor or motor_disponible()
+    t = time.perf_counter()
+    if motor == MOTOR_DUCKDB:
+        df = _consulta_duckdb(sql, fuentes, limite, timeout_s, desde, hasta)
+    else:
+        df = _consulta_sqlite(sql, fuentes, limite, timeout_s, desde, hasta)
+    truncado = len(df) > limite
+    return {
+        "df": df.iloc[:limite] if truncado else df,
+        "truncado": truncado,
+        "segundos": time.perf_counter() - t,
+        "motor": motor,
+    }
@@ -0,0 +1,285 @@
+# disponibilidad_slots.py — Búsqueda del próximo horario libre en todos los lotes.
+# Mantiene, por lote y por día (UTC), un arreglo de franjas de 15 minutos con
+# el número de reservas vivas que las tocan. Se construye una vez desde el log
+# y luego solo procesa las filas nuevas (reservas y cancelaciones), así una
+# consulta de una semana sobre todos los lotes es aritmética sobre arreglos.
+
+import threading
+from datetime import datetime, time as dtime, timedelta, timezone, tzinfo
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from importar_reservas import HORIZONTE_DIAS
+
+MINUTOS_BIN = 15
+BINS_DIA = 24 * 60 // MINUTOS_BIN
+_NS_BIN = MINUTOS_BIN * 60 * 10**9
+# Una reserva no ocupa más del horizonte de la importación masiva: un slot_end mal
+# escrito (p. ej. año 2125) no puede pedir un arreglo de un siglo en _aplicar
+_BINS_HORIZONTE = HORIZONTE_DIAS * BINS_DIA
+
+# `tz` de buscar: zona del servidor con sus cambios de horario, como datetime.astimezone()
+ZONA_SERVIDOR = "servidor"
+
+CRITERIO_PRIMERO = "primero"           # el horario más temprano
+CRITERIO_MENOS_OCUPADO = "menos_ocupado"  # el de menor ocupación máxima en la franja
+
+
+def _ns(serie: pd.Series) -> np.ndarray:
+    """Nanosegundos desde 1970 UTC de una serie de fechas con zona horaria."""
+    return serie.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[ns]").astype(np.int64)
+
+
+def _bins(serie: pd.Series, hacia_arriba: bool) -> np.ndarray:
+    """Índice absoluto de franja (desde 1970 UTC) de cada instante."""
+    ns = _ns(serie)
+    return -(-ns // _NS_BIN) if hacia_arriba else ns // _NS_BIN
+
+
+def _bin_de(instante: datetime, hacia_arriba: bool) -> int:
+    ns = pd.Timestamp(instante).tz_convert("UTC").value
+    return -(-ns // _NS_BIN) if hacia_arriba else ns // _NS_BIN
+
+
+def _desfases_min(bins: np.ndarray, tz: Union[tzinfo, str, None]) -> np.ndarray:
+    """Minutos de desfase de `tz` respecto de UTC en el instante de cada franja (cambia con el horario de verano)."""
+    por_hora = 60 // MINUTOS_BIN
+    horas, inversa = np.unique(bins // por_hora, return_inverse=True)
+    desfases = np.empty(len(horas), dtype=np.int64)
+    for i, h in enumerate(horas):
+        instante = datetime.fromtimestamp(int(h) * 3600, timezone.utc)
+        local = instante.astimezone() if tz == ZONA_SERVIDOR else instante.astimezone(tz or timezone.utc)
+        desfases[i] = int(local.utcoffset().total_seconds() // 60)
+    return desfases[inversa]
+
+
+class OcupacionSlots:
+    """
+    Ocupación por franjas de 15 minutos de cada lote, actualizada incrementalmente.
+    `max_simultaneas` limita cuántas reservas pueden compartir una franja además
+    de la capacidad del lote (la app usa 1 porque sus reglas rechazan traslapes).
+    Con `cupo_vigentes`, buscar también aplica el cupo de verificar_reserva: las
+    reservas vivas del lote con slot_end ≥ inicio no llegan a la capacidad.
+    """
+
+    def __init__(self, lotes: Sequence[Tuple[str, int]], max_simultaneas: Optional[int] = None,
+                 cupo_vigentes: bool = False):
+        self.nombres: List[str] = [str(l[0]) for l in lotes]
+        self._pos: Dict[str, int] = {n: i for i, n in enumerate(self.nombres)}
+        caps = np.array([int(l[1]) for l in lotes], dtype=np.int32)
+        self.capacidades = caps
+        self.limite = caps if max_simultaneas is None else np.minimum(caps, max_simultaneas)
+        self.cupo_vigentes = cupo_vigentes
+        self._dias: Dict[int, np.ndarray] = {}                # día -> int32[n_lotes, BINS_DIA]
+        self._reservas: Dict[str, Tuple[int, int, int]] = {}  # booking -> (lote, bin_ini, bin_fin)
+        self._canceladas: set = set()
+        self.filas_vistas = 0
+        self._lock = threading.Lock()
+
+    # ---------- Actualización ----------
+    def sincronizar(self, df: pd.DataFrame) -> int:
+        """
+        Procesa las filas del log que aún no se han visto (el log es de solo
+        agregado, así que son las del final). Un DataFrame más corto que lo ya
+        visto es una versión vieja de otra sesión y se ignora. Retorna filas nuevas.
+        """
+        with self._lock:
+            if len(df) <= self.filas_vistas:
+                return 0
+            nuevas = df.iloc[self.filas_vistas:]
+            self.filas_vistas = len(df)
+            if nuevas.empty or "accion" not in nuevas.columns:
+                return len(nuevas)
+
+            ok = nuevas["success"] == 1
+            res = nuevas[ok & (nuevas["accion"] == "reserva")]
+            res = res[res["slot_start"].notna() & res["slot_end"].notna() & res["lot_id"].isin(self._pos)]
+            # Pertenencia al set en Python: isin() convertiría todo el set en cada lote pequeño
+            vivas = [b != "" and b not in self._canceladas for b in res["booking_id"]]
+            res = res[np.array(vivas, dtype=bool)]
+            if not res.empty:
+                lote = res["lot_id"].map(self._pos).to_numpy()
+                b0 = _bins(res["slot_start"], False)
+                b1 = np.clip(_bins(res["slot_end"], True), b0 + 1, b0 + _BINS_HORIZONTE)
+                self._aplicar(lote, b0, b1, 1)
+                for bid, l, i, f in zip(res["booking_id"], lote, b0, b1):
+                    self._reservas[bid] = (int(l), int(i), int(f))
+
+            canc = nuevas.loc[ok & (nuevas["accion"] == "cancelacion"), "booking_id"]
+            quitar = [self._reservas.pop(b) for b in canc if b in self._reservas]
+            self._canceladas.update(canc)
+            if quitar:
+                l, i, f = (np.array(x) for x in zip(*quitar))
+                self._aplicar(l, i, f, -1)
+            return len(nuevas)
+
+    def _aplicar(self, lote: np.ndarray, b0: np.ndarray, b1: np.ndarray, signo: int) -> None:
+        # Por tandas de inicios dentro de un horizonte: con la duración acotada, el
+        # arreglo de cada tanda cubre a lo sumo dos horizontes aunque el log abarque años
+        orden = np.argsort(b0, kind="stable")
+        lote, b0, b1 = lote[orden], b0[orden], b1[orden]
+        i = 0
+        while i < len(b0):
+            j = int(np.searchsorted(b0, b0[i] + _BINS_HORIZONTE, side="left"))
+            self._aplicar_tanda(lote[i:j], b0[i:j], b1[i:j], signo)
+            i = j
+
+    def _aplicar_tanda(self, lote: np.ndarray, b0: np.ndarray, b1: np.ndarray, signo: int) -> None:
+        # Arreglo de diferencias sobre el rango cubierto y un cumsum, en vez de sumar reserva por reserva
+        base = int(b0.min()) // BINS_DIA * BINS_DIA
+        ancho = int(b1.max()) - base
+        dif = np.zeros((len(self.nombres), ancho + 1), dtype=np.int32)
+        np.add.at(dif, (lote, b0 - base), signo)
+        np.add.at(dif, (lote, b1 - base), -signo)
+        delta = np.cumsum(dif[:, :ancho], axis=1)
+        for d in range(base // BINS_DIA, (base + ancho - 1) // BINS_DIA + 1):
+            ini = d * BINS_DIA - base
+            tramo = delta[:, ini:ini + BINS_DIA]
+            if not tramo.any():
+                continue
+            dia = self._dias.setdefault(d, np.zeros((len(self.nombres), BINS_DIA), dtype=np.int32))
+            dia[:, :tramo.shape[1]] += tramo
+
+    # ---------- Consultas ----------
+    def conteos(self, bin_ini: int, bin_fin: int) -> np.ndarray:
+        """Reservas vivas por lote y franja en [bin_ini, bin_fin): int32[n_lotes, n_bins]."""
+        out = np.zeros((len(self.nombres), max(bin_fin - bin_ini, 0)), dtype=np.int32)
+        with self._lock:
+            for d in range(bin_ini // BINS_DIA, (bin_fin - 1) // BINS_DIA + 1):
+                dia = self._dias.get(d)
+                if dia is None:
+                    continue
+                lo, hi = max(bin_ini, d * BINS_DIA), min(bin_fin, (d + 1) * BINS_DIA)
+                out[:, lo - bin_ini:hi - bin_ini] = dia[:, lo - d * BINS_DIA:hi - d * BINS_DIA]
+        return out
+
+    def vigentes(self, sel: np.ndarray, inicios: np.ndarray) -> np.ndarray:
+        """
+        Reservas vivas de cada lote de `sel` con fin en o después de cada franja
+        de `inicios` (el conteo de recalcular_ocupacion_desde_eventos):
+        int32[len(sel), len(inicios)]. El fin va redondeado hacia arriba a su
+        franja, así que el conteo nunca queda por debajo del de la app.
+        """
+        with self._lock:
+            tramos = np.array(list(self._reservas.values()), dtype=np.int64).reshape(-1, 3)
+        out = np.zeros((len(sel), len(inicios)), dtype=np.int32)
+        for j, l in enumerate(sel):
+            fines = np.sort(tramos[tramos[:, 0] == l, 2])
+            out[j] = len(fines) - np.searchsorted(fines, inicios, side="left")
+        return out
+
+    def buscar(self, duracion_min: int, desde: datetime, hasta: datetime,
+               lotes: Optional[Sequence[str]] = None,
+               horas: Optional[Tuple[dtime, dtime]] = None, tz: Union[tzinfo, str, None] = None,
+               criterio: str = CRITERIO_PRIMERO, n: int = 10) -> pd.DataFrame:
+        """
+        Horarios libres de `duracion_min` que empiezan en una franja dentro de
+        [desde, hasta) y terminan antes de `hasta`. `horas` restringe el inicio
+        y el fin a una banda diaria en la zona `tz` (por defecto UTC; ZONA_SERVIDOR =
+        la del servidor), con el desfase de cada instante: la banda sigue a la hora
+        local aunque el rango cruce un cambio de horario.
+        Con `cupo_vigentes`, `libres` y el criterio de menor ocupación usan el
+        conteo de vigentes y la capacidad del lote, como verificar_reserva.
+        Retorna hasta `n` filas: lot_id, slot_start, slot_end, libres.
+        """
+        k = max(-(-int(duracion_min) // MINUTOS_BIN), 1)
+        b_ini, b_fin = _bin_de(desde, True), _bin_de(hasta, False)
+        sel = np.array([self._pos[l] for l in (lotes or self.nombres) if l in self._pos], dtype=np.int64)
+        vacio = pd.DataFrame(columns=["lot_id", "slot_start", "slot_end", "libres"])
+        if b_fin - b_ini < k or len(sel) == 0:
+            return vacio
+
+        cnt = self.conteos(b_ini, b_fin)[sel]
+        limite = self.limite[sel][:, None]
+        lleno = np.concatenate([np.zeros((len(sel), 1), dtype=np.int32), np.cumsum(cnt >= limite, axis=1)], axis=1)
+        libre = (lleno[:, k:] - lleno[:, :-k]) == 0                       # [lotes, inicios]
+        pico = np.lib.stride_tricks.sliding_window_view(cnt, k, axis=1).max(axis=2)
+
+        inicios = np.arange(b_ini, b_fin - k + 1)
+        if horas is not None:
+            desfase = _desfases_min(inicios, tz)
+            minuto = (inicios * MINUTOS_BIN + desfase) % (24 * 60)
+            # El fin, con su propio desfase (un cambio de horario dentro del slot lo corre)
+            minuto_fin = minuto + k * MINUTOS_BIN + (_desfases_min(inicios + k, tz) - desfase)
+            h0 = horas[0].hour * 60 + horas[0].minute
+            h1 = horas[1].hour * 60 + horas[1].minute
+            libre &= ((minuto >= h0) & (minuto_fin <= h1))[None, :]
+
+        if self.cupo_vigentes:
+            # Un inicio que verificar_reserva rechazaría como SIN_CUPO no se ofrece
+            pico = self.vigentes(sel, inicios)
+            limite = self.capacidades[sel][:, None]
+            libre &= pico < limite
+
+        fil, col = np.nonzero(libre)
+        if len(fil) == 0:
+            return vacio
+        if criterio == CRITERIO_MENOS_OCUPADO:
+            orden = np.lexsort((col, pico[fil, col] / limite[fil, 0]))
+        else:
+            orden = np.lexsort((fil, col))
+        fil, col = fil[orden[:n]], col[orden[:n]]
+
+        ini = pd.to_datetime(inicios[col] * _NS_BIN, utc=True)
+        return pd.DataFrame({
+            "lot_id": [self.nombres[i] for i in sel[fil]],
+            "slot_start": ini,
+            "slot_end": ini + timedelta(minutes=int(duracion_min)),
+            "libres": (limite[fil, 0] - pico[fil, col]).astype(int),
+        })
+
+
+def ocupacion_dia(reservas: pd.DataFrame, lotes: Sequence[Tuple[str, int]],
+                  desde: datetime, hasta: datetime, minutos_bin: int = MINUTOS_BIN) -> pd.DataFrame:
+    """
+    Línea de tiempo de ocupación de cada lote en [desde, hasta) a partir de
+    reservas vivas (lot_id, slot_start, slot_end). Un solo barrido: +1 en cada
+    inicio y -1 en cada fin, ordenados por (lote, instante) con los fines antes
+    que los inicios simultáneos; el cumsum es la función escalón de cada lote.
+    Retorna lot_id, inicio, ocupados (máximo dentro de la franja) y libres.
+    """
+    nombres = [str(l[0]) for l in lotes]
+    caps = np.array([int(l[1]) for l in lotes], dtype=np.int64)
+    pos = {n: i for i, n in enumerate(nombres)}
+    paso = minutos_bin * 60 * 10**9
+    d0, d1 = pd.Timestamp(desde).tz_convert("UTC").value, pd.Timestamp(hasta).tz_convert("UTC").value
+    bordes = np.arange(d0, d1, paso, dtype=np.int64)
+    occ = np.zeros((len(nombres), len(bordes)), dtype=np.int64)
+
+    r = reservas[reservas["lot_id"].isin(pos) & reservas["slot_start"].notna() & reservas["slot_end"].notna()]
+    if not r.empty:
+        ini = np.clip(_ns(r["slot_start"]), d0, d1)
+        fin = np.clip(_ns(r["slot_end"]), d0, d1)
+        lote = r["lot_id"].map(pos).to_numpy(dtype=np.int64)
+        dentro = fin > ini
+        ini, fin, lote = ini[dentro], fin[dentro], lote[dentro]
+
+        t = np.concatenate([ini, fin])
+        signo = np.concatenate([np.ones(len(ini), dtype=np.int64), -np.ones(len(fin), dtype=np.int64)])
+        lt = np.concatenate([lote, lote])
+        orden = np.lexsort((signo, t, lt))
+        t, signo, lt = t[orden], signo[orden], lt[orden]
+        # Cada reserva suma y resta en el mismo lote: el cumsum global vuelve a 0 entre lotes
+        valor = np.cumsum(signo)
+
+        for i in range(len(nombres)):
+            a, b = np.searchsorted(lt, [i, i + 1])
+            if a == b:
+                continue
+            ti, vi = t[a:b], valor[a:b]
+            # Valor vigente al inicio de cada franja…
+            k = np.searchsorted(ti, bordes, side="right") - 1
+            occ[i] = np.where(k >= 0, vi[np.maximum(k, 0)], 0)
+            # …y el máximo de los cambios que caen dentro de ella
+            j = (ti - d0) // paso
+            m = (j < len(bordes)) & (ti > d0 + j * paso)
+            np.maximum.at(occ[i], j[m], vi[m])
+
+    return pd.DataFrame({
+        "lot_id": np.repeat(nombres, len(bordes)),
+        "inicio": pd.to_datetime(np.tile(bordes, len(nombres)), utc=True),
+        "ocupados": occ.ravel(),
+        "libres": np.maximum(caps[:, None] - occ, 0).ravel(),
+    })
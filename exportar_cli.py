@@ -0,0 +1,64 @@
+# Exporta eventos filtrados (y opcionalmente las 10 métricas) a Parquet o Arrow IPC.
+# Uso: python exportar_cli.py Eventos.csv salida.parquet [--formato arrow] [--desde 2025-11-01]
+#      [--hasta 2025-11-30] [--motivos clase,examen] [--lotes "parqueo publico 1"] [--metricas metricas.parquet]
+#      [--parqueos Parqueos.csv]
+import argparse
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from archivo_eventos import leer_eventos_texto
+from exportar_columnar import FORMATO_ARROW, FORMATO_PARQUET, exportar_eventos_csv, exportar_metricas
+from generar_eventos import leer_lotes
+from metricas_parqueos import calcular_metricas, ocupacion_rango, preparar_eventos
+from sketch_cuantiles import percentiles_tiempos
+
+def lista(texto: str):
+    return [x.strip() for x in texto.split(",") if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportación columnar de Eventos.csv")
+    parser.add_argument("eventos")
+    parser.add_argument("salida")
+    parser.add_argument("--formato", choices=[FORMATO_PARQUET, FORMATO_ARROW], default=FORMATO_PARQUET)
+    parser.add_argument("--desde", type=date.fromisoformat)
+    parser.add_argument("--hasta", type=date.fromisoformat)
+    parser.add_argument("--motivos", default="")
+    parser.add_argument("--lotes", default="")
+    parser.add_argument("--metricas", help="ruta para exportar las 10 métricas del rango")
+    parser.add_argument("--parqueos", default="Parqueos.csv", help="capacidades de los lotes para la ocupación")
+    args = parser.parse_args()
+
+    n = exportar_eventos_csv(args.eventos, args.salida, args.formato, args.desde, args.hasta,
+                             lista(args.motivos), lista(args.lotes))
+    print(f"{n} eventos → {args.salida}")
+
+    if args.metricas:
+        # Las métricas se calculan leyendo de vuelta la exportación (ya tipada, solo columnas necesarias).
+        cols = ["accion", "motivo", "lot_id", "user_email", "booking_id", "success", "free_spots_after", "capacity",
+                "slot_start", "slot_end", "fecha", "hora"]
+        if args.formato == FORMATO_PARQUET:
+            tabla = pq.read_table(args.salida, columns=cols)
+        else:
+            tabla = ipc.open_file(pa.memory_map(args.salida)).read_all().select(cols)
+        df = tabla.to_pandas()
+        for c in ["accion", "motivo", "lot_id"]:
+            df[c] = df[c].fillna("").astype(str)
+        # Como en la app y CF3: ocupación de los días del rango con las reservas que los
+        # solapan (aunque se hayan hecho antes), la capacidad de los lotes elegidos y las
+        # cancelaciones de todo el log (una fuera del rango también quita la reserva)
+        capacidades = {l[0]: int(l[1]) for l in leer_lotes(args.parqueos)}
+        log = preparar_eventos(leer_eventos_texto(args.eventos, args.desde, args.hasta, por_slot=True))
+        occ = ocupacion_rango(log, args.desde, args.hasta, lista(args.motivos), lista(args.lotes), capacidades or None)
+        # Percentiles del log completo: un filtro de motivo en la exportación deja fuera los check-ins
+        tiempos = percentiles_tiempos(log, desde=args.desde, hasta=args.hasta, lotes=lista(args.lotes),
+                                      motivos=lista(args.motivos), sin_mayusculas=True)
+        exportar_metricas(calcular_metricas(df, ocupacion=occ, tiempos=tiempos), args.metricas, args.formato)
+        print(f"métricas → {args.metricas}")
+
+
+if __name__ == "__main__":
+    main()
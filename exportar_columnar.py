@@ -0,0 +1,229 @@
+# exportar_columnar.py — Exportación de eventos filtrados y métricas a Parquet / Arrow IPC.
+# Las filas se escriben por grupos: cada bloque se convierte a Arrow y se escribe
+# antes de pasar al siguiente, así un rango grande nunca existe dos veces en memoria.
+
+import os
+import tempfile
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from archivo_eventos import bloques_en_rango, leer_bloque
+from metricas_parqueos import preparar_eventos, aplicar_filtros
+
+FORMATO_PARQUET = "parquet"
+FORMATO_ARROW   = "arrow"
+FILAS_POR_GRUPO = 65536
+
+_DICC = pa.dictionary(pa.int32(), pa.string())
+_TS   = pa.timestamp("us", tz="UTC")
+
+ESQUEMA_EVENTOS = pa.schema([
+    ("event_id", pa.string()),
+    ("timestamp", _TS),
+    ("user_email", pa.string()),
+    ("accion", _DICC),
+    ("motivo", _DICC),
+    ("lot_id", _DICC),
+    ("spot_id", pa.string()),
+    ("booking_id", pa.string()),
+    ("success", pa.int8()),
+    ("free_spots_after", pa.int32()),
+    ("capacity", pa.int32()),
+    ("source", _DICC),
+    ("app_version", _DICC),
+    ("error_code", _DICC),
+    ("slot_start", _TS),
+    ("slot_end", _TS),
+    ("fecha", pa.date32()),
+    ("hora", pa.int8()),
+])
+
+ESQUEMA_METRICAS = pa.schema([
+    ("metrica", _DICC),
+    ("clave", pa.string()),
+    ("valor", pa.float64()),
+])
+
+
+class CodificadorDicc:
+    """
+    Diccionario estable entre bloques: los valores nuevos se agregan al final,
+    de modo que cada bloque solo extiende el diccionario anterior (Arrow IPC
+    en formato archivo admite deltas, no reemplazos). Empieza con "" porque
+    un diccionario inicial vacío también cuenta como reemplazo.
+    """
+
+    def __init__(self):
+        self.valores: List[str] = [""]
+        self._indice = pd.Index(self.valores, dtype=object)
+
+    def codificar(self, serie: pd.Series) -> pa.DictionaryArray:
+        nulos = serie.isna().to_numpy()
+        texto = serie.astype(object)
+        nuevos = [v for v in pd.unique(texto[~nulos]) if v not in self._indice]
+        if nuevos:
+            self.valores.extend(str(v) for v in nuevos)
+            self._indice = pd.Index(self.valores, dtype=object)
+        codigos = self._indice.get_indexer(texto.where(~nulos, "")).astype("int32")
+        return pa.DictionaryArray.from_arrays(
+            pa.array(codigos, type=pa.int32(), mask=nulos | (codigos < 0)),
+            pa.array(self.valores, type=pa.string()),
+        )
+
+
+def _columna(serie: Optional[pd.Series], tipo: pa.DataType, n: int,
+             codificador: Optional[CodificadorDicc] = None) -> pa.Array:
+    if serie is None:
+        return pa.nulls(n, type=tipo)
+    if pa.types.is_dictionary(tipo):
+        return (codificador or CodificadorDicc()).codificar(serie)
+    if pa.types.is_timestamp(tipo):
+        if not pd.api.types.is_datetime64_any_dtype(serie):
+            serie = pd.to_datetime(serie, errors="coerce", utc=True)
+        return pa.array(serie, type=tipo, from_pandas=True)
+    if pa.types.is_integer(tipo):
+        return pa.array(pd.to_numeric(serie, errors="coerce").round().astype("Int64"), type=tipo, from_pandas=True)
+    if pa.types.is_date(tipo):
+        return pa.array(serie.where(serie.notna(), None), type=tipo, from_pandas=True)
+    return pa.array(serie.astype(object).where(serie.notna(), None), type=tipo)
+
+
+def codificadores_eventos() -> Dict[str, CodificadorDicc]:
+    return {f.name: CodificadorDicc() for f in ESQUEMA_EVENTOS if pa.types.is_dictionary(f.type)}
+
+
+def lote_eventos(df: pd.DataFrame, codificadores: Optional[Dict[str, CodificadorDicc]] = None) -> pa.RecordBatch:
+    """Convierte un bloque de eventos (ya preparado) a un RecordBatch con ESQUEMA_EVENTOS."""
+    n = len(df)
+    codificadores = codificadores if codificadores is not None else codificadores_eventos()
+    arrays = [_columna(df[c] if c in df.columns else None, ESQUEMA_EVENTOS.field(c).type, n, codificadores.get(c))
+              for c in ESQUEMA_EVENTOS.names]
+    return pa.RecordBatch.from_arrays(arrays, schema=ESQUEMA_EVENTOS)
+
+
+class EscritorColumnar:
+    """Escribe RecordBatch a Parquet (un row group por lote, con estadísticas) o Arrow IPC."""
+
+    def __init__(self, destino, esquema: pa.Schema, formato: str = FORMATO_PARQUET):
+        if formato == FORMATO_PARQUET:
+            self._w = pq.ParquetWriter(destino, esquema, compression="zstd", write_statistics=True)
+        elif formato == FORMATO_ARROW:
+            # Sin compresión para que el archivo pueda mapearse en memoria sin copia.
+            self._w = ipc.new_file(destino, esquema, options=ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        else:
+            raise ValueError(f"Formato no soportado: {formato}")
+        self.formato = formato
+        self.filas = 0
+
+    def escribir(self, lote: pa.RecordBatch) -> None:
+        if lote.num_rows == 0:
+            return
+        if self.formato == FORMATO_PARQUET:
+            self._w.write_batch(lote, row_group_size=lote.num_rows)
+        else:
+            self._w.write_batch(lote)
+        self.filas += lote.num_rows
+
+    def cerrar(self) -> None:
+        self._w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def exportar_eventos(df: pd.DataFrame, destino, formato: str = FORMATO_PARQUET,
+                     filas_por_grupo: int = FILAS_POR_GRUPO) -> int:
+    """Exporta un DataFrame de eventos ya cargado, bloque a bloque. Retorna filas escritas."""
+    cods = codificadores_eventos()
+    with EscritorColumnar(destino, ESQUEMA_EVENTOS, formato) as w:
+        for ini in range(0, len(df), filas_por_grupo):
+            w.escribir(lote_eventos(df.iloc[ini:ini + filas_por_grupo], cods))
+        return w.filas
+
+
+def bloques_csv(ruta_csv: str, filas_por_grupo: int = FILAS_POR_GRUPO,
+                desde: Optional[date] = None, hasta: Optional[date] = None) -> Iterable[pd.DataFrame]:
+    """
+    Lee por bloques ya preparados (tipos, fecha, hora) los bloques del archivo
+    frío que tocan [desde, hasta], uno a la vez, y después Eventos.csv.
+    """
+    for b in bloques_en_rango(ruta_csv, desde, hasta):
+        yield preparar_eventos(leer_bloque(ruta_csv, b))
+    if not os.path.exists(ruta_csv):
+        return
+    for chunk in pd.read_csv(ruta_csv, dtype=str, chunksize=filas_por_grupo):
+        yield preparar_eventos(chunk)
+
+
+def exportar_eventos_csv(ruta_csv: str, destino, formato: str = FORMATO_PARQUET,
+                         f_ini: Optional[date] = None, f_fin: Optional[date] = None,
+                         motivos: Optional[List[str]] = None, lotes: Optional[List[str]] = None,
+                         filas_por_grupo: int = FILAS_POR_GRUPO) -> int:
+    """Filtra y exporta directamente desde el CSV (y el archivo frío) sin cargarlo completo."""
+    cods = codificadores_eventos()
+    with EscritorColumnar(destino, ESQUEMA_EVENTOS, formato) as w:
+        for bloque in bloques_csv(ruta_csv, filas_por_grupo, f_ini, f_fin):
+            w.escribir(lote_eventos(aplicar_filtros(bloque, f_ini, f_fin, motivos or [], lotes or []), cods))
+        return w.filas
+
+
+def tabla_metricas(resultados: Dict[str, object]) -> pa.Table:
+    """Pasa el dict de métricas a formato largo (metrica, clave, valor)."""
+    metricas: List[str] = []
+    claves: List[Optional[str]] = []
+    valores: List[Optional[float]] = []
+    for nombre, valor in resultados.items():
+        if isinstance(valor, pd.Series):
+            for k, v in valor.items():
+                metricas.append(nombre)
+                claves.append(str(k))
+                valores.append(None if pd.isna(v) else float(v))
+        elif isinstance(valor, (int, float)):
+            metricas.append(nombre)
+            claves.append(None)
+            valores.append(float(valor))
+    return pa.Table.from_arrays([
+        pa.array(metricas, type=pa.string()).dictionary_encode(),
+        pa.array(claves, type=pa.string()),
+        pa.array(valores, type=pa.float64()),
+    ], schema=ESQUEMA_METRICAS)
+
+
+def exportar_metricas(resultados: Dict[str, object], destino, formato: str = FORMATO_PARQUET) -> int:
+    tabla = tabla_metricas(resultados)
+    with EscritorColumnar(destino, ESQUEMA_METRICAS, formato) as w:
+        for lote in tabla.to_batches():
+            w.escribir(lote)
+        return w.filas
+
+
+def a_temporal(exportar: Callable, *args, sufijo: str = "", **kwargs) -> str:
+    """
+    Ejecuta una exportación sobre un archivo temporal, bloque a bloque (para
+    st.download_button sin armar el archivo completo en memoria). Retorna la
+    ruta; quien la pide la borra con borrar_temporales.
+    """
+    fd, ruta = tempfile.mkstemp(prefix="parqueos_", suffix=sufijo)
+    os.close(fd)
+    try:
+        exportar(*args, ruta, **kwargs)
+    except BaseException:
+        os.remove(ruta)
+        raise
+    return ruta
+
+
+def borrar_temporales(*rutas: str) -> None:
+    for ruta in rutas:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
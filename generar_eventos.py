@@ -0,0 +1,108 @@
+# generar_eventos.py — Genera un Eventos.csv sintético (ordenado por timestamp)
+# con el mismo formato que escribe la app, para benchmarks y pruebas de carga.
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from servicio_eventos import EVENT_HEADERS
+
+MOTIVOS = ["clase", "examen", "visita", "reunión", "actividad", "charla DELVA", "otro"]
+
+
+def leer_lotes(ruta_parqueos: str) -> List[Tuple[str, int]]:
+    """(nombre, capacidad) de un Parqueos.csv de 3 columnas."""
+    df = pd.read_csv(ruta_parqueos, header=None, names=["lot_id", "capacity", "occupied"])
+    return [(str(r.lot_id), int(r.capacity)) for r in df.itertuples()]
+
+
+def _iso(ts: pd.DatetimeIndex, unidad: str) -> np.ndarray:
+    # Igual que datetime.isoformat() en UTC, pero vectorizado (strftime es muy lento)
+    return np.char.add(np.datetime_as_string(ts.tz_convert(None).values, unit=unidad), "+00:00")
+
+
+def generar_eventos(ruta: str, n: int, lotes: Sequence[Tuple[str, int]],
+                    inicio: Optional[datetime] = None, dias: int = 30,
+                    usuarios: int = 2000, semilla: int = 0,
+                    cerrar_vencidas: bool = True) -> pd.DataFrame:
+    """
+    Escribe `n` eventos repartidos en `dias` días desde `inicio` y retorna el DataFrame.
+    Mezcla: ~70% reserva, ~10% lista_espera, ~10% checkin y ~10% cancelación;
+    los checkin/cancelación referencian reservas anteriores. Con `cerrar_vencidas`
+    se agregan los eventos de expiración que la app ya habría escrito.
+    """
+    rng = np.random.default_rng(semilla)
+    inicio = inicio or (datetime.now(timezone.utc) - timedelta(days=dias)).replace(minute=0, second=0, microsecond=0)
+
+    ts = (pd.Timestamp(inicio) + pd.to_timedelta(np.sort(rng.uniform(0, dias * 86400, n)), unit="s")).floor("us")
+    accion = rng.choice(np.array(["reserva", "lista_espera", "checkin", "cancelacion"]), n, p=[0.7, 0.1, 0.1, 0.1])
+    es_res = accion == "reserva"
+    es_res[0] = True
+    accion[0] = "reserva"
+
+    nombres = np.array([l[0] for l in lotes], dtype=object)
+    caps = np.array([l[1] for l in lotes])
+    lote_i = rng.choice(len(lotes), n, p=caps / caps.sum())
+
+    # Slot: entre 0 y 2 días después del evento, en medias horas entre 7:00 y 18:30
+    dia_slot = (ts + pd.to_timedelta(rng.integers(0, 3, n), unit="D")).normalize()
+    slot_start = dia_slot + pd.to_timedelta(7 * 60 + 30 * rng.integers(0, 24, n), unit="m")
+    slot_start = pd.DatetimeIndex(np.maximum(slot_start.values, ts.ceil("30min").values)).tz_localize("UTC")
+    slot_end = slot_start + pd.to_timedelta(rng.choice([30, 60, 90], n), unit="m")
+
+    usuario = np.array([f"est{u:05d}" for u in range(usuarios)], dtype=object)[rng.integers(0, usuarios, n)]
+    booking = np.array([f"{i:08x}-0000-4000-8000-{r:012x}" for i, r in enumerate(rng.integers(0, 2**48, n))], dtype=object)
+
+    # checkin/cancelación toman una reserva previa al azar y copian sus datos
+    pos_res = np.flatnonzero(es_res)
+    previas = np.cumsum(es_res) - 1
+    ref = pos_res[np.floor(rng.random(n) * (previas + 1)).astype(int)]
+    ref = np.where(np.isin(accion, ["checkin", "cancelacion"]), ref, np.arange(n))
+    lote_i = lote_i[ref]
+    usuario = usuario[ref]
+    booking = np.where(np.isin(accion, ["reserva", "checkin", "cancelacion"]), booking[ref], "")
+    slot_start = slot_start[ref]
+    slot_end = slot_end[ref]
+
+    cap = caps[lote_i]
+    exito = np.where(es_res, rng.random(n) > 0.05, True).astype(int)
+    cols = {
+        "event_id": [f"e{i:010d}" for i in range(n)],
+        "timestamp": _iso(ts, "us"),
+        "user_email": usuario,
+        "accion": accion,
+        "motivo": np.where(np.isin(accion, ["reserva", "lista_espera"]), rng.choice(MOTIVOS, n), ""),
+        "lot_id": nombres[lote_i],
+        "spot_id": "",
+        "booking_id": booking,
+        "success": exito,
+        "free_spots_after": np.maximum(cap - rng.integers(0, cap + 1), 0),
+        "capacity": cap,
+        "source": "ui",
+        "app_version": "v2",
+        "error_code": np.where(accion == "lista_espera", rng.choice(["TRASLAPE", "SIN_CUPO"], n), ""),
+        "slot_start": _iso(slot_start, "s"),
+        "slot_end": _iso(slot_end, "s"),
+    }
+    df = pd.DataFrame(cols, columns=EVENT_HEADERS)
+
+    if cerrar_vencidas:
+        # Como haría expirar_vencidas: expiracion/no_show en slot_end de reservas ya terminadas
+        ahora = pd.Timestamp.now(tz="UTC")
+        bid = pd.Series(booking)
+        cancel = bid.isin(booking[accion == "cancelacion"]).to_numpy()
+        con_checkin = bid.isin(booking[accion == "checkin"]).to_numpy()
+        venc = es_res & (exito == 1) & ~cancel & (slot_end < ahora)
+        cierre = df[venc].copy()
+        cierre["event_id"] = [f"x{i:010d}" for i in range(int(venc.sum()))]
+        cierre["timestamp"] = _iso(slot_end[venc], "us")
+        cierre["accion"] = np.where(con_checkin[venc], "expiracion", "no_show")
+        cierre["source"] = "system"
+        cierre["free_spots_after"] = 0
+        orden_ts = np.concatenate([ts.values, slot_end[venc].tz_convert(None).values])
+        df = pd.concat([df, cierre], ignore_index=True).iloc[np.argsort(orden_ts, kind="stable")]
+
+    df.to_csv(ruta, index=False)
+    return df
@@ -0,0 +1,184 @@
+# importar_reservas.py — Importación masiva de reservas (exámenes, charlas, eventos).
+# Valida todas las solicitudes de un CSV contra la ocupación actual y entre sí,
+# y arma las filas de evento para escribirlas en un solo append agrupado.
+
+import uuid
+from datetime import datetime, timezone, tzinfo
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+_NS_MIN = 60 * 10**9
+
+# Nombres aceptados para cada columna del CSV de solicitudes
+COLUMNAS_IMPORTACION = {
+    "user_email": ["user_email", "user", "email", "usuario"],
+    "lot_id": ["lot_id", "lot", "lote", "parqueo"],
+    "slot_start": ["slot_start", "start", "inicio"],
+    "slot_end": ["slot_end", "end", "fin"],
+    "motivo": ["motivo", "reason"],
+}
+
+ACEPTADA  = "aceptada"
+RECHAZADA = "rechazada"
+
+# Días hacia adelante que se aceptan: acota el arreglo por minuto de validar_solicitudes
+# (un año mal escrito, p. ej. 2125, pediría gigabytes)
+HORIZONTE_DIAS = 366
+
+
+def leer_solicitudes(archivo, tz_local: Optional[tzinfo] = None) -> pd.DataFrame:
+    """
+    Lee el CSV (ruta o buffer) y normaliza columnas a user_email, lot_id,
+    slot_start, slot_end, motivo. Horas sin zona se toman en `tz_local` (UTC si no se da).
+    """
+    crudo = pd.read_csv(archivo, dtype=str).fillna("")
+    cols = {c.strip().lower(): c for c in crudo.columns}
+    df = pd.DataFrame(index=crudo.index)
+    for destino, alias in COLUMNAS_IMPORTACION.items():
+        origen = next((cols[a] for a in alias if a in cols), None)
+        df[destino] = crudo[origen].str.strip() if origen is not None else ""
+    for c in ["slot_start", "slot_end"]:
+        df[c] = _a_utc(df[c], tz_local)
+    return df
+
+
+def _a_utc(serie: pd.Series, tz_local: Optional[tzinfo]) -> pd.Series:
+    # Cada valor puede venir con o sin zona: se parsean por separado y se unen en UTC
+    con_zona = serie.str.contains(r"(?:Z|[+-]\d{2}:?\d{2})$", regex=True)
+    out = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns, UTC]")
+    if con_zona.any():
+        out[con_zona] = pd.to_datetime(serie[con_zona], errors="coerce", utc=True, format="mixed")
+    if (~con_zona).any():
+        naive = pd.to_datetime(serie[~con_zona], errors="coerce", format="mixed")
+        out[~con_zona] = naive.dt.tz_localize(tz_local or timezone.utc, ambiguous="NaT", nonexistent="NaT").dt.tz_convert("UTC")
+    return out
+
+
+def _minutos(serie: pd.Series, hacia_arriba: bool) -> np.ndarray:
+    ns = serie.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[ns]").astype(np.int64)
+    return -(-ns // _NS_MIN) if hacia_arriba else ns // _NS_MIN
+
+
+def validar_solicitudes(solicitudes: pd.DataFrame, vivas: pd.DataFrame,
+                        lotes: Sequence[Tuple[str, int]], ahora: datetime,
+                        max_simultaneas: Optional[int] = None,
+                        horizonte_dias: int = HORIZONTE_DIAS) -> pd.DataFrame:
+    """
+    Reporte por fila (estado, error_code) de las solicitudes frente a las
+    reservas vivas y entre sí. La ocupación actual de cada lote se arma una
+    vez por minuto con un arreglo de diferencias. Las solicitudes válidas que no
+    se traslapan con otra del archivo en su lote se deciden todas juntas contra
+    ese arreglo; las que sí, en el orden del archivo sobre el mismo arreglo (una
+    suma y un máximo sobre un tramo por solicitud, sin releer el log). Las que
+    terminan más de `horizonte_dias` después de `ahora` se rechazan con FECHA_INVALIDA.
+    """
+    rep = solicitudes.reset_index(drop=True).copy()
+    rep.insert(0, "fila", np.arange(2, len(rep) + 2))   # fila del CSV (encabezado = 1)
+    rep["estado"] = RECHAZADA
+    rep["error_code"] = ""
+    rep["free_spots_after"] = 0
+    rep["capacity"] = 0
+
+    nombres = [str(l[0]) for l in lotes]
+    pos = {n: i for i, n in enumerate(nombres)}
+    caps = np.array([int(l[1]) for l in lotes], dtype=np.int64)
+    limite = caps if max_simultaneas is None else np.minimum(caps, max_simultaneas)
+
+    lote_i = rep["lot_id"].map(pos)
+    errores = [
+        ("SIN_USUARIO", rep["user_email"] == ""),
+        ("LOTE_DESCONOCIDO", lote_i.isna()),
+        ("FECHA_INVALIDA", rep["slot_start"].isna() | rep["slot_end"].isna()),
+        ("HORARIO_INVALIDO", ~(rep["slot_end"] > rep["slot_start"])),
+        ("EN_PASADO", rep["slot_start"] < ahora),
+        ("FECHA_INVALIDA", rep["slot_end"] > pd.Timestamp(ahora) + pd.Timedelta(days=horizonte_dias)),
+    ]
+    for codigo, m in reversed(errores):   # queda el primer error de la lista
+        rep.loc[m.fillna(True).to_numpy(), "error_code"] = codigo
+    validas = np.flatnonzero((rep["error_code"] == "").to_numpy())
+    if len(validas) == 0:
+        return rep
+    rep.loc[validas, "capacity"] = caps[lote_i.to_numpy()[validas].astype(int)]
+
+    sub = rep.iloc[validas]
+    li = lote_i.to_numpy()[validas].astype(np.int64)
+    a = _minutos(sub["slot_start"], False)
+    b = _minutos(sub["slot_end"], True)
+    base, ancho = int(a.min()), int(b.max() - a.min())
+
+    # Ocupación actual por minuto en el horizonte de las solicitudes (vectorizado)
+    occ = np.zeros((len(nombres), ancho + 1), dtype=np.int64)
+    v = vivas[vivas["lot_id"].isin(pos) & vivas["slot_start"].notna() & vivas["slot_end"].notna()]
+    if not v.empty:
+        va = np.clip(_minutos(v["slot_start"], False) - base, 0, ancho)
+        vb = np.clip(_minutos(v["slot_end"], True) - base, 0, ancho)
+        dentro = vb > va
+        vl = v["lot_id"].map(pos).to_numpy(dtype=np.int64)[dentro]
+        np.add.at(occ, (vl, va[dentro]), 1)
+        np.add.at(occ, (vl, vb[dentro]), -1)
+        occ = np.cumsum(occ, axis=1)
+
+    # Tramos en el arreglo aplanado, ordenados por lote e inicio
+    i, f = a - base, b - base
+    orden = np.lexsort((i, li))
+    ini_o, fin_o = (li * occ.shape[1] + i)[orden], (li * occ.shape[1] + f)[orden]
+
+    # Máximo de la ocupación actual en cada tramo, de una vez: reduceat sobre los
+    # pares (inicio, fin); en orden, los huecos entre un tramo y el siguiente no se repiten
+    pico = np.empty(len(validas), dtype=np.int64)
+    pico[orden] = np.maximum.reduceat(occ.ravel(), np.column_stack([ini_o, fin_o]).ravel())[::2]
+
+    # Solicitudes del mismo lote que se traslapan entre sí: un grupo empieza donde
+    # el inicio alcanza el fin máximo de las anteriores
+    fin_prev = np.concatenate([[-1], np.maximum.accumulate(fin_o)[:-1]])
+    grupo = np.empty(len(validas), dtype=np.int64)
+    grupo[orden] = np.cumsum(ini_o >= fin_prev)
+    sola = np.bincount(grupo)[grupo] == 1
+
+    # Una solicitud sin traslapes en el archivo solo depende de la ocupación actual
+    cabe = pico < limite[li]
+    estado = np.where(cabe, ACEPTADA, RECHAZADA).astype(object)
+    codigo = np.where(cabe, "", np.where(limite[li] < caps[li], "TRASLAPE", "SIN_CUPO")).astype(object)
+    libres = np.where(cabe, caps[li] - pico - 1, 0)
+
+    # Las que se traslapan se asignan en orden del archivo: cada aceptada ocupa su tramo para las siguientes
+    resto = np.flatnonzero(~sola)
+    for k, l, s, e in zip(resto, li[resto], i[resto], f[resto]):
+        tramo = occ[l, s:e]
+        p = int(tramo.max())
+        if p < limite[l]:
+            tramo += 1
+            estado[k], codigo[k] = ACEPTADA, ""
+            libres[k] = caps[l] - p - 1
+        else:
+            estado[k], libres[k] = RECHAZADA, 0
+            codigo[k] = "TRASLAPE" if limite[l] < caps[l] else "SIN_CUPO"
+    rep.loc[validas, "estado"] = estado
+    rep.loc[validas, "error_code"] = codigo
+    rep.loc[validas, "free_spots_after"] = np.maximum(libres, 0)
+    return rep
+
+
+def filas_evento(aceptadas: pd.DataFrame, origen: str = "bulk", version: str = "v2") -> List[Dict]:
+    """Filas de evento `reserva` (mismo formato que registrar_evento) para un append agrupado."""
+    ahora = datetime.now(timezone.utc).isoformat()
+    return [{
+        "event_id": str(uuid.uuid4()),
+        "timestamp": ahora,
+        "user_email": r.user_email,
+        "accion": "reserva",
+        "motivo": r.motivo,
+        "lot_id": r.lot_id,
+        "spot_id": "",
+        "booking_id": str(uuid.uuid4()),
+        "success": "1",
+        "free_spots_after": str(int(r.free_spots_after)),
+        "capacity": str(int(r.capacity)),
+        "source": origen,
+        "app_version": version,
+        "error_code": "",
+        "slot_start": r.slot_start.to_pydatetime().isoformat(),
+        "slot_end": r.slot_end.to_pydatetime().isoformat(),
+    } for r in aceptadas.itertuples(index=False)]
@@ -0,0 +1,84 @@
+# indice_usuarios.py — Índice por usuario de sus reservas y su estado.
+# Check-in y Cancelar solo necesitan las pocas reservas del usuario en sesión;
+# este índice se alimenta con las filas nuevas del log (solo agregado) y evita
+# recorrer el DataFrame completo en cada clic.
+
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+
+COLUMNAS = ["booking_id", "lot_id", "motivo", "slot_start", "slot_end", "capacity",
+            "free_spots_after", "cancelada", "checkin", "cerrada"]
+
+
+class IndiceUsuarios:
+    """email → {booking_id → datos de la reserva + estado (cancelada, checkin, cerrada)}."""
+
+    def __init__(self):
+        self._por_usuario: Dict[str, Dict[str, Dict]] = {}
+        self._duenos: Dict[str, str] = {}      # booking_id → email
+        self._pendientes: Dict[str, Dict] = {}  # estados vistos antes que su reserva
+        self.filas_vistas = 0
+        self._lock = threading.Lock()
+
+    def sincronizar(self, df: pd.DataFrame) -> int:
+        """Procesa solo las filas nuevas; un DataFrame más corto (versión vieja) se ignora."""
+        with self._lock:
+            if len(df) <= self.filas_vistas:
+                return 0
+            nuevas = df.iloc[self.filas_vistas:]
+            self.filas_vistas = len(df)
+            rel = nuevas[(nuevas["success"] == 1) & (nuevas["booking_id"] != "")]
+            cols = ["accion", "booking_id", "user_email", "lot_id", "motivo", "slot_start", "slot_end",
+                    "capacity", "free_spots_after"]
+            for r in rel[cols].itertuples(index=False):
+                if r.accion == "reserva":
+                    datos = {"booking_id": r.booking_id, "lot_id": r.lot_id, "motivo": r.motivo,
+                             "slot_start": r.slot_start, "slot_end": r.slot_end, "capacity": r.capacity,
+                             "free_spots_after": r.free_spots_after,
+                             "cancelada": False, "checkin": False, "cerrada": False}
+                    datos.update(self._pendientes.pop(r.booking_id, {}))
+                    self._por_usuario.setdefault(r.user_email, {})[r.booking_id] = datos
+                    self._duenos[r.booking_id] = r.user_email
+                    continue
+                campo = {"cancelacion": "cancelada", "checkin": "checkin", "expiracion": "cerrada",
+                         "no_show": "cerrada", "cierrejornada": "cerrada"}.get(r.accion)
+                if campo is None:
+                    continue
+                dueno = self._duenos.get(r.booking_id)
+                if dueno is None:
+                    self._pendientes.setdefault(r.booking_id, {})[campo] = True
+                else:
+                    self._por_usuario[dueno][r.booking_id][campo] = True
+            return len(nuevas)
+
+    def reservas(self, email: str) -> pd.DataFrame:
+        """Todas las reservas exitosas del usuario con su estado (solo sus filas)."""
+        with self._lock:
+            filas = [dict(d) for d in self._por_usuario.get(email, {}).values()]
+        return pd.DataFrame(filas, columns=COLUMNAS)
+
+    def activas(self, email: str, ahora: datetime) -> pd.DataFrame:
+        """Igual que reservas_activas(df, ahora) filtrado por el usuario."""
+        r = self.reservas(email)
+        if r.empty:
+            return r
+        return r[~r["cancelada"] & (pd.to_datetime(r["slot_end"], utc=True) >= ahora)]
+
+    def tiene_checkin(self, booking_id: str) -> bool:
+        with self._lock:
+            dueno = self._duenos.get(booking_id)
+            return bool(dueno and self._por_usuario[dueno][booking_id]["checkin"])
+
+    def ultima_activa(self, email: str, lot_id: str) -> Optional[str]:
+        """Reserva no cancelada del usuario en el lote con el slot_start más tardío (como ultima_reserva_activa)."""
+        with self._lock:
+            vivas = [d for d in self._por_usuario.get(email, {}).values()
+                     if d["lot_id"] == lot_id and not d["cancelada"]]
+        if not vivas:
+            return None
+        # sort_values deja los NaT al final, así que ganaban como "última"
+        return max(vivas, key=lambda d: (pd.isna(d["slot_start"]),
+                                         d["slot_start"] if not pd.isna(d["slot_start"]) else pd.Timestamp.min.tz_localize("UTC")))["booking_id"]
@@ -0,0 +1,13 @@
+# Arranca el escritor único de Eventos.csv.
+# Uso: python lanzar_servicio_eventos.py [unix:/tmp/parqueos.sock | tcp:127.0.0.1:8765] [siempre|intervalo|nunca]
+# Las réplicas lo usan exportando PARQUEOS_SERVICIO_EVENTOS con la misma dirección.
+# Con PARQUEOS_METRICAS_ARCHIVO / PARQUEOS_METRICAS_PUERTO exporta sus métricas (lock, commits).
+import sys
+from metricas_operacion import exportador_desde_entorno
+from servicio_eventos import EscritorEventos, crear_servidor, FSYNC_INTERVALO
+
+direccion = sys.argv[1] if len(sys.argv) > 1 else "tcp:127.0.0.1:8765"
+politica = sys.argv[2] if len(sys.argv) > 2 else FSYNC_INTERVALO
+exportador = exportador_desde_entorno()
+servidor = crear_servidor(direccion, EscritorEventos("Eventos.csv", politica_fsync=politica))
+servidor.serve_forever()
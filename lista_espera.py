@@ -0,0 +1,203 @@
+# lista_espera.py — Cola de espera con promoción automática.
+# Una cola de prioridad (heap por hora de solicitud) por (lote, ventana pedida).
+# Las rutas que liberan cupo (cancelación, expiración, no-show) consultan las
+# ventanas que se traslapan con lo liberado y promueven al primero compatible;
+# la promoción se escribe como un evento `reserva` normal (source "waitlist").
+# Una solicitud se da por atendida cuando aparece una reserva exitosa del mismo
+# usuario, lote y ventana, así que el estado se reconstruye solo desde el log.
+# Si esa reserva se cancela o vence, la misma ventana se puede volver a pedir.
+# Una ventana que ya empezó sigue en la cola hasta su fin: si se libera cupo
+# (p. ej. una cancelación) recibe lo que queda de ella, de `ahora` a su fin.
+# El estado es de cada proceso: quien promueve debe hacerlo bajo un lock común
+# y con el log al día, o dos réplicas podrían promover a la misma persona.
+
+import bisect
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Acciones que terminan una reserva (la ventana deja de estar atendida)
+CIERRES = ("cancelacion", "expiracion", "no_show", "cierrejornada")
+
+
+def _ns(ts) -> int:
+    return pd.Timestamp(ts).tz_convert("UTC").value
+
+
+class ListaEspera:
+    """
+    Solicitudes pendientes indexadas por lote. Para cada lote se guardan las
+    ventanas ordenadas por inicio (búsqueda binaria de las que traslapan un
+    rango liberado) y, por ventana, un heap (hora de solicitud, secuencia).
+    Las solicitudes atendidas o vencidas se descartan de forma perezosa.
+    """
+
+    def __init__(self):
+        self._colas: Dict[Tuple[str, int, int], List[Tuple[int, int, Dict]]] = {}
+        self._ventanas: Dict[str, List[Tuple[int, int]]] = {}   # lote -> [(ini, fin)] ordenado
+        self._atendidas: set = set()                            # (email, lote, ini, fin) con reserva vigente
+        self._en_cola: Dict[Tuple, Dict] = {}                   # misma clave -> solicitud vigente (sin duplicados)
+        self._reservas: Dict[str, Tuple] = {}                   # booking_id -> clave de su reserva vigente
+        self._duracion_max = 0
+        self._seq = itertools.count()
+        self.filas_vistas = 0
+        self._lock = threading.RLock()
+
+    # ---------- Construcción ----------
+    def sincronizar(self, df: pd.DataFrame) -> int:
+        """Procesa solo las filas nuevas del log (solicitudes y reservas que las atienden)."""
+        with self._lock:
+            if len(df) <= self.filas_vistas:
+                return 0
+            nuevas = df.iloc[self.filas_vistas:]
+            self.filas_vistas = len(df)
+            con_slot = nuevas["slot_start"].notna() & nuevas["slot_end"].notna()
+            ok = (nuevas["success"] == 1) & (
+                (con_slot & nuevas["accion"].isin(["lista_espera", "reserva"])) | nuevas["accion"].isin(CIERRES))
+            for r in nuevas[ok].itertuples(index=False):
+                if r.accion in CIERRES:
+                    # Las cancelaciones no traen slot: la ventana sale del booking_id
+                    self._atendidas.discard(self._reservas.pop(r.booking_id, None))
+                    continue
+                clave = (r.user_email, r.lot_id, _ns(r.slot_start), _ns(r.slot_end))
+                if r.accion == "reserva" and r.source == "waitlist":
+                    clave = self._ventana_promovida(clave)
+                if r.accion == "reserva":
+                    self._atendidas.add(clave)
+                    self._en_cola.pop(clave, None)
+                    if r.booking_id:
+                        self._reservas[r.booking_id] = clave
+                elif clave not in self._atendidas:
+                    self.agregar({
+                        "user_email": r.user_email, "motivo": r.motivo, "lot_id": r.lot_id,
+                        "slot_start": r.slot_start, "slot_end": r.slot_end,
+                        "solicitada": r.timestamp, "codigo": r.error_code,
+                    })
+            return len(nuevas)
+
+    def agregar(self, entrada: Dict) -> None:
+        with self._lock:
+            ini, fin = _ns(entrada["slot_start"]), _ns(entrada["slot_end"])
+            clave = (entrada["lot_id"], ini, fin)
+            persona = (entrada["user_email"], entrada["lot_id"], ini, fin)
+            if persona in self._en_cola:
+                return
+            self._en_cola[persona] = entrada
+            cola = self._colas.get(clave)
+            if cola is None:
+                cola = self._colas[clave] = []
+                bisect.insort(self._ventanas.setdefault(entrada["lot_id"], []), (ini, fin))
+                self._duracion_max = max(self._duracion_max, fin - ini)
+            solicitada = entrada.get("solicitada")
+            orden = _ns(solicitada) if solicitada is not None and not pd.isna(solicitada) else 0
+            heapq.heappush(cola, (orden, next(self._seq), entrada))
+
+    def _ventana_promovida(self, clave: Tuple) -> Tuple:
+        # Una promoción a una ventana ya empezada reserva solo su resto: atiende a la
+        # solicitud del mismo usuario y lote que termina igual y la contiene
+        if clave in self._en_cola:
+            return clave
+        email, lote, ini, fin = clave
+        ventanas = self._ventanas.get(lote, [])
+        lo = bisect.bisect_left(ventanas, (ini - self._duracion_max,))
+        hi = bisect.bisect_right(ventanas, (ini, fin))
+        for v_ini, v_fin in ventanas[lo:hi]:
+            if v_fin == fin and (email, lote, v_ini, v_fin) in self._en_cola:
+                return (email, lote, v_ini, v_fin)
+        return clave
+
+    # ---------- Consulta ----------
+    def _atendida(self, e: Dict) -> bool:
+        # Ya no es la solicitud vigente de su clave: atendida (o reemplazada al volver a pedirla)
+        return self._en_cola.get((e["user_email"], e["lot_id"], _ns(e["slot_start"]), _ns(e["slot_end"]))) is not e
+
+    def _cabeza(self, clave: Tuple[str, int, int]) -> Optional[Tuple[int, int, Dict]]:
+        cola = self._colas.get(clave)
+        while cola and self._atendida(cola[0][2]):
+            heapq.heappop(cola)
+        if not cola:
+            self._quitar_ventana(clave)
+            return None
+        return cola[0]
+
+    def _quitar_ventana(self, clave: Tuple[str, int, int]) -> None:
+        lote, ini, fin = clave
+        for _, _, e in self._colas.pop(clave, []):
+            persona = (e["user_email"], lote, ini, fin)
+            if self._en_cola.get(persona) is e:
+                del self._en_cola[persona]
+        ventanas = self._ventanas.get(lote, [])
+        i = bisect.bisect_left(ventanas, (ini, fin))
+        if i < len(ventanas) and ventanas[i] == (ini, fin):
+            ventanas.pop(i)
+
+    def candidatas(self, lote: str, ini: datetime, fin: datetime, ahora: datetime) -> List[Tuple[int, int, Dict, Tuple]]:
+        """Cabezas de las ventanas del lote que traslapan [ini, fin) y aún no terminan, por hora de solicitud."""
+        a, b, t = _ns(ini), _ns(fin), _ns(ahora)
+        with self._lock:
+            ventanas = self._ventanas.get(lote, [])
+            # Solo pueden traslapar ventanas que empiezan en (a - duración máxima, b)
+            lo = bisect.bisect_right(ventanas, (a - self._duracion_max, b))
+            hi = bisect.bisect_left(ventanas, (b, b))
+            heads = []
+            for v_ini, v_fin in list(ventanas[lo:hi]):
+                clave = (lote, v_ini, v_fin)
+                if v_fin <= t:
+                    self._quitar_ventana(clave)   # ya terminó: no queda nada que asignar
+                    continue
+                if v_fin <= a:
+                    continue
+                cab = self._cabeza(clave)
+                if cab is not None:
+                    heads.append(cab + (clave,))
+            heads.sort(key=lambda h: (h[0], h[1]))
+            return heads
+
+    def promover(self, lote: str, ini: datetime, fin: datetime, ahora: datetime,
+                 compatible: Callable[[Dict], bool], asignar: Callable[[Dict], bool]) -> List[Dict]:
+        """
+        Asigna lo liberado en [ini, fin) del lote: toma la solicitud más antigua
+        entre las ventanas que traslapan; si `compatible` la acepta, `asignar`
+        escribe la reserva (de una ventana ya empezada, solo de `ahora` a su fin).
+        Se repite mientras quede alguien compatible.
+        """
+        promovidas: List[Dict] = []
+        with self._lock:
+            descartadas = set()
+            while True:
+                heads = [h for h in self.candidatas(lote, ini, fin, ahora) if h[3] not in descartadas]
+                if not heads:
+                    break
+                _, _, entrada, clave = heads[0]
+                if not compatible(entrada):
+                    # Toda la ventana comparte la misma restricción: se pasa a la siguiente
+                    descartadas.add(clave)
+                    continue
+                if not asignar(entrada):
+                    break
+                # Queda atendida; la cabeza se descarta de forma perezosa en la próxima consulta
+                persona = (entrada["user_email"], lote, clave[1], clave[2])
+                self._atendidas.add(persona)
+                self._en_cola.pop(persona, None)
+                promovidas.append(entrada)
+        return promovidas
+
+    def pendientes(self, ahora: Optional[datetime] = None) -> pd.DataFrame:
+        """Solicitudes vigentes con su posición en la cola de su ventana."""
+        t = _ns(ahora) if ahora is not None else None
+        filas = []
+        with self._lock:
+            for (lote, ini, fin), cola in list(self._colas.items()):
+                if t is not None and fin <= t:
+                    continue
+                vivas = sorted(x for x in cola if not self._atendida(x[2]))
+                for pos, (_, _, e) in enumerate(vivas, start=1):
+                    filas.append({"lot_id": lote, "slot_start": e["slot_start"], "slot_end": e["slot_end"],
+                                  "posicion": pos, "user_email": e["user_email"], "motivo": e["motivo"],
+                                  "solicitada": e["solicitada"], "codigo": e["codigo"]})
+        return pd.DataFrame(filas, columns=["lot_id", "slot_start", "slot_end", "posicion", "user_email",
+                                            "motivo", "solicitada", "codigo"])
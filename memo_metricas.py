@@ -0,0 +1,122 @@
+# memo_metricas.py — Memoización de métricas por (versión del log, filtros normalizados).
+# Una sola instancia por proceso (st.cache_resource) la comparten todas las
+# sesiones: el mismo filtro sobre la misma versión de Eventos.csv se calcula
+# una vez. Límite de entradas y de bytes con desalojo LRU; estadísticas de
+# aciertos/fallos para el panel de administración.
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+MAX_ENTRADAS = 128
+MAX_BYTES    = 64 * 2**20
+
+
+def tamano_bytes(obj, _prof: int = 0) -> int:
+    """Tamaño aproximado en memoria de un resultado (DataFrame, Series, arreglos, dicts...)."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        uso = obj.memory_usage(index=True, deep=True)
+        return int(uso.sum()) if isinstance(uso, pd.Series) else int(uso)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if _prof < 4 and isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(tamano_bytes(v, _prof + 1) for v in obj.values())
+    if _prof < 4 and isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(tamano_bytes(v, _prof + 1) for v in obj)
+    return sys.getsizeof(obj)
+
+
+def version_archivo(ruta: str) -> Tuple[int, int]:
+    """(mtime_ns, tamaño) del archivo; (0, 0) si no existe."""
+    try:
+        s = os.stat(ruta)
+        return (s.st_mtime_ns, s.st_size)
+    except FileNotFoundError:
+        return (0, 0)
+
+
+def normalizar_filtros(f_ini: Optional[date], f_fin: Optional[date],
+                       motivos: Iterable[str] = (), lotes: Iterable[str] = ()) -> Tuple:
+    """Misma tupla para filtros equivalentes (el orden y los repetidos de la selección no importan)."""
+    return (
+        f_ini.isoformat() if isinstance(f_ini, date) else None,
+        f_fin.isoformat() if isinstance(f_fin, date) else None,
+        tuple(sorted(set(motivos))),
+        tuple(sorted(set(lotes))),
+    )
+
+
+class MemoLRU:
+    """
+    Diccionario LRU acotado por entradas y por bytes. `obtener(clave, calcular)`
+    devuelve el valor guardado o lo calcula (fuera del lock) y lo guarda.
+    El primer elemento de la clave se usa como "tipo" en las estadísticas.
+    Los valores se comparten entre sesiones: tratarlos como de solo lectura.
+    """
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS, max_bytes: int = MAX_BYTES):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos: "OrderedDict[Hashable, Tuple[object, int]]" = OrderedDict()
+        self.bytes = 0
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _contar(self, clave: Hashable, campo: str) -> None:
+        tipo = str(clave[0]) if isinstance(clave, tuple) and clave else "-"
+        st = self._stats.setdefault(tipo, {"aciertos": 0, "fallos": 0, "desalojos": 0, "omitidos": 0})
+        st[campo] += 1
+
+    def obtener(self, clave: Hashable, calcular: Callable[[], object]) -> object:
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is not None:
+                self._datos.move_to_end(clave)
+                self._contar(clave, "aciertos")
+                return item[0]
+            self._contar(clave, "fallos")
+
+        valor = calcular()
+        tam = tamano_bytes(valor)
+        with self._lock:
+            if tam > self.max_bytes:
+                self._contar(clave, "omitidos")   # más grande que todo el presupuesto
+                return valor
+            previo = self._datos.pop(clave, None)
+            if previo is not None:
+                self.bytes -= previo[1]
+            self._datos[clave] = (valor, tam)
+            self.bytes += tam
+            while len(self._datos) > self.max_entradas or self.bytes > self.max_bytes:
+                viejo, (_, t) = self._datos.popitem(last=False)
+                self.bytes -= t
+                self._contar(viejo, "desalojos")
+        return valor
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+
+    def estadisticas(self) -> pd.DataFrame:
+        """Una fila por tipo de resultado: aciertos, fallos, tasa de acierto, desalojos."""
+        with self._lock:
+            filas = [dict(tipo=t, **v) for t, v in self._stats.items()]
+        df = pd.DataFrame(filas, columns=["tipo", "aciertos", "fallos", "desalojos", "omitidos"])
+        total = df["aciertos"] + df["fallos"]
+        # astype: sin filas (caché recién creada) las columnas quedan como object
+        df["tasa_acierto_%"] = (df["aciertos"] / total.where(total > 0) * 100).astype(float).round(1)
+        return df
+
+    def resumen(self) -> str:
+        with self._lock:
+            n, b = len(self._datos), self.bytes
+        return f"{n}/{self.max_entradas} entradas · {b / 2**20:.1f}/{self.max_bytes / 2**20:.0f} MB"
@@ -0,0 +1,298 @@
+# metricas_operacion.py — Registro en proceso de métricas operativas (contadores,
+# medidores e histogramas con etiquetas) y su exportación en formato de texto de
+# Prometheus: a un archivo .prom (reescrito de forma atómica cada N segundos, para
+# el textfile collector de node_exporter) y/o en http://127.0.0.1:<puerto>/metrics.
+# Lo alimentan registrar_evento, acquire_lock/release_lock, expirar_vencidas y la
+# ruta de Reservar; el registro es uno por proceso (compartido entre sesiones).
+#
+# Configuración por variables de entorno (como PARQUEOS_SERVICIO_EVENTOS):
+#   PARQUEOS_METRICAS_ARCHIVO    ruta del .prom       (sin definir = no se escribe)
+#   PARQUEOS_METRICAS_INTERVALO  segundos entre escrituras (por defecto 15)
+#   PARQUEOS_METRICAS_PUERTO     puerto HTTP local    (sin definir = sin endpoint)
+
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+ENV_ARCHIVO = "PARQUEOS_METRICAS_ARCHIVO"
+ENV_INTERVALO = "PARQUEOS_METRICAS_INTERVALO"
+ENV_PUERTO = "PARQUEOS_METRICAS_PUERTO"
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+
+def _etiquetas(valores: Dict[str, object]) -> Etiquetas:
+    return tuple(sorted((k, str(v)) for k, v in valores.items()))
+
+
+def _escapar(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formato_etiquetas(et: Etiquetas, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pares = list(et) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _numero(x: float) -> str:
+    if math.isinf(x):
+        return "+Inf" if x > 0 else "-Inf"
+    return repr(float(x)) if not float(x).is_integer() else str(int(x))
+
+
+class _Metrica(ABC):
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self._lock = threading.Lock()
+
+    def lineas(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"] + self._muestras()
+
+    @abstractmethod
+    def _muestras(self) -> List[str]:
+        """Líneas de muestra (sin HELP/TYPE) en formato de texto de Prometheus."""
+
+
+class Contador(_Metrica):
+    """Valor que solo crece (eventos escritos, rechazos, timeouts...)."""
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str):
+        super().__init__(nombre, ayuda)
+        self._valores: Dict[Etiquetas, float] = {}
+
+    def inc(self, n: float = 1, **etiquetas) -> None:
+        clave = _etiquetas(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + n
+
+    def valor(self, **etiquetas) -> float:
+        with self._lock:
+            return self._valores.get(_etiquetas(etiquetas), 0)
+
+    def _muestras(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._valores.items())
+        return [f"{self.nombre}{_formato_etiquetas(et)} {_numero(v)}" for et, v in items]
+
+
+class Medidor(Contador):
+    """Valor que sube y baja (pendientes de expirar, lock retenido)."""
+    tipo = "gauge"
+
+    def fijar(self, v: float, **etiquetas) -> None:
+        with self._lock:
+            self._valores[_etiquetas(etiquetas)] = v
+
+
+class Histograma(_Metrica):
+    """Distribución en buckets acumulados (latencias), más suma y conteo."""
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, buckets: Sequence[float] = BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Etiquetas, List[float]] = {}   # conteos por bucket + [suma, total]
+
+    def observar(self, v: float, **etiquetas) -> None:
+        clave = _etiquetas(etiquetas)
+        with self._lock:
+            s = self._series.get(clave)
+            if s is None:
+                s = self._series[clave] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if v <= b:
+                    s[i] += 1
+                    break
+            s[-2] += v
+            s[-1] += 1
+
+    def _muestras(self) -> List[str]:
+        with self._lock:
+            items = sorted((et, list(s)) for et, s in self._series.items())
+        out = []
+        for et, s in items:
+            acum = 0.0
+            for b, c in zip(self.buckets, s):
+                acum += c
+                out.append(f"{self.nombre}_bucket{_formato_etiquetas(et, [('le', _numero(b))])} {_numero(acum)}")
+            out.append(f"{self.nombre}_bucket{_formato_etiquetas(et, [('le', '+Inf')])} {_numero(s[-1])}")
+            out.append(f"{self.nombre}_sum{_formato_etiquetas(et)} {_numero(s[-2])}")
+            out.append(f"{self.nombre}_count{_formato_etiquetas(et)} {_numero(s[-1])}")
+        return out
+
+
+class Registro:
+    """Métricas por nombre; pedir dos veces la misma retorna la misma instancia."""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def _obtener(self, clase, nombre: str, ayuda: str, **kw) -> _Metrica:
+        with self._lock:
+            m = self._metricas.get(nombre)
+            if m is None:
+                m = self._metricas[nombre] = clase(nombre, ayuda, **kw)
+            return m
+
+    def contador(self, nombre: str, ayuda: str) -> Contador:
+        return self._obtener(Contador, nombre, ayuda)
+
+    def medidor(self, nombre: str, ayuda: str) -> Medidor:
+        return self._obtener(Medidor, nombre, ayuda)
+
+    def histograma(self, nombre: str, ayuda: str, buckets: Sequence[float] = BUCKETS_SEGUNDOS) -> Histograma:
+        return self._obtener(Histograma, nombre, ayuda, buckets=buckets)
+
+    def texto_prometheus(self) -> str:
+        with self._lock:
+            metricas = [self._metricas[n] for n in sorted(self._metricas)]
+        lineas: List[str] = []
+        for m in metricas:
+            lineas.extend(m.lineas())
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = Registro()
+
+# ---------- Métricas de la ruta de reservas ----------
+EVENTOS_REGISTRADOS = REGISTRO.contador(
+    "parqueos_eventos_registrados_total", "Eventos agregados a Eventos.csv por registrar_evento.")
+EVENTOS_FALLIDOS = REGISTRO.contador(
+    "parqueos_eventos_fallidos_total", "Eventos que el escritor no confirmó, por error (clase del error o sin_confirmar).")
+REGISTRAR_SEGUNDOS = REGISTRO.histograma(
+    "parqueos_registrar_evento_segundos", "Latencia de registrar_evento hasta el commit.")
+RESERVAS = REGISTRO.contador(
+    "parqueos_reservas_total", "Solicitudes de reserva por resultado (reserva, TRASLAPE, SIN_CUPO) y origen.")
+RESERVA_SEGUNDOS = REGISTRO.histograma(
+    "parqueos_reserva_segundos", "Latencia de procesar_reserva (reglas + escritura).")
+LOCK_ESPERA_SEGUNDOS = REGISTRO.histograma(
+    "parqueos_lock_espera_segundos", "Espera en acquire_lock por lockfile y resultado (ok, timeout).")
+LOCK_TIMEOUTS = REGISTRO.contador(
+    "parqueos_lock_timeouts_total", "acquire_lock que agotaron su tiempo, por lockfile.")
+LOCK_RETENIDO = REGISTRO.medidor(
+    "parqueos_lock_retenido", "1 mientras este proceso retiene el lockfile (etiqueta lock).")
+LOCK_RETENCION_SEGUNDOS = REGISTRO.histograma(
+    "parqueos_lock_retencion_segundos", "Tiempo entre acquire_lock y release_lock, por lockfile.")
+EXPIRACION_PENDIENTES = REGISTRO.medidor(
+    "parqueos_expiracion_pendientes", "Reservas vencidas sin cerrar en la última pasada de expirar_vencidas.")
+EXPIRADAS = REGISTRO.contador(
+    "parqueos_expiradas_total", "Reservas cerradas por expirar_vencidas (expiracion, no_show).")
+EXPIRAR_SEGUNDOS = REGISTRO.histograma(
+    "parqueos_expirar_segundos", "Duración de cada pasada de expirar_vencidas.")
+PROMOCIONES_POSPUESTAS = REGISTRO.contador(
+    "parqueos_promociones_pospuestas_total", "Liberaciones que no consiguieron el lock de la lista de espera y quedaron en cola.")
+PROMOCIONES_PENDIENTES = REGISTRO.medidor(
+    "parqueos_promociones_pendientes", "Liberaciones en cola para promover la lista de espera en la próxima pasada.")
+
+
+class cronometro:
+    """`with cronometro(HISTOGRAMA, etiqueta=...)`: observa la duración del bloque."""
+
+    def __init__(self, histograma: Histograma, **etiquetas):
+        self.histograma = histograma
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self._t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histograma.observar(time.perf_counter() - self._t, **self.etiquetas)
+
+
+# ---------- Exportación ----------
+def escribir_archivo(ruta: str, registro: Registro = REGISTRO) -> None:
+    """Reescribe `ruta` de forma atómica (el lector nunca ve un archivo a medias)."""
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registro.texto_prometheus())
+    os.replace(tmp, ruta)
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        cuerpo = self.server.registro.texto_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class Exportador:
+    """Hilos de exportación: archivo periódico y/o endpoint HTTP solo en localhost."""
+
+    def __init__(self, registro: Registro = REGISTRO, archivo: Optional[str] = None,
+                 intervalo: float = 15.0, puerto: Optional[int] = None):
+        self.registro = registro
+        self.archivo = archivo
+        self.intervalo = intervalo
+        self.puerto = puerto
+        self.error: Optional[str] = None
+        self._parar = threading.Event()
+        self._servidor: Optional[ThreadingHTTPServer] = None
+        if archivo:
+            threading.Thread(target=self._bucle_archivo, name="metricas-archivo", daemon=True).start()
+        if puerto:
+            try:
+                self._servidor = ThreadingHTTPServer(("127.0.0.1", int(puerto)), _ManejadorMetricas)
+            except OSError as e:
+                # Otra réplica en el mismo equipo ya tiene el puerto: se sigue sin endpoint
+                self.error = f"No se pudo abrir 127.0.0.1:{puerto}: {e}"
+            else:
+                self._servidor.daemon_threads = True
+                self._servidor.registro = registro
+                threading.Thread(target=self._servidor.serve_forever, name="metricas-http", daemon=True).start()
+
+    def _bucle_archivo(self) -> None:
+        while not self._parar.is_set():
+            try:
+                escribir_archivo(self.archivo, self.registro)
+                self.error = None
+            except OSError as e:
+                self.error = f"No se pudo escribir {self.archivo}: {e}"
+            self._parar.wait(self.intervalo)
+
+    def destinos(self) -> List[str]:
+        out = []
+        if self.archivo:
+            out.append(self.archivo)
+        if self._servidor is not None:
+            out.append(f"http://127.0.0.1:{self._servidor.server_address[1]}/metrics")
+        return out
+
+    def cerrar(self) -> None:
+        self._parar.set()
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+
+
+def exportador_desde_entorno(registro: Registro = REGISTRO) -> Exportador:
+    """Exportador configurado con PARQUEOS_METRICAS_*; sin variables no exporta nada."""
+    puerto = os.environ.get(ENV_PUERTO)
+    return Exportador(
+        registro,
+        archivo=os.environ.get(ENV_ARCHIVO) or None,
+        intervalo=float(os.environ.get(ENV_INTERVALO) or 15.0),
+        puerto=int(puerto) if puerto else None,
+    )
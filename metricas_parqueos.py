@@ -0,0 +1,165 @@
+# metricas_parqueos.py — Preparación, filtros y los 10 indicadores del análisis.
+# Compartido por CF3.py (Streamlit) y las herramientas de línea de comandos,
+# que no pueden importar CF3.py porque este ejecuta la app al cargarse.
+
+import pandas as pd
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from ocupacion_ponderada import ocupacion_ponderada
+from sketch_cuantiles import MEDIDAS, percentiles_tiempos
+from sketch_topk import usuarios_con_mas_reservas
+
+# ------------------------- CARGA Y PREPARACIÓN -------------------------
+
+def preparar_eventos(df_eventos: pd.DataFrame) -> pd.DataFrame:
+    """Convierte tipos y agrega fecha/hora a un DataFrame de eventos leído como texto."""
+    # Tipos y columnas derivadas
+    if "timestamp" in df_eventos.columns:
+        df_eventos["timestamp"] = pd.to_datetime(df_eventos["timestamp"], errors="coerce", utc=True)
+        df_eventos["fecha"] = df_eventos["timestamp"].dt.date
+        df_eventos["hora"] = df_eventos["timestamp"].dt.hour
+    else:
+        df_eventos["fecha"] = pd.NaT
+        df_eventos["hora"] = pd.NA
+
+    for col in ["slot_start", "slot_end"]:
+        if col in df_eventos.columns:
+            df_eventos[col] = pd.to_datetime(df_eventos[col], errors="coerce", utc=True)
+
+    for col in ["success", "free_spots_after", "capacity"]:
+        if col in df_eventos.columns:
+            df_eventos[col] = pd.to_numeric(df_eventos[col], errors="coerce")
+
+    for col in ["accion", "motivo", "lot_id"]:
+        if col in df_eventos.columns:
+            df_eventos[col] = df_eventos[col].fillna("").str.strip()
+
+    return df_eventos
+
+
+def mascara_filtros(df: pd.DataFrame,
+                    f_ini: Optional[date],
+                    f_fin: Optional[date],
+                    motivos: List[str],
+                    lotes: List[str]) -> pd.Series:
+    """Máscara booleana de rango de fechas, motivos y lotes."""
+    mask = pd.Series(True, index=df.index)
+    if f_ini:
+        mask &= df["fecha"] >= f_ini
+    if f_fin:
+        mask &= df["fecha"] <= f_fin
+    if motivos:
+        mask &= df["motivo"].str.lower().isin([m.lower() for m in motivos])
+    if lotes:
+        mask &= df["lot_id"].isin(lotes)
+    return mask
+
+
+def aplicar_filtros(df: pd.DataFrame,
+                    f_ini: Optional[date],
+                    f_fin: Optional[date],
+                    motivos: List[str],
+                    lotes: List[str]) -> pd.DataFrame:
+    """Filtra por rango de fechas, motivos y lotes (una sola máscara, una sola selección)."""
+    mask = mascara_filtros(df, f_ini, f_fin, motivos, lotes)
+    return df if mask.all() else df[mask]
+
+
+def reservas_en_rango(df: pd.DataFrame,
+                      f_ini: Optional[date],
+                      f_fin: Optional[date],
+                      motivos: List[str],
+                      lotes: List[str]) -> pd.DataFrame:
+    """Reservas cuyo slot toca los días [f_ini, f_fin] (UTC), aunque se hayan hecho antes, con filtros de motivo y lote."""
+    mask = (df["accion"] == "reserva") & mascara_filtros(df, None, None, motivos, lotes)
+    if f_ini:
+        mask &= df["slot_end"] > pd.Timestamp(f_ini, tz="UTC")
+    if f_fin:
+        mask &= df["slot_start"] < pd.Timestamp(f_fin, tz="UTC") + pd.Timedelta(days=1)
+    return df[mask]
+
+
+def ocupacion_rango(df: pd.DataFrame,
+                    f_ini: Optional[date],
+                    f_fin: Optional[date],
+                    motivos: List[str],
+                    lotes: List[str],
+                    capacidades: Optional[Dict[str, int]] = None,
+                    canceladas: Optional[Iterable[str]] = None) -> Dict[str, object]:
+    """
+    Ocupación ponderada de los días [f_ini, f_fin] como la calcula la app: sobre
+    las reservas de `df` que solapan el rango (reservas_en_rango), con la
+    capacidad solo de los lotes seleccionados y las cancelaciones de todo `df`.
+    """
+    if capacidades is not None and lotes:
+        capacidades = {l: c for l, c in capacidades.items() if l in lotes}
+    if canceladas is None:
+        canceladas = df.loc[(df["accion"] == "cancelacion") & (df["success"] == 1), "booking_id"]
+    desde = datetime.combine(f_ini, time(0), tzinfo=timezone.utc) if f_ini else None
+    hasta = datetime.combine(f_fin + timedelta(days=1), time(0), tzinfo=timezone.utc) if f_fin else None
+    return ocupacion_ponderada(reservas_en_rango(df, f_ini, f_fin, motivos, lotes),
+                               capacidades=capacidades, canceladas=canceladas, desde=desde, hasta=hasta)
+
+
+# ------------------------- ANÁLISIS (10) -------------------------
+
+def calcular_metricas(df: pd.DataFrame,
+                      capacidades: Optional[Dict[str, int]] = None,
+                      canceladas: Optional[List[str]] = None,
+                      tiempos: Optional[pd.DataFrame] = None,
+                      ocupacion: Optional[Dict[str, object]] = None,
+                      usuarios: Optional[pd.Series] = None) -> Dict[str, object]:
+    """
+    Devuelve 10 indicadores/series para usar en tarjetas y gráficos.
+    `capacidades` (lote → capacidad) y `canceladas` (booking_id del log completo)
+    afinan la ocupación cuando `df` ya viene filtrado. `ocupacion` es la del
+    rango ya calculada (ocupacion_rango); sin ella se calcula sobre `df`.
+    `tiempos` es el resumen de percentiles de los sketches compartidos
+    (CuantilesDiarios.resumen); sin él se calcula sobre `df`, que con filtro de
+    motivo ya no trae los check-ins (su motivo es el de la reserva).
+    `usuarios` es el top 10 de los sketches Space-Saving compartidos
+    (TopKDiario.combinado(...).serie); sin él se arma el mismo sketch sobre `df`.
+    """
+    resultados: Dict[str, object] = {}
+
+    acciones = df["accion"].value_counts(dropna=False) if "accion" in df.columns else pd.Series(dtype=int)
+    reservas = df[df["accion"] == "reserva"] if "accion" in df.columns else pd.DataFrame()
+
+    total_reservas = int(len(reservas))
+    tasa_exito = float(round(reservas["success"].mean() * 100, 2)) if "success" in reservas.columns and len(reservas) else 0.0
+
+    motivos = reservas["motivo"].value_counts() if "motivo" in reservas.columns else pd.Series(dtype=int)
+    horas = df["hora"].value_counts().sort_index() if "hora" in df.columns else pd.Series(dtype=int)
+    reservas_por_dia = reservas.groupby("fecha").size() if "fecha" in reservas.columns and len(reservas) else pd.Series(dtype=int)
+    reservas_por_lote = reservas["lot_id"].value_counts() if "lot_id" in reservas.columns else pd.Series(dtype=int)
+
+    # Ocupación ponderada por tiempo (slot_start/slot_end), no promedio sobre eventos
+    occ = ocupacion_ponderada(df, capacidades=capacidades, canceladas=canceladas) if ocupacion is None else ocupacion
+    ocupacion_prom = float(round(occ["global"], 2))
+    ocupacion_por_lote = occ["por_lote"]["media"]
+
+    top_usuarios = usuarios_con_mas_reservas(df) if usuarios is None else usuarios
+
+    resultados["acciones"] = acciones
+    resultados["total_reservas"] = total_reservas
+    resultados["tasa_exito"] = tasa_exito
+    resultados["motivos"] = motivos
+    resultados["horas"] = horas
+    resultados["reservas_por_dia"] = reservas_por_dia
+    resultados["reservas_por_lote"] = reservas_por_lote
+    resultados["ocupacion_prom"] = ocupacion_prom
+    resultados["ocupacion_por_lote"] = ocupacion_por_lote
+    resultados["ocupacion_pico_por_lote"] = occ["por_lote"]["pico"]
+    resultados["ocupacion_p90_por_lote"] = occ["por_lote"]["p90"]
+    resultados["ocupacion_por_dia"] = occ["serie_dia"]
+    resultados["ocupacion_por_hora"] = occ["serie_hora"]
+    resultados["top_usuarios"] = top_usuarios
+
+    # Percentiles (min) de anticipación, duración y retraso de check-in
+    tiempos = percentiles_tiempos(df) if tiempos is None else tiempos
+    resultados["percentiles_tiempos"] = tiempos
+    for medida in MEDIDAS:
+        resultados[f"{medida}_min"] = tiempos.loc[medida].drop("n")
+
+    return resultados
@@ -0,0 +1,170 @@
+# ocupacion_ponderada.py — Ocupación ponderada por tiempo a partir de slot_start/slot_end.
+# Promediar `1 - free_spots_after/capacity` sobre eventos sobrepesa los momentos
+# con mucha actividad e ignora cuánto dura cada reserva. Aquí se arma la curva
+# de ocupación de cada lote (barrido de inicios y fines, O(n log n)) y se
+# integra en el tiempo: media, pico y percentiles por lote, día y hora (UTC).
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+PERCENTILES = (50, 90, 95)
+_NS_HORA = 3600 * 10**9
+
+
+def _ns(serie: pd.Series) -> np.ndarray:
+    if not pd.api.types.is_datetime64_any_dtype(serie):
+        serie = pd.to_datetime(serie, errors="coerce", utc=True)
+    elif serie.dt.tz is None:
+        serie = serie.dt.tz_localize("UTC")
+    return serie.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[ns]").astype(np.int64)
+
+
+def reservas_vivas(df: pd.DataFrame, canceladas: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Reservas exitosas sin cancelación exitosa, con slot_start/slot_end válidos.
+    `canceladas` permite pasar los booking_id cancelados del log completo
+    cuando `df` ya viene filtrado (las cancelaciones pueden quedar fuera del filtro).
+    """
+    if df.empty or not {"accion", "success", "lot_id", "slot_start", "slot_end"}.issubset(df.columns):
+        return pd.DataFrame(columns=["lot_id", "booking_id", "ini", "fin", "capacity"])
+    ok = df["success"] == 1
+    if canceladas is None:
+        canceladas = df.loc[ok & (df["accion"] == "cancelacion"), "booking_id"]
+    res = df[ok & (df["accion"] == "reserva") & ~df["booking_id"].isin(canceladas)]
+    out = pd.DataFrame({
+        "lot_id": res["lot_id"].to_numpy(),
+        "booking_id": res["booking_id"].to_numpy(),
+        "ini": _ns(res["slot_start"]),
+        "fin": _ns(res["slot_end"]),
+        "capacity": pd.to_numeric(res["capacity"], errors="coerce").to_numpy() if "capacity" in res.columns else np.nan,
+    })
+    nat = np.iinfo(np.int64).min
+    return out[(out["ini"] != nat) & (out["fin"] != nat) & (out["fin"] > out["ini"])]
+
+
+def curvas_ocupacion(reservas: pd.DataFrame) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Función escalón por lote: (instantes, ocupados desde cada instante).
+    Un solo ordenamiento de todos los +1/-1 por (lote, instante, signo): los
+    fines van antes que los inicios simultáneos y el cumsum vuelve a 0 entre lotes.
+    """
+    if reservas.empty:
+        return {}
+    codigos, nombres = pd.factorize(reservas["lot_id"])
+    t = np.concatenate([reservas["ini"].to_numpy(), reservas["fin"].to_numpy()])
+    signo = np.repeat(np.array([1, -1], dtype=np.int64), len(reservas))
+    lt = np.concatenate([codigos, codigos])
+    orden = np.lexsort((signo, t, lt))
+    t, lt, valor = t[orden], lt[orden], np.cumsum(signo[orden])
+    cortes = np.searchsorted(lt, np.arange(len(nombres) + 1))
+    curvas = {}
+    for i, nombre in enumerate(nombres):
+        a, b = cortes[i], cortes[i + 1]
+        # Cambios simultáneos: vale el último valor de cada instante
+        ultimo = np.r_[t[a + 1:b] != t[a:b - 1], True]
+        curvas[str(nombre)] = (t[a:b][ultimo], valor[a:b][ultimo])
+    return curvas
+
+
+def _percentiles_ponderados(valores: np.ndarray, pesos: np.ndarray, qs: Sequence[float]) -> np.ndarray:
+    orden = np.argsort(valores, kind="stable")
+    acum = np.cumsum(pesos[orden])
+    if len(acum) == 0 or acum[-1] <= 0:
+        return np.zeros(len(qs))
+    idx = np.searchsorted(acum, np.asarray(qs, dtype=float) / 100.0 * acum[-1], side="left")
+    return valores[orden][np.minimum(idx, len(orden) - 1)]
+
+
+def ocupacion_ponderada(df: pd.DataFrame,
+                        capacidades: Optional[Dict[str, int]] = None,
+                        canceladas: Optional[Iterable[str]] = None,
+                        desde: Optional[datetime] = None,
+                        hasta: Optional[datetime] = None,
+                        percentiles: Sequence[float] = PERCENTILES) -> Dict[str, object]:
+    """
+    Utilización (%) ponderada por tiempo en [desde, hasta); por defecto, los
+    días completos que cubren las reservas. Sin `capacidades` se usa la
+    columna `capacity` de las reservas; con ellas, los lotes sin reservas
+    cuentan con ocupación 0 (su capacidad sigue en el denominador). Retorna:
+      "global"     float — ocupados·tiempo / (capacidad·tiempo) de todos los lotes
+      "por_lote"   DataFrame (índice lot_id): media, pico y pXX
+      "por_dia"    DataFrame largo: fecha, lot_id, media, pico
+      "por_hora"   DataFrame largo: hora (0-23), lot_id, media, pico
+      "serie_dia" / "serie_hora"  Series globales (ponderadas por capacidad)
+    """
+    cols_p = [f"p{int(q)}" for q in percentiles]
+    vacio = {
+        "global": 0.0,
+        "por_lote": pd.DataFrame(columns=["media", "pico"] + cols_p, dtype=float),
+        "por_dia": pd.DataFrame(columns=["fecha", "lot_id", "media", "pico"]),
+        "por_hora": pd.DataFrame(columns=["hora", "lot_id", "media", "pico"]),
+        "serie_dia": pd.Series(dtype=float),
+        "serie_hora": pd.Series(dtype=float),
+    }
+    res = reservas_vivas(df, canceladas)
+    if res.empty and (desde is None or hasta is None):
+        return vacio
+    if capacidades is None:
+        capacidades = res.groupby("lot_id")["capacity"].max().dropna().astype(int).to_dict()
+
+    g0 = pd.Timestamp(desde).tz_convert("UTC").value if desde is not None else int(res["ini"].min()) // (24 * _NS_HORA) * (24 * _NS_HORA)
+    g1 = pd.Timestamp(hasta).tz_convert("UTC").value if hasta is not None else -(-int(res["fin"].max()) // (24 * _NS_HORA)) * (24 * _NS_HORA)
+    g0 = g0 // _NS_HORA * _NS_HORA
+    g1 = max(-(-g1 // _NS_HORA) * _NS_HORA, g0 + _NS_HORA)
+    rejilla = np.arange(g0, g1 + 1, _NS_HORA, dtype=np.int64)   # bordes de hora
+    nh = len(rejilla) - 1
+    horas_ts = pd.to_datetime(rejilla[:-1], utc=True)
+
+    curvas = curvas_ocupacion(res)
+    sin_reservas = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    filas_lote, filas_hora = [], []
+    for lote in dict.fromkeys([*capacidades, *curvas]):
+        cap = int(capacidades.get(lote) or 0)
+        if cap <= 0:
+            continue
+        t, v = curvas.get(lote, sin_reservas)
+        # Se agregan los bordes de hora como cortes: ningún tramo cruza de una hora a otra
+        puntos = np.union1d(t[(t > g0) & (t < g1)], rejilla)
+        k = np.searchsorted(t, puntos[:-1], side="right") - 1
+        val = np.where(k >= 0, v[np.maximum(k, 0)], 0).astype(float) if len(t) else np.zeros(len(puntos) - 1)
+        dur = np.diff(puntos).astype(float)
+        hora = (puntos[:-1] - g0) // _NS_HORA
+        media_h = np.bincount(hora, weights=val * dur, minlength=nh) / _NS_HORA
+        pico_h = np.zeros(nh)
+        np.maximum.at(pico_h, hora, val)
+
+        util = val / cap * 100
+        filas_lote.append(pd.Series(
+            [float(np.average(util, weights=dur)), float(util.max())] + list(_percentiles_ponderados(util, dur, percentiles)),
+            index=["media", "pico"] + cols_p, name=lote))
+        filas_hora.append(pd.DataFrame({"inicio": horas_ts, "lot_id": lote, "ocupados": media_h,
+                                        "pico": pico_h, "capacidad": cap}))
+
+    if not filas_lote:
+        return vacio
+    por_lote = pd.DataFrame(filas_lote).sort_values("media", ascending=False)
+    por_lote.index.name = "lot_id"
+    h = pd.concat(filas_hora, ignore_index=True)
+    h["fecha"] = h["inicio"].dt.date
+    h["hora"] = h["inicio"].dt.hour
+    h["media"] = h["ocupados"] / h["capacidad"] * 100
+    h["pico"] = h["pico"] / h["capacidad"] * 100
+
+    def _agrupar(clave: str) -> pd.DataFrame:
+        return h.groupby([clave, "lot_id"], sort=True).agg(media=("media", "mean"), pico=("pico", "max")).reset_index()
+
+    def _serie(clave: str) -> pd.Series:
+        g = h.groupby(clave)[["ocupados", "capacidad"]].sum()
+        return g["ocupados"] / g["capacidad"] * 100
+
+    return {
+        "global": float(h["ocupados"].sum() / h["capacidad"].sum() * 100),
+        "por_lote": por_lote,
+        "por_dia": _agrupar("fecha"),
+        "por_hora": _agrupar("hora"),
+        "serie_dia": _serie("fecha"),
+        "serie_hora": _serie("hora"),
+    }
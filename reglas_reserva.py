@@ -0,0 +1,286 @@
+# reglas_reserva.py — Lectura del log y reglas de reserva (traslape, cupo, check-in).
+# Viven fuera de app_streamlit.py (que ejecuta la interfaz al importarse) para
+# que las herramientas de carga y simulación usen exactamente las mismas reglas.
+
+import io
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cache_columnas import leer_csv_eventos
+from servicio_eventos import EVENT_HEADERS
+
+# Filas que ProyeccionEventos reserva como mínimo; al agotarse duplica la capacidad
+FILAS_INICIALES = 1024
+# El texto de la proyección se guarda en arreglos de objetos, que sí se escriben en sitio
+_TEXTO = pd.StringDtype("python", na_value=np.nan)
+
+def leer_eventos(ruta: str) -> pd.DataFrame:
+    if not os.path.exists(ruta):
+        return pd.DataFrame(columns=EVENT_HEADERS)
+
+    # Fechas ya parseadas desde la caché de columnas; to_datetime de abajo no las vuelve a parsear
+    return tipar_eventos(leer_csv_eventos(ruta))
+
+def tipar_eventos(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipos de la app (números, fechas UTC, fecha/hora, texto sin espacios) para eventos leídos como texto."""
+    for c in ["success", "free_spots_after", "capacity"]:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+
+    for c in ["timestamp", "slot_start", "slot_end"]:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], errors="coerce", utc=True)
+
+    if "timestamp" in df.columns:
+        df["fecha"] = df["timestamp"].dt.date
+        df["hora"] = df["timestamp"].dt.hour
+
+    for c in ["accion", "motivo", "lot_id", "user_email", "booking_id", "error_code"]:
+        if c in df.columns:
+            df[c] = df[c].fillna("").str.strip()
+
+    return df
+
+class ProyeccionEventos:
+    """
+    Eventos.csv tipado en memoria, al día con los avisos de commit del escritor
+    ({"offset_inicio", "offset_fin", "filas"}). Lo que no llegó por aviso (otro
+    proceso sin el servicio, o un aviso aún en camino) se lee de la cola del
+    archivo; solo se relee completo si el archivo fue reemplazado (archivado).
+
+    Cada lote nuevo se tipa solo y se escribe en sitio en arreglos por columna
+    con capacidad de sobra (se duplica al agotarse); `df` son vistas de las
+    primeras `_filas` filas, así que un lote no copia el log. `df` comparte
+    memoria con esos arreglos: quien lo usa no lo modifica en sitio.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.df: Optional[pd.DataFrame] = None
+        self._columnas: Dict[str, object] = {}
+        self._filas = 0
+        self._capacidad = 0
+        self._ino: Optional[int] = None
+        self._offset: Optional[int] = None     # bytes del CSV ya incorporados a `df`
+        self._avisos: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def recibir(self, aviso: Dict) -> None:
+        with self._lock:
+            self._avisos.append(aviso)
+
+    def _aplicar_avisos(self) -> List[Dict]:
+        filas: List[Dict] = []
+        for aviso in sorted(self._avisos, key=lambda a: a["offset_inicio"]):
+            if aviso["offset_fin"] <= self._offset:
+                continue                        # ya incorporado al leer el archivo
+            if aviso["offset_inicio"] != self._offset:
+                break                           # hueco: lo que falta sale del archivo
+            filas += aviso["filas"]
+            self._offset = aviso["offset_fin"]
+        self._avisos = [a for a in self._avisos if a["offset_fin"] > self._offset]
+        return filas
+
+    def _leer_cola(self, tamano: int) -> pd.DataFrame:
+        inicio = self._offset
+        with open(self.ruta, "rb") as f:
+            f.seek(inicio)
+            datos = f.read(tamano - inicio)
+        datos = datos[:datos.rfind(b"\n") + 1]   # sin una última línea a medio escribir
+        self._offset += len(datos)
+        if not datos:
+            return pd.DataFrame(columns=EVENT_HEADERS)
+        return pd.read_csv(io.BytesIO(datos), header=0 if inicio == 0 else None, names=EVENT_HEADERS, dtype=str)
+
+    def _cargar(self, df: pd.DataFrame) -> None:
+        self._capacidad = max(2 * len(df), FILAS_INICIALES)
+        self._columnas = {c: _reservar(df[c], self._capacidad) for c in df.columns}
+        self._filas = len(df)
+        self._publicar()
+
+    def _publicar(self) -> None:
+        # dtype explícito: sin él DataFrame() infiere (y copia) las columnas de objetos
+        indice = pd.RangeIndex(self._filas)
+        self.df = pd.DataFrame({c: pd.Series(a[:self._filas], index=indice, dtype=a.dtype, copy=False)
+                                for c, a in self._columnas.items()}, index=indice, copy=False)
+
+    def _anexar(self, lote: pd.DataFrame) -> None:
+        n, k = self._filas, len(lote)
+        if list(lote.columns) != list(self._columnas) or n + k > self._capacidad:
+            self._cargar(pd.concat([self.df, lote], ignore_index=True))
+            return
+        for c, a in self._columnas.items():
+            nuevos = lote[c]
+            if _cabe(a, nuevos.dtype):
+                a[n:n + k] = nuevos.to_numpy() if isinstance(a, np.ndarray) else nuevos.array
+            else:
+                # Tipo nuevo (p. ej. NaN en un entero): solo esa columna se copia
+                self._columnas[c] = _reservar(pd.concat([self.df[c], nuevos], ignore_index=True), self._capacidad)
+        self._filas = n + k
+        self._publicar()
+
+    def obtener(self) -> pd.DataFrame:
+        with self._lock:
+            try:
+                st = os.stat(self.ruta)
+            except FileNotFoundError:
+                return pd.DataFrame(columns=EVENT_HEADERS)
+            if self.df is not None and self._offset is not None and st.st_ino == self._ino and st.st_size >= self._offset:
+                nuevos = []
+                filas = self._aplicar_avisos()
+                if filas:
+                    avisado = pd.DataFrame(filas, columns=EVENT_HEADERS)
+                    nuevos.append(avisado.where(avisado != ""))    # vacíos como NaN, igual que read_csv
+                if st.st_size > self._offset:
+                    nuevos.append(self._leer_cola(st.st_size))
+                nuevos = [n for n in nuevos if not n.empty]
+                if nuevos:
+                    self._anexar(tipar_eventos(pd.concat(nuevos, ignore_index=True)))
+                return self.df
+
+            self._cargar(leer_eventos(self.ruta))
+            despues = os.stat(self.ruta)
+            # Si creció durante la lectura no se sabe hasta qué byte llegó: se relee la próxima vez
+            self._ino = st.st_ino
+            self._offset = st.st_size if (despues.st_ino, despues.st_size) == (st.st_ino, st.st_size) else None
+            self._avisos = [a for a in self._avisos if self._offset is not None and a["offset_fin"] > self._offset]
+            return self.df
+
+def _reservar(col: pd.Series, capacidad: int):
+    # Los valores de `col` en un arreglo de `capacidad` filas (el resto, sin usar).
+    # Texto en objetos (p. ej. error_code todo vacío) también pasa a _TEXTO, como cuando trae valores
+    if isinstance(col.dtype, pd.StringDtype) or (col.dtype == object and pd.api.types.infer_dtype(col) == "string"):
+        col = col.astype(_TEXTO)
+    if isinstance(col.dtype, np.dtype):
+        arr = np.empty(capacidad, dtype=col.dtype)
+        arr[:len(col)] = col.to_numpy()
+        return arr
+    pos = np.full(capacidad, -1)
+    pos[:len(col)] = np.arange(len(col))
+    return col.array.take(pos, allow_fill=True)
+
+def _cabe(arr, dtype) -> bool:
+    # ¿Se pueden escribir valores de `dtype` en `arr` sin cambiar su tipo?
+    if isinstance(arr, np.ndarray):
+        return arr.dtype == object or (isinstance(dtype, np.dtype) and np.can_cast(dtype, arr.dtype))
+    if isinstance(arr.dtype, (pd.StringDtype, pd.DatetimeTZDtype)):
+        return type(dtype) is type(arr.dtype)
+    return dtype == arr.dtype
+
+
+def fila_evento(
+    user_email: str, accion: str, motivo: str,
+    lot_id: str, booking_id: str,
+    exito: bool, libres_despues: int, capacidad: int,
+    slot_start: Optional[datetime] = None,
+    slot_end:   Optional[datetime] = None,
+    origen: str = "ui",
+    version: str = "v2",
+    codigo_error: str = ""
+) -> Dict:
+    return {
+        "event_id": str(uuid.uuid4()),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "user_email": user_email,
+        "accion": accion,
+        "motivo": motivo,
+        "lot_id": lot_id,
+        "spot_id": "",
+        "booking_id": booking_id,
+        "success": "1" if exito else "0",
+        "free_spots_after": str(libres_despues),
+        "capacity": str(capacidad),
+        "source": origen,
+        "app_version": version,
+        "error_code": codigo_error,
+        "slot_start": slot_start.isoformat() if slot_start else "",
+        "slot_end":   slot_end.isoformat()   if slot_end   else ""
+    }
+
+def overlap(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datetime) -> bool:
+    return (a_start < b_end) and (b_start < a_end)
+
+def mascara_reservas_vivas(df: pd.DataFrame) -> pd.Series:
+    # Reservas exitosas sin cancelación exitosa (máscara booleana, sin copiar filas)
+    ok_res = (df["accion"] == "reserva") & (df["success"] == 1)
+    ok_can = (df["accion"] == "cancelacion") & (df["success"] == 1)
+    return ok_res & (~df["booking_id"].isin(df.loc[ok_can, "booking_id"]))
+
+def reservas_activas(df: pd.DataFrame, ahora_utc: datetime) -> pd.DataFrame:
+    if df.empty:
+        return df
+    mask = mascara_reservas_vivas(df)
+    if "slot_end" in df.columns:
+        mask &= df["slot_end"] >= ahora_utc
+    return df[mask]
+
+def hay_traslape(df: pd.DataFrame, lot_id: str, start: datetime, end: datetime) -> bool:
+    if df.empty:
+        return False
+    mask = (df["lot_id"] == lot_id) & mascara_reservas_vivas(df)
+    # overlap() vectorizado; NaT compara como False igual que el dropna anterior
+    mask &= (df["slot_start"] < end) & (df["slot_end"] > start)
+    return bool(mask.any())
+
+def recalcular_ocupacion_desde_eventos(lotes: List[List], df: pd.DataFrame, instante: datetime) -> List[List]:
+    activos = reservas_activas(df, instante)
+    mapa = activos["lot_id"].astype(str).value_counts().to_dict() if not activos.empty else {}
+    actualizados: List[List] = []
+    for nombre, cap, _ in lotes:
+        ocup = mapa.get(nombre, 0)
+        actualizados.append([nombre, cap, min(ocup, cap)])
+    return actualizados
+
+def tiene_checkin(df: pd.DataFrame, booking_id: str) -> bool:
+    if df.empty or not booking_id:
+        return False
+    sel = (df["accion"] == "checkin") & (df["success"] == 1) & (df["booking_id"] == booking_id)
+    return bool(sel.any())
+
+def verificar_reserva(df: pd.DataFrame, lotes: List[List], lote_sel: str,
+                      start_dt: datetime, end_dt: datetime) -> Tuple[str, int, int]:
+    """Reglas de reserva sin escribir nada: ("reserva" | "TRASLAPE" | "SIN_CUPO", libres, capacidad)."""
+    if hay_traslape(df, lote_sel, start_dt, end_dt):
+        capacidad_lote = 0
+        for l in lotes:
+            if l[0] == lote_sel:
+                capacidad_lote = int(l[1])
+                break
+        return "TRASLAPE", 0, capacidad_lote
+
+    lotes_slot = recalcular_ocupacion_desde_eventos(lotes, df, start_dt)
+    lotemap = {l[0]: l for l in lotes_slot}
+    lote = lotemap.get(lote_sel)
+    libres = max(int(lote[1]) - int(lote[2]), 0) if lote else 0
+    capacidad_lote = int(lote[1]) if lote else 0
+    if libres <= 0:
+        return "SIN_CUPO", 0, capacidad_lote
+    return "reserva", libres, capacidad_lote
+
+def reservas_traslapadas(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pares de reservas vivas del mismo lote cuyos horarios se traslapan (lo que
+    hay_traslape debió impedir): doble asignación por reservas concurrentes.
+    """
+    cols = ["lot_id", "booking_a", "booking_b", "inicio_a", "fin_a", "inicio_b", "fin_b"]
+    if df.empty:
+        return pd.DataFrame(columns=cols)
+    vivas = df[mascara_reservas_vivas(df) & df["slot_start"].notna() & df["slot_end"].notna()]
+    vivas = vivas.sort_values(["lot_id", "slot_start"], kind="stable")
+    filas = []
+    for lote, g in vivas.groupby("lot_id", sort=False):
+        ini = g["slot_start"].to_numpy()
+        fin = g["slot_end"].to_numpy()
+        bid = g["booking_id"].to_numpy()
+        # Ordenadas por inicio: j traslapa a i si empieza antes de que i termine
+        for i in range(len(g)):
+            j = i + 1 + int(np.searchsorted(ini[i + 1:], fin[i], side="left"))
+            for k in range(i + 1, j):
+                filas.append([lote, bid[i], bid[k], ini[i], fin[i], ini[k], fin[k]])
+    return pd.DataFrame(filas, columns=cols)
@@ -0,0 +1,363 @@
+# reporte_diario.py — Paquete de reporte inmutable por día (UTC), generado al cerrar jornada.
+# Cada día cerrado queda en <Eventos>_reportes/AAAA-MM-DD/:
+#   metricas.json  los 10 indicadores + componentes sumables (conteos, horas
+#                  ocupadas / horas de capacidad, centroides de los t-digest de
+#                  tiempos) para combinar días sin el log
+#   reporte.html   con los gráficos embebidos (PNG en base64)
+#   tablas/*.csv   las tablas de los indicadores
+# Un reporte de varios días combina los metricas.json; solo los días sin paquete
+# (el de hoy, o si se filtra por motivo) se calculan desde los eventos.
+# La ocupación de un día es la de sus 24 h: cuenta las reservas hechas antes que
+# caen en el día y la capacidad de todos los lotes (también los que no tienen
+# reservas), así la combinación de días es exacta.
+
+import base64
+import io
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from archivo_eventos import bloques_en_rango, leer_archivados
+from ocupacion_ponderada import ocupacion_ponderada
+from reglas_reserva import tipar_eventos
+from sketch_cuantiles import MEDIDAS, NOMBRES_MEDIDAS, TDigest, medidas_de_eventos, tabla_cuantiles
+
+VERSION_PAQUETE = 1
+TOP_USUARIOS = 10
+
+
+def directorio_reportes(ruta_eventos: str) -> str:
+    base, _ = os.path.splitext(os.path.abspath(ruta_eventos))
+    return base + "_reportes"
+
+
+def ruta_paquete(ruta_eventos: str, dia: date) -> str:
+    return os.path.join(directorio_reportes(ruta_eventos), dia.isoformat())
+
+
+def dias_con_paquete(ruta_eventos: str) -> List[date]:
+    try:
+        nombres = os.listdir(directorio_reportes(ruta_eventos))
+    except FileNotFoundError:
+        return []
+    dias = []
+    for n in nombres:
+        try:
+            dias.append(date.fromisoformat(n))
+        except ValueError:
+            continue        # temporales de un paquete a medio escribir
+    return sorted(dias)
+
+
+# ------------------------- MÉTRICAS COMBINABLES -------------------------
+
+def _conteos(serie: pd.Series) -> Dict[str, int]:
+    return {str(k): int(v) for k, v in serie.value_counts().items()}
+
+
+def componentes_dia(df: pd.DataFrame, dia: date, capacidades: Dict[str, int],
+                    canceladas: Optional[Iterable[str]] = None) -> Dict[str, object]:
+    """
+    Componentes sumables de un día: conteos de los eventos con fecha == dia y
+    ocupación durante sus 24 h (reservas de `df` que se traslapan con el día).
+    """
+    del_dia = df[df["fecha"] == dia]
+    reservas = del_dia[del_dia["accion"] == "reserva"]
+    ini = pd.Timestamp(dia, tz="UTC")
+    fin = ini + pd.Timedelta(days=1)
+    solapan = df[(df["accion"] == "reserva") & (df["slot_start"] < fin) & (df["slot_end"] > ini)]
+    occ = ocupacion_ponderada(solapan, capacidades=capacidades, canceladas=canceladas,
+                              desde=ini.to_pydatetime(), hasta=fin.to_pydatetime())
+    por_lote = {}
+    for lote, fila in occ["por_lote"].iterrows():
+        cap_h = int(capacidades.get(lote) or 0) * 24
+        por_lote[str(lote)] = {"ocupados_h": float(fila["media"]) / 100 * cap_h, "capacidad_h": cap_h,
+                               "pico": float(fila["pico"])}
+    cap_total = sum(v["capacidad_h"] for v in por_lote.values()) / 24
+    tiempos = {}
+    for medida, grupo in medidas_de_eventos(del_dia).groupby("medida", sort=False):
+        td = TDigest()
+        td.agregar(grupo["minutos"].to_numpy())
+        tiempos[medida] = td.a_dict()
+    return {
+        "version": VERSION_PAQUETE,
+        "dias": [dia.isoformat()],
+        "eventos": int(len(del_dia)),
+        "acciones": _conteos(del_dia["accion"]),
+        "reservas": int(len(reservas)),
+        "reservas_exitosas": int((reservas["success"] == 1).sum()),
+        "motivos": _conteos(reservas["motivo"]),
+        "horas": {str(int(h)): int(n) for h, n in del_dia["hora"].dropna().value_counts().sort_index().items()},
+        "reservas_por_dia": {dia.isoformat(): int(len(reservas))} if len(reservas) else {},
+        "reservas_por_lote": _conteos(reservas["lot_id"]),
+        "usuarios": _conteos(reservas["user_email"]),
+        "ocupacion_por_lote": por_lote,
+        "ocupacion_por_hora": {str(int(h)): [float(v) / 100 * cap_total, cap_total]
+                               for h, v in occ["serie_hora"].items()},
+        "tiempos": tiempos,
+    }
+
+
+def combinar(partes: Iterable[Dict[str, object]]) -> Dict[str, object]:
+    """Suma componentes de varios días (mismo esquema que componentes_dia)."""
+    total: Dict[str, object] = {"version": VERSION_PAQUETE, "dias": [], "eventos": 0, "reservas": 0,
+                                "reservas_exitosas": 0}
+    digests: Dict[str, List[TDigest]] = {m: [] for m in MEDIDAS}
+    for p in partes:
+        total["dias"] += p["dias"]
+        for clave in ["eventos", "reservas", "reservas_exitosas"]:
+            total[clave] += p[clave]
+        for clave in ["acciones", "motivos", "horas", "reservas_por_dia", "reservas_por_lote", "usuarios"]:
+            dic = total.setdefault(clave, {})
+            for k, v in p[clave].items():
+                dic[k] = dic.get(k, 0) + v
+        lotes = total.setdefault("ocupacion_por_lote", {})
+        for lote, v in p["ocupacion_por_lote"].items():
+            acc = lotes.setdefault(lote, {"ocupados_h": 0.0, "capacidad_h": 0, "pico": 0.0})
+            acc["ocupados_h"] += v["ocupados_h"]
+            acc["capacidad_h"] += v["capacidad_h"]
+            acc["pico"] = max(acc["pico"], v["pico"])
+        horas = total.setdefault("ocupacion_por_hora", {})
+        for h, (ocupados, cap) in p["ocupacion_por_hora"].items():
+            acc = horas.setdefault(h, [0.0, 0.0])
+            acc[0] += ocupados
+            acc[1] += cap
+        for medida, datos in p["tiempos"].items():
+            digests[medida].append(TDigest.de_dict(datos))
+    total["dias"] = sorted(total["dias"])
+    total["tiempos"] = {m: TDigest.unir(tds).a_dict() for m, tds in digests.items() if tds}
+    return total
+
+
+def _serie(dic: Dict[str, float], indice=str, orden_por_valor: bool = True) -> pd.Series:
+    s = pd.Series({indice(k): v for k, v in dic.items()}, dtype=float if not dic else None)
+    return s.sort_values(ascending=False, kind="stable") if orden_por_valor else s.sort_index()
+
+
+def indicadores(comp: Dict[str, object]) -> Dict[str, object]:
+    """Los 10 indicadores (mismas claves que calcular_metricas) a partir de componentes."""
+    tiempos = tabla_cuantiles({m: TDigest.de_dict(d) for m, d in comp.get("tiempos", {}).items()})
+    lotes = comp.get("ocupacion_por_lote", {})
+    ocupados = sum(v["ocupados_h"] for v in lotes.values())
+    capacidad = sum(v["capacidad_h"] for v in lotes.values())
+    por_lote = pd.Series({k: v["ocupados_h"] / v["capacidad_h"] * 100 for k, v in lotes.items() if v["capacidad_h"]},
+                         dtype=float).sort_values(ascending=False)
+    horas = comp.get("ocupacion_por_hora", {})
+    return {
+        "acciones": _serie(comp.get("acciones", {})),
+        "total_reservas": comp["reservas"],
+        "tasa_exito": round(comp["reservas_exitosas"] / comp["reservas"] * 100, 2) if comp["reservas"] else 0.0,
+        "motivos": _serie(comp.get("motivos", {})),
+        "horas": _serie(comp.get("horas", {}), int, orden_por_valor=False),
+        "reservas_por_dia": _serie(comp.get("reservas_por_dia", {}), date.fromisoformat, orden_por_valor=False),
+        "reservas_por_lote": _serie(comp.get("reservas_por_lote", {})),
+        "ocupacion_prom": round(ocupados / capacidad * 100, 2) if capacidad else 0.0,
+        "ocupacion_por_lote": por_lote,
+        "ocupacion_pico_por_lote": pd.Series({k: v["pico"] for k, v in lotes.items()}, dtype=float).reindex(por_lote.index),
+        "ocupacion_por_hora": pd.Series({int(h): o / c * 100 for h, (o, c) in horas.items() if c}, dtype=float).sort_index(),
+        "top_usuarios": _serie(comp.get("usuarios", {})).head(TOP_USUARIOS),
+        "percentiles_tiempos": tiempos,
+        **{f"{m}_min": tiempos.loc[m].drop("n") for m in MEDIDAS},
+    }
+
+
+def _json_valor(v) -> object:
+    if pd.isna(v):
+        return None
+    return int(v) if float(v).is_integer() else round(float(v), 2)
+
+
+def _json_indicadores(res: Dict[str, object]) -> Dict[str, object]:
+    out: Dict[str, object] = {}
+    for k, x in res.items():
+        if isinstance(x, pd.DataFrame):
+            out[k] = {str(i): {str(c): _json_valor(v) for c, v in fila.items()} for i, fila in x.iterrows()}
+        elif isinstance(x, pd.Series):
+            out[k] = {str(i): _json_valor(v) for i, v in x.items()}
+        else:
+            out[k] = x
+    return out
+
+
+# ------------------------- HTML (escritura por partes) -------------------------
+
+_GRAFICOS = [
+    ("acciones", "Frecuencia de acciones", "bar"),
+    ("reservas_por_dia", "Reservas por día", "line"),
+    ("horas", "Eventos por hora (UTC)", "bar"),
+    ("reservas_por_lote", "Reservas por lote", "bar"),
+    ("ocupacion_por_hora", "Ocupación media por hora (%)", "line"),
+]
+
+_TABLAS = [
+    ("acciones", "1) Frecuencia de acciones", "eventos"),
+    ("motivos", "4) Motivos de reserva", "reservas"),
+    ("horas", "5) Eventos por hora (UTC)", "eventos"),
+    ("reservas_por_dia", "6) Reservas por día", "reservas"),
+    ("reservas_por_lote", "7) Reservas por lote", "reservas"),
+    ("ocupacion_por_lote", "9) Ocupación media por lote (%)", "media_%"),
+    ("top_usuarios", "10) Usuarios con más reservas", "reservas"),
+    ("percentiles_tiempos", "11) Tiempos (minutos)", None),    # ya es una tabla (n, p50, p90, p99)
+]
+
+
+def _png_base64(serie: pd.Series, titulo: str, tipo: str) -> str:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(6, 3.2))
+    if len(serie):
+        serie.plot(kind=tipo, ax=ax)
+    ax.set_title(titulo if len(serie) else f"{titulo} (sin datos)")
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=80)
+    plt.close(fig)
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def escribir_html(f, res: Dict[str, object], desde: date, hasta: date, dias_paquete: int = 0,
+                  dias_calculados: int = 0) -> None:
+    """Escribe el reporte en `f` (archivo de texto) sección por sección, sin armar el documento en memoria."""
+    f.write("<html><head><meta charset='utf-8'><title>Reporte Parqueos</title></head><body>\n")
+    f.write("<h1>Reporte de uso de parqueos</h1>\n")
+    f.write(f"<p>Rango de fechas (UTC): <b>{desde}</b> a <b>{hasta}</b>.")
+    if dias_paquete or dias_calculados:
+        f.write(f" Días de reportes cerrados: {dias_paquete}; calculados al momento: {dias_calculados}.")
+    f.write("</p>\n<h2>Resumen general</h2>\n<ul>\n")
+    f.write(f"<li>2) Total de reservas: <b>{res['total_reservas']}</b></li>\n")
+    f.write(f"<li>3) Tasa de éxito: <b>{res['tasa_exito']:.2f}%</b></li>\n")
+    f.write(f"<li>8) Ocupación promedio (ponderada por tiempo): <b>{res['ocupacion_prom']:.2f}%</b></li>\n")
+    if len(res["motivos"]):
+        f.write(f"<li>Motivo más frecuente: <b>{res['motivos'].index[0]}</b></li>\n")
+    if len(res["reservas_por_lote"]):
+        f.write(f"<li>Lote más utilizado: <b>{res['reservas_por_lote'].index[0]}</b></li>\n")
+    f.write("</ul>\n<h2>Gráficos</h2>\n")
+    for clave, titulo, tipo in _GRAFICOS:
+        f.write(f"<img alt='{titulo}' src='data:image/png;base64,{_png_base64(res[clave], titulo, tipo)}'/>\n")
+    for clave, titulo, columna in _TABLAS:
+        f.write(f"<h2>{titulo}</h2>\n")
+        if columna is None:
+            tabla = res[clave].rename(index=NOMBRES_MEDIDAS)
+        else:
+            tabla = res[clave].rename(columna).to_frame()
+        if clave == "ocupacion_por_lote":
+            tabla["pico_%"] = res["ocupacion_pico_por_lote"]
+        tabla.round(2).to_html(f, border=1)
+        f.write("\n")
+    f.write("<p>Este reporte fue generado automáticamente por el prototipo de gestión de parqueos UVG.</p>\n")
+    f.write("</body></html>\n")
+
+
+def html_bytes(res: Dict[str, object], desde: date, hasta: date, **kw) -> bytes:
+    buf = io.StringIO()
+    escribir_html(buf, res, desde, hasta, **kw)
+    return buf.getvalue().encode("utf-8")
+
+
+# ------------------------- PAQUETES POR DÍA -------------------------
+
+def escribir_paquete(ruta_eventos: str, df: pd.DataFrame, dia: date, capacidades: Dict[str, int],
+                     canceladas: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    Escribe el paquete de `dia` si no existe (los paquetes no se reescriben).
+    Se arma en un directorio temporal y se publica con un rename atómico.
+    Retorna la ruta, o None si ya existía.
+    """
+    destino = ruta_paquete(ruta_eventos, dia)
+    if os.path.isdir(destino):
+        return None
+    comp = componentes_dia(df, dia, capacidades, canceladas)
+    res = indicadores(comp)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(os.path.join(tmp, "tablas"))
+    with open(os.path.join(tmp, "metricas.json"), "w", encoding="utf-8") as f:
+        json.dump({"fecha": dia.isoformat(), "generado": datetime.now(timezone.utc).isoformat(),
+                   "indicadores": _json_indicadores(res), "componentes": comp}, f, ensure_ascii=False, indent=1)
+    with open(os.path.join(tmp, "reporte.html"), "w", encoding="utf-8") as f:
+        escribir_html(f, res, dia, dia)
+    for clave, _, columna in _TABLAS:
+        tabla = res[clave] if columna is None else res[clave].rename(columna)
+        tabla.to_csv(os.path.join(tmp, "tablas", f"{clave}.csv"), index_label="clave")
+    try:
+        os.rename(tmp, destino)
+    except OSError:             # otro proceso lo publicó primero
+        shutil.rmtree(tmp, ignore_errors=True)
+        return None
+    return destino
+
+
+def leer_componentes(ruta_eventos: str, dia: date) -> Optional[Dict[str, object]]:
+    try:
+        with open(os.path.join(ruta_paquete(ruta_eventos, dia), "metricas.json"), encoding="utf-8") as f:
+            datos = json.load(f)
+    except FileNotFoundError:
+        return None
+    comp = datos.get("componentes")
+    return comp if comp and comp.get("version") == VERSION_PAQUETE else None
+
+
+def cerrar_dias(ruta_eventos: str, df: pd.DataFrame, capacidades: Dict[str, int], hoy: Optional[date] = None,
+                max_dias: Optional[int] = None) -> List[date]:
+    """
+    Escribe los paquetes que falten de días ya terminados (UTC, < hoy) con eventos.
+    `df` son los eventos de Eventos.csv (tipados como reglas_reserva.leer_eventos);
+    los días del archivo frío y las reservas archivadas con slots en los días a
+    cerrar se leen de sus bloques. `max_dias` limita cuántos (los más recientes)
+    se generan en una llamada.
+    """
+    hoy = hoy or datetime.now(timezone.utc).date()
+    hechos = set(dias_con_paquete(ruta_eventos))
+    candidatos = set(df["fecha"].dropna().unique()) if not df.empty else set()
+    for b in bloques_en_rango(ruta_eventos):
+        dia = date.fromisoformat(b["desde"])
+        while dia <= date.fromisoformat(b["hasta"]):
+            candidatos.add(dia)
+            dia += timedelta(days=1)
+    pendientes = sorted(d for d in candidatos if d < hoy and d not in hechos)
+    if max_dias is not None:
+        pendientes = pendientes[-max_dias:]
+    if not pendientes:
+        return []
+    archivados = leer_archivados(ruta_eventos, pendientes[0], pendientes[-1], por_slot=True)
+    if not archivados.empty:
+        df = pd.concat([tipar_eventos(archivados), df], ignore_index=True)
+    con_eventos = set(df["fecha"].dropna().unique())
+    canceladas = df.loc[(df["accion"] == "cancelacion") & (df["success"] == 1), "booking_id"]
+    escritos = []
+    for dia in pendientes:
+        if dia in con_eventos and escribir_paquete(ruta_eventos, df, dia, capacidades, canceladas):
+            escritos.append(dia)
+    return escritos
+
+
+def reporte_rango(ruta_eventos: str, desde: date, hasta: date, df: Optional[pd.DataFrame] = None,
+                  capacidades: Optional[Dict[str, int]] = None, canceladas: Optional[Iterable[str]] = None,
+                  usar_paquetes: bool = True) -> Tuple[Dict[str, object], int, int]:
+    """
+    Indicadores de [desde, hasta] combinando paquetes; los días sin paquete dentro
+    del historial de `df` (si se pasa) se calculan desde él, también los que no
+    tienen eventos: su ocupación sale de reservas hechas antes. `df` debe traer
+    esas reservas (p. ej. leer_eventos_texto con por_slot=True).
+    Retorna (indicadores, días de paquete, días calculados).
+    """
+    partes, n_paq, n_calc = [], 0, 0
+    fechas = df["fecha"].dropna() if df is not None else pd.Series(dtype=object)
+    primero, ultimo = (fechas.min(), fechas.max()) if len(fechas) else (None, None)
+    dia = desde
+    while dia <= hasta:
+        comp = leer_componentes(ruta_eventos, dia) if usar_paquetes else None
+        if comp is not None:
+            partes.append(comp)
+            n_paq += 1
+        elif primero is not None and primero <= dia <= ultimo:
+            partes.append(componentes_dia(df, dia, capacidades or {}, canceladas))
+            n_calc += 1
+        dia += timedelta(days=1)
+    comp = combinar(partes)
+    return indicadores(comp), n_paq, n_calc
@@ -0,0 +1,48 @@
+# Paquetes de reporte diarios (reporte_diario.py) para correr como tarea programada.
+# Uso: python reportes_cli.py [Eventos.csv] [--parqueos Parqueos.csv] [--max-dias 30]
+#      python reportes_cli.py [Eventos.csv] --combinar 2025-11-01 2025-11-30 --salida noviembre.html
+#   sin --combinar   genera los paquetes que falten de los días (UTC) ya terminados
+#   --combinar       arma un reporte HTML del rango a partir de los paquetes (los
+#                    días sin paquete se calculan desde los eventos)
+import argparse, time
+from datetime import date
+
+from archivo_eventos import leer_eventos_texto
+from generar_eventos import leer_lotes
+from metricas_parqueos import preparar_eventos
+from reglas_reserva import leer_eventos
+from reporte_diario import cerrar_dias, directorio_reportes, html_bytes, reporte_rango
+
+def main():
+    parser = argparse.ArgumentParser(description="Reportes diarios inmutables de Eventos.csv")
+    parser.add_argument("eventos", nargs="?", default="Eventos.csv")
+    parser.add_argument("--parqueos", default="Parqueos.csv")
+    parser.add_argument("--max-dias", type=int, default=None, help="como máximo, los N días pendientes más recientes")
+    parser.add_argument("--combinar", nargs=2, type=date.fromisoformat, metavar=("DESDE", "HASTA"))
+    parser.add_argument("--salida", default="reporte_parqueos.html")
+    args = parser.parse_args()
+
+    capacidades = {l[0]: int(l[1]) for l in leer_lotes(args.parqueos)}
+    t = time.perf_counter()
+
+    if args.combinar:
+        desde, hasta = args.combinar
+        # Todo el CSV y los bloques archivados con reservas para el rango: los días sin
+        # paquete cuentan también lo reservado antes de `desde`
+        df = preparar_eventos(leer_eventos_texto(args.eventos, desde, hasta, por_slot=True))
+        canceladas = df.loc[(df["accion"] == "cancelacion") & (df["success"] == 1), "booking_id"]
+        res, n_paq, n_calc = reporte_rango(args.eventos, desde, hasta, df, capacidades, canceladas)
+        with open(args.salida, "wb") as f:
+            f.write(html_bytes(res, desde, hasta, dias_paquete=n_paq, dias_calculados=n_calc))
+        print(f"{desde} → {hasta}: {n_paq} días desde paquetes, {n_calc} calculados → {args.salida} "
+              f"({time.perf_counter() - t:.1f} s)")
+    else:
+        # Solo Eventos.csv: cerrar_dias lee del archivo frío los días y reservas que le faltan
+        dias = cerrar_dias(args.eventos, leer_eventos(args.eventos), capacidades, max_dias=args.max_dias)
+        print(f"{len(dias)} paquetes nuevos en {directorio_reportes(args.eventos)} ({time.perf_counter() - t:.1f} s)")
+        for d in dias:
+            print(f"  {d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+# servicio_eventos.py — Escritor único de Eventos.csv con commits agrupados.
+# Puede correr como proceso aparte (socket Unix o localhost) o dentro de cada
+# réplica de Streamlit como sustituto en proceso con la misma interfaz.
+
+import os, csv, io, json, stat, time, queue, socket, threading, socketserver
+from typing import List, Dict, Optional, Callable
+
+from metricas_operacion import (LOCK_ESPERA_SEGUNDOS, LOCK_RETENCION_SEGUNDOS, LOCK_RETENIDO,
+                                LOCK_TIMEOUTS)
+
+LOCK_FILE = ".parqueos.lock"
+
+# Variable de entorno con la dirección del servicio: "unix:/ruta.sock" o "tcp:127.0.0.1:8765".
+ENV_SERVICIO = "PARQUEOS_SERVICIO_EVENTOS"
+
+# Espera entre reconexiones de una suscripción del cliente: se duplica hasta el máximo
+RECONEXION_MIN_S = 0.5
+RECONEXION_MAX_S = 30.0
+
+# Políticas de fsync por commit agrupado
+FSYNC_SIEMPRE   = "siempre"    # fsync en cada commit
+FSYNC_INTERVALO = "intervalo"  # fsync como máximo cada `intervalo_fsync` segundos (y al quedar ocioso)
+FSYNC_NUNCA     = "nunca"      # se deja al sistema operativo
+
+EVENT_HEADERS = [
+    "event_id","timestamp","user_email","accion","motivo","lot_id","spot_id",
+    "booking_id","success","free_spots_after","capacity","source","app_version",
+    "error_code","slot_start","slot_end"
+]
+
+# ---------- Lockfile  ----------
+_retenidos: Dict[str, float] = {}   # lockfile -> perf_counter al adquirirlo
+
+def acquire_lock(path: str, timeout_sec: int = 4) -> bool:
+    inicio = time.time()
+    t = time.perf_counter()
+    lock = os.path.basename(path)
+    while time.time() - inicio <= timeout_sec:
+        try:
+            with open(path, "x"):
+                LOCK_ESPERA_SEGUNDOS.observar(time.perf_counter() - t, resultado="ok", lock=lock)
+                _retenidos[path] = time.perf_counter()
+                LOCK_RETENIDO.fijar(1, lock=lock)
+                return True
+        except FileExistsError:
+            time.sleep(0.08)
+    LOCK_ESPERA_SEGUNDOS.observar(time.perf_counter() - t, resultado="timeout", lock=lock)
+    LOCK_TIMEOUTS.inc(lock=lock)
+    return False
+
+def release_lock(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    lock = os.path.basename(path)
+    t = _retenidos.pop(path, None)
+    if t is not None:
+        LOCK_RETENCION_SEGUNDOS.observar(time.perf_counter() - t, lock=lock)
+    LOCK_RETENIDO.fijar(1 if any(os.path.basename(p) == lock for p in _retenidos) else 0, lock=lock)
+
+# ---------- Escritor con commit agrupado ----------
+class ErrorEscritura(OSError):
+    """El commit de un lote falló: sus filas no quedaron en Eventos.csv."""
+
+
+class _Ticket:
+    """Espera de un productor hasta que su lote quede confirmado en disco."""
+    def __init__(self, filas: List[Dict]):
+        self.filas = filas
+        self.listo = threading.Event()
+        self.offset: Optional[int] = None
+        self.error: Optional[BaseException] = None
+
+
+class _Suscripcion:
+    """Cola e hilo propios de un suscriptor: un callback lento atrasa solo sus avisos, no los commits."""
+    def __init__(self, callback: Callable[[Dict], None], al_fallar: Callable[[Callable], None]):
+        self.callback = callback
+        self._al_fallar = al_fallar
+        self._cola: "queue.SimpleQueue[Optional[Dict]]" = queue.SimpleQueue()
+        threading.Thread(target=self._bucle, name="aviso-eventos", daemon=True).start()
+
+    def avisar(self, aviso: Dict) -> None:
+        self._cola.put(aviso)
+
+    def detener(self) -> None:
+        self._cola.put(None)   # tras los avisos ya encolados
+
+    def _bucle(self) -> None:
+        while True:
+            aviso = self._cola.get()
+            if aviso is None:
+                return
+            try:
+                self.callback(aviso)
+            except Exception:
+                self._al_fallar(self.callback)
+                return
+
+
+class EscritorEventos:
+    """
+    Único escritor del log de eventos. Los `agregar` concurrentes se encolan y
+    un hilo los escribe juntos (group commit): una apertura, un flush y, según
+    la política, un fsync por lote. Tras cada commit se notifica a los
+    suscriptores con el rango de bytes [offset_inicio, offset_fin) confirmado;
+    cada suscriptor recibe sus avisos en orden desde su propio hilo.
+    """
+
+    def __init__(self, ruta: str, politica_fsync: str = FSYNC_INTERVALO,
+                 intervalo_fsync: float = 0.05, max_lote: int = 1024,
+                 lock_file: str = LOCK_FILE):
+        if politica_fsync not in (FSYNC_SIEMPRE, FSYNC_INTERVALO, FSYNC_NUNCA):
+            raise ValueError(f"Política de fsync desconocida: {politica_fsync}")
+        self.ruta = ruta
+        self.politica_fsync = politica_fsync
+        self.intervalo_fsync = intervalo_fsync
+        self.max_lote = max_lote
+        self.lock_file = lock_file
+        self.commits = 0
+        self.filas_escritas = 0
+        self._ultimo_fsync = 0.0
+        self._sin_fsync = False          # hubo commits escritos sin fsync (FSYNC_INTERVALO)
+        self._pendientes: List[_Ticket] = []
+        self._suscriptores: List[_Suscripcion] = []
+        self._cond = threading.Condition()
+        self._cerrado = False
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-eventos", daemon=True)
+        self._hilo.start()
+
+    def agregar(self, fila: Dict) -> Optional[int]:
+        return self.agregar_lote([fila])
+
+    def agregar_lote(self, filas: List[Dict]) -> Optional[int]:
+        """
+        Encola filas y bloquea hasta su commit. Retorna el offset final (None si
+        no hay filas o el escritor ya se cerró); si el commit falló, ErrorEscritura.
+        """
+        if not filas:
+            return None
+        ticket = _Ticket(filas)
+        with self._cond:
+            if self._cerrado:
+                return None
+            self._pendientes.append(ticket)
+            self._cond.notify()
+        ticket.listo.wait()
+        if ticket.error is not None:
+            raise ErrorEscritura(f"No se escribió el lote: {ticket.error}") from ticket.error
+        return ticket.offset
+
+    def suscribir(self, callback: Callable[[Dict], None]) -> None:
+        """`callback` recibe {"offset_inicio", "offset_fin", "filas"} tras cada commit."""
+        with self._cond:
+            self._suscriptores.append(_Suscripcion(callback, self.desuscribir))
+
+    def desuscribir(self, callback: Callable[[Dict], None]) -> None:
+        with self._cond:
+            for s in [s for s in self._suscriptores if s.callback == callback]:
+                self._suscriptores.remove(s)
+                s.detener()
+
+    def cerrar(self) -> None:
+        with self._cond:
+            self._cerrado = True
+            self._cond.notify()
+        self._hilo.join(timeout=5)
+        with self._cond:
+            suscriptores, self._suscriptores = self._suscriptores, []
+        for s in suscriptores:
+            s.detener()
+
+    def _espera_fsync(self) -> Optional[float]:
+        """Segundos hasta el fsync del último commit sin él (None si no hay ninguno pendiente)."""
+        if not self._sin_fsync:
+            return None
+        return max(0.0, self._ultimo_fsync + self.intervalo_fsync - time.monotonic())
+
+    def _fsync_pendiente(self) -> None:
+        # Con FSYNC_INTERVALO el último commit antes de un periodo sin escrituras
+        # quedaría sin fsync: se hace al vencer el intervalo con la cola vacía.
+        if not self._sin_fsync:
+            return
+        try:
+            fd = os.open(self.ruta, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+        self._sin_fsync = False
+        self._ultimo_fsync = time.monotonic()
+
+    def _bucle(self) -> None:
+        activo = True
+        while activo:
+            with self._cond:
+                while not self._pendientes and not self._cerrado and self._espera_fsync() != 0.0:
+                    self._cond.wait(self._espera_fsync())
+                # Cola vacía: fsync pendiente y, si se cerró, fin del hilo
+                activo = bool(self._pendientes) or not self._cerrado
+                lote: List[_Ticket] = []
+                n = 0
+                while self._pendientes and (not lote or n + len(self._pendientes[0].filas) <= self.max_lote):
+                    t = self._pendientes.pop(0)
+                    lote.append(t)
+                    n += len(t.filas)
+                suscriptores = list(self._suscriptores)
+
+            if not lote:
+                self._fsync_pendiente()
+                continue
+            filas = [f for t in lote for f in t.filas]
+            try:
+                ini, fin = self._commit(filas)
+            except Exception as e:
+                for t in lote:
+                    t.error = e
+                    t.listo.set()
+                continue
+
+            for t in lote:
+                t.offset = fin
+                t.listo.set()
+            aviso = {"offset_inicio": ini, "offset_fin": fin, "filas": filas}
+            for s in suscriptores:
+                s.avisar(aviso)
+
+    def _commit(self, filas: List[Dict]):
+        buf = io.StringIO()
+        w = csv.DictWriter(buf, fieldnames=EVENT_HEADERS, extrasaction="ignore")
+        for fila in filas:
+            w.writerow(fila)
+
+        # El lock protege frente a réplicas que aún escriben sin el servicio.
+        if not acquire_lock(self.lock_file):
+            raise TimeoutError("No se pudo obtener el lock de Eventos.csv")
+        try:
+            with open(self.ruta, "a", newline="", encoding="utf-8") as f:
+                ini = f.tell()
+                if ini == 0:
+                    hb = io.StringIO()
+                    csv.writer(hb).writerow(EVENT_HEADERS)
+                    f.write(hb.getvalue())
+                f.write(buf.getvalue())
+                f.flush()
+                ahora = time.monotonic()
+                if self.politica_fsync == FSYNC_SIEMPRE or (
+                    self.politica_fsync == FSYNC_INTERVALO and ahora - self._ultimo_fsync >= self.intervalo_fsync
+                ):
+                    os.fsync(f.fileno())
+                    self._ultimo_fsync = ahora
+                    self._sin_fsync = False
+                else:
+                    self._sin_fsync = self.politica_fsync == FSYNC_INTERVALO
+                fin = f.tell()
+        finally:
+            release_lock(self.lock_file)
+        self.commits += 1
+        self.filas_escritas += len(filas)
+        return ini, fin
+
+# ---------- Servicio por socket ----------
+def _parse_direccion(direccion: str):
+    """'unix:/tmp/p.sock' → (AF_UNIX, '/tmp/p.sock'); 'tcp:127.0.0.1:8765' → (AF_INET, (host, puerto))."""
+    tipo, _, resto = direccion.partition(":")
+    if tipo == "unix":
+        return socket.AF_UNIX, resto
+    if tipo == "tcp":
+        host, _, puerto = resto.rpartition(":")
+        return socket.AF_INET, (host or "127.0.0.1", int(puerto))
+    raise ValueError(f"Dirección de servicio inválida: {direccion}")
+
+
+class _ManejadorEventos(socketserver.StreamRequestHandler):
+    """Protocolo de líneas JSON: {"op": "agregar", "filas": [...]} o {"op": "suscribir"}."""
+
+    def handle(self) -> None:
+        escritor: EscritorEventos = self.server.escritor
+        for linea in self.rfile:
+            try:
+                msg = json.loads(linea)
+            except ValueError:
+                self._responder({"ok": False, "error": "json inválido"})
+                continue
+            op = msg.get("op")
+            if op == "agregar":
+                try:
+                    offset = escritor.agregar_lote(msg.get("filas") or [])
+                except ErrorEscritura as e:
+                    self._responder({"ok": False, "offset": None, "error": str(e)})
+                    continue
+                self._responder({"ok": offset is not None, "offset": offset})
+            elif op == "suscribir":
+                self._suscribir(escritor)
+                return
+            else:
+                self._responder({"ok": False, "error": f"op desconocida: {op}"})
+
+    def _suscribir(self, escritor: EscritorEventos) -> None:
+        desconectado = threading.Event()
+
+        def empujar(aviso: Dict) -> None:
+            try:
+                self._responder(aviso)
+            except OSError:
+                desconectado.set()
+                raise
+
+        # La confirmación va antes que cualquier aviso (empujar corre en otro hilo)
+        self._responder({"ok": True})
+        escritor.suscribir(empujar)
+        # El cliente no envía nada más; al cerrar su socket termina la suscripción.
+        self.rfile.read()
+        desconectado.set()
+        escritor.desuscribir(empujar)
+
+    def _responder(self, obj: Dict) -> None:
+        self.wfile.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+class _ServidorTCP(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _ServidorUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def crear_servidor(direccion: str, escritor: EscritorEventos):
+    """Crea (sin arrancar) el servidor del servicio de eventos; usar `serve_forever()`."""
+    familia, addr = _parse_direccion(direccion)
+    if familia == socket.AF_UNIX:
+        if os.path.exists(addr):
+            # Solo se borra un socket que quedó de un servicio caído; uno que atiende es otro escritor vivo
+            if not stat.S_ISSOCK(os.stat(addr).st_mode):
+                raise FileExistsError(f"{addr} existe y no es un socket")
+            if _socket_atiende(addr):
+                raise OSError(f"Ya hay un servicio de eventos escuchando en {addr}")
+            os.remove(addr)
+        servidor = _ServidorUnix(addr, _ManejadorEventos)
+    else:
+        servidor = _ServidorTCP(addr, _ManejadorEventos)
+    servidor.escritor = escritor
+    return servidor
+
+
+def _socket_atiende(addr: str) -> bool:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(1.0)
+    try:
+        s.connect(addr)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+# ---------- Cliente ----------
+class ClienteEventos:
+    """Cliente del servicio con la misma interfaz que EscritorEventos (una conexión por hilo)."""
+
+    def __init__(self, direccion: str, timeout_sec: float = 10.0):
+        self.direccion = direccion
+        self.timeout_sec = timeout_sec
+        self._local = threading.local()
+        self._suscripciones: Dict[Callable[[Dict], None], threading.Event] = {}
+
+    def _conectar(self) -> socket.socket:
+        familia, addr = _parse_direccion(self.direccion)
+        s = socket.socket(familia, socket.SOCK_STREAM)
+        s.settimeout(self.timeout_sec)
+        s.connect(addr)
+        return s
+
+    def agregar(self, fila: Dict) -> Optional[int]:
+        return self.agregar_lote([fila])
+
+    def agregar_lote(self, filas: List[Dict]) -> Optional[int]:
+        """
+        Retorna el offset final, None si no se sabe si el servicio escribió
+        (sin respuesta), o ErrorEscritura si el servicio reporta que el commit falló.
+        """
+        if not filas:
+            return None
+        mensaje = (json.dumps({"op": "agregar", "filas": filas}, ensure_ascii=False) + "\n").encode("utf-8")
+        # La conexión guardada puede estar muerta (servicio reiniciado): un reintento con una nueva.
+        # Un timeout no se reintenta: el servicio pudo escribir y la fila quedaría duplicada.
+        for _ in range(2):
+            conn = getattr(self._local, "conn", None)
+            try:
+                if conn is None:
+                    s = self._conectar()
+                    conn = (s, s.makefile("rb"))
+                    self._local.conn = conn
+                s, rf = conn
+                s.sendall(mensaje)
+                linea = rf.readline()
+                if not linea:
+                    raise ConnectionResetError("El servicio de eventos cerró la conexión")
+                resp = json.loads(linea)
+            except (socket.timeout, ValueError):
+                self.cerrar()
+                return None
+            except OSError:
+                self.cerrar()
+                continue
+            if resp.get("error"):
+                raise ErrorEscritura(resp["error"])
+            return resp.get("offset") if resp.get("ok") else None
+        return None
+
+    def suscribir(self, callback: Callable[[Dict], None]) -> None:
+        """
+        Abre una conexión dedicada y llama `callback` por cada commit empujado.
+        Si la conexión se cae (servicio reiniciado) se reconecta esperando de
+        RECONEXION_MIN_S a RECONEXION_MAX_S; los commits de mientras no se avisan
+        (ProyeccionEventos los lee de la cola del archivo).
+        """
+        detener = self._suscripciones[callback] = threading.Event()
+
+        def leer() -> None:
+            espera = RECONEXION_MIN_S
+            while not detener.is_set():
+                try:
+                    with self._conectar() as s:
+                        s.settimeout(None)
+                        s.sendall(b'{"op": "suscribir"}\n')
+                        rf = s.makefile("rb")
+                        if rf.readline():            # confirmación {"ok": true}
+                            espera = RECONEXION_MIN_S
+                        for linea in rf:
+                            if detener.is_set():
+                                return
+                            try:
+                                callback(json.loads(linea))
+                            except Exception:
+                                return              # como en EscritorEventos: se deja de avisar
+                except OSError:
+                    pass
+                detener.wait(espera)
+                espera = min(espera * 2, RECONEXION_MAX_S)
+
+        threading.Thread(target=leer, name="suscripcion-eventos", daemon=True).start()
+
+    def desuscribir(self, callback: Callable[[Dict], None]) -> None:
+        # Termina al llegar el siguiente aviso o en la próxima espera de reconexión
+        detener = self._suscripciones.pop(callback, None)
+        if detener is not None:
+            detener.set()
+
+    def cerrar(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            try:
+                conn[0].close()
+            except OSError:
+                pass
+            self._local.conn = None
+
+
+def obtener_escritor(ruta: str, direccion: Optional[str] = None, **kwargs):
+    """
+    Cliente del servicio si hay dirección (argumento o PARQUEOS_SERVICIO_EVENTOS);
+    si no, un EscritorEventos en proceso que cumple el mismo papel.
+    """
+    direccion = direccion or os.environ.get(ENV_SERVICIO, "")
+    if direccion:
+        return ClienteEventos(direccion)
+    return EscritorEventos(ruta, **kwargs)
@@ -0,0 +1,359 @@
+# simulador_politicas.py — Reproducción acelerada del log con políticas alternativas.
+# Las solicitudes de Eventos.csv (reservas y entradas a lista de espera hechas por
+# usuarios) se vuelven a decidir en orden de timestamp con las reglas de la app
+# (traslape, cupo, vencimiento por slot_end, promoción desde la lista de espera,
+# también al resto de una ventana ya empezada) bajo otra configuración: capacidades, límite de duración, reglas de espera,
+# liberación de no-shows. Cancelaciones y check-ins se aplican a lo que el
+# escenario haya aceptado. Cada escenario corre en un proceso del pool.
+#
+# La ocupación se guarda por minuto y lote (reservas que tocan cada minuto) y,
+# para la regla de cupo de la app (reservas vivas con slot_end ≥ inicio pedido),
+# un árbol de Fenwick sobre el minuto de fin: cada solicitud cuesta un par de
+# rebanadas de numpy y O(log n), sin volver a filtrar el DataFrame del log.
+
+import heapq
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from archivo_eventos import leer_eventos_texto
+from ocupacion_ponderada import ocupacion_ponderada
+
+_NS_MIN = 60 * 10**9
+
+# Tipos de evento reproducidos
+SOLICITUD, CANCELACION, CHECKIN = 0, 1, 2
+
+REGLA_CUPO_APP = "app"                   # reservas vivas con slot_end ≥ inicio pedido (recalcular_ocupacion_desde_eventos)
+REGLA_CUPO_SIMULTANEAS = "simultaneas"   # máximo de reservas simultáneas dentro de la ventana pedida
+
+ESCENARIO_BASE = {
+    "nombre": "actual",
+    "capacidades": None,              # {lote: capacidad}; None = las de Parqueos.csv
+    "factor_capacidad": 1.0,
+    "duracion_max_min": None,         # límite de duración en minutos
+    "modo_duracion": "recortar",      # "recortar" la ventana o "rechazar" la solicitud
+    "regla_traslape": True,           # hay_traslape: una sola reserva viva por ventana y lote
+    "regla_cupo": REGLA_CUPO_APP,
+    "lista_espera": True,
+    "max_espera_por_lote": None,      # solicitudes pendientes por lote; None = sin límite
+    "liberar_sin_checkin_min": None,  # minutos tras slot_start sin check-in para liberar la reserva
+}
+
+
+def escenarios_por_defecto() -> List[Dict]:
+    """Política actual y variantes típicas: duraciones, más capacidad, sin espera, cupo por simultáneas."""
+    return [
+        {"nombre": "actual"},
+        {"nombre": "duracion_30", "duracion_max_min": 30},
+        {"nombre": "duracion_60", "duracion_max_min": 60},
+        {"nombre": "duracion_90", "duracion_max_min": 90},
+        {"nombre": "capacidad_x1.5", "factor_capacidad": 1.5},
+        {"nombre": "sin_lista_espera", "lista_espera": False},
+        {"nombre": "liberar_no_show_15", "liberar_sin_checkin_min": 15},
+        {"nombre": "cupo_simultaneas", "regla_traslape": False, "regla_cupo": REGLA_CUPO_SIMULTANEAS},
+    ]
+
+
+# ---------- Preparación (una vez, en el proceso principal) ----------
+def _ns(serie: pd.Series) -> np.ndarray:
+    return serie.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[ns]").astype(np.int64)
+
+
+def preparar_eventos(ruta_eventos: str, lotes: Sequence, desde=None, hasta=None) -> Dict[str, object]:
+    """
+    Arreglos compactos, en orden de timestamp, de lo que se reproduce:
+    solicitudes de usuarios (reserva o lista_espera, no las promociones ni los
+    eventos del sistema), cancelaciones y check-ins exitosos. `desde`/`hasta`
+    (date, inclusive) recortan por fecha del evento.
+    """
+    cols = ["timestamp", "accion", "lot_id", "booking_id", "success", "source", "slot_start", "slot_end"]
+    # Archivo frío del rango + Eventos.csv; las cancelaciones fuera del rango no se reproducen
+    df = leer_eventos_texto(ruta_eventos, desde, hasta)
+    df = df[[c for c in cols if c in df.columns]].copy()
+    for c in ["accion", "lot_id", "booking_id", "source"]:
+        df[c] = df[c].fillna("").str.strip() if c in df.columns else ""
+    df["success"] = pd.to_numeric(df["success"], errors="coerce")
+    for c in ["timestamp", "slot_start", "slot_end"]:
+        df[c] = pd.to_datetime(df[c], errors="coerce", utc=True)
+    df = df[df["timestamp"].notna()]
+    if desde is not None:
+        df = df[df["timestamp"].dt.date >= desde]
+    if hasta is not None:
+        df = df[df["timestamp"].dt.date <= hasta]
+
+    nombres = [str(l[0]) for l in lotes]
+    solicitud = (df["accion"].isin(["reserva", "lista_espera"]) & ~df["source"].isin(["waitlist", "system"])
+                 & df["slot_start"].notna() & df["slot_end"].notna() & (df["slot_end"] > df["slot_start"]))
+    otros = df["accion"].isin(["cancelacion", "checkin"]) & (df["success"] == 1) & (df["booking_id"] != "")
+    df = df[(solicitud | otros) & df["lot_id"].isin(nombres)]
+    df = df.iloc[np.argsort(_ns(df["timestamp"]), kind="stable")]
+
+    tipo = np.where(df["accion"].isin(["reserva", "lista_espera"]), SOLICITUD,
+                    np.where(df["accion"] == "cancelacion", CANCELACION, CHECKIN)).astype(np.int8)
+    ini = _ns(df["slot_start"])
+    fin = _ns(df["slot_end"])
+    es_sol = tipo == SOLICITUD
+    base = int(ini[es_sol].min()) // _NS_MIN if es_sol.any() else 0
+    n_min = int(-(-int(fin[es_sol].max()) // _NS_MIN)) - base + 1 if es_sol.any() else 1
+    # Las reservas `lista_espera` no traen booking_id: se les da código -1
+    bid = df["booking_id"].where(df["accion"] != "lista_espera", "")
+    codigos_b, _ = pd.factorize(bid)
+    codigos_b = np.where(bid.to_numpy() == "", -1, codigos_b)
+    return {
+        "t": _ns(df["timestamp"]),
+        "tipo": tipo,
+        "lote": pd.Categorical(df["lot_id"], categories=nombres).codes.astype(np.int32),
+        "ini": np.where(es_sol, ini // _NS_MIN - base, 0).astype(np.int64),
+        "fin": np.where(es_sol, -(-fin // _NS_MIN) - base, 0).astype(np.int64),
+        "booking": codigos_b.astype(np.int64),
+        "base_min": base,
+        "n_min": n_min,
+        "lotes": nombres,
+        "capacidades": [int(l[1]) for l in lotes],
+    }
+
+
+# ---------- Motor (por escenario, en un proceso del pool) ----------
+class _Fenwick:
+    """Conteos por minuto de fin con suma de prefijos en O(log n)."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.arbol = [0] * (n + 1)
+        self.total = 0
+
+    def sumar(self, i: int, v: int) -> None:
+        self.total += v
+        i += 1
+        while i <= self.n:
+            self.arbol[i] += v
+            i += i & -i
+
+    def hasta(self, i: int) -> int:
+        """Suma de las posiciones < i."""
+        s = 0
+        while i > 0:
+            s += self.arbol[i]
+            i -= i & -i
+        return s
+
+    def desde(self, i: int) -> int:
+        """Suma de las posiciones ≥ i."""
+        return self.total - self.hasta(max(min(i, self.n), 0))
+
+
+def simular(datos: Dict[str, object], escenario: Dict) -> Dict[str, object]:
+    """Reproduce los eventos bajo `escenario` (ver ESCENARIO_BASE) y retorna sus métricas."""
+    esc = {**ESCENARIO_BASE, **escenario}
+    t0 = time.perf_counter()
+    nombres: List[str] = datos["lotes"]
+    caps_base = {**dict(zip(nombres, datos["capacidades"])), **(esc["capacidades"] or {})}
+    caps = [max(int(math.floor(caps_base[n] * esc["factor_capacidad"])), 0) for n in nombres]
+    n_min = int(datos["n_min"])
+    n_lotes = len(nombres)
+    ocup = np.zeros((n_lotes, n_min + 1), dtype=np.int32)
+    fines = [_Fenwick(n_min + 1) for _ in range(n_lotes)]
+    lim = esc["duracion_max_min"]
+    traslape = esc["regla_traslape"]
+    por_simultaneas = esc["regla_cupo"] == REGLA_CUPO_SIMULTANEAS
+    liberar = esc["liberar_sin_checkin_min"]
+    max_espera = esc["max_espera_por_lote"]
+    base_ns = int(datos["base_min"]) * _NS_MIN
+
+    reservas: Dict[int, List] = {}      # id simulado -> [lote, ini, fin, booking, checkin, vigente]
+    por_booking: Dict[int, int] = {}    # booking del log -> id simulado
+    espera: List[List] = [[] for _ in range(n_lotes)]   # FIFO por lote: [ini, fin, booking, pendiente]
+    en_espera = [0] * n_lotes
+    vencimientos: List = []             # (fin, secuencia, lote, entrada) de lo que está en espera
+    pendientes = 0
+    area_espera = 0.0
+    max_pendientes = 0
+    temporizadores: List = []           # (minuto, id) de reservas a liberar sin check-in
+    cont = {"solicitudes": 0, "aceptadas": 0, "TRASLAPE": 0, "SIN_CUPO": 0, "DURACION": 0,
+            "a_espera": 0, "espera_llena": 0, "promovidas": 0, "espera_vencida": 0,
+            "canceladas": 0, "liberadas_sin_checkin": 0, "no_show": 0}
+
+    def decidir(l: int, a: int, b: int) -> Optional[str]:
+        if traslape and ocup[l, a:b].any():
+            return "TRASLAPE"
+        if por_simultaneas:
+            lleno = ocup[l, a:b].max(initial=0) >= caps[l]
+        else:
+            lleno = fines[l].desde(a) >= caps[l]
+        return "SIN_CUPO" if lleno else None
+
+    def aceptar(l: int, a: int, b: int, booking: int) -> None:
+        i = len(reservas)
+        reservas[i] = [l, a, b, booking, False, True]
+        if booking >= 0:
+            por_booking[booking] = i
+        ocup[l, a:b] += 1
+        fines[l].sumar(b, 1)
+        if liberar is not None:
+            heapq.heappush(temporizadores, (a + liberar, i))
+
+    def quitar(i: int, desde_min: int) -> None:
+        """Libera la reserva a partir de `desde_min` (recorta su fin) y promueve espera."""
+        r = reservas[i]
+        l, a, b = r[0], r[1], r[2]
+        c = min(max(desde_min, a), b)
+        ocup[l, c:b] -= 1
+        fines[l].sumar(b, -1)
+        if c > a:
+            fines[l].sumar(c, 1)
+            r[2] = c
+        else:
+            r[5] = False
+        if c < b:
+            promover(l, c, b, desde_min)
+
+    def sacar(l: int, e: List, clave: str) -> None:
+        nonlocal pendientes
+        e[3] = False
+        pendientes -= 1
+        en_espera[l] -= 1
+        cont[clave] += 1
+
+    def promover(l: int, r0: int, r1: int, ahora_min: int) -> None:
+        # En orden de llegada, como ListaEspera.promover: de una ventana ya empezada
+        # se asigna solo lo que queda, de `ahora_min` a su fin
+        if not en_espera[l]:
+            return
+        quedan = []
+        for e in espera[l]:
+            if not e[3]:
+                continue
+            if e[1] <= ahora_min:         # su ventana ya terminó
+                sacar(l, e, "espera_vencida")
+                continue
+            a = max(e[0], ahora_min)
+            if a < r1 and e[1] > r0 and decidir(l, a, e[1]) is None:
+                aceptar(l, a, e[1], e[2])
+                sacar(l, e, "promovidas")
+                continue
+            quedan.append(e)
+        espera[l] = quedan
+
+    t = datos["t"].tolist()
+    tipo = datos["tipo"].tolist()
+    lote = datos["lote"].tolist()
+    ini = datos["ini"].tolist()
+    fin = datos["fin"].tolist()
+    booking = datos["booking"].tolist()
+    t_prev = t[0] if t else 0
+
+    for k in range(len(t)):
+        ahora_min = (t[k] - base_ns) // _NS_MIN
+        area_espera += pendientes * (t[k] - t_prev)
+        t_prev = t[k]
+        # Solicitudes en espera cuya ventana ya terminó: no queda nada que asignar
+        while vencimientos and vencimientos[0][0] <= ahora_min:
+            _, _, lv, e = heapq.heappop(vencimientos)
+            if e[3]:
+                sacar(lv, e, "espera_vencida")
+        while temporizadores and temporizadores[0][0] <= ahora_min:
+            m, i = heapq.heappop(temporizadores)
+            r = reservas[i]
+            if r[5] and not r[4] and r[2] > m:
+                cont["liberadas_sin_checkin"] += 1
+                quitar(i, m)
+        l = lote[k]
+        if tipo[k] == SOLICITUD:
+            cont["solicitudes"] += 1
+            a, b = ini[k], fin[k]
+            if lim is not None and b - a > lim:
+                if esc["modo_duracion"] == "rechazar":
+                    cont["DURACION"] += 1
+                    continue
+                b = a + lim
+            motivo = decidir(l, a, b)
+            if motivo is None:
+                aceptar(l, a, b, booking[k])
+                cont["aceptadas"] += 1
+                continue
+            cont[motivo] += 1
+            if not esc["lista_espera"] or b <= ahora_min:
+                continue
+            if max_espera is not None and en_espera[l] >= max_espera:
+                cont["espera_llena"] += 1
+                continue
+            e = [a, b, booking[k], True]
+            espera[l].append(e)
+            heapq.heappush(vencimientos, (b, k, l, e))
+            en_espera[l] += 1
+            pendientes += 1
+            cont["a_espera"] += 1
+            max_pendientes = max(max_pendientes, pendientes)
+        else:
+            i = por_booking.get(booking[k])
+            if i is None or not reservas[i][5]:
+                continue
+            if tipo[k] == CHECKIN:
+                reservas[i][4] = True
+            elif ahora_min < reservas[i][2]:
+                cont["canceladas"] += 1
+                quitar(i, ahora_min)
+
+    vigentes = [r for r in reservas.values() if r[5]]
+    cont["no_show"] = sum(1 for r in vigentes if not r[4])
+    duracion = max(t[-1] - t[0], 1) if t else 1
+
+    # Ocupación ponderada por tiempo de lo que quedó asignado (recortado por cancelación o liberación)
+    asignadas = pd.DataFrame({
+        "accion": "reserva", "success": 1,
+        "lot_id": [nombres[r[0]] for r in vigentes],
+        "booking_id": [str(i) for i in range(len(vigentes))],
+        "slot_start": pd.to_datetime([base_ns + r[1] * _NS_MIN for r in vigentes], utc=True),
+        "slot_end": pd.to_datetime([base_ns + r[2] * _NS_MIN for r in vigentes], utc=True),
+        "capacity": [caps[r[0]] for r in vigentes],
+    })
+    desde = pd.Timestamp(t[0], tz="UTC").floor("D") if t else None
+    hasta = pd.Timestamp(t[-1], tz="UTC").ceil("D") if t else None
+    occ = ocupacion_ponderada(asignadas, dict(zip(nombres, caps)), canceladas=(), desde=desde, hasta=hasta)
+    por_lote = occ["por_lote"]["media"].round(2).to_dict() if not occ["por_lote"].empty else {}
+
+    rechazos = cont["TRASLAPE"] + cont["SIN_CUPO"] + cont["DURACION"]
+    return {
+        "escenario": esc["nombre"],
+        **cont,
+        "rechazos": rechazos,
+        "tasa_rechazo_%": round(100.0 * rechazos / max(cont["solicitudes"], 1), 2),
+        "espera_media": round(area_espera / duracion, 2),
+        "espera_max": max_pendientes,
+        "espera_final": pendientes,
+        "ocupacion_%": round(occ["global"], 3),
+        "ocupacion_por_lote_%": por_lote,
+        "segundos": round(time.perf_counter() - t0, 2),
+    }
+
+
+_DATOS: Dict[str, object] = {}
+
+
+def _inicializar(datos: Dict[str, object]) -> None:
+    _DATOS.update(datos)
+
+
+def _simular_en_proceso(escenario: Dict) -> Dict[str, object]:
+    return simular(_DATOS, escenario)
+
+
+def simular_escenarios(datos: Dict[str, object], escenarios: Sequence[Dict],
+                       procesos: Optional[int] = None) -> pd.DataFrame:
+    """
+    Un escenario por tarea en un pool de procesos; los arreglos del log se
+    envían una sola vez a cada proceso (inicializador), no en cada tarea.
+    """
+    procesos = max(1, min(procesos or os.cpu_count() or 1, len(escenarios)))
+    if procesos == 1:
+        filas = [simular(datos, e) for e in escenarios]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar, initargs=(datos,)) as pool:
+            filas = list(pool.map(_simular_en_proceso, escenarios))
+    return pd.DataFrame(filas).set_index("escenario")
@@ -0,0 +1,62 @@
+# Simulador "qué pasaría si": reproduce Eventos.csv con políticas alternativas
+# (capacidades, límite de duración, lista de espera, liberación de no-shows) en
+# un pool de procesos y compara rechazos, espera y ocupación ponderada por tiempo.
+# Uso: python simular_cli.py [Eventos.csv] [--parqueos Parqueos.csv] [--escenarios escenarios.json]
+#      [--desde 2025-08-01] [--hasta 2025-12-15] [--procesos 4] [--salida resultados.csv]
+#   --escenarios  JSON con una lista de escenarios (claves de ESCENARIO_BASE en
+#                 simulador_politicas.py); sin él se corren escenarios_por_defecto()
+#   --parqueos    capacidades base (p. ej. un Parqueos.csv propuesto)
+import argparse, json, time
+from datetime import date
+
+import pandas as pd
+
+from generar_eventos import leer_lotes
+from simulador_politicas import escenarios_por_defecto, preparar_eventos, simular_escenarios
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducción del log con políticas alternativas")
+    parser.add_argument("eventos", nargs="?", default="Eventos.csv")
+    parser.add_argument("--parqueos", default="Parqueos.csv")
+    parser.add_argument("--escenarios", help="JSON con la lista de escenarios")
+    parser.add_argument("--desde", type=date.fromisoformat)
+    parser.add_argument("--hasta", type=date.fromisoformat)
+    parser.add_argument("--procesos", type=int, default=None, help="por defecto, uno por CPU")
+    parser.add_argument("--salida", help="CSV con una fila por escenario")
+    args = parser.parse_args()
+
+    if args.escenarios:
+        with open(args.escenarios, encoding="utf-8") as f:
+            escenarios = json.load(f)
+    else:
+        escenarios = escenarios_por_defecto()
+
+    t = time.perf_counter()
+    datos = preparar_eventos(args.eventos, leer_lotes(args.parqueos), args.desde, args.hasta)
+    n = len(datos["t"])
+    if n == 0:
+        raise SystemExit("No hay solicitudes que reproducir en el rango.")
+    dias = (int(datos["t"][-1]) - int(datos["t"][0])) / 86400e9
+    print(f"{n} eventos a reproducir ({dias:.0f} días) preparados en {time.perf_counter() - t:.1f} s")
+
+    t = time.perf_counter()
+    res = simular_escenarios(datos, escenarios, args.procesos)
+    total = time.perf_counter() - t
+    print(f"{len(escenarios)} escenarios en {total:.1f} s "
+          f"(≈{dias * 86400 / max(res['segundos'].max(), 1e-9):,.0f}× tiempo real por escenario)\n")
+
+    columnas = ["solicitudes", "aceptadas", "TRASLAPE", "SIN_CUPO", "DURACION", "tasa_rechazo_%",
+                "a_espera", "promovidas", "espera_vencida", "espera_media", "espera_max",
+                "canceladas", "liberadas_sin_checkin", "no_show", "ocupacion_%", "segundos"]
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(res[columnas].T.to_string())
+        print("\nOcupación ponderada por tiempo por lote (%):")
+        print(pd.DataFrame(res["ocupacion_por_lote_%"].to_dict()).T.to_string())
+
+    if args.salida:
+        res.to_csv(args.salida)
+        print(f"\nresultados → {args.salida}")
+
+
+if __name__ == "__main__":      # los procesos del pool no deben volver a ejecutar el script
+    main()
@@ -0,0 +1,244 @@
+# sketch_cuantiles.py — Percentiles aproximados (t-digest) de tiempos por día, lote y motivo.
+# Tres medidas, en minutos:
+#   anticipacion     slot_start - timestamp de la reserva exitosa
+#   duracion         slot_end - slot_start de la reserva exitosa
+#   retraso_checkin  timestamp del check-in - slot_start (negativo = llegó antes)
+# El check-in no trae motivo en el log: toma el de su reserva (por booking_id);
+# el motivo de una reserva se recuerda hasta su slot_end más GRACIA_CHECKIN
+# Cada celda guarda un t-digest (a lo sumo ~DELTA centroides); un rango de
+# filtros se responde combinando celdas, sin recorrer el historial completo.
+
+import heapq
+import math
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+DELTA = 200
+CUANTILES = (50, 90, 99)
+MEDIDAS = ("anticipacion", "duracion", "retraso_checkin")
+NOMBRES_MEDIDAS = {"anticipacion": "Anticipación de la reserva", "duracion": "Duración reservada",
+                   "retraso_checkin": "Retraso del check-in"}
+# El check-in solo se hace sobre reservas activas: pasado su slot_end ya no llega.
+# El margen cubre relojes desfasados y filas que se escriben tarde
+GRACIA_CHECKIN = pd.Timedelta(days=1)
+
+
+class TDigest:
+    """t-digest con compresión vectorizada (escala k1: centroides finos en las colas)."""
+
+    def __init__(self, delta: int = DELTA):
+        self.delta = delta
+        self.medias = np.empty(0)
+        self.pesos = np.empty(0)
+        self.minimo = math.inf
+        self.maximo = -math.inf
+
+    @property
+    def n(self) -> int:
+        return int(self.pesos.sum())
+
+    def _comprimir(self, medias: np.ndarray, pesos: np.ndarray) -> None:
+        orden = np.argsort(medias, kind="stable")
+        medias, pesos = medias[orden], pesos[orden]
+        total = pesos.sum()
+        q = (np.cumsum(pesos) - pesos / 2) / total
+        # Un centroide por unidad de la escala k = δ/π · asin(2q - 1): ~δ centroides
+        k = self.delta / math.pi * np.arcsin(np.clip(2 * q - 1, -1, 1))
+        grupo = np.floor(k - k[0]).astype(np.int64)
+        grupo = np.unique(grupo, return_inverse=True)[1]
+        w = np.bincount(grupo, weights=pesos)
+        self.medias = np.bincount(grupo, weights=medias * pesos) / w
+        self.pesos = w
+
+    def agregar(self, valores: np.ndarray) -> None:
+        valores = np.asarray(valores, dtype=float)
+        valores = valores[np.isfinite(valores)]
+        if len(valores) == 0:
+            return
+        self.minimo = min(self.minimo, float(valores.min()))
+        self.maximo = max(self.maximo, float(valores.max()))
+        self._comprimir(np.concatenate([self.medias, valores]),
+                        np.concatenate([self.pesos, np.ones(len(valores))]))
+
+    @classmethod
+    def unir(cls, digests: Sequence["TDigest"], delta: int = DELTA) -> "TDigest":
+        """Nuevo digest con los datos de todos (una sola compresión; no modifica ninguno)."""
+        out = cls(delta)
+        digests = [d for d in digests if len(d.pesos)]
+        if digests:
+            out.minimo = min(d.minimo for d in digests)
+            out.maximo = max(d.maximo for d in digests)
+            out._comprimir(np.concatenate([d.medias for d in digests]), np.concatenate([d.pesos for d in digests]))
+        return out
+
+    def cuantiles(self, qs: Sequence[float] = CUANTILES) -> np.ndarray:
+        """Percentiles (0-100) interpolando entre centroides; los extremos son exactos."""
+        if len(self.pesos) == 0:
+            return np.full(len(qs), np.nan)
+        total = self.pesos.sum()
+        centros = (np.cumsum(self.pesos) - self.pesos / 2) / total
+        x = np.concatenate([[0.0], centros, [1.0]])
+        y = np.concatenate([[self.minimo], self.medias, [self.maximo]])
+        return np.interp(np.asarray(qs, dtype=float) / 100.0, x, y)
+
+    def a_dict(self) -> Dict[str, object]:
+        """Centroides y extremos en tipos de JSON (para guardarlo en un paquete diario)."""
+        return {"medias": self.medias.tolist(), "pesos": self.pesos.tolist(),
+                "minimo": self.minimo, "maximo": self.maximo}
+
+    @classmethod
+    def de_dict(cls, datos: Dict[str, object], delta: int = DELTA) -> "TDigest":
+        out = cls(delta)
+        out.medias = np.asarray(datos["medias"], dtype=float)
+        out.pesos = np.asarray(datos["pesos"], dtype=float)
+        out.minimo, out.maximo = float(datos["minimo"]), float(datos["maximo"])
+        return out
+
+
+def tabla_cuantiles(digests: Dict[str, TDigest], qs: Sequence[float] = CUANTILES) -> pd.DataFrame:
+    """Una fila por medida (las que falten, vacías): n y percentiles en minutos."""
+    cols = [f"p{int(q)}" for q in qs]
+    filas = {m: [td.n] + list(np.round(td.cuantiles(qs), 1))
+             for m, td in ((m, digests.get(m) or TDigest()) for m in MEDIDAS)}
+    out = pd.DataFrame.from_dict(filas, orient="index", columns=["n"] + cols)
+    out.index.name = "medida_min"
+    return out
+
+
+def _minutos(fin: pd.Series, ini: pd.Series) -> np.ndarray:
+    return ((fin - ini).dt.total_seconds() / 60.0).to_numpy(dtype=float)
+
+
+def motivos_de_reservas(df: pd.DataFrame) -> Dict[str, str]:
+    """booking_id → motivo de las reservas exitosas de `df`."""
+    if df.empty or not {"accion", "success", "booking_id", "motivo"}.issubset(df.columns):
+        return {}
+    res = df[(df["accion"] == "reserva") & (df["success"] == 1) & (df["booking_id"].fillna("") != "")]
+    return dict(zip(res["booking_id"], res["motivo"].fillna("")))
+
+
+def medidas_de_eventos(df: pd.DataFrame, motivo_reserva: Optional[Mapping[str, str]] = None) -> pd.DataFrame:
+    """
+    Formato largo (fecha, lot_id, motivo, medida, minutos) de las tres medidas.
+    El motivo de un check-in es el de su reserva: la de `df` o, si vino antes, la de `motivo_reserva`.
+    """
+    cols = ["fecha", "lot_id", "motivo", "medida", "minutos"]
+    req = {"accion", "success", "fecha", "lot_id", "timestamp", "slot_start", "slot_end"}
+    if df.empty or not req.issubset(df.columns):
+        return pd.DataFrame(columns=cols)
+    ok = (df["success"] == 1) & df["fecha"].notna()
+    res = df[ok & (df["accion"] == "reserva")]
+    chk = df[ok & (df["accion"] == "checkin")]
+    motivo_chk = chk["motivo"] if "motivo" in chk.columns else pd.Series("", index=chk.index)
+    if not chk.empty and "booking_id" in chk.columns:
+        de_reserva = chk["booking_id"].map(motivos_de_reservas(df))
+        if motivo_reserva:
+            de_reserva = de_reserva.fillna(chk["booking_id"].map(motivo_reserva))
+        motivo_chk = de_reserva.fillna(motivo_chk)
+    partes = []
+    motivo_res = res["motivo"] if "motivo" in res.columns else pd.Series("", index=res.index)
+    for medida, sub, motivo, valores in [
+        ("anticipacion", res, motivo_res, _minutos(res["slot_start"], res["timestamp"])),
+        ("duracion", res, motivo_res, _minutos(res["slot_end"], res["slot_start"])),
+        ("retraso_checkin", chk, motivo_chk, _minutos(chk["timestamp"], chk["slot_start"])),
+    ]:
+        partes.append(pd.DataFrame({
+            "fecha": sub["fecha"].to_numpy(), "lot_id": sub["lot_id"].to_numpy(),
+            "motivo": motivo.to_numpy(), "medida": medida, "minutos": valores,
+        }))
+    largo = pd.concat(partes, ignore_index=True)
+    return largo[np.isfinite(largo["minutos"].to_numpy(dtype=float))]
+
+
+class CuantilesDiarios:
+    """t-digest por (fecha, lot_id, motivo, medida); `sincronizar(df)` procesa solo filas nuevas."""
+
+    def __init__(self, delta: int = DELTA):
+        self.delta = delta
+        self._celdas: Dict[Tuple[date, str, str, str], TDigest] = {}
+        # Motivo de cada reserva ya vista, para los check-ins que llegan en filas posteriores;
+        # `_vencen` (slot_end en ns, booking_id) dice cuándo olvidarlo
+        self._motivo_reserva: Dict[str, str] = {}
+        self._vencen: List[Tuple[int, str]] = []
+        self._ultimo: Optional[pd.Timestamp] = None     # timestamp más reciente visto en el log
+        self.filas_vistas = 0
+        self._lock = threading.Lock()
+
+    def sincronizar(self, df: pd.DataFrame) -> int:
+        """Un DataFrame más corto (versión vieja del log) se ignora."""
+        with self._lock:
+            if len(df) <= self.filas_vistas:
+                return 0
+            nuevas = df.iloc[self.filas_vistas:]
+            self.filas_vistas = len(df)
+            self._agregar(nuevas)
+            return len(nuevas)
+
+    def agregar_df(self, df: pd.DataFrame) -> None:
+        with self._lock:
+            self._agregar(df)
+
+    def _agregar(self, df: pd.DataFrame) -> None:
+        self._recordar(df)
+        largo = medidas_de_eventos(df, self._motivo_reserva)
+        for clave, grupo in largo.groupby(["fecha", "lot_id", "motivo", "medida"], sort=False):
+            td = self._celdas.get(clave)
+            if td is None:
+                td = self._celdas[clave] = TDigest(self.delta)
+            td.agregar(grupo["minutos"].to_numpy())
+        self._olvidar(df)
+
+    def _recordar(self, df: pd.DataFrame) -> None:
+        motivos = motivos_de_reservas(df)
+        if not motivos or "slot_end" not in df.columns:
+            return
+        res = df[(df["accion"] == "reserva") & (df["success"] == 1) & df["booking_id"].isin(motivos)
+                 & df["slot_end"].notna()]
+        for bid, fin in zip(res["booking_id"], res["slot_end"]):
+            self._motivo_reserva[bid] = motivos[bid]
+            heapq.heappush(self._vencen, (fin.value, bid))
+
+    def _olvidar(self, df: pd.DataFrame) -> None:
+        # Las reservas cuyo slot_end pasó hace más de GRACIA_CHECKIN (en la hora del log) ya no reciben check-in
+        if "timestamp" in df.columns and df["timestamp"].notna().any():
+            ultimo = df["timestamp"].max()
+            self._ultimo = ultimo if self._ultimo is None else max(self._ultimo, ultimo)
+        if self._ultimo is None:
+            return
+        corte = (self._ultimo - GRACIA_CHECKIN).value
+        while self._vencen and self._vencen[0][0] < corte:
+            _, bid = heapq.heappop(self._vencen)
+            self._motivo_reserva.pop(bid, None)
+
+    def resumen(self, desde: Optional[date] = None, hasta: Optional[date] = None,
+                lotes: Iterable[str] = (), motivos: Iterable[str] = (), sin_mayusculas: bool = False,
+                qs: Sequence[float] = CUANTILES) -> pd.DataFrame:
+        """Una fila por medida: n y percentiles en minutos para el filtro dado."""
+        lotes = set(lotes or [])
+        motivos = {m.lower() for m in motivos} if sin_mayusculas and motivos else set(motivos or [])
+        elegidos: Dict[str, list] = {m: [] for m in MEDIDAS}
+        with self._lock:
+            for (fecha, lote, motivo, medida), td in self._celdas.items():
+                if desde is not None and fecha < desde or hasta is not None and fecha > hasta:
+                    continue
+                if lotes and lote not in lotes:
+                    continue
+                if motivos and (motivo.lower() if sin_mayusculas else motivo) not in motivos:
+                    continue
+                elegidos[medida].append(td)
+        return tabla_cuantiles({m: TDigest.unir(tds, self.delta) for m, tds in elegidos.items()}, qs)
+
+
+def percentiles_tiempos(df: pd.DataFrame, qs: Sequence[float] = CUANTILES, **filtros) -> pd.DataFrame:
+    """
+    Mismo resumen para un DataFrame suelto (herramientas sin sketches compartidos).
+    Con filtros (los de `CuantilesDiarios.resumen`) `df` debe ser el log sin filtrar
+    por motivo: si no, los check-ins se pierden antes de tomar el motivo de su reserva.
+    """
+    c = CuantilesDiarios()
+    c.agregar_df(df)
+    return c.resumen(qs=qs, **filtros)
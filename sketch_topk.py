@@ -0,0 +1,214 @@
+# sketch_topk.py — Top-K aproximado (Space-Saving) por (fecha, lote, motivo), combinable.
+# Cada celda guarda a lo sumo K contadores por tipo (usuarios, lotes) en vez de
+# la tabla completa de conteos. Cualquier filtro de fechas, lotes y motivos se
+# responde combinando las celdas que lo cumplen; cada conteo trae su error
+# máximo, así que el conteo real de un elemento está en [conteo - error, conteo].
+
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+K_POR_DIA = 512
+
+# tipo → columna del log que se cuenta (solo eventos `reserva`, como value_counts sobre reservas)
+TIPOS = {"usuarios": "user_email", "lotes": "lot_id"}
+
+Celda = Tuple[date, str, str]   # (fecha UTC, lot_id, motivo)
+
+
+class SpaceSaving:
+    """
+    Resumen de a lo sumo `k` contadores. `umbral` acota el conteo real de
+    cualquier elemento no monitoreado (0 mientras no se haya descartado nada).
+    """
+
+    def __init__(self, k: int = K_POR_DIA):
+        self.k = k
+        self.conteos: Dict[str, int] = {}
+        self.errores: Dict[str, int] = {}
+        self.umbral = 0
+        self.total = 0
+
+    @classmethod
+    def desde_conteos(cls, conteos: pd.Series, k: int = K_POR_DIA) -> "SpaceSaving":
+        """Resumen exacto de un lote de conteos (los K mayores; el resto queda acotado por el K-ésimo)."""
+        s = cls(k)
+        conteos = conteos[conteos > 0].sort_values(ascending=False, kind="stable")
+        s.total = int(conteos.sum())
+        if len(conteos) > k:
+            s.umbral = int(conteos.iloc[k])
+            conteos = conteos.iloc[:k]
+        s.conteos = {str(x): int(c) for x, c in conteos.items()}
+        s.errores = dict.fromkeys(s.conteos, 0)
+        return s
+
+    def combinar(self, otro: "SpaceSaving") -> "SpaceSaving":
+        """
+        Combinación de dos resúmenes (no modifica ninguno). Un elemento ausente
+        de un lado aporta el `umbral` de ese lado como conteo y como error.
+        """
+        out = SpaceSaving(max(self.k, otro.k))
+        out.total = self.total + otro.total
+        conteos, errores = {}, {}
+        for x in self.conteos.keys() | otro.conteos.keys():
+            conteos[x] = self.conteos.get(x, self.umbral) + otro.conteos.get(x, otro.umbral)
+            errores[x] = self.errores.get(x, self.umbral) + otro.errores.get(x, otro.umbral)
+        orden = sorted(conteos, key=conteos.get, reverse=True)
+        descartado = conteos[orden[out.k]] if len(orden) > out.k else 0
+        out.umbral = max(self.umbral + otro.umbral, descartado)
+        out.conteos = {x: conteos[x] for x in orden[:out.k]}
+        out.errores = {x: errores[x] for x in orden[:out.k]}
+        return out
+
+    @classmethod
+    def unir(cls, resumenes: Iterable["SpaceSaving"], k: Optional[int] = None) -> "SpaceSaving":
+        """
+        Combinación de varios resúmenes de una vez: lo mismo que `combinar` en
+        cadena, pero se recorta a k una sola vez al final (encadenar recorta en
+        cada paso y cada recorte suma su umbral a los elementos ausentes).
+        """
+        resumenes = [r for r in resumenes if r.total]
+        out = cls(k or max([r.k for r in resumenes], default=K_POR_DIA))
+        if not resumenes:
+            return out
+        umbral = sum(r.umbral for r in resumenes)
+        partes = pd.DataFrame({
+            "clave": [x for r in resumenes for x in r.conteos],
+            "conteo": [c for r in resumenes for c in r.conteos.values()],
+            "error": [r.errores[x] for r in resumenes for x in r.conteos],
+            "umbral": [r.umbral for r in resumenes for _ in r.conteos],
+        })
+        g = partes.groupby("clave", sort=False)[["conteo", "error", "umbral"]].sum()
+        # Un elemento ausente de un resumen aporta el umbral de ese resumen
+        faltante = umbral - g["umbral"]
+        conteos = (g["conteo"] + faltante).sort_values(ascending=False, kind="stable")
+        descartado = int(conteos.iloc[out.k]) if len(conteos) > out.k else 0
+        conteos = conteos.iloc[:out.k]
+        out.total = sum(r.total for r in resumenes)
+        out.umbral = max(umbral, descartado)
+        out.conteos = {str(x): int(c) for x, c in conteos.items()}
+        out.errores = {str(x): int(e) for x, e in (g["error"] + faltante).loc[conteos.index].items()}
+        return out
+
+    def cota_error(self) -> int:
+        """Mayor sobreestimación posible de cualquier conteo (monitoreado o no)."""
+        return max([self.umbral] + list(self.errores.values()))
+
+    def top(self, n: int = 10) -> pd.DataFrame:
+        """
+        Los n mayores con cota inferior (conteo - error). `garantizado` indica
+        que su cota inferior supera al conteo estimado del (n+1)-ésimo y al
+        umbral, es decir, que con seguridad está entre los n mayores.
+        """
+        orden = sorted(self.conteos, key=lambda x: (-self.conteos[x], x))
+        siguiente = max(self.conteos[orden[n]] if len(orden) > n else 0, self.umbral)
+        filas = [{"clave": x, "conteo": self.conteos[x], "error": self.errores[x],
+                  "minimo": self.conteos[x] - self.errores[x],
+                  "garantizado": self.conteos[x] - self.errores[x] > siguiente}
+                 for x in orden[:n]]
+        return pd.DataFrame(filas, columns=["clave", "conteo", "error", "minimo", "garantizado"])
+
+    def serie(self, n: int = 10, nombre: Optional[str] = None) -> pd.Series:
+        """Los n mayores como value_counts().head(n): conteo estimado por clave."""
+        t = self.top(n)
+        return pd.Series(t["conteo"].to_numpy(dtype="int64"), index=pd.Index(t["clave"], name=nombre), name="count")
+
+
+class TopKDiario:
+    """
+    Sketches por celda (fecha, lot_id, motivo) y tipo. `sincronizar(df)` procesa
+    solo las filas nuevas del log; `agregar_df` sirve también para lectura por
+    bloques (fuera de memoria) y para las filas que empuja el servicio de eventos.
+    """
+
+    def __init__(self, k: int = K_POR_DIA):
+        self.k = k
+        self._celdas: Dict[Celda, Dict[str, SpaceSaving]] = {}
+        self.filas_vistas = 0
+        self._lock = threading.Lock()
+
+    def sincronizar(self, df: pd.DataFrame) -> int:
+        """Un DataFrame más corto (versión vieja del log) se ignora."""
+        with self._lock:
+            if len(df) <= self.filas_vistas:
+                return 0
+            nuevas = df.iloc[self.filas_vistas:]
+            self.filas_vistas = len(df)
+            self._agregar(nuevas)
+            return len(nuevas)
+
+    def agregar_df(self, df: pd.DataFrame) -> None:
+        """Agrega eventos sin pasar por `filas_vistas` (bloques de CSV o filas empujadas)."""
+        with self._lock:
+            self._agregar(df)
+
+    def _agregar(self, df: pd.DataFrame) -> None:
+        if df.empty or not {"accion", "fecha"}.issubset(df.columns):
+            return
+        res = df[(df["accion"] == "reserva") & df["fecha"].notna()]
+        if res.empty:
+            return
+        celda = [res["fecha"],
+                 res["lot_id"].fillna("") if "lot_id" in res.columns else pd.Series("", index=res.index),
+                 res["motivo"].fillna("") if "motivo" in res.columns else pd.Series("", index=res.index)]
+        for tipo, col in TIPOS.items():
+            if col not in res.columns:
+                continue
+            # Conteo exacto del bloque por celda, luego se combina con el sketch de la celda
+            conteos = res.groupby(celda + [res[col]], sort=False).size()
+            for clave, por_clave in conteos.groupby(level=[0, 1, 2], sort=False):
+                nuevo = SpaceSaving.desde_conteos(por_clave.droplevel([0, 1, 2]), self.k)
+                sketches = self._celdas.setdefault(clave, {})
+                sketches[tipo] = sketches[tipo].combinar(nuevo) if tipo in sketches else nuevo
+
+    def resumenes(self, tipo: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+                  lotes: Iterable[str] = (), motivos: Iterable[str] = (), sin_mayusculas: bool = False) -> List[SpaceSaving]:
+        """Sketches de las celdas que cumplen el filtro (fechas UTC [desde, hasta] inclusive, lotes, motivos)."""
+        lotes = set(lotes or [])
+        motivos = {m.lower() for m in motivos} if sin_mayusculas and motivos else set(motivos or [])
+        out = []
+        with self._lock:
+            for (fecha, lote, motivo), sketches in self._celdas.items():
+                if tipo not in sketches:
+                    continue
+                if desde is not None and fecha < desde or hasta is not None and fecha > hasta:
+                    continue
+                if lotes and lote not in lotes:
+                    continue
+                if motivos and (motivo.lower() if sin_mayusculas else motivo) not in motivos:
+                    continue
+                out.append(sketches[tipo])
+        return out
+
+    def combinado(self, tipo: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+                  **filtros) -> SpaceSaving:
+        """Sketch del filtro combinando las celdas que lo cumplen."""
+        return SpaceSaving.unir(self.resumenes(tipo, desde, hasta, **filtros), self.k)
+
+    def top(self, tipo: str, desde: Optional[date] = None, hasta: Optional[date] = None, n: int = 10,
+            **filtros) -> pd.DataFrame:
+        return self.combinado(tipo, desde, hasta, **filtros).top(n)
+
+    @classmethod
+    def desde_csv(cls, ruta: str, k: int = K_POR_DIA, filas_bloque: int = 200_000) -> "TopKDiario":
+        """Construye los sketches leyendo el CSV por bloques (sin cargar el log completo)."""
+        sk = cls(k)
+        cols = ["timestamp", "accion", "motivo"] + list(TIPOS.values())
+        for bloque in pd.read_csv(ruta, dtype=str, usecols=lambda c: c in cols, chunksize=filas_bloque):
+            bloque["accion"] = bloque["accion"].fillna("").str.strip()
+            for col in ["motivo"] + list(TIPOS.values()):
+                if col in bloque.columns:
+                    bloque[col] = bloque[col].fillna("").str.strip()
+            bloque["fecha"] = pd.to_datetime(bloque["timestamp"], errors="coerce", utc=True).dt.date
+            sk.agregar_df(bloque)
+        return sk
+
+
+
+def usuarios_con_mas_reservas(df: pd.DataFrame, n: int = 10, **filtros) -> pd.Series:
+    """Usuarios con más reservas de un DataFrame suelto, con el mismo sketch (y filtros) que la app."""
+    sk = TopKDiario()
+    sk.agregar_df(df)
+    return sk.combinado("usuarios", **filtros).serie(n, TIPOS["usuarios"])
@@ -0,0 +1,145 @@
+# tabla_paginada.py — Visor de tablas grandes que ordena y pagina en el servidor.
+# Solo viaja al navegador la página visible y el total de filas; el orden se
+# precalcula una vez por versión de datos y los filtros por columna usan
+# índices de códigos (factorize) en lugar de comparar texto fila a fila.
+
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Combinaciones (orden, sentido, filtros) memorizadas por tabla; se desaloja la usada hace más tiempo
+MAX_FILTRADOS = 32
+
+
+class IndiceTabla:
+    """Órdenes precalculados (posiciones) y códigos de categorías para un DataFrame fijo."""
+
+    def __init__(self, df: pd.DataFrame, version: Hashable):
+        self.df = df
+        self.version = version
+        self._ordenes: Dict[Tuple[str, bool], np.ndarray] = {}
+        self._codigos: Dict[str, Tuple[np.ndarray, pd.Index]] = {}
+        self._filtrados: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+
+    def orden(self, columna: str, descendente: bool = False) -> np.ndarray:
+        """
+        Posiciones de filas ordenadas por `columna` (nulos al final). El orden es
+        estable en ambos sentidos: los empates quedan en el orden original.
+        """
+        pos = self._ordenes.get((columna, descendente))
+        if pos is None:
+            serie = self.df[columna].reset_index(drop=True)
+            pos = serie.sort_values(ascending=not descendente, kind="stable", na_position="last").index.to_numpy()
+            self._ordenes[(columna, descendente)] = pos
+        return pos
+
+    def codigos(self, columna: str) -> Tuple[np.ndarray, pd.Index]:
+        cod = self._codigos.get(columna)
+        if cod is None:
+            codes, uniques = pd.factorize(self.df[columna].astype("string").fillna(""), sort=True)
+            cod = (codes, pd.Index(uniques))
+            self._codigos[columna] = cod
+        return cod
+
+    def valores(self, columna: str) -> List[str]:
+        return list(self.codigos(columna)[1])
+
+    def posiciones(self, columna_orden: str, descendente: bool,
+                   filtros: Dict[str, Sequence[str]]) -> np.ndarray:
+        """
+        Posiciones ordenadas que cumplen los filtros (nulos al final); se memorizan
+        las últimas MAX_FILTRADOS combinaciones.
+        """
+        clave = (columna_orden, descendente, tuple(sorted((c, tuple(sorted(v))) for c, v in filtros.items() if v)))
+        pos = self._filtrados.get(clave)
+        if pos is not None:
+            self._filtrados.move_to_end(clave)
+            return pos
+        pos = self.orden(columna_orden, descendente)
+        mascara: Optional[np.ndarray] = None
+        for col, vals in filtros.items():
+            if not vals:
+                continue
+            codes, uniques = self.codigos(col)
+            sel = uniques.get_indexer(list(vals))
+            m = np.isin(codes, sel[sel >= 0])
+            mascara = m if mascara is None else (mascara & m)
+        if mascara is not None:
+            pos = pos[mascara[pos]]
+        self._filtrados[clave] = pos
+        if len(self._filtrados) > MAX_FILTRADOS:
+            self._filtrados.popitem(last=False)
+        return pos
+
+    def pagina(self, columna_orden: str, descendente: bool, filtros: Dict[str, Sequence[str]],
+               num_pagina: int, tam_pagina: int) -> Tuple[pd.DataFrame, int]:
+        pos = self.posiciones(columna_orden, descendente, filtros)
+        total = int(len(pos))
+        ini = max(num_pagina - 1, 0) * tam_pagina
+        return self.df.iloc[pos[ini:ini + tam_pagina]], total
+
+
+def _para_mostrar(df: pd.DataFrame) -> pd.DataFrame:
+    """Quita la zona horaria solo a las filas de la página (Arrow/Streamlit las muestran mejor)."""
+    out = df.copy()
+    for c in out.columns:
+        if isinstance(out[c].dtype, pd.DatetimeTZDtype):
+            out[c] = out[c].dt.tz_convert(None)
+    return out
+
+
+def tabla_paginada(df: pd.DataFrame, clave: str, version: Hashable,
+                   columnas: Optional[List[str]] = None,
+                   columnas_orden: Optional[List[str]] = None,
+                   columnas_filtro: Optional[List[str]] = None,
+                   tam_pagina: int = 50,
+                   descendente: bool = False) -> int:
+    """
+    Dibuja la tabla paginada de `df` y retorna el total de filas tras filtros.
+    `version` debe cambiar cuando cambian los datos (p. ej. tamaño del CSV + filtros).
+    """
+    columnas = [c for c in (columnas or list(df.columns)) if c in df.columns]
+    columnas_orden = [c for c in (columnas_orden or columnas) if c in df.columns]
+    columnas_filtro = [c for c in (columnas_filtro or []) if c in df.columns]
+
+    ses = st.session_state
+    idx: Optional[IndiceTabla] = ses.get(f"_tp_{clave}")
+    if idx is None or idx.version != version:
+        idx = IndiceTabla(df, version)
+        ses[f"_tp_{clave}"] = idx
+
+    if df.empty or not columnas_orden:
+        st.dataframe(df[columnas], use_container_width=True)
+        return int(len(df))
+
+    c1, c2, c3 = st.columns([2, 1, 1])
+    with c1:
+        col_orden = st.selectbox("Ordenar por", columnas_orden, key=f"{clave}_orden")
+    with c2:
+        desc = st.checkbox("Descendente", value=descendente, key=f"{clave}_desc")
+    with c3:
+        tam = st.selectbox("Filas por página", [25, 50, 100, 250], key=f"{clave}_tam",
+                           index=[25, 50, 100, 250].index(tam_pagina) if tam_pagina in (25, 50, 100, 250) else 1)
+
+    filtros: Dict[str, List[str]] = {}
+    if columnas_filtro:
+        cols_f = st.columns(len(columnas_filtro))
+        for cf, col in zip(cols_f, columnas_filtro):
+            with cf:
+                filtros[col] = st.multiselect(col, idx.valores(col), default=[], key=f"{clave}_f_{col}")
+
+    total = int(len(idx.posiciones(col_orden, desc, filtros)))
+    n_paginas = max((total + tam - 1) // tam, 1)
+    if ses.get(f"{clave}_pag", 1) > n_paginas:
+        ses[f"{clave}_pag"] = 1
+    num = st.number_input("Página", min_value=1, max_value=n_paginas, step=1, key=f"{clave}_pag")
+    num = min(int(num), n_paginas)
+
+    df_pag, total = idx.pagina(col_orden, desc, filtros, num, tam)
+    st.dataframe(_para_mostrar(df_pag[columnas]), use_container_width=True)
+    ini = (num - 1) * tam
+    st.caption(f"Filas {ini + 1 if total else 0}–{min(ini + tam, total)} de **{total}** · página {num}/{n_paginas}")
+    return total
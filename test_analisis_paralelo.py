@@ -0,0 +1,68 @@
+# test_analisis_paralelo.py — El análisis por segmentos en varios procesos da lo mismo que en uno solo.
+
+import csv
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from analisis_paralelo import analisis_paralelo, segmentos
+from archivo_eventos import archivar
+from reglas_reserva import fila_evento
+from servicio_eventos import EVENT_HEADERS
+
+CAPACIDADES = {"L1": 3, "L2": 2}
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    # Reservas de 6 días; algunas se cancelan o tienen check-in varias filas después
+    rnd = random.Random(7)
+    filas = []
+    for i in range(120):
+        hecho = datetime(2025, 11, 1, 7, tzinfo=timezone.utc) + timedelta(hours=i, microseconds=rnd.randrange(10**6))
+        inicio = hecho + timedelta(hours=rnd.randint(1, 30))
+        lote, motivo = rnd.choice(list(CAPACIDADES)), rnd.choice(["clase", "evento", "Clase"])
+        fila = fila_evento(f"u{rnd.randrange(15)}@uvg.edu.gt", "reserva", motivo, lote, f"b{i}",
+                           rnd.random() < 0.9, 1, CAPACIDADES[lote], inicio, inicio + timedelta(hours=rnd.randint(1, 3)))
+        fila["timestamp"] = hecho.isoformat()
+        filas.append(fila)
+        if fila["success"] == "1" and rnd.random() < 0.4:
+            cierre = dict(fila, accion=rnd.choice(["cancelacion", "checkin"]), motivo="")
+            cierre["timestamp"] = (inicio + timedelta(minutes=rnd.randint(-20, 20),
+                                                      microseconds=rnd.randrange(10**6))).isoformat()
+            filas.append(cierre)
+    filas.sort(key=lambda f: f["timestamp"])
+    ruta = tmp_path / "Eventos.csv"
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=EVENT_HEADERS)
+        w.writeheader()
+        w.writerows(filas)
+    # Los primeros días van al archivo frío: los segmentos mezclan bloques y tramos del CSV
+    archivar(str(ruta), hasta=date(2025, 11, 2), filas_por_bloque=20, lock_file=str(tmp_path / ".lock"))
+    return ruta
+
+
+def _iguales(a, b):
+    assert a.keys() == b.keys()
+    for clave in a:
+        if isinstance(a[clave], pd.Series):
+            pd.testing.assert_series_equal(a[clave], b[clave], check_names=False)
+        elif isinstance(a[clave], pd.DataFrame):
+            pd.testing.assert_frame_equal(a[clave], b[clave])
+        else:
+            assert a[clave] == b[clave], clave
+
+
+@pytest.mark.parametrize("desde, hasta, motivos", [
+    (None, None, ()),
+    (date(2025, 11, 2), date(2025, 11, 4), ()),
+    (date(2025, 11, 2), None, ("clase",)),
+])
+def test_varios_procesos_igual_que_uno(ruta, desde, hasta, motivos):
+    assert len(segmentos(str(ruta), desde, hasta, bytes_por_segmento=2048)) > 3
+    uno = analisis_paralelo(str(ruta), desde, hasta, motivos, procesos=1, capacidades=CAPACIDADES)
+    varios = analisis_paralelo(str(ruta), desde, hasta, motivos, procesos=3, bytes_por_segmento=2048,
+                               capacidades=CAPACIDADES)
+    _iguales(uno, varios)
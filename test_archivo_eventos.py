@@ -0,0 +1,59 @@
+# test_archivo_eventos.py — Si el CSV no se puede reemplazar, archivar deja el índice y los bloques como estaban.
+
+import csv
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+import archivo_eventos
+from archivo_eventos import archivar, directorio_archivo, leer_archivados, leer_indice
+from reglas_reserva import fila_evento
+from servicio_eventos import EVENT_HEADERS
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    # Tres días ya terminados, dos reservas por día
+    ruta = tmp_path / "Eventos.csv"
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=EVENT_HEADERS)
+        w.writeheader()
+        for dia in range(3):
+            for h in (8, 14):
+                inicio = datetime(2025, 11, 1 + dia, h, tzinfo=timezone.utc)
+                fila = fila_evento("a@uvg.edu.gt", "reserva", "clase", "L1", f"b{dia}{h}", True, 4, 5,
+                                   inicio, inicio + timedelta(hours=1))
+                fila["timestamp"] = (inicio - timedelta(hours=1)).isoformat()
+                w.writerow(fila)
+    return ruta
+
+
+def _bloques(ruta):
+    return sorted(n for n in os.listdir(directorio_archivo(str(ruta))) if n.startswith("bloque_"))
+
+
+def test_archiva_los_dias_cerrados(ruta):
+    resumen = archivar(str(ruta), hasta=date(2025, 11, 2), lock_file=str(ruta.parent / ".lock"))
+    assert (resumen["filas"], resumen["bloques"]) == (4, 1)
+    assert len(leer_archivados(str(ruta))) == 4
+    assert ruta.read_text(encoding="utf-8").count("\n") == 3      # cabecera + el 3 de noviembre
+
+
+def test_revierte_si_falla_la_reescritura(ruta, monkeypatch):
+    lock = str(ruta.parent / ".lock")
+    archivar(str(ruta), hasta=date(2025, 11, 1), lock_file=lock)
+    csv_previo, indice_previo, bloques_previos = ruta.read_bytes(), leer_indice(str(ruta)), _bloques(ruta)
+
+    def falla(*args, **kwargs):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(archivo_eventos, "_reescribir_csv", falla)
+    with pytest.raises(OSError, match="disco lleno"):
+        archivar(str(ruta), hasta=date(2025, 11, 2), lock_file=lock)
+    assert ruta.read_bytes() == csv_previo
+    assert leer_indice(str(ruta)) == indice_previo
+    assert _bloques(ruta) == bloques_previos
+    # Los locks quedaron libres: el siguiente archivado procede
+    monkeypatch.undo()
+    assert archivar(str(ruta), hasta=date(2025, 11, 2), lock_file=lock)["filas"] == 2
@@ -0,0 +1,117 @@
+# test_cache_columnas.py — La caché por columna se extiende con la cola del CSV y se reconstruye si cambia su huella;
+# el índice por hora acota las lecturas por rango de fechas.
+
+import csv
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from cache_columnas import actualizar_cache, leer_cache, leer_csv_rango, tramos_en_rango
+from reglas_reserva import fila_evento
+from servicio_eventos import EVENT_HEADERS
+
+INICIO = datetime(2025, 11, 10, 8, tzinfo=timezone.utc)
+
+
+def _filas(n, desde=0, lote="L1", paso_h=1):
+    filas = []
+    for i in range(desde, desde + n):
+        ts = INICIO + timedelta(hours=i * paso_h)
+        fila = fila_evento(f"u{i}@uvg.edu.gt", "reserva", "clase", lote, f"b{i}", True, 4, 5,
+                           ts, ts + timedelta(hours=1))
+        fila["timestamp"] = ts.isoformat()
+        filas.append(fila)
+    return filas
+
+
+def _escribir(ruta, filas, modo="w"):
+    with open(ruta, modo, newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=EVENT_HEADERS)
+        if modo == "w":
+            w.writeheader()
+        w.writerows(filas)
+
+
+def _igual_al_csv(ruta, meta):
+    df = leer_cache(str(ruta), meta)
+    csv_df = pd.read_csv(ruta, dtype=str)
+    assert len(df) == len(csv_df) == meta["filas"]
+    for col in ["event_id", "user_email", "lot_id", "booking_id"]:
+        assert df[col].tolist() == csv_df[col].tolist()
+    esperado = pd.to_datetime(csv_df["timestamp"], utc=True, format="ISO8601")
+    assert (df["timestamp"] == esperado).all()
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    ruta = tmp_path / "Eventos.csv"
+    _escribir(ruta, _filas(3))
+    return ruta
+
+
+def test_extiende_con_la_cola(ruta):
+    meta = actualizar_cache(str(ruta))
+    assert (meta["generacion"], meta["filas"]) == (1, 3)
+    _escribir(ruta, _filas(2, desde=3, lote="L2"), modo="a")
+    meta = actualizar_cache(str(ruta))
+    assert (meta["generacion"], meta["filas"]) == (1, 5)
+    assert meta["diccionarios"]["lot_id"] == 2
+    _igual_al_csv(ruta, meta)
+
+
+def test_sin_cambios_no_toca_la_cache(ruta):
+    meta = actualizar_cache(str(ruta))
+    assert actualizar_cache(str(ruta)) == meta
+
+
+def test_reconstruye_si_cambia_la_huella(ruta):
+    actualizar_cache(str(ruta))
+    # Mismo tamaño, contenido distinto (una reescritura): solo la huella lo delata
+    texto = ruta.read_bytes().replace(b",b1,", b",b9,")
+    ruta.write_bytes(texto)
+    meta = actualizar_cache(str(ruta))
+    assert (meta["generacion"], meta["filas"]) == (2, 3)
+    _igual_al_csv(ruta, meta)
+    assert "b9" in leer_cache(str(ruta), meta)["booking_id"].tolist()
+
+
+def test_reconstruye_si_el_csv_se_acorta(ruta):
+    actualizar_cache(str(ruta))
+    _escribir(ruta, _filas(2, desde=10))
+    meta = actualizar_cache(str(ruta))
+    assert (meta["generacion"], meta["filas"]) == (2, 2)
+    _igual_al_csv(ruta, meta)
+
+
+@pytest.fixture
+def tres_dias(tmp_path):
+    # Filas cada 6 h del 10 al 13 de noviembre (08:00, 14:00, 20:00, 02:00, ...)
+    ruta = tmp_path / "Eventos.csv"
+    _escribir(ruta, _filas(12, paso_h=6))
+    return ruta
+
+
+def _fechas(df):
+    return sorted(set(pd.to_datetime(df["timestamp"], utc=True, format="ISO8601").dt.date))
+
+
+def test_lectura_por_rango_de_la_cache(tres_dias):
+    meta = actualizar_cache(str(tres_dias))
+    dia = date(2025, 11, 11)
+    df = leer_cache(str(tres_dias), meta, desde=dia, hasta=dia)
+    assert _fechas(df) == [dia]
+    assert len(df) == 4
+    assert len(leer_cache(str(tres_dias), meta, desde=date(2025, 11, 20))) == 0
+
+
+def test_lectura_por_rango_del_csv_con_cola_sin_indexar(tres_dias):
+    actualizar_cache(str(tres_dias))
+    _escribir(tres_dias, _filas(1, desde=12, paso_h=6), modo="a")     # 13 nov 08:00, aún sin indexar
+    dia = date(2025, 11, 10)
+    tramos = tramos_en_rango(str(tres_dias), desde=dia, hasta=dia)
+    assert tramos[1][1] == tres_dias.stat().st_size
+    df = leer_csv_rango(str(tres_dias), desde=dia, hasta=dia)
+    # Las 3 filas del día, más la cola que el llamador filtra
+    assert _fechas(df) == [dia, date(2025, 11, 13)]
+    assert len(df) == 4
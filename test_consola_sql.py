@@ -0,0 +1,42 @@
+# test_consola_sql.py — La consola SQL con DuckDB no lee archivos fuera de sus fuentes.
+
+import csv
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+from consola_sql import MOTOR_DUCKDB, ejecutar_consulta, fuentes_sql
+from reglas_reserva import fila_evento
+from servicio_eventos import EVENT_HEADERS
+
+
+@pytest.fixture
+def fuentes(tmp_path):
+    ruta = tmp_path / "Eventos.csv"
+    inicio = datetime(2025, 11, 10, 8, tzinfo=timezone.utc)
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=EVENT_HEADERS)
+        w.writeheader()
+        w.writerow(fila_evento("a@uvg.edu.gt", "reserva", "clase", "L1", "b1", True, 4, 5,
+                               inicio, inicio + timedelta(hours=1)))
+    # Filas LF detrás de las CRLF del módulo csv, como al generar_eventos sobre un log existente
+    with open(ruta, "a", newline="\n", encoding="utf-8") as f:
+        csv.DictWriter(f, fieldnames=EVENT_HEADERS, lineterminator="\n").writerow(
+            fila_evento("b@uvg.edu.gt", "reserva", "clase", "L1", "b2", True, 3, 5,
+                        inicio, inicio + timedelta(hours=1)))
+    (tmp_path / "afuera.csv").write_text("secreto\nsi\n", encoding="utf-8")
+    return fuentes_sql(str(ruta))
+
+
+def test_consulta_las_fuentes(fuentes):
+    res = ejecutar_consulta("SELECT count(*) AS n FROM eventos", fuentes, motor=MOTOR_DUCKDB)
+    assert int(res["df"]["n"].iloc[0]) == 2
+
+
+@pytest.mark.parametrize("funcion", ["read_text", "read_csv"])
+def test_no_lee_archivos_fuera_de_las_fuentes(fuentes, funcion):
+    afuera = str(fuentes["eventos"]).replace("Eventos.csv", "afuera.csv")
+    with pytest.raises(duckdb.PermissionException):
+        ejecutar_consulta(f"SELECT * FROM {funcion}('{afuera}')", fuentes, motor=MOTOR_DUCKDB)
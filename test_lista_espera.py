@@ -0,0 +1,80 @@
+# test_lista_espera.py — La lista de espera promueve por hora de solicitud entre las ventanas que traslapan lo liberado.
+
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from lista_espera import ListaEspera
+
+DIA = datetime(2025, 11, 10, tzinfo=timezone.utc)
+AHORA = DIA + timedelta(hours=6)
+
+
+def _h(horas):
+    return pd.Timestamp(DIA + timedelta(hours=horas))
+
+
+def _solicitud(email, ini, fin, solicitada, lote="L1"):
+    return {"user_email": email, "motivo": "clase", "lot_id": lote, "slot_start": _h(ini), "slot_end": _h(fin),
+            "solicitada": _h(solicitada), "codigo": "SIN_CUPO"}
+
+
+def _promover(lista, ini, fin, cupos, compatible=lambda e: True, lote="L1"):
+    restantes = [cupos]
+
+    def asignar(e):
+        if not restantes[0]:
+            return False
+        restantes[0] -= 1
+        return True
+
+    return [e["user_email"] for e in lista.promover(lote, _h(ini), _h(fin), AHORA, compatible, asignar)]
+
+
+@pytest.fixture
+def lista():
+    lista = ListaEspera()
+    lista.agregar(_solicitud("tarde@uvg.edu.gt", 8, 10, solicitada=3))
+    lista.agregar(_solicitud("primera@uvg.edu.gt", 9, 11, solicitada=1))
+    lista.agregar(_solicitud("segunda@uvg.edu.gt", 8, 10, solicitada=2))
+    lista.agregar(_solicitud("otra_hora@uvg.edu.gt", 14, 16, solicitada=0))
+    lista.agregar(_solicitud("otro_lote@uvg.edu.gt", 8, 10, solicitada=0, lote="L2"))
+    return lista
+
+
+def test_promueve_por_hora_de_solicitud(lista):
+    # Ventanas 8-10 y 9-11 traslapan lo liberado; 14-16 y el otro lote no
+    assert _promover(lista, 8, 12, cupos=2) == ["primera@uvg.edu.gt", "segunda@uvg.edu.gt"]
+    assert _promover(lista, 8, 12, cupos=5) == ["tarde@uvg.edu.gt"]
+    assert list(lista.pendientes()["user_email"]) == ["otra_hora@uvg.edu.gt", "otro_lote@uvg.edu.gt"]
+
+
+def test_empate_respeta_el_orden_de_llegada():
+    lista = ListaEspera()
+    for email in ["a@uvg.edu.gt", "b@uvg.edu.gt", "c@uvg.edu.gt"]:
+        lista.agregar(_solicitud(email, 8, 10, solicitada=1))
+    assert _promover(lista, 8, 10, cupos=3) == ["a@uvg.edu.gt", "b@uvg.edu.gt", "c@uvg.edu.gt"]
+
+
+def test_salta_la_ventana_incompatible(lista):
+    # La ventana 9-11 no cabe (p. ej. ya no hay cupo a las 10): pasa la siguiente más antigua
+    compatible = lambda e: e["slot_start"] != _h(9)
+    assert _promover(lista, 8, 12, cupos=1, compatible=compatible) == ["segunda@uvg.edu.gt"]
+    assert _promover(lista, 8, 12, cupos=1) == ["primera@uvg.edu.gt"]
+
+
+def test_descarta_ventanas_terminadas(lista):
+    assert _promover(lista, 0, 12, cupos=5) == ["primera@uvg.edu.gt", "segunda@uvg.edu.gt", "tarde@uvg.edu.gt"]
+    tarde = DIA + timedelta(hours=17)
+    assert lista.promover("L1", _h(14), _h(16), tarde, lambda e: True, lambda e: True) == []
+    # La ventana 14-16 salió de la cola; la del otro lote sigue hasta que alguien la consulte
+    assert lista.pendientes()["user_email"].tolist() == ["otro_lote@uvg.edu.gt"]
+
+
+def test_una_reserva_en_el_log_atiende_la_solicitud(lista):
+    df = pd.DataFrame([{"user_email": "primera@uvg.edu.gt", "accion": "reserva", "motivo": "clase", "lot_id": "L1",
+                        "booking_id": "b1", "success": 1, "source": "ui", "error_code": "",
+                        "timestamp": _h(4), "slot_start": _h(9), "slot_end": _h(11)}])
+    lista.sincronizar(df)
+    assert _promover(lista, 8, 12, cupos=1) == ["segunda@uvg.edu.gt"]